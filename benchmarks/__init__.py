@@ -0,0 +1,10 @@
+''' Performance benchmarks of the HAB-toolbox.
+
+Benchmarks live in `bench_*.py` modules of this package and are kept out of
+the default test run. Run them with
+``` bash
+python -m benchmarks                 # compare against baseline.json
+python -m benchmarks -k run --save   # update the baseline of some cases
+```
+See `benchmarks.harness` for how cases are defined and measured.
+'''
@@ -0,0 +1,5 @@
+from benchmarks.harness import main
+
+if __name__ == '__main__':
+    # pylint: disable=no-value-for-parameter
+    main()
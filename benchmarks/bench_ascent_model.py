@@ -0,0 +1,48 @@
+''' Benchmarks of `ascent_model` simulations.
+'''
+
+from hab_toolbox import ascent_model
+from hab_toolbox import atmosphere as atmosphere_models
+from hab_toolbox.trajectory import Telemetry
+
+from benchmarks.harness import benchmark, make_config
+
+
+@benchmark
+def bench_step():
+    sim_config = make_config()
+    balloon = ascent_model.configure_balloon(sim_config)
+    payload = ascent_model.configure_payload(sim_config)
+    atmosphere = atmosphere_models.tabulated_atmosphere()
+    return lambda: ascent_model.step(0.5, 0.0, 5.0, 1000.0, balloon, payload,
+                                     atmosphere)
+
+
+@benchmark(params=[{'dt': dt, 'duration': duration}
+                   for dt in (0.5, 0.1) for duration in (1000, 10000)])
+def bench_run(dt, duration):
+    sim_config = make_config(dt=dt, duration=duration)
+    return lambda: ascent_model.run(sim_config)
+
+
+@benchmark(params=[{'integrator': 'rk4'}, {'integrator': 'rk45'}])
+def bench_run_integrator(integrator):
+    sim_config = make_config(integrator=integrator)
+    return lambda: ascent_model.run(sim_config)
+
+
+@benchmark
+def bench_run_telemetry():
+    # telemetry runs the step-by-step model instead of the fused kernel
+    sim_config = make_config()
+    return lambda: ascent_model.run(sim_config, telemetry=Telemetry())
+
+
+@benchmark
+def bench_iter_run():
+    sim_config = make_config()
+
+    def workload():
+        for _ in ascent_model.iter_run(sim_config):
+            pass
+    return workload
@@ -0,0 +1,23 @@
+''' Benchmarks of `Balloon` and `Gas` objects.
+'''
+
+from hab_toolbox import atmosphere as atmosphere_models
+from hab_toolbox.balloon_library.balloon import Balloon, Gas
+
+from benchmarks.harness import benchmark
+
+
+@benchmark
+def bench_balloon_init():
+    return lambda: Balloon('HAB-3000')
+
+
+@benchmark
+def bench_gas_properties():
+    gas = Gas('helium', mass=2.5)
+    ambient = atmosphere_models.tabulated_atmosphere()(20000.0)
+
+    def workload():
+        gas.match_ambient(ambient)
+        return gas.volume, gas.density
+    return workload
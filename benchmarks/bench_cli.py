@@ -0,0 +1,67 @@
+''' Benchmarks of the command line interface and of saving and loading
+results.
+'''
+
+import json
+import os
+import tempfile
+
+from click.testing import CliRunner
+
+from hab_toolbox import ascent_model
+from hab_toolbox import cli
+from hab_toolbox import plot_tools
+from hab_toolbox import sinks
+from hab_toolbox import trajectory_io
+
+from benchmarks.harness import benchmark, make_config
+
+TEMP_DIR = tempfile.TemporaryDirectory(prefix='hab_toolbox_bench_')
+
+
+def _path(name):
+    return os.path.join(TEMP_DIR.name, name)
+
+
+@benchmark
+def bench_cli_simple_ascent_csv():
+    config_file = _path('sim_config.json')
+    with open(config_file, 'w') as output_file:
+        json.dump(make_config(), output_file)
+    # measure the simulation, not a read from the result cache
+    args = ['simple-ascent', config_file, '-o', _path('cli.csv'), '--no-cache']
+    runner = CliRunner()
+
+    def workload():
+        result = runner.invoke(cli.cli, args)
+        if result.exit_code != 0:
+            raise RuntimeError(result.output) from result.exception
+    return workload
+
+
+@benchmark(params=[{'extension': '.csv'}, {'extension': '.traj'}])
+def bench_save(extension):
+    columns = ascent_model.run(make_config())
+    path = _path(f'save{extension}')
+
+    def workload():
+        with sinks.open_sink(path) as sink:
+            sink.write(*columns)
+    return workload
+
+
+@benchmark(params=[{'extension': '.csv'}, {'extension': '.traj'}])
+def bench_load(extension):
+    path = _path(f'load{extension}')
+    with sinks.open_sink(path) as sink:
+        sink.write(*ascent_model.run(make_config()))
+    # copy memory-mapped columns so the data is actually read
+    return lambda: [column.copy() for column in trajectory_io.read(path)]
+
+
+@benchmark
+def bench_plot_ascent():
+    columns = ascent_model.run(make_config())
+    path = _path('plot.png')
+    return lambda: plot_tools.plot_ascent(*columns, title='benchmark',
+                                          save_fig=path, headless=True)
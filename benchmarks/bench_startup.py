@@ -0,0 +1,149 @@
+''' Benchmarks of the cold start of the command line interface.
+
+Job scripts start `hab-toolbox` once per simulation, so the time to start a
+new interpreter and import the command line interface is paid every time.
+Each case starts a new interpreter, so its time per call is the cold start
+latency.
+
+Run this module to see which imports the startup time is spent in, measured
+with `python -X importtime`:
+```bash
+python -m benchmarks.bench_startup
+```
+It exits with status 1 if importing `hab_toolbox.cli` takes longer than
+`STARTUP_TARGET` or imports one of the `HEAVY_MODULES`, which should only be
+imported by the commands that use them. `-X importtime` requires Python 3.7,
+on older versions only the heavy modules are checked.
+'''
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import click
+
+from benchmarks.harness import benchmark, make_config
+
+STARTUP_TARGET = 0.1  # [s] cumulative import time of hab_toolbox.cli
+IMPORTTIME = sys.version_info >= (3, 7)  # python -X importtime is available
+HEAVY_MODULES = ('numpy', 'matplotlib', 'ambiance', 'scipy')
+COMMANDS = {
+    'import': ['-c', 'import hab_toolbox.cli'],
+    'help': ['-m', 'hab_toolbox.cli', '--help'],
+}
+TEMP_DIR = tempfile.TemporaryDirectory(prefix='hab_toolbox_bench_')
+
+
+def _python(args, **kwargs):
+    return subprocess.run([sys.executable, *args], check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, **kwargs)
+
+
+def import_times(module='hab_toolbox.cli'):
+    ''' Import time of a module and of every module it imports, in a new
+    interpreter.
+
+    Args:
+        module (string): Name of the module to import. Optional, defaults to
+            `hab_toolbox.cli`.
+
+    Returns:
+        dict: Own and cumulative import time (s) by module name, in the
+        order the imports finished.
+
+    Raises:
+        RuntimeError: On Python versions without `-X importtime`.
+    '''
+    if not IMPORTTIME:
+        raise RuntimeError('python -X importtime requires Python 3.7')
+    stderr = _python(['-X', 'importtime', '-c', f'import {module}']).stderr
+    return parse_importtime(stderr)
+
+
+def parse_importtime(text):
+    ''' Parse the output of `python -X importtime`.
+
+    Returns:
+        dict: `(self, cumulative)` import time (s) by module name.
+    '''
+    times = {}
+    for line in text.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        if own.strip().isdigit():  # skip the column titles
+            times[name.strip()] = (int(own) / 1e6, int(cumulative) / 1e6)
+    return times
+
+
+def loaded_modules(module='hab_toolbox.cli'):
+    ''' Names of the `HEAVY_MODULES` that are executed by importing a module
+    in a new interpreter.
+    '''
+    # modules imported with lazy_import are in sys.modules before executing
+    code = (f'import sys, types, {module}; print(",".join(m for m in '
+            f'{HEAVY_MODULES!r} if type(sys.modules.get(m)) is '
+            f'types.ModuleType))')
+    output = _python(['-c', code]).stdout.strip()
+    return output.split(',') if output else []
+
+
+@benchmark(params=[{'command': command} for command in COMMANDS])
+def bench_cold_start(command):
+    return lambda: _python(COMMANDS[command])
+
+
+@benchmark(params=[{'configs': 10}])
+def bench_worker(configs):
+    config_file = os.path.join(TEMP_DIR.name, 'worker_config.json')
+    with open(config_file, 'w') as output_file:
+        json.dump(make_config(), output_file)
+    # one interpreter simulates every config
+    paths = f'{config_file}\n' * configs
+    return lambda: _python(['-m', 'hab_toolbox.cli', 'worker', '--no-cache'],
+                           input=paths)
+
+
+@click.command()
+@click.option('-m',
+              '--module',
+              default='hab_toolbox.cli',
+              show_default=True,
+              help='Module to import.')
+@click.option('-n',
+              '--top',
+              type=int,
+              default=15,
+              show_default=True,
+              help='Number of slowest imports to show.')
+def main(module, top):
+    ''' Show the slowest imports of a module and check the startup target.
+    '''
+    slow = False
+    if IMPORTTIME:
+        times = import_times(module)
+        for name, (own, cumulative) in sorted(
+                times.items(), key=lambda item: item[1][1],
+                reverse=True)[:top]:
+            click.echo(f'{name:<50} {own * 1e3:8.2f} ms '
+                       f'{cumulative * 1e3:8.2f} ms')
+        total = times[module][1]
+        click.echo(f'{module} imports in {total * 1e3:.1f} ms (target '
+                   f'{STARTUP_TARGET * 1e3:.0f} ms)')
+        slow = total > STARTUP_TARGET
+    else:
+        click.echo('Import times are not measured, python -X importtime '
+                   'requires Python 3.7')
+    heavy = loaded_modules(module)
+    if heavy:
+        click.echo(f'{module} imports {", ".join(heavy)}')
+    if slow or heavy:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    # pylint: disable=no-value-for-parameter
+    main()
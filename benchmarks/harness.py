@@ -0,0 +1,377 @@
+''' Benchmark harness.
+
+A benchmark case is a function decorated with `benchmark` in a `bench_*.py`
+module of this package. The function does any setup and returns the
+workload, a function without arguments that is timed:
+``` python
+@benchmark(params=[{'dt': 0.5}, {'dt': 0.1}])
+def bench_run(dt):
+    sim_config = make_config(dt=dt)
+    return lambda: ascent_model.run(sim_config)
+```
+
+Each case is measured twice:
+
+- `time`: The workload is called in loops long enough to time reliably (like
+  `timeit.Timer.autorange`), repeated `repeat` times. The fastest loop gives
+  the time per call in seconds, which is the least disturbed by other
+  processes.
+- `peak_memory`: The workload is called once more while `tracemalloc` traces
+  memory allocations. Peak traced memory in bytes includes every allocation
+  made by the workload, but not memory allocated during setup.
+
+Results are compared against a stored JSON baseline. A case regresses when
+its time or peak memory exceeds the baseline by more than a threshold. Every
+run also measures the `calibration` case, a fixed workload that does not
+depend on the HAB-toolbox, and times are compared relative to it, so a
+machine that is slower or busier than when the baseline was saved does not
+flag every case.
+'''
+
+import gc
+import importlib
+import json
+import logging
+import os
+import pkgutil
+import platform
+import sys
+import time
+import tracemalloc
+
+import click
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(__file__)
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+SIM_CONFIG_FILE = os.path.join(BENCHMARK_DIR, os.pardir, 'sim_config.json')
+DEFAULT_REPEAT = 5
+DEFAULT_MIN_TIME = 0.2  # [s] shortest timed loop
+DEFAULT_TIME_THRESHOLD = 0.5  # allowed relative increase of time per call
+DEFAULT_MEMORY_THRESHOLD = 0.10  # allowed relative increase of peak memory
+METRICS = ('time', 'peak_memory')
+CALIBRATION = 'calibration'  # name of the calibration case
+
+BENCHMARKS = {}  # registered cases by name
+
+
+def benchmark(function=None, params=None):
+    ''' Register a benchmark case.
+
+    Args:
+        function (function): Setup function that returns the workload.
+        params (list): Keyword arguments of the setup function. Registers one
+            case per dictionary, named like `bench_run[dt=0.5]`. Optional,
+            registers a single case without arguments by default.
+    '''
+    def register(function):
+        for kwargs in params or [{}]:
+            name = function.__name__
+            if kwargs:
+                name += '[%s]' % ','.join(
+                    f'{key}={value}' for key, value in kwargs.items())
+            if name in BENCHMARKS:
+                raise ValueError('Benchmark "%s" is already registered' % name)
+            BENCHMARKS[name] = (function, kwargs)
+        return function
+    if function is None:
+        return register
+    return register(function)
+
+
+def make_config(**simulation):
+    ''' The repository's `sim_config.json` with keys of the `simulation`
+    block replaced.
+    '''
+    with open(SIM_CONFIG_FILE) as config_file:
+        sim_config = json.load(config_file)
+    sim_config['simulation'].update(simulation)
+    return sim_config
+
+
+def calibration():
+    ''' Workload of the `calibration` case: sorting the sines of an array,
+    a mix of NumPy and pure Python work like the benchmark cases.
+    '''
+    values = np.linspace(0.0, 100.0, 10000)
+    return lambda: sorted(np.sin(values).tolist())
+
+
+def discover():
+    ''' Import every `bench_*` module of this package to register its cases.
+    '''
+    for module in pkgutil.iter_modules([BENCHMARK_DIR]):
+        if module.name.startswith('bench_'):
+            importlib.import_module(f'{__package__}.{module.name}')
+    return BENCHMARKS
+
+
+def measure(workload, repeat=DEFAULT_REPEAT, min_time=DEFAULT_MIN_TIME):
+    ''' Time per call and peak traced memory of a workload.
+
+    Args:
+        workload (function): Function without arguments to measure.
+        repeat (int): Number of timed loops. Optional, defaults to
+            `DEFAULT_REPEAT`.
+        min_time (float): Shortest duration of a timed loop in seconds.
+            Optional, defaults to `DEFAULT_MIN_TIME`.
+
+    Returns:
+        dict: `time` per call (s), `peak_memory` (bytes) and the number of
+        `calls` per timed loop.
+    '''
+    # find the number of calls per loop, this also warms up caches
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            workload()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 10 if elapsed < min_time / 10 else 2
+    best = elapsed
+    gc_enabled = gc.isenabled()
+    gc.disable()  # like timeit, collection pauses are not part of the time
+    try:
+        for _ in range(repeat - 1):
+            start = time.perf_counter()
+            for _ in range(calls):
+                workload()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        workload()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'time': best / calls, 'peak_memory': peak_memory,
+            'calls': calls}
+
+
+def run(cases, repeat=DEFAULT_REPEAT, min_time=DEFAULT_MIN_TIME,
+        callback=None):
+    ''' Measure benchmark cases.
+
+    Log messages of the HAB-toolbox are disabled while measuring, so that
+    cases measure the same code paths as a run without `--verbose`. The
+    `calibration` case is measured before and after the cases, and the
+    faster measurement is kept, so that it is as little disturbed by other
+    processes as the fastest loop of each case.
+
+    Args:
+        cases (dict): Setup function and keyword arguments by case name,
+            like `BENCHMARKS`.
+        repeat (int): See `measure`.
+        min_time (float): See `measure`.
+        callback (function): Called with the name and measurements of each
+            case as soon as it is measured. Optional.
+
+    Returns:
+        dict: Measurements of each case by name.
+    '''
+    results = {CALIBRATION: measure(calibration(), repeat, min_time)}
+    logging.disable(logging.WARNING)
+    try:
+        for name, (function, kwargs) in cases.items():
+            results[name] = measure(function(**kwargs), repeat, min_time)
+            if callback is not None:
+                callback(name, results[name])
+    finally:
+        logging.disable(logging.NOTSET)
+    results[CALIBRATION] = min(
+        results[CALIBRATION], measure(calibration(), repeat, min_time),
+        key=lambda result: result['time'])
+    if callback is not None:
+        callback(CALIBRATION, results[CALIBRATION])
+    return results
+
+
+def environment():
+    ''' Description of the machine and library versions the benchmarks ran
+    on, stored with the results.
+    '''
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, time_threshold=DEFAULT_TIME_THRESHOLD,
+            memory_threshold=DEFAULT_MEMORY_THRESHOLD):
+    ''' Compare measurements against a baseline.
+
+    Args:
+        results (dict): Measurements by case name, from `run`.
+        baseline (dict): Baseline measurements by case name.
+        time_threshold (float): Largest allowed relative increase of the time
+            per call. Optional, defaults to `DEFAULT_TIME_THRESHOLD`.
+        memory_threshold (float): Largest allowed relative increase of peak
+            memory. Optional, defaults to `DEFAULT_MEMORY_THRESHOLD`.
+
+    Returns:
+        list: `(name, metric, baseline value, value, ratio, regressed)`
+        tuples for every metric of every case in both `results` and
+        `baseline`. If both have the `calibration` case, the time ratio is
+        divided by the time ratio of the calibration, and the calibration
+        itself is not compared.
+    '''
+    thresholds = {'time': time_threshold, 'peak_memory': memory_threshold}
+    speed = calibration_ratio(results, baseline)
+    rows = []
+    for name, result in results.items():
+        if name not in baseline or name == CALIBRATION:
+            continue
+        for metric in METRICS:
+            old, new = baseline[name][metric], result[metric]
+            ratio = new / old if old else float('inf') if new else 1.0
+            if metric == 'time':
+                ratio /= speed
+            rows.append((name, metric, old, new, ratio,
+                         ratio > 1 + thresholds[metric]))
+    return rows
+
+
+def calibration_ratio(results, baseline):
+    ''' Time of the `calibration` case in `results` relative to `baseline`,
+    1.0 if either does not have it.
+    '''
+    if CALIBRATION not in results or CALIBRATION not in baseline:
+        return 1.0
+    return results[CALIBRATION]['time'] / baseline[CALIBRATION]['time']
+
+
+def load_baseline(path):
+    ''' Measurements by case name and the `environment` stored in a baseline
+    file, or empty dictionaries if the file does not exist.
+    '''
+    if not os.path.exists(path):
+        return {}, {}
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)
+    return baseline['benchmarks'], baseline.get('environment', {})
+
+
+def save_results(path, results, merge=True):
+    ''' Save measurements to a JSON file.
+
+    Args:
+        path (string): Path of the file.
+        results (dict): Measurements by case name, from `run`.
+        merge (bool): Keep cases of an existing file that were not measured
+            (`True`, default) or drop them (`False`).
+    '''
+    benchmarks = load_baseline(path)[0] if merge else {}
+    benchmarks.update(results)
+    with open(path, 'w') as output_file:
+        json.dump({'environment': environment(),
+                   'benchmarks': dict(sorted(benchmarks.items()))},
+                  output_file, indent=4)
+        output_file.write('\n')
+
+
+def _format(metric, value):
+    if metric == 'time':
+        for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+            if value >= scale:
+                break
+        return f'{value / scale:8.3f} {unit:>3}'
+    for unit, scale in (('MiB', 2**20), ('KiB', 2**10), ('B', 1)):
+        if value >= scale:
+            break
+    return f'{value / scale:8.3f} {unit:>3}'
+
+
+@click.command()
+@click.option('-k',
+              'pattern',
+              help='Only run cases whose name contains this string.')
+@click.option('-b',
+              '--baseline',
+              type=click.Path(dir_okay=False),
+              default=DEFAULT_BASELINE,
+              show_default=True,
+              help='Baseline JSON file to compare against.')
+@click.option('--save',
+              is_flag=True,
+              help='Store the measurements in the baseline file instead of '
+              'comparing against it.')
+@click.option('-o',
+              '--save_output',
+              type=click.Path(dir_okay=False),
+              help='Also save the measurements to a JSON file.')
+@click.option('--time_threshold',
+              type=float,
+              default=DEFAULT_TIME_THRESHOLD,
+              show_default=True,
+              help='Largest allowed relative increase of the time per call.')
+@click.option('--memory_threshold',
+              type=float,
+              default=DEFAULT_MEMORY_THRESHOLD,
+              show_default=True,
+              help='Largest allowed relative increase of peak memory.')
+@click.option('-r',
+              '--repeat',
+              type=int,
+              default=DEFAULT_REPEAT,
+              show_default=True,
+              help='Number of timed loops per case.')
+@click.option('-v',
+              '--verbose',
+              is_flag=True,
+              help='Print every measurement as soon as it is taken.')
+def main(pattern, baseline, save, save_output, time_threshold,
+         memory_threshold, repeat, verbose):
+    ''' Run the HAB-toolbox benchmarks and compare them against a baseline.
+
+    Exits with status 1 if any case is slower or uses more memory than its
+    baseline by more than the thresholds.
+    '''
+    cases = {name: case for name, case in discover().items()
+             if not pattern or pattern in name}
+    if not cases:
+        raise click.UsageError(f'No benchmarks match "{pattern}"')
+    callback = None
+    if verbose:
+        def callback(name, result):
+            click.echo(f'{name}: {result}', err=True)
+    results = run(cases, repeat=repeat, callback=callback)
+    if save_output:
+        save_results(save_output, results, merge=False)
+    if save:
+        save_results(baseline, results)
+        for name, result in results.items():
+            click.echo(f'{name:<50} ' + '  '.join(
+                _format(metric, result[metric]) for metric in METRICS))
+        click.echo(f'Baseline saved to {baseline}')
+        return
+
+    baseline_results, baseline_environment = load_baseline(baseline)
+    if baseline_environment and baseline_environment != environment():
+        click.echo(f'Baseline was measured on a different environment: '
+                   f'{baseline_environment}', err=True)
+    speed = calibration_ratio(results, baseline_results)
+    click.echo(f'Calibration: {speed:.2f}x the baseline time, time ratios '
+               f'are relative to it')
+    rows = compare(results, baseline_results, time_threshold,
+                   memory_threshold)
+    compared = {row[0] for row in rows}
+    for name, metric, old, new, ratio, regressed in rows:
+        flag = 'REGRESSION' if regressed else ''
+        click.echo(f'{name:<50} {metric:<12} {_format(metric, old)} -> '
+                   f'{_format(metric, new)} {ratio:6.2f}x {flag}')
+    for name in results:
+        if name not in compared and name != CALIBRATION:
+            click.echo(f'{name:<50} not in baseline, run with --save')
+    regressions = [row for row in rows if row[5]]
+    if regressions:
+        click.echo(f'{len(regressions)} regressions')
+        sys.exit(1)
@@ -1,14 +1,30 @@
 import logging
+import math
 import numpy as np
-from ambiance.ambiance import Atmosphere
 
+from hab_toolbox import atmosphere as atmosphere_models
+from hab_toolbox import cache as result_cache
+from hab_toolbox import controller
+from hab_toolbox import integrators
+from hab_toolbox import kernels
+from hab_toolbox.atmosphere import ambiance_atmosphere
 from hab_toolbox.balloon_library.balloon import Balloon, Gas, Payload
+from hab_toolbox.trajectory import FlightTrajectory, Trajectory
 
 
 log = logging.getLogger()
 np.set_printoptions(formatter={'float': '{:8.4f}'.format})
 MAX_ALLOWED_DT = 0.5
 MIN_ALLOWED_DT = 0.001
+MAX_ALLOWED_DT_RK4 = 2.0
+DEFAULT_MAX_DT = 60.0  # largest step the adaptive integrator may take
+DEFAULT_RTOL = 1e-6
+DEFAULT_ATOL = 1e-6
+EVENT_TOLERANCE = 1e-6  # tolerance of the burst time (s)
+INTEGRATORS = ('euler', 'rk4', 'rk45')
+DEFAULT_CHUNK_SIZE = 4096  # samples per chunk yielded by iter_run
+FLIGHT_PHASES = ('ascent', 'descent')  # phase markers of run_flight
+ASCENT, DESCENT = range(len(FLIGHT_PHASES))
 
 
 # All forces assume positive up coordinate frame.
@@ -17,7 +33,8 @@ def weight(atmosphere, total_mass)->float:
 
     Args:
         atmosphere (Atmosphere): Atmosphere object initialized at a specific
-            altitude.
+            altitude. Either an `ambiance.Atmosphere` or the conditions
+            returned by an `AtmosphereModel`.
         total_mass (float): Total dry mass in kilograms.
 
     Returns:
@@ -32,7 +49,8 @@ def buoyancy(atmosphere, balloon)->float:
 
     Args:
         atmosphere (Atmosphere): Atmosphere object initialized at a specific
-            altitude.
+            altitude. Either an `ambiance.Atmosphere` or the conditions
+            returned by an `AtmosphereModel`.
         balloon (Balloon): Balloon object.
 
     Returns:
@@ -50,7 +68,8 @@ def drag(atmosphere, balloon, ascent_rate)->float:
 
     Args:
         atmosphere (Atmosphere): Atmosphere object initialized at a specific
-            altitude.
+            altitude. Either an `ambiance.Atmosphere` or the conditions
+            returned by an `AtmosphereModel`.
         balloon (Balloon): Balloon object.
         ascent_rate (float): Velocity (positive up) in meters/second.
 
@@ -63,7 +82,54 @@ def drag(atmosphere, balloon, ascent_rate)->float:
     return direction * (1/2) * Cd * area * (ascent_rate ** 2) * atmosphere.density
 
 
-def step(dt, a, v, h, balloon, payload):
+def parachute_drag(atmosphere, cd, area, ascent_rate)->float:
+    ''' Drag force (N) of a parachute at a given geometric altitude (m).
+
+    Args:
+        atmosphere (Atmosphere): Atmosphere object initialized at a specific
+            altitude. Either an `ambiance.Atmosphere` or the conditions
+            returned by an `AtmosphereModel`.
+        cd (float): Drag coefficient of the parachute.
+        area (float): Reference area of the parachute (m^2).
+        ascent_rate (float): Velocity (positive up) in meters/second.
+
+    Returns:
+        float: Drag force (positive up) in Newtons.
+    '''
+    direction = -np.sign(ascent_rate)  # always oppose direction of motion
+    return direction * (1/2) * cd * area * (ascent_rate ** 2) * atmosphere.density
+
+
+def forces(h, v, balloon, payload, atmosphere=ambiance_atmosphere):
+    ''' Forces (N) acting on the balloon and payload.
+
+    Matches the lift gas to ambient conditions at the altitude as a side
+    effect.
+
+    Args:
+        h (float): Altitude in meters.
+        v (float): Velocity (positive up) in meters/second.
+        balloon (Balloon): Balloon object.
+        payload (Payload): Payload object.
+        atmosphere (AtmosphereModel): Callable that returns ambient conditions
+            at an altitude. Optional, defaults to constructing an
+            `ambiance.Atmosphere`.
+
+    Returns:
+        tuple: Weight, buoyancy, drag and net force (positive up) in Newtons.
+    '''
+    ambient = atmosphere(h)
+    balloon.match_ambient(ambient)
+    total_mass = balloon.mass + payload.total_mass
+
+    f_weight = weight(ambient, total_mass)
+    f_buoyancy = buoyancy(ambient, balloon)
+    f_drag = drag(ambient, balloon, v)
+    f_net = f_weight + f_buoyancy + f_drag
+    return f_weight, f_buoyancy, f_drag, f_net
+
+
+def step(dt, a, v, h, balloon, payload, atmosphere=ambiance_atmosphere):
     ''' Progress the simulation by one time step.
 
     Args:
@@ -73,6 +139,9 @@ def step(dt, a, v, h, balloon, payload):
         h (float): Altitude in meters.
         balloon (Balloon): Balloon object.
         payload (Payload): Payload object.
+        atmosphere (AtmosphereModel): Callable that returns ambient conditions
+            at an altitude, such as a `TabulatedAtmosphere`. Optional,
+            defaults to constructing an `ambiance.Atmosphere`.
 
     Returns:
         tuple: Tuple containing rates of change over the time step:
@@ -84,29 +153,157 @@ def step(dt, a, v, h, balloon, payload):
         - `dh` (`float`): Delta altitude between the previous time index and
                 the latest one in meters.
     '''
-    atmosphere = Atmosphere(h)
-    balloon.match_ambient(atmosphere)
+    f_net = forces(h, v, balloon, payload, atmosphere)[3]
     total_mass = balloon.mass + payload.total_mass
 
-    f_weight = weight(atmosphere, total_mass)
-    f_buoyancy = buoyancy(atmosphere, balloon)
-    f_drag = drag(atmosphere, balloon, v)
-    f_net = f_weight + f_buoyancy + f_drag
-
     a = f_net/total_mass
     dv = a*dt
     dh = v*dt
-    log.debug(' | '.join([
-        f'f_net {f_net[0]} N',
-        f'f_weight {f_weight[0]} N',
-        f'f_buoyancy {f_buoyancy[0]} N',
-        f'f_drag {f_drag[0]} N',
-        f''
-    ]))
     return a, dv, dh
 
 
-def run(sim_config):
+def acceleration(h, v, balloon, payload,
+                 atmosphere=ambiance_atmosphere)->float:
+    ''' Instantaneous acceleration (m/s^2) of the balloon and payload.
+
+    This is the right-hand side of the equations of motion used by the
+    Runge-Kutta integrators, with the same force model as `step`.
+
+    Args:
+        h (float): Altitude in meters.
+        v (float): Velocity (positive up) in meters/second.
+        balloon (Balloon): Balloon object.
+        payload (Payload): Payload object.
+        atmosphere (AtmosphereModel): Callable that returns ambient conditions
+            at an altitude. Optional, defaults to constructing an
+            `ambiance.Atmosphere`.
+
+    Returns:
+        float: Acceleration (positive up) in meters/second^2.
+    '''
+    f_net = forces(h, v, balloon, payload, atmosphere)[3]
+    total_mass = balloon.mass + payload.total_mass
+    return np.asarray(f_net/total_mass).item()
+
+
+def burst_margin(h, balloon, atmosphere=ambiance_atmosphere)->float:
+    ''' Difference between the balloon diameter at an altitude and its burst
+    diameter (m). The balloon bursts where the margin crosses zero.
+
+    Args:
+        h (float): Altitude in meters.
+        balloon (Balloon): Balloon object.
+        atmosphere (AtmosphereModel): Callable that returns ambient conditions
+            at an altitude. Optional, defaults to constructing an
+            `ambiance.Atmosphere`.
+
+    Returns:
+        float: Diameter minus burst diameter in meters. Negative while the
+        balloon is intact.
+    '''
+    balloon.match_ambient(atmosphere(h))
+    return np.asarray(balloon.diameter - balloon.burst_diameter).item()
+
+
+def configure_balloon(sim_config):
+    ''' Initialize a `Balloon` from the `balloon` block of a simulation
+    config and fill it with lift gas.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+
+    Returns:
+        Balloon: Balloon object filled with `reserve_mass_kg` plus
+        `bleed_mass_kg` of lift gas.
+    '''
+    balloon = Balloon(sim_config['balloon']['type'])
+    balloon.reserve_gas = sim_config['balloon']['reserve_mass_kg']
+    balloon.bleed_gas = sim_config['balloon']['bleed_mass_kg']
+    balloon.lift_gas = Gas(balloon.spec['lifting_gas'],
+                           mass=balloon.reserve_gas+balloon.bleed_gas)
+    if 'cd' in sim_config['balloon']:
+        balloon.cd = sim_config['balloon']['cd']
+    return balloon
+
+
+def configure_payload(sim_config):
+    ''' Initialize a `Payload` from the `payload` block of a simulation
+    config.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+
+    Returns:
+        Payload: Payload object.
+    '''
+    bus_mass = sim_config['payload']['bus_mass_kg']
+    ballast_mass = sim_config['payload']['ballast_mass_kg']
+    return Payload(dry_mass=bus_mass, ballast_mass=ballast_mass)
+
+
+def configure_parachute(sim_config):
+    ''' Read the parachute of the `descent` block of a simulation config.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+
+    Returns:
+        tuple: Drag coefficient and reference area (m^2) of the parachute,
+        and the altitude of the ground (m).
+    '''
+    descent = sim_config.get('descent')
+    if descent is None:
+        raise ValueError('Simulation config has no "descent" block')
+    cd = descent['parachute_cd']
+    area = descent['parachute_area_m2']
+    if cd <= 0 or area <= 0:
+        raise ValueError('Parachute drag coefficient and area must be '
+                         'positive, not %s and %s' % (cd, area))
+    ground = descent.get('ground_altitude_m',
+                         sim_config['simulation']['initial_altitude'])
+    return cd, area, ground
+
+
+def limit_time_step(dt, max_dt=MAX_ALLOWED_DT):
+    ''' Clamp a time step (s) to the range the solver is stable in.
+
+    Args:
+        dt (float): Requested time step size in seconds.
+        max_dt (float): Largest stable time step of the solver in seconds.
+            Optional, defaults to the limit of the Euler solver.
+
+    Returns:
+        float: The closest allowed time step size in seconds.
+    '''
+    if dt < MIN_ALLOWED_DT or dt > max_dt:
+        # solver gets unstable with time steps above max_dt
+        log.error(f'Time step must be between {MIN_ALLOWED_DT} and {max_dt} '
+                  f'seconds, not {dt}')
+        if dt < MIN_ALLOWED_DT:
+            dt = MIN_ALLOWED_DT
+        elif dt > max_dt:
+            dt = max_dt
+        log.warning(f'Using closest allowed time step: {dt} seconds')
+    return dt
+
+
+def step_count(duration, dt):
+    ''' Number of fixed time steps of a simulation, the length of
+    `np.arange(0, duration, dt)` without allocating it. Step `k` is at time
+    `k * dt`, the same float as element `k` of the `arange`.
+    '''
+    return max(0, math.ceil(duration / dt))
+
+
+def _log_burst(t, h, balloon):
+    ''' Log that the balloon reached its burst threshold at time `t` (s) and
+    altitude `h` (m).
+    '''
+    log.warning('Balloon burst threshold exceeded: time %s, altitude %s m, '
+                'diameter %s m' % (t, h, balloon.diameter))
+
+
+def run(sim_config, telemetry=None, profile=None, cache=None):
     ''' Start a simulation. Specify initial conditions and configurable
     parameters with a dictionary containing special keys.
 
@@ -121,6 +318,7 @@ def run(sim_config):
             "type": (string) Part number of the balloon to import from balloon_library,
             "reserve_mass_kg": (float) Mass of lift gas to always keep in balloon (kg),
             "bleed_mass_kg": (float) Mass of lift gas allowed to be bled from balloon (kg),
+            "cd": (float) Optional. Drag coefficient, overrides the balloon spec,
         },
         "payload": {
             "bus_mass_kg": (float) Mass of non-ballast payload mass (kg),
@@ -128,8 +326,14 @@ def run(sim_config):
         },
         "pid": {
             "mode": (string) Altitude controller mode. [pwm, continuous],
+            "target_altitude_m": (float) Optional. Altitude to hold (m), enables the controller,
+            "delay_time_s": (float) Optional. Earliest time to arm the controller (s),
+            "delay_altitude_m": (float) Optional. Altitude to reach before arming the controller (m),
+            "arm_tolerance_m": (float) Optional. Largest altitude error to arm the controller at (m),
             "bleed_rate_kgps": (float) Mass flow rate of lift gas bleed (kg/s),
             "ballast_rate_kgps": (float) Mass flow rate of ballast release (kg/s),
+            "bleed_min_rate_kgps": (float) Optional. Smallest mass flow rate of lift gas bleed (kg/s),
+            "ballast_min_rate_kgps": (float) Optional. Smallest mass flow rate of ballast release (kg/s),
             "gains": {
                 "kp": (float) Proportional gain,
                 "ki": (float) Integral gain,
@@ -142,19 +346,97 @@ def run(sim_config):
             "duration": (float) Max time duration of simulation (seconds),
             "dt": (float) Time step (seconds),
             "initial_altitude": (float) Altitude at simulation start (m), [-5004 to 80000],
-            "initial_velocity": (float) Velocity at simulation start (m/s)
+            "initial_velocity": (float) Velocity at simulation start (m/s),
+            "decimation": (int) Optional. Only keep every Nth time step,
+            "max_samples": (int) Optional. Only keep the most recent samples,
+            "integrator": (string) Optional. Integrator. [euler, rk4, rk45],
+            "rtol": (float) Optional. Relative tolerance of rk45,
+            "atol": (float) Optional. Absolute tolerance of rk45,
+            "max_dt": (float) Optional. Largest time step of rk45 (seconds)
+        },
+        "atmosphere": (optional) {
+            "model": (string) Atmosphere model. [tabulated, ambiance],
+            "resolution_m": (float) Spacing between table entries (m),
+            "temperature_noise_gain": (float) Temperature noise power,
+            "pressure_noise_gain": (float) Pressure noise power,
+            "density_noise_gain": (float) Density noise power,
+            "seed": (int) Seed for the noise random number generator
         }
     }
     ```
+
+    By default, ambient conditions are interpolated from tables of the 1976
+    COESA model that are built once and shared between simulations. Set the
+    atmosphere `model` to `ambiance` to evaluate `ambiance.Atmosphere` on every
+    time step instead. Set any of the noise gains to add random noise to the
+    ambient conditions at every time step, see `atmosphere.noise_std`.
+
+    The equations of motion are integrated with explicit Euler by default.
+    Set the `integrator` to `rk4` for the classic 4th order Runge-Kutta method
+    at a fixed step of `dt` (up to `MAX_ALLOWED_DT_RK4`), or to `rk45` for the
+    adaptive Dormand-Prince 5(4) method, which starts at `dt` and adjusts the
+    step size to keep the local error within `rtol` and `atol` (see
+    `integrators.error_norm`). With either Runge-Kutta integrator the burst
+    is located as an event: the time at which `burst_margin` crosses zero is
+    found by root finding within the step, and the last sample is the state at
+    that time. Runge-Kutta trajectories also include the initial state at
+    time `0`. Atmosphere noise is drawn on every evaluation of the forces, so
+    it is best combined with the Euler integrator.
+
+    Set a `target_altitude_m` in the `pid` block to fly with the closed-loop
+    altitude controller of `hab_toolbox.controller`. On every time step the
+    controller bleeds lift gas (down to `reserve_mass_kg`) or drops ballast to
+    hold the target altitude. By default it arms at the target altitude, with
+    an `arm_tolerance_m` of `1000` m, and the smallest flow rates are `0`.
+    The controller requires the Euler integrator.
+
+    Results are written into a `Trajectory` that is preallocated from the
+    number of time steps, then trimmed when the simulation ends. Set
+    `decimation` and/or `max_samples` to bound memory use for long
+    simulations, or use `iter_run` to stream results in chunks.
+
+    The simulation ends when the balloon bursts. Use `run_flight` to continue
+    with the descent under a parachute until the payload lands.
+
+    Euler simulations with the default tabulated atmosphere and no noise,
+    controller or telemetry run on the fused kernel of `hab_toolbox.kernels`,
+    which is compiled if `numba` is installed. Results are the same as with
+    the step-by-step model.
+
+    Per-step diagnostics are not logged unless the log level is `INFO`. To
+    record the forces acting on the balloon and payload, pass a `Telemetry`
+    record. It is resized to match the trajectory and filled with one row of
+    forces and masses per stored sample:
+    ``` python
+    telemetry = Telemetry()
+    tspan, altitude, velocity, acceleration = run(sim_config, telemetry)
+    telemetry.drag  # drag force (N) at each time in tspan
+    ```
+
+    To find out where the time of a simulation goes, pass a `Profile` from
+    `hab_toolbox.profiling`. Its phase timers and step count are updated as
+    the simulation runs.
+
+    To reuse the results of simulations that already ran, pass a
+    `ResultCache` from `hab_toolbox.cache`. Results are read from the cache if
+    the same config was simulated before, and stored otherwise. The cache is
+    not used if a `telemetry` record or a `profile` is passed, or if the
+    config adds atmosphere noise without a `seed`.
+
     Args:
         sim_config (dict): Dictionary of simulation config parameters.
+        telemetry (Telemetry): Record to fill with the forces and masses at
+            each sample. Optional, nothing is recorded by default.
+        profile (Profile): Profile to collect phase timers in. Optional,
+            nothing is timed by default.
+        cache (ResultCache): Cache to read the results from or store them
+            in. Optional, results are not cached by default.
 
     Returns:
         tuple: Tuple containing timeserieses of simulation values:
 
         - `tspan` (`array`): Array of time indices in seconds.
-        - `altitude` (`array`): Instantaneous acceleration (positive up) in
-                meters/second^2.
+            One entry for each stored sample.
         - `altitude` (`array`): Array of altitudes.
             One entry for each time index.
         - `velocity` (`array`): Array of ascent velocities.
@@ -162,58 +444,631 @@ def run(sim_config):
         - `acceleration` (`array`): Array of ascent accelerations.
             One entry for each time index. Positive up.
     '''
-    altitude=np.array([])
-    ascent_rate=np.array([])
-    ascent_accel=np.array([])
+    key = None
+    if cache is not None and telemetry is None and profile is None:
+        key = _cache_key(sim_config)
+    if key is not None:
+        records = cache.load(key)
+        if records is not None:
+            return tuple(np.ascontiguousarray(column) for column in records.T)
+    if profile is not None:
+        profile.mark()
+    integrator = _integrator(sim_config)
+    trajectory = Trajectory.from_config(_sample_count(sim_config), sim_config,
+                                        growable=integrator == 'rk45')
+    if telemetry is None and _fused(sim_config):
+        for chunk in _simulate_euler_fused(sim_config, profile=profile):
+            trajectory.extend(*chunk)
+            if profile is not None:
+                profile.lap('io')
+    elif telemetry is None:
+        for sample in _simulate(sim_config, profile=profile):
+            trajectory.append(*sample)
+            if profile is not None:
+                profile.lap('io')
+    else:
+        telemetry.configure_like(trajectory)
+        for sample in _simulate(sim_config, record_forces=True,
+                                profile=profile):
+            trajectory.append(*sample[:4])
+            telemetry.append(sample[0], *sample[4:])
+            if profile is not None:
+                profile.lap('io')
+    if key is not None:
+        cache.save(key, np.column_stack(trajectory.trim()))
+    return trajectory.trim()
 
-    balloon = Balloon(sim_config['balloon']['type'])
-    balloon.reserve_gas = sim_config['balloon']['reserve_mass_kg']
-    balloon.bleed_gas = sim_config['balloon']['bleed_mass_kg']
-    balloon.lift_gas = Gas(balloon.spec['lifting_gas'],
-                           mass=balloon.reserve_gas+balloon.bleed_gas)
-    bus_mass = sim_config['payload']['bus_mass_kg']
-    ballast_mass = sim_config['payload']['ballast_mass_kg']
-    payload = Payload(dry_mass=bus_mass, ballast_mass=ballast_mass)
 
+def iter_run(sim_config, chunk_size=DEFAULT_CHUNK_SIZE, profile=None,
+             checkpoint=None, cache=None):
+    ''' Start a simulation and yield its results in chunks as they are
+    computed.
+
+    Runs the same simulation as `run`, but only holds up to `chunk_size`
+    samples in memory at a time so that results can be streamed to a sink
+    (see `hab_toolbox.sinks`) at constant memory. `decimation` is applied to
+    the stream, `max_samples` is ignored.
+
+    Long simulations can be stopped and resumed with a `Checkpoint` from
+    `hab_toolbox.checkpoint`. Before each chunk is yielded, the checkpoint is
+    updated to the state after its last time step, so a checkpoint saved
+    while the chunk is being consumed continues right after it. A simulation
+    that is passed a checkpoint loaded from a file starts from its state and
+    yields the same samples as the rest of the original simulation.
+
+    With a `ResultCache`, a stored result is streamed from a memory-mapped
+    file, and a simulated result is written to the cache as it is streamed.
+    It is only stored once the last chunk was consumed. The cache is not used
+    together with a `profile` or `checkpoint`, see `run`.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters. See
+            `run` for supported keys.
+        chunk_size (int): Number of samples per chunk. Optional, defaults to
+            `DEFAULT_CHUNK_SIZE`.
+        profile (Profile): Profile to collect phase timers in, see `run`.
+            The time between yielding a chunk and being asked for the next one
+            is added to the `io` phase. Optional.
+        checkpoint (Checkpoint): Checkpoint to update before each chunk and
+            to resume from. Optional.
+        cache (ResultCache): Cache to read the results from or store them
+            in. Optional, results are not cached by default.
+
+    Yields:
+        tuple: `tspan`, `altitude`, `velocity` and `acceleration` arrays in
+        the same format as `run`, with up to `chunk_size` samples each.
+    '''
+    if chunk_size < 1:
+        raise ValueError('Chunk size must be at least 1, not %s' % chunk_size)
+    key = None
+    if cache is not None and profile is None and checkpoint is None:
+        key = _cache_key(sim_config, stream=True)
+    if key is None:
+        yield from _iter_chunks(sim_config, chunk_size, profile, checkpoint)
+        return
+    records = cache.load(key, mmap_mode='r')
+    if records is not None:
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start+chunk_size]
+            yield tuple(np.array(chunk[:, j]) for j in range(chunk.shape[1]))
+        return
+    with cache.writer(key) as sink:
+        for chunk in _iter_chunks(sim_config, chunk_size):
+            sink.write(*chunk)
+            yield chunk
+
+
+def _iter_chunks(sim_config, chunk_size, profile=None, checkpoint=None):
+    ''' Generate the chunks of `iter_run` by simulating.
+    '''
+    if profile is not None:
+        profile.mark()
+    decimation = sim_config['simulation'].get('decimation', 1)
+    count = 0 if checkpoint is None else checkpoint.count
+    if _fused(sim_config):
+        # whole chunks of time steps decimate to whole chunks of samples
+        for chunk in _simulate_euler_fused(sim_config,
+                                           chunk_size * decimation,
+                                           profile=profile,
+                                           checkpoint=checkpoint):
+            first = -count % decimation
+            count += len(chunk[0])
+            if checkpoint is not None:
+                checkpoint.update(count, *[column[-1] for column in chunk])
+            yield tuple(column[first::decimation].copy() for column in chunk)
+            if profile is not None:
+                profile.lap('io')
+        return
+    buffer = Trajectory(chunk_size, decimation=decimation)
+    buffer.count = count
+    for sample in _simulate(sim_config, profile=profile,
+                            checkpoint=checkpoint):
+        buffer.append(*sample)
+        if len(buffer) == chunk_size:
+            if checkpoint is not None:
+                checkpoint.update(buffer.count, *sample)
+            yield tuple(column.copy() for column in buffer.trim())
+            buffer.clear()
+        if profile is not None:
+            profile.lap('io')
+    if len(buffer):
+        if checkpoint is not None:
+            checkpoint.update(buffer.count, *sample)
+        yield tuple(column.copy() for column in buffer.trim())
+        if profile is not None:
+            profile.lap('io')
+
+
+def run_flight(sim_config):
+    ''' Simulate a full flight: the ascent, the balloon burst and the descent
+    under a parachute until the payload lands.
+
+    The ascent is the same simulation as `run`, with any integrator and the
+    altitude controller. Once the balloon bursts, the payload, ballast and
+    the remains of the balloon fall under a parachute described by the
+    `descent` block of `sim_config`:
+    ``` json
+    {
+        "descent": {
+            "parachute_cd": (float) Drag coefficient of the parachute,
+            "parachute_area_m2": (float) Reference area of the parachute (m^2),
+            "ground_altitude_m": (float) Optional. Altitude of the ground (m), defaults to `initial_altitude`
+        }
+    }
+    ```
+    The descent is integrated with the integrator of the ascent, through the
+    atmosphere model of the config without noise. The flight ends when the
+    payload reaches the ground or the `duration` is reached.
+
+    Both phases are written into one `FlightTrajectory`, preallocated for the
+    whole `duration`, with a phase marker for each sample. The time of the
+    landing is located exactly within the step that reaches the ground: by
+    solving the linear motion of the step with the Euler integrator, or by
+    root finding like the burst event with the Runge-Kutta integrators. The
+    last sample is the state at landing, and is kept regardless of
+    `decimation`.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters. See
+            `run` for supported keys.
+
+    Returns:
+        tuple: `tspan`, `altitude`, `velocity` and `acceleration` arrays like
+        `run`, an array of the index of the phase of each sample in
+        `FLIGHT_PHASES`, and a dictionary of the `burst` and `landing`
+        events. Each event holds the `time` (s), `altitude` (m) and
+        `velocity` (m/s) at which it happened, or is `None` if the flight
+        ended before it.
+    '''
+    cd, area, ground = configure_parachute(sim_config)
+    integrator = _integrator(sim_config)
     duration = sim_config['simulation']['duration']
+    # the landing adds a sample that is kept regardless of decimation
+    decimation = sim_config['simulation'].get('decimation', 1)
+    trajectory = FlightTrajectory.from_config(
+        _sample_count(sim_config) + decimation, sim_config,
+        growable=integrator == 'rk45')
+    balloon = configure_balloon(sim_config)
+    payload = configure_payload(sim_config)
+    events = {'burst': None, 'landing': None}
+
+    sample = None
+    for sample in _simulate(sim_config, balloon=balloon, payload=payload):
+        trajectory.append(*sample, ASCENT)
+    if integrator == 'euler':
+        dt = limit_time_step(sim_config['simulation']['dt'])
+        if trajectory.count == step_count(duration, dt):
+            return (*trajectory.trim(), events)
+        # the burst was detected before the step at this time
+        t = trajectory.count * dt
+    else:
+        t = sample[0]
+        if duration - t <= EVENT_TOLERANCE:
+            return (*trajectory.trim(), events)
+    if sample is None:
+        h = sim_config['simulation']['initial_altitude']
+        v = sim_config['simulation']['initial_velocity']
+    else:
+        h, v = sample[1], sample[2]
+    events['burst'] = {'time': float(t), 'altitude': float(h),
+                       'velocity': float(v)}
+
+    mass = balloon.mass + payload.total_mass
+    atmosphere = atmosphere_models.from_config(sim_config, noise=False)
+    log.warning(f'Starting descent: parachute area: {area} m^2 | '
+                f'mass: {mass} kg')
+    events['landing'] = _descend(sim_config, integrator, trajectory, t, h, v,
+                                 mass, cd, area, ground, atmosphere)
+    if events['landing'] is not None:
+        log.warning('Landed: time %s, velocity %s m/s' % (
+            events['landing']['time'], events['landing']['velocity']))
+    return (*trajectory.trim(), events)
+
+
+def _cache_key(sim_config, stream=False):
+    ''' Key of the results of a simulation config in a `ResultCache`, or
+    `None` if the results are random. Results streamed by `iter_run` ignore
+    `max_samples`.
+    '''
+    atmo_config = sim_config.get('atmosphere', {})
+    if any(atmosphere_models.noise_std(sim_config)) and (
+            atmo_config.get('seed') is None):
+        return None
+    if stream and 'max_samples' in sim_config['simulation']:
+        sim_config = dict(sim_config, simulation={
+            key: value for key, value in sim_config['simulation'].items()
+            if key != 'max_samples'})
+    return result_cache.make_key('trajectory', sim_config)
+
+
+def _integrator(sim_config):
+    ''' Name of the integrator requested by a simulation config.
+    '''
+    integrator = sim_config['simulation'].get('integrator', 'euler')
+    if integrator not in INTEGRATORS:
+        raise ValueError('Integrator must be one of %s, not "%s"' % (
+            INTEGRATORS, integrator))
+    return integrator
+
+
+def _sample_count(sim_config):
+    ''' Number of samples in the trajectory of a simulation config that runs
+    for its full duration. An estimate for the `rk45` integrator.
+    '''
+    integrator = _integrator(sim_config)
     dt = sim_config['simulation']['dt']
-    if dt < MIN_ALLOWED_DT or dt > MAX_ALLOWED_DT:
-        # solver gets unstable with time steps above 0.5
-        log.error(f'Time step must be between 0.001 and 0.5 seconds, not {dt}')
-        if dt < MIN_ALLOWED_DT:
-            dt = MIN_ALLOWED_DT
-        elif dt > MAX_ALLOWED_DT:
-            dt = MAX_ALLOWED_DT
-        log.warning(f'Using closest allowed time step: {dt} seconds')
+    if integrator != 'rk45':
+        max_dt = MAX_ALLOWED_DT_RK4 if integrator == 'rk4' else MAX_ALLOWED_DT
+        dt = min(max(dt, MIN_ALLOWED_DT), max_dt)
+    n_steps = step_count(sim_config['simulation']['duration'], dt)
+    # Runge-Kutta trajectories include the initial state
+    return n_steps if integrator == 'euler' else n_steps + 1
 
-    tspan = np.arange(0, duration, step=dt)
 
-    h = sim_config['simulation']['initial_altitude']
-    v = sim_config['simulation']['initial_velocity']
-    a = Atmosphere(h).grav_accel
+def _fused(sim_config):
+    ''' Whether a simulation can run on the fused Euler kernel.
+    '''
+    return (_integrator(sim_config) == 'euler'
+            and not controller.is_enabled(sim_config)
+            and isinstance(atmosphere_models.from_config(sim_config),
+                           atmosphere_models.TabulatedAtmosphere)
+            and not log.isEnabledFor(logging.INFO))
+
+
+def _simulate(sim_config, record_forces=False, profile=None,
+              checkpoint=None, balloon=None, payload=None):
+    ''' Generate the samples of a simulation, one `(t, h, v, a)` tuple at a
+    time. See `run`. If `record_forces` is set, each sample is followed by the
+    weight, buoyancy, drag and net force, lift gas mass and ballast mass at
+    that sample. If a `profile` is given, each phase of a step ends with a
+    lap of the profile. If a `checkpoint` is given, it is bound to the
+    simulation and the simulation resumes from it, see `iter_run`. A
+    `balloon` and `payload` that are given are flown instead of new ones, so
+    that their state can be read after the simulation.
+    '''
+    integrator = _integrator(sim_config)
+    if controller.is_enabled(sim_config) and integrator != 'euler':
+        raise ValueError('The altitude controller requires the euler '
+                         'integrator, not "%s"' % integrator)
+    if balloon is None:
+        balloon = configure_balloon(sim_config)
+    if payload is None:
+        payload = configure_payload(sim_config)
+    if integrator == 'euler':
+        yield from _simulate_euler(sim_config, balloon, payload, record_forces,
+                                   profile, checkpoint)
+    else:
+        yield from _simulate_runge_kutta(sim_config, balloon, payload,
+                                         integrator, record_forces, profile,
+                                         checkpoint)
+
+
+def _simulate_euler(sim_config, balloon, payload, record_forces=False,
+                    profile=None, checkpoint=None):
+    ''' Generate the samples of a simulation with the `euler` integrator.
+    '''
+    duration = sim_config['simulation']['duration']
+    dt = limit_time_step(sim_config['simulation']['dt'])
+
+    n_steps = step_count(duration, dt)
+    atmosphere = atmosphere_models.from_config(sim_config)
+    control = None
+    if controller.is_enabled(sim_config):
+        control = controller.AltitudeController.from_config(sim_config)
+    start = 0
+    if checkpoint is not None and checkpoint.resumed:
+        start = checkpoint.count
+        h, v, a = [checkpoint.state[key] for key in (
+            'altitude', 'ascent_rate', 'ascent_accel')]
+    else:
+        h = sim_config['simulation']['initial_altitude']
+        v = sim_config['simulation']['initial_velocity']
+        a = atmosphere(h).grav_accel
+    if checkpoint is not None:
+        checkpoint.bind(balloon, payload, control, atmosphere)
+    if profile is not None:
+        atmosphere = profile.timed('atmosphere', atmosphere)
 
     log.warning(
         f'Starting simulation: '
         f'balloon: {balloon.name} | '
         f'duration: {duration} s | '
         f'dt: {dt} s')
-    for t in tspan:
-        if balloon.burst_threshold_exceeded:
-            log.warning('Balloon burst threshold exceeded: time %s, altitude %s m, diameter %s m' % (
-                t, h, balloon.diameter))
-            # truncate timesteps that weren't simulated
-            tspan = np.transpose(tspan[np.where(tspan < t)])
+    verbose = log.isEnabledFor(logging.INFO)
+    if profile is not None:
+        profile.lap('setup')
+    for k in range(start, n_steps):
+        t = k * dt
+        burst = balloon.burst_threshold_exceeded
+        if profile is not None:
+            profile.lap('burst_check')
+        if burst:
+            _log_burst(t, h, balloon)
             break
-        a, dv, dh = step(dt, a, v, h, balloon, payload)
+        # same update as `step`, keeping the forces for telemetry
+        f = forces(h, v, balloon, payload, atmosphere)
+        if profile is not None:
+            profile.lap('forces')
+        total_mass = balloon.mass + payload.total_mass
+        a = f[3]/total_mass
+        dv = a*dt
+        dh = v*dt
+        # ambiance returns single-element arrays, keep the state scalar
+        a, dv, dh = [np.asarray(x).item() for x in (a, dv, dh)]
+        if control is not None:
+            # mass flow is driven by the altitude at the start of the step
+            control.actuate(balloon, payload, t, h, dt)
         v += dv
         h += dh
-        log.info(' | '.join([
-            f'{t:6.1f} s',
-            f'{a} m/s^2',
-            f'{v} m/s | {h} m',
-        ]))
-        altitude = np.append(altitude, h)
-        ascent_rate = np.append(ascent_rate, v)
-        ascent_accel = np.append(ascent_accel, a)
-
-    return tspan, altitude, ascent_rate, ascent_accel
+        if profile is not None:
+            profile.steps += 1
+            profile.lap('integration')
+        if verbose:
+            log.info('%6.1f s | %s m/s^2 | %s m/s | %s m', t, a, v, h)
+            if profile is not None:
+                profile.lap('logging')
+        if record_forces:
+            yield (t, h, v, a, *[np.asarray(x).item() for x in f],
+                   balloon.lift_gas.mass, payload.ballast_mass)
+        else:
+            yield t, h, v, a
+
+
+def _simulate_euler_fused(sim_config, chunk_size=DEFAULT_CHUNK_SIZE,
+                          profile=None, checkpoint=None):
+    ''' Generate the samples of a simulation with the fused Euler kernel of
+    `kernels`, as `(tspan, altitude, velocity, acceleration)` arrays of up to
+    `chunk_size` time steps. Same samples as `_simulate_euler`. Arrays are
+    reused for the next chunk. The lift gas is matched to the conditions
+    after the last step of a chunk before the chunk is yielded.
+    '''
+    duration = sim_config['simulation']['duration']
+    dt = limit_time_step(sim_config['simulation']['dt'])
+
+    n_steps = step_count(duration, dt)
+    atmosphere = atmosphere_models.from_config(sim_config)
+    balloon = configure_balloon(sim_config)
+    payload = configure_payload(sim_config)
+    gas = balloon.lift_gas
+    kernel = kernels.compiled(kernels.euler_steps)
+    tables = kernels.tables(atmosphere)
+    time_buffer = np.empty(min(chunk_size, n_steps))
+    buffers = [np.empty(min(chunk_size, n_steps)) for _ in range(3)]
+
+    start = 0
+    if checkpoint is not None and checkpoint.resumed:
+        start = checkpoint.count
+        h = checkpoint.state['altitude']
+        v = checkpoint.state['ascent_rate']
+    else:
+        h = sim_config['simulation']['initial_altitude']
+        v = sim_config['simulation']['initial_velocity']
+    if checkpoint is not None:
+        checkpoint.bind(balloon, payload)
+    total_mass = balloon.mass + payload.total_mass
+    temperature = gas.temperature
+    pressure = gas.pressure
+
+    log.warning(
+        f'Starting simulation: '
+        f'balloon: {balloon.name} | '
+        f'duration: {duration} s | '
+        f'dt: {dt} s')
+    if profile is not None:
+        profile.lap('setup')
+    while start < n_steps:
+        n, status, h, v, temperature, pressure = kernel(
+            h, v, temperature, pressure, min(chunk_size, n_steps - start),
+            dt, gas.mass, gas.molar_mass, total_mass, balloon.cd,
+            balloon.burst_diameter, atmosphere.resolution, *tables, *buffers)
+        if profile is not None:
+            profile.steps += n
+            profile.lap('kernel')
+        balloon.match_conditions(temperature, pressure)
+        if n:
+            tspan = np.multiply(np.arange(start, start + n), dt,
+                                out=time_buffer[:n])
+            yield (tspan, *[buffer[:n] for buffer in buffers])
+        start += n
+        if status == kernels.BURST:
+            _log_burst(start * dt, h, balloon)
+            break
+        elif status == kernels.OUT_OF_BOUNDS:
+            raise ValueError(
+                'Altitude out of bounds. Lower limit: %s m. Upper limit: %s m.'
+                % (atmosphere_models.MIN_ALTITUDE,
+                   atmosphere_models.MAX_ALTITUDE))
+
+
+def _simulate_runge_kutta(sim_config, balloon, payload, integrator,
+                          record_forces=False, profile=None, checkpoint=None):
+    ''' Generate the samples of a simulation with the `rk4` or `rk45`
+    integrator.
+    '''
+    duration = sim_config['simulation']['duration']
+    if integrator == 'rk4':
+        dt = limit_time_step(sim_config['simulation']['dt'],
+                             max_dt=MAX_ALLOWED_DT_RK4)
+    else:
+        dt = sim_config['simulation']['dt']
+        max_dt = sim_config['simulation'].get('max_dt', DEFAULT_MAX_DT)
+        rtol = sim_config['simulation'].get('rtol', DEFAULT_RTOL)
+        atol = sim_config['simulation'].get('atol', DEFAULT_ATOL)
+    atmosphere = atmosphere_models.from_config(sim_config)
+    resumed = checkpoint is not None and checkpoint.resumed
+    if checkpoint is not None:
+        checkpoint.bind(balloon, payload, atmosphere=atmosphere,
+                        step_size=lambda: dt)
+    if profile is not None:
+        atmosphere = profile.timed('atmosphere', atmosphere)
+
+    total_mass = balloon.mass + payload.total_mass
+    last_forces = None  # forces of the latest evaluation of f
+
+    def f(t, y):
+        nonlocal last_forces
+        if profile is not None:
+            profile.lap('integration')
+        last_forces = [np.asarray(x).item() for x in forces(
+            y[0], y[1], balloon, payload, atmosphere)]
+        if profile is not None:
+            profile.lap('forces')
+        return np.array((y[1], last_forces[3]/total_mass))
+
+    def sample(t, y, k):
+        # every sample is preceded by an evaluation of f at that sample
+        if record_forces:
+            return (t, y[0], y[1], k[1], *last_forces,
+                    balloon.lift_gas.mass, payload.ballast_mass)
+        return t, y[0], y[1], k[1]
+
+    def event(y):
+        if profile is not None:
+            profile.lap('integration')
+        margin = burst_margin(y[0], balloon, atmosphere)
+        if profile is not None:
+            profile.lap('burst_check')
+        return margin
+
+    if profile is not None:
+        profile.lap('setup')
+    if resumed:
+        state = checkpoint.state
+        t = state['time']
+        y = np.array((state['altitude'], state['ascent_rate']))
+        k = np.array((state['ascent_rate'], state['ascent_accel']))
+        if state['dt'] is not None:
+            dt = state['dt']
+    else:
+        t = 0.0
+        y = np.array((sim_config['simulation']['initial_altitude'],
+                      sim_config['simulation']['initial_velocity']),
+                     dtype=float)
+        k = f(t, y)
+        yield sample(t, y, k)
+
+    log.warning(
+        f'Starting simulation: '
+        f'balloon: {balloon.name} | '
+        f'duration: {duration} s | '
+        f'dt: {dt} s | '
+        f'integrator: {integrator}')
+    verbose = log.isEnabledFor(logging.INFO)
+    n_steps = 0
+    n_rejected = 0
+    if not resumed and event(y) >= 0:
+        _log_burst(t, y[0], balloon)
+        return
+    while duration - t > EVENT_TOLERANCE:
+        step_dt = min(dt, duration - t)
+        if integrator == 'rk4':
+            y_new = integrators.rk4_step(f, t, y, step_dt, k1=k)
+            k_new = f(t + step_dt, y_new)
+        else:
+            y_new, error, k_new = integrators.dormand_prince_step(
+                f, t, y, step_dt, k1=k)
+            norm = integrators.error_norm(error, y, y_new, rtol, atol)
+            dt = min(max_dt, max(MIN_ALLOWED_DT,
+                                 integrators.next_step_size(step_dt, norm)))
+            if norm > 1 and step_dt > MIN_ALLOWED_DT:
+                n_rejected += 1
+                continue
+        n_steps += 1
+        if profile is not None:
+            profile.steps += 1
+        if event(y_new) >= 0:
+            t, y = integrators.locate_event(
+                event, t, y, k, t + step_dt, y_new, k_new,
+                tol=EVENT_TOLERANCE)
+            k = f(t, y)
+            yield sample(t, y, k)
+            _log_burst(t, y[0], balloon)
+            break
+        t, y, k = t + step_dt, y_new, k_new
+        if profile is not None:
+            profile.lap('integration')
+        if verbose:
+            log.info('%6.1f s | %s m/s^2 | %s m/s | %s m', t, k[1], y[1], y[0])
+            if profile is not None:
+                profile.lap('logging')
+        yield sample(t, y, k)
+    log.warning(f'Finished simulation: {n_steps} steps, '
+                f'{n_rejected} rejected steps')
+
+
+def _descend(sim_config, integrator, trajectory, t, h, v, mass, cd, area,
+             ground, atmosphere):
+    ''' Append the samples of the parachute descent of `run_flight` to its
+    trajectory, starting from the state at time `t`. Returns the landing
+    event, or `None` if the `duration` is reached first.
+    '''
+    duration = sim_config['simulation']['duration']
+
+    def acceleration(h, v):
+        ambient = atmosphere(h)
+        f_net = (weight(ambient, mass)
+                 + parachute_drag(ambient, cd, area, v))
+        return np.asarray(f_net/mass).item()
+
+    if h <= ground:
+        return {'time': float(t), 'altitude': float(h), 'velocity': float(v)}
+    if integrator == 'euler':
+        dt = limit_time_step(sim_config['simulation']['dt'])
+        # one sample was offered to the trajectory per time step so far
+        for k in range(trajectory.count, step_count(duration, dt)):
+            t = k * dt
+            a = acceleration(h, v)
+            if h + v*dt <= ground:
+                # altitude changes linearly at `v` during the step
+                t_land = t + (ground - h) / v
+                v_land = v + a * (t_land - t)
+                trajectory.append(t_land, ground, v_land, a, DESCENT,
+                                  keep=True)
+                return {'time': float(t_land), 'altitude': float(ground),
+                        'velocity': float(v_land)}
+            h += v*dt
+            v += a*dt
+            trajectory.append(t, h, v, a, DESCENT)
+        return None
+
+    if integrator == 'rk4':
+        dt = limit_time_step(sim_config['simulation']['dt'],
+                             max_dt=MAX_ALLOWED_DT_RK4)
+    else:
+        dt = sim_config['simulation']['dt']
+        max_dt = sim_config['simulation'].get('max_dt', DEFAULT_MAX_DT)
+        rtol = sim_config['simulation'].get('rtol', DEFAULT_RTOL)
+        atol = sim_config['simulation'].get('atol', DEFAULT_ATOL)
+
+    def f(t, y):
+        return np.array((y[1], acceleration(y[0], y[1])))
+
+    def event(y):
+        return y[0] - ground
+
+    y = np.array((h, v), dtype=float)
+    k = f(t, y)
+    while duration - t > EVENT_TOLERANCE:
+        step_dt = min(dt, duration - t)
+        if integrator == 'rk4':
+            y_new = integrators.rk4_step(f, t, y, step_dt, k1=k)
+        else:
+            y_new, error, _ = integrators.dormand_prince_step(
+                f, t, y, step_dt, k1=k)
+            norm = integrators.error_norm(error, y, y_new, rtol, atol)
+            dt = min(max_dt, max(MIN_ALLOWED_DT,
+                                 integrators.next_step_size(step_dt, norm)))
+            if norm > 1 and step_dt > MIN_ALLOWED_DT:
+                continue
+        k_new = f(t + step_dt, y_new)
+        if event(y_new) <= 0:
+            t, y = integrators.locate_event(
+                event, t, y, k, t + step_dt, y_new, k_new,
+                tol=EVENT_TOLERANCE)
+            k = f(t, y)
+            trajectory.append(t, y[0], y[1], k[1], DESCENT, keep=True)
+            return {'time': float(t), 'altitude': float(y[0]),
+                    'velocity': float(y[1])}
+        t, y, k = t + step_dt, y_new, k_new
+        trajectory.append(t, y[0], y[1], k[1], DESCENT)
+    return None
@@ -0,0 +1,381 @@
+''' Atmosphere models.
+
+This module defines atmosphere models that provide ambient conditions
+(gravitational acceleration, temperature, pressure and density) at a given
+geometric altitude.
+
+Every atmosphere model is a callable that takes an altitude (m) and returns an
+object with `h`, `grav_accel`, `temperature`, `pressure` and `density`
+attributes. These objects can be used anywhere an `ambiance.Atmosphere`
+instance is expected, such as `ascent_model.weight` or `Gas.match_ambient`.
+
+| Model | Description |
+| ----- | ----------- |
+| `AmbianceAtmosphere` | Evaluates the 1976 COESA model with `ambiance` on every lookup. |
+| `TabulatedAtmosphere` | Interpolates precomputed tables of the 1976 COESA model. |
+| `NoisyAtmosphere` | Adds random noise to another atmosphere model. |
+'''
+
+import functools
+import logging
+import math
+import numpy as np
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+# Valid range of geometric altitudes (m)
+MIN_ALTITUDE = -5004
+MAX_ALTITUDE = 80000
+DEFAULT_RESOLUTION = 10  # [m] spacing between table entries
+
+
+def ambiance_atmosphere(h):
+    ''' `ambiance.Atmosphere` at a geometric altitude (m).
+
+    `ambiance` is imported on the first call rather than with this module,
+    because importing it (and SciPy with it) takes longer than importing the
+    rest of the toolbox.
+    '''
+    from ambiance import Atmosphere
+    return Atmosphere(h)
+
+
+class AtmosphereConditions():
+    ''' Ambient conditions at a specific geometric altitude (m).
+
+    A lightweight stand-in for an `ambiance.Atmosphere` object. Attributes are
+    floats when initialized with a scalar altitude or arrays when initialized
+    with an array of altitudes.
+
+    Args:
+        h (float): Geometric altitude in meters.
+        grav_accel (float): Gravitational acceleration in meters/second^2.
+        temperature (float): Temperature in Kelvin.
+        pressure (float): Pressure in Pascals.
+        density (float): Density in kilograms/meter^3.
+    '''
+    __slots__ = ('h', 'grav_accel', 'temperature', 'pressure', 'density')
+
+    def __init__(self, h, grav_accel, temperature, pressure, density):
+        self.h = h
+        self.grav_accel = grav_accel
+        self.temperature = temperature
+        self.pressure = pressure
+        self.density = density
+
+
+class AtmosphereModel():
+    ''' Interface for atmosphere models.
+
+    Subclasses implement `grav_accel`, `temperature`, `pressure` and `density`
+    as functions of geometric altitude (m). Calling the model returns all of
+    them at once as an `AtmosphereConditions` object.
+    '''
+    def grav_accel(self, h):
+        ''' Gravitational acceleration (m/s^2) at a geometric altitude (m).
+        '''
+        raise NotImplementedError
+
+    def temperature(self, h):
+        ''' Temperature (K) at a geometric altitude (m).
+        '''
+        raise NotImplementedError
+
+    def pressure(self, h):
+        ''' Pressure (Pa) at a geometric altitude (m).
+        '''
+        raise NotImplementedError
+
+    def density(self, h):
+        ''' Density (kg/m^3) at a geometric altitude (m).
+        '''
+        raise NotImplementedError
+
+    def __call__(self, h):
+        return AtmosphereConditions(h,
+                                    self.grav_accel(h),
+                                    self.temperature(h),
+                                    self.pressure(h),
+                                    self.density(h))
+
+
+class AmbianceAtmosphere(AtmosphereModel):
+    ''' The 1976 COESA atmosphere model, evaluated by `ambiance` on every
+    lookup.
+    '''
+    def grav_accel(self, h):
+        return ambiance_atmosphere(h).grav_accel
+
+    def temperature(self, h):
+        return ambiance_atmosphere(h).temperature
+
+    def pressure(self, h):
+        return ambiance_atmosphere(h).pressure
+
+    def density(self, h):
+        return ambiance_atmosphere(h).density
+
+    def __call__(self, h):
+        return ambiance_atmosphere(h)
+
+
+class TabulatedAtmosphere(AtmosphereModel):
+    ''' The 1976 COESA atmosphere model, precomputed by `ambiance` over the
+    valid altitude range and interpolated at lookup time.
+
+    Gravitational acceleration and temperature are interpolated linearly.
+    Pressure and density decay exponentially with altitude, so they are
+    interpolated linearly in log space. Use `max_error` to check the
+    interpolation error against `ambiance` for a given `resolution`.
+
+    Args:
+        resolution (float): Spacing between table entries in meters.
+            Optional, defaults to `DEFAULT_RESOLUTION`.
+
+    Note:
+        Tables are built once per instance. Use `tabulated_atmosphere` to
+        share one instance for each `resolution`.
+    '''
+    def __init__(self, resolution=DEFAULT_RESOLUTION):
+        if resolution <= 0:
+            raise ValueError('Resolution must be positive, not %s' % (
+                resolution))
+        n = math.ceil((MAX_ALTITUDE - MIN_ALTITUDE) / resolution) + 1
+        self.resolution = resolution
+        # evenly spaced, so the last entry may be slightly above MAX_ALTITUDE
+        self.altitude = MIN_ALTITUDE + resolution * np.arange(n)
+        table = ambiance_atmosphere(self.altitude)
+        self.grav_accel_table = table.grav_accel
+        self.temperature_table = table.temperature
+        self.log_pressure_table = np.log(table.pressure)
+        self.log_density_table = np.log(table.density)
+        self._arrays = (self.grav_accel_table,
+                        self.temperature_table,
+                        self.log_pressure_table,
+                        self.log_density_table)
+        # python lists are faster than arrays for scalar indexing
+        self._tables = [table.tolist() for table in self._arrays]
+        self._last = n - 1
+        log.debug('Tabulated atmosphere with %s entries every %s m' % (
+            n, resolution))
+
+    def _index(self, h):
+        ''' Table index and interpolation fraction for a scalar altitude.
+        '''
+        if not MIN_ALTITUDE <= h <= MAX_ALTITUDE:
+            raise ValueError(
+                'Altitude out of bounds. Lower limit: %s m. Upper limit: %s m.'
+                % (MIN_ALTITUDE, MAX_ALTITUDE))
+        x = (h - MIN_ALTITUDE) / self.resolution
+        i = min(int(x), self._last - 1)
+        return i, x - i
+
+    def _index_array(self, h):
+        ''' Table indices and interpolation fractions for an array of
+        altitudes. Same arithmetic as `_index`.
+        '''
+        h = np.asarray(h, dtype=float)
+        if np.any(h < MIN_ALTITUDE) or np.any(h > MAX_ALTITUDE):
+            raise ValueError(
+                'Altitude out of bounds. Lower limit: %s m. Upper limit: %s m.'
+                % (MIN_ALTITUDE, MAX_ALTITUDE))
+        x = (h - MIN_ALTITUDE) / self.resolution
+        i = np.minimum(x.astype(int), self._last - 1)
+        return i, x - i
+
+    def _lookup(self, table, h):
+        if np.ndim(h) == 0:
+            i, f = self._index(h)
+            y = self._tables[table]
+        else:
+            i, f = self._index_array(h)
+            y = self._arrays[table]
+        return y[i] + f * (y[i+1] - y[i])
+
+    def grav_accel(self, h):
+        return self._lookup(0, h)
+
+    def temperature(self, h):
+        return self._lookup(1, h)
+
+    def pressure(self, h):
+        return np.exp(self._lookup(2, h))
+
+    def density(self, h):
+        return np.exp(self._lookup(3, h))
+
+    def __call__(self, h):
+        if np.ndim(h) != 0:
+            # find the table indices once for all properties
+            i, f = self._index_array(h)
+            g, T, log_p, log_rho = self._arrays
+            return AtmosphereConditions(
+                h,
+                g[i] + f * (g[i+1] - g[i]),
+                T[i] + f * (T[i+1] - T[i]),
+                np.exp(log_p[i] + f * (log_p[i+1] - log_p[i])),
+                np.exp(log_rho[i] + f * (log_rho[i+1] - log_rho[i])))
+        # scalar fast path
+        i, f = self._index(h)
+        g, T, log_p, log_rho = self._tables
+        return AtmosphereConditions(
+            h,
+            g[i] + f * (g[i+1] - g[i]),
+            T[i] + f * (T[i+1] - T[i]),
+            math.exp(log_p[i] + f * (log_p[i+1] - log_p[i])),
+            math.exp(log_rho[i] + f * (log_rho[i+1] - log_rho[i])))
+
+    def max_error(self, samples_per_entry=4):
+        ''' Compare interpolated values against `ambiance` between every table
+        entry.
+
+        Args:
+            samples_per_entry (int): Number of altitudes to check between
+                neighboring table entries. Optional, defaults to `4`.
+
+        Returns:
+            dict: Maximum relative error of `grav_accel`, `temperature`,
+            `pressure` and `density` over the valid altitude range.
+        '''
+        h = np.linspace(MIN_ALTITUDE, MAX_ALTITUDE,
+                        samples_per_entry * (len(self.altitude) - 1) + 1)
+        truth = ambiance_atmosphere(h)
+        report = {}
+        for name in ('grav_accel', 'temperature', 'pressure', 'density'):
+            expected = getattr(truth, name)
+            error = np.abs(getattr(self, name)(h) - expected) / expected
+            report[name] = float(np.max(error))
+        log.info('Tabulated atmosphere max relative error at %s m resolution: %s'
+                 % (self.resolution, report))
+        return report
+
+
+class NoisyAtmosphere(AtmosphereModel):
+    ''' Another atmosphere model with random noise added to its temperature,
+    pressure and density.
+
+    Noise is normally distributed and independent between lookups. It
+    approximates weather and convection disturbances the same way as the
+    band-limited white noise blocks in `etc/Simulink`.
+
+    Args:
+        model (AtmosphereModel): Atmosphere model to add noise to.
+        temperature_std (float): Standard deviation of temperature noise (K).
+        pressure_std (float): Standard deviation of pressure noise (Pa).
+        density_std (float): Standard deviation of density noise (kg/m^3).
+        rng (Generator): A `numpy.random.Generator` to draw noise from.
+            Optional, defaults to a new unseeded generator.
+    '''
+    def __init__(self, model, temperature_std=0, pressure_std=0,
+                 density_std=0, rng=None):
+        self.model = model
+        self.temperature_std = temperature_std
+        self.pressure_std = pressure_std
+        self.density_std = density_std
+        self.rng = np.random.default_rng() if rng is None else rng
+
+    def _noise(self, std, h):
+        return std * self.rng.standard_normal(np.shape(h)) if std else 0
+
+    def grav_accel(self, h):
+        return self.model.grav_accel(h)
+
+    def temperature(self, h):
+        return self.model.temperature(h) + self._noise(self.temperature_std, h)
+
+    def pressure(self, h):
+        return self.model.pressure(h) + self._noise(self.pressure_std, h)
+
+    def density(self, h):
+        return self.model.density(h) + self._noise(self.density_std, h)
+
+    def __call__(self, h):
+        ambient = self.model(h)
+        return AtmosphereConditions(
+            h,
+            ambient.grav_accel,
+            ambient.temperature + self._noise(self.temperature_std, h),
+            ambient.pressure + self._noise(self.pressure_std, h),
+            ambient.density + self._noise(self.density_std, h))
+
+
+def noise_std(sim_config):
+    ''' Standard deviations of atmosphere noise requested by a simulation
+    config.
+
+    Noise gains are the noise power of band-limited white noise sampled every
+    time step, like in `etc/Simulink/monte_carlo.m`. The standard deviation
+    of each sample is `sqrt(gain / dt)`.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+
+    Returns:
+        tuple: Standard deviations of temperature (K), pressure (Pa) and
+        density (kg/m^3) noise.
+    '''
+    atmo_config = sim_config.get('atmosphere', {})
+    gains = [atmo_config.get(key, 0) for key in (
+        'temperature_noise_gain', 'pressure_noise_gain', 'density_noise_gain')]
+    if not any(gains):
+        return (0, 0, 0)
+    dt = sim_config['simulation']['dt']
+    return tuple(math.sqrt(gain / dt) for gain in gains)
+
+
+@functools.lru_cache(maxsize=None)
+def tabulated_atmosphere(resolution=DEFAULT_RESOLUTION):
+    ''' Get a shared `TabulatedAtmosphere` for a given `resolution` (m).
+
+    Tables are only built the first time each `resolution` is requested.
+    '''
+    return TabulatedAtmosphere(resolution)
+
+
+def from_config(sim_config, noise=True, rng=None):
+    ''' Get the atmosphere model requested by a simulation config.
+
+    The atmosphere model is set by the optional `atmosphere` block of
+    `sim_config`:
+    ``` json
+    {
+        "atmosphere": {
+            "model": (string) Atmosphere model. [tabulated, ambiance],
+            "resolution_m": (float) Spacing between table entries (m),
+            "temperature_noise_gain": (float) Temperature noise power,
+            "pressure_noise_gain": (float) Pressure noise power,
+            "density_noise_gain": (float) Density noise power,
+            "seed": (int) Seed for the noise random number generator
+        }
+    }
+    ```
+    Defaults to a `TabulatedAtmosphere` at `DEFAULT_RESOLUTION` without
+    noise.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+        noise (bool): Wrap the model in a `NoisyAtmosphere` if any noise gains
+            are set (`True`, default) or return the model without noise
+            (`False`).
+        rng (Generator): A `numpy.random.Generator` to draw noise from.
+            Optional, defaults to a generator seeded with the config `seed`.
+
+    Returns:
+        AtmosphereModel: Atmosphere model to use in the simulation.
+    '''
+    atmo_config = sim_config.get('atmosphere', {})
+    model = atmo_config.get('model', 'tabulated')
+    if model == 'tabulated':
+        atmosphere = tabulated_atmosphere(
+            atmo_config.get('resolution_m', DEFAULT_RESOLUTION))
+    elif model == 'ambiance':
+        atmosphere = AmbianceAtmosphere()
+    else:
+        raise ValueError('Unknown atmosphere model "%s"' % model)
+    std = noise_std(sim_config)
+    if noise and any(std):
+        if rng is None:
+            rng = np.random.default_rng(atmo_config.get('seed'))
+        atmosphere = NoisyAtmosphere(atmosphere, *std, rng=rng)
+    return atmosphere
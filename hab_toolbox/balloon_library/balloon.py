@@ -9,12 +9,18 @@ files are generated from high altitude balloon specification datasheets
 provided by the balloon's manufacturer. It includes attributes such as the
 size, mass, volume limits, approximate drag coefficient, and other useful
 metrics. The Balloon object has class methods
+
+Specification files are indexed once by a `BalloonLibrary` and each file is
+parsed at most once, so creating a `Balloon` does not touch the file system
+after the first time a spec is used. Extra directories of specification files
+can be registered with `LIBRARY.add_path`.
 '''
 
 import logging
 import json
 import os
 import math
+import types
 
 # Logger (initialized by cli.py)
 log = logging.getLogger()
@@ -101,18 +107,19 @@ Note:
 '''
 
 
+GAS_PROPERTIES = types.MappingProxyType({
+    gas_name: gas['molar_mass']
+    for gas in GAS_PROPERTIES_CONFIG['gas_properties']
+    for gas_name in gas['species']})
+''' Read-only mapping of every known species name to its molar mass (kg/mol),
+built once from `GAS_PROPERTIES_CONFIG`.
+'''
+
+
 def get_gas_properties():
     ''' Return the dictionary of gas species and their molar mass (kg/mol).
     '''
-    gas_properties = GAS_PROPERTIES_CONFIG['gas_properties']
-    units = GAS_PROPERTIES_CONFIG['units']
-
-    known_species = {}
-    for gas in gas_properties:
-        for gas_name in gas['species']:
-            known_species[gas_name] = gas['molar_mass']
-    log.debug('Known gas species: %s' % known_species)
-    return known_species, units
+    return GAS_PROPERTIES, GAS_PROPERTIES_CONFIG['units']
 
 
 def list_known_species():
@@ -121,8 +128,7 @@ def list_known_species():
     Returns:
         list: Keys of valid gas species.
     '''
-    known_species, _ = get_gas_properties()
-    return list(known_species.keys())
+    return list(GAS_PROPERTIES)
 
 
 def is_valid_gas(species):
@@ -135,14 +141,183 @@ def is_valid_gas(species):
     Returns:
         bool: Returns `True` if `species` is in the known list of gas species.
     '''
-    return species in list_known_species()
+    return isinstance(species, str) and species in GAS_PROPERTIES
+
+
+class FrozenSpec(dict):
+    ''' Read-only dictionary of balloon specification parameters.
+
+    Spec records are shared between every `Balloon` of the same type, so they
+    cannot be modified. Nested dictionaries are also `FrozenSpec` and lists
+    are converted to tuples.
+    '''
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Balloon specs are read-only')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenSpec({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class BalloonLibrary():
+    ''' Registry of balloon specification files.
+
+    Specification files are JSON files named after the balloon
+    (i.e. `HAB-3000.json`) in one of the library directories. The directories
+    are indexed the first time a balloon is looked up, and each file is parsed
+    and validated the first time its balloon is requested. Parsed specs are
+    cached as immutable `FrozenSpec` records that are shared by every caller.
+
+    Lookups of cached specs do no I/O. When a name is not in the index, the
+    modification times of the directories are checked and the index is
+    rebuilt if files were added or removed. Use `refresh` to also reload
+    specs whose files were modified.
+
+    Args:
+        paths (list): Directories to search for specification files, in order
+            of precedence. Optional, defaults to the `balloon_library`
+            directory.
+    '''
+    REQUIRED_KEYS = ('name', 'datasheet', 'part_number', 'spec')
+    REQUIRED_SPEC_KEYS = ('lifting_gas', 'drag_coefficient', 'mass',
+                          'diameter_burst')
+
+    def __init__(self, paths=None):
+        self.paths = list(paths) if paths is not None else [BALLOON_LIBRARY_DIR]
+        self._index = None  # spec name -> path of the specification file
+        self._dir_mtimes = {}
+        self._specs = {}  # spec name -> (file modification time, spec)
+
+    def add_path(self, path):
+        ''' Register a directory of specification files. Specs in this
+        directory take precedence over specs with the same name in
+        previously registered directories.
+
+        Args:
+            path (string): Directory of specification files.
+        '''
+        if not os.path.isdir(path):
+            raise ValueError('Balloon library path is not a directory: %s' % (
+                path))
+        self.paths.insert(0, path)
+        self._index = None
+        self._specs.clear()
+
+    def _build_index(self):
+        index = {}
+        self._dir_mtimes = {}
+        # later paths have lower precedence, index them first
+        for path in reversed(self.paths):
+            self._dir_mtimes[path] = os.stat(path).st_mtime_ns
+            for f in os.listdir(path):
+                name, extension = os.path.splitext(f)
+                if extension == '.json' and os.path.isfile(
+                        os.path.join(path, f)):
+                    index[name] = os.path.join(path, f)
+        log.debug('Known balloons: %s' % list(index))
+        self._index = index
+
+    def _index_is_stale(self):
+        return any(os.stat(path).st_mtime_ns != mtime
+                   for path, mtime in self._dir_mtimes.items())
+
+    def _lookup(self, spec_name):
+        if self._index is None:
+            self._build_index()
+        elif spec_name not in self._index and self._index_is_stale():
+            self._build_index()
+        return self._index.get(spec_name)
+
+    def __contains__(self, spec_name):
+        if not isinstance(spec_name, str):
+            return False
+        return spec_name in self._specs or self._lookup(spec_name) is not None
+
+    def names(self):
+        ''' Return the names of all known balloon specs.
+
+        Returns:
+            list: Sorted names of known balloon specs.
+        '''
+        if self._index is None or self._index_is_stale():
+            self._build_index()
+        return sorted(self._index)
+
+    def get(self, spec_name):
+        ''' Get the spec record of a balloon.
+
+        Args:
+            spec_name (string): Name of the balloon spec. Case sensitive and
+                does not include the file extension.
+
+        Returns:
+            FrozenSpec: Read-only dictionary of balloon specification
+            parameters.
+        '''
+        cached = self._specs.get(spec_name)
+        if cached is not None:
+            return cached[1]
+        if spec_name not in self:
+            raise ValueError('No valid balloon named %s' % spec_name)
+        path = self._index[spec_name]
+        mtime = os.stat(path).st_mtime_ns
+        with open(path) as config_json_data:
+            config_data = json.load(config_json_data)
+        self._validate(spec_name, config_data)
+        spec = _freeze(config_data)
+        self._specs[spec_name] = (mtime, spec)
+        return spec
+
+    def _validate(self, spec_name, config_data):
+        missing = [key for key in self.REQUIRED_KEYS if key not in config_data]
+        missing += ['spec.%s' % key for key in self.REQUIRED_SPEC_KEYS
+                    if key not in config_data.get('spec', {})]
+        if missing:
+            raise ValueError('Balloon spec %s is missing keys: %s' % (
+                spec_name, ', '.join(missing)))
+
+    def refresh(self):
+        ''' Re-index the library directories and drop cached specs whose
+        files were modified or removed since they were loaded.
+        '''
+        self._build_index()
+        for spec_name, (mtime, _) in list(self._specs.items()):
+            path = self._index.get(spec_name)
+            if path is None or os.stat(path).st_mtime_ns != mtime:
+                del self._specs[spec_name]
+
+
+LIBRARY = BalloonLibrary()
+''' The shared `BalloonLibrary` used by `Balloon`, `get_balloon` and
+`is_valid_balloon`.
+'''
+
+
+def list_known_balloons():
+    ''' Return the names of all balloon definitions in `LIBRARY`.
+
+    Returns:
+        list: Sorted names of known balloons.
+    '''
+    return LIBRARY.names()
 
 
 def is_valid_balloon(spec_name):
     ''' Returns True if `spec_name` matches the name of a known balloon
     definition.
 
-    Balloon definition files are JSON files in the `balloon_library` directory.
+    Balloon definition files are JSON files in the `balloon_library` directory
+    or in a directory registered with `LIBRARY.add_path`.
 
     Args:
         spec_name (string): Name of the balloon spec to use. Case sensitive and
@@ -153,20 +328,15 @@ def is_valid_balloon(spec_name):
         bool: Returns True if `spec_name` matches the name of a known balloon
         definition.
     '''
-    known_balloons = []
-    for f in os.listdir(BALLOON_LIBRARY_DIR):
-        if os.path.isfile(os.path.join(BALLOON_LIBRARY_DIR, f)):
-            fileparts = os.path.splitext(f)
-            if fileparts[1] == '.json':
-                known_balloons.append(fileparts[0])
-    log.debug('Known balloons: %s' % known_balloons)
-    return spec_name in known_balloons
+    return spec_name in LIBRARY
 
 
 def get_balloon(spec_name):
     ''' Get balloon spec sheet definitions as a dictionary.
 
-    Balloon definition files are JSON files in the `balloon_library` directory.
+    Balloon definition files are JSON files in the `balloon_library` directory
+    or in a directory registered with `LIBRARY.add_path`. Each file is only
+    read once, the returned spec is shared and read-only.
 
     Args:
         spec_name (string): Name of the balloon spec to use. Case sensitive and
@@ -174,16 +344,9 @@ def get_balloon(spec_name):
             `ballon_library/HAB-3000.json`).
 
     Returns:
-        dict: Dictionary of balloon specification parameters.
+        FrozenSpec: Read-only dictionary of balloon specification parameters.
     '''
-    if is_valid_balloon(spec_name):
-        config_filename = '%s.json' % spec_name
-        config_path = os.path.join(BALLOON_LIBRARY_DIR, config_filename)
-        with open(config_path) as config_json_data:
-            config_data = json.load(config_json_data)
-        return config_data
-    else:
-        raise ValueError('No valid balloon named %s' % spec_name)
+    return LIBRARY.get(spec_name)
 
 
 def _radius_from_volume(volume):
@@ -209,30 +372,20 @@ class Gas():
         While `Gas` objects function alone, they are best used when set as the
         `lift_gas` attribute of a `Balloon`.
     '''
+    __slots__ = ('species', 'molar_mass', 'temperature', 'pressure', 'mass')
+
     def __init__(self, species, mass=0):
         species = species.lower()
-        if is_valid_gas(species):
-            self.species = species
-        else:
+        if species not in GAS_PROPERTIES:
             raise ValueError(
                 '"%s" is not a member of the list of known gases: %s' % (
                     species, list_known_species()))
-        self.molar_mass = self._set_molar_mass()  # get molar mass from config
+        self.species = species
+        self.molar_mass = GAS_PROPERTIES[species]  # [kg/mol] molar mass
         self.temperature = STANDARD_TEMPERATURE_K  # [K] standard temperature
         self.pressure = STANDARD_PRESSURE_Pa  # [Pa] standard pressure
         self.mass = mass  # [kg] mass
 
-    def _set_molar_mass(self):
-        ''' Get the molecular weight (kg/mol) of a dry gas.
-        '''
-        known_species, _ = get_gas_properties()
-
-        species_of_interest = self.species.lower()
-        if species_of_interest in known_species.keys():
-            return known_species[species_of_interest]
-        else:
-            log.error('Species %s is not defined!' % self.species)
-
     @property
     def volume(self):
         ''' Ideal gas volume (m^3) from temperature (K) and pressure (Pa) for
@@ -261,16 +414,16 @@ class Gas():
         match ambient air conditions at a given geopotential altitude (m).
 
         Args:
-            atmosphere (Atmosphere): An `ambiance.Atmosphere` object with
-                valid `temperature` and `pressure` attributes.
+            atmosphere (Atmosphere): An `ambiance.Atmosphere` object, or the
+                conditions returned by an `AtmosphereModel`, with valid
+                `temperature` and `pressure` attributes.
 
         Returns:
             Gas: Updates the `temperature` and `pressure` properties to be
                 equal to those of the input `atmosphere`, then returns itself.
         '''
-        log.debug('Matching %s temperature and pressure to ambient at %s meters (geometric altitude)' % (
-            self.species, atmosphere.h
-        ))
+        log.debug('Matching %s temperature and pressure to ambient at %s meters (geometric altitude)',
+                  self.species, atmosphere.h)
         self.temperature = atmosphere.temperature
         self.pressure = atmosphere.pressure
         return self
@@ -287,9 +440,8 @@ class Gas():
                 equal to the input `temperature` and `pressure`, then returns
                 itself.
         '''
-        log.debug('Matching %s temperature and pressure to %s K, %s Pa' % (
-            self.species, temperature, pressure
-        ))
+        log.debug('Matching %s temperature and pressure to %s K, %s Pa',
+                  self.species, temperature, pressure)
         self.temperature = temperature
         self.pressure = pressure
         return self
@@ -381,16 +533,23 @@ class Balloon():
         self.radius = _radius_from_volume(self.volume)
         return PI * (self.radius ** 2)
 
+    @property
+    def diameter(self)->float:
+        ''' Diameter of the balloon (m) assuming the balloon is a sphere with
+        nonzero volume (m^3).
+        '''
+        return 2 * _radius_from_volume(self.volume)
+
     @property
     def burst_threshold_exceeded(self)->bool:
         ''' Check if the given volume (m^3) is greater than or equal to the
         burst volume (m^3) from the spec sheet.
         '''
         burst_diameter = self.spec['diameter_burst']['value']
-        self.diameter = 2 * _radius_from_volume(self.volume)
-        log.debug('Balloon diameter is %s (burst at %s)' % (
-            self.diameter, burst_diameter))
-        return self.diameter >= burst_diameter
+        diameter = self.diameter
+        log.debug('Balloon diameter is %s (burst at %s)',
+                  diameter, burst_diameter)
+        return diameter >= burst_diameter
 
     def match_ambient(self, atmosphere):
         ''' Update temperature (K), pressure (Pa), and density (kg/m^3) to
@@ -0,0 +1,500 @@
+''' Batch ascent simulations.
+
+This module advances many simulation configs in lockstep. The state of every
+config is stored as `(N,)` arrays and each time step is computed with
+vectorized NumPy operations instead of one Python loop per config.
+
+The force model and the order of operations follow `ascent_model.step` and
+`ascent_model.run`, including the altitude controller of
+`hab_toolbox.controller`, so each member of a batch follows the same
+trajectory as the equivalent scalar simulation to within floating point
+tolerance.
+'''
+
+import logging
+import numpy as np
+
+from hab_toolbox import ascent_model
+from hab_toolbox import atmosphere as atmosphere_models
+from hab_toolbox import cache as result_cache
+from hab_toolbox import controller
+from hab_toolbox.balloon_library.balloon import (
+    PI, R, STANDARD_TEMPERATURE_K, STANDARD_PRESSURE_Pa)
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+
+class BatchResult():
+    ''' Stacked trajectories from a batch of simulations.
+
+    Trajectory fields are `(N, M)` arrays with one row per simulation config
+    and one column per stored time step. Rows are padded with `NaN` after the
+    last stored sample of that member.
+
+    | Property | Description |
+    | -------- | ----------- |
+    | `time` | Time index of each sample (s) |
+    | `altitude` | Altitude of each sample (m) |
+    | `ascent_rate` | Ascent rate of each sample (m/s) |
+    | `ascent_accel` | Ascent acceleration of each sample (m/s^2) |
+    | `length` | Number of time steps simulated for each member |
+    | `burst` | Whether each member stopped because its balloon burst |
+    | `out_of_bounds` | Whether each member stopped because it left the valid altitude range |
+    | `aborted` | Whether each member stopped because its altitude controller strayed too far from the target |
+    | `final_time` | Time at which each member stopped (s) |
+    | `final_altitude` | Altitude at which each member stopped (m) |
+    | `final_gas_mass` | Lift gas mass of each member when it stopped (kg) |
+    | `final_ballast_mass` | Ballast mass of each member when it stopped (kg) |
+
+    A member's `length` equals the length of the arrays returned by
+    `ascent_model.run` for the same config. Where `ascent_model.run` would
+    raise a `ValueError` for an altitude outside of the atmosphere model's
+    range, the member is stopped and flagged as `out_of_bounds` instead so
+    that the rest of the batch can continue.
+    '''
+    FIELDS = ('time', 'altitude', 'ascent_rate', 'ascent_accel')
+    MEMBER_FIELDS = ('length', 'burst', 'out_of_bounds', 'aborted',
+                     'final_time', 'final_altitude', 'final_gas_mass',
+                     'final_ballast_mass')
+
+    def __init__(self, time, altitude, ascent_rate, ascent_accel, length,
+                 burst, out_of_bounds, final_time, final_altitude,
+                 final_gas_mass=None, final_ballast_mass=None, aborted=None,
+                 decimation=1):
+        self.decimation = decimation
+        self.time = time
+        self.altitude = altitude
+        self.ascent_rate = ascent_rate
+        self.ascent_accel = ascent_accel
+        self.length = length
+        self.burst = burst
+        self.out_of_bounds = out_of_bounds
+        if aborted is None:
+            aborted = np.zeros_like(burst)
+        self.aborted = aborted
+        self.final_time = final_time
+        self.final_altitude = final_altitude
+        self.final_gas_mass = final_gas_mass
+        self.final_ballast_mass = final_ballast_mass
+
+    def __len__(self):
+        return len(self.length)
+
+    def member(self, i):
+        ''' Trajectory of one member of the batch.
+
+        Args:
+            i (int): Index of the member.
+
+        Returns:
+            tuple: `tspan`, `altitude`, `ascent_rate`, `ascent_accel` arrays
+            in the same format as `ascent_model.run`.
+        '''
+        n = -(-self.length[i] // self.decimation)
+        return tuple(getattr(self, field)[i, :n] for field in self.FIELDS)
+
+    def member_record(self, i):
+        ''' Trajectory and final state of one member of the batch, as a
+        dictionary of arrays.
+        '''
+        record = dict(zip(self.FIELDS, self.member(i)))
+        for field in self.MEMBER_FIELDS:
+            record[field] = getattr(self, field)[i]
+        return record
+
+    @classmethod
+    def from_member_records(cls, records, decimation=1, record=True):
+        ''' Stack the `member_record` of each member into a batch result.
+
+        Args:
+            records (list): One `member_record` dictionary per member.
+            decimation (int): Decimation of the trajectories.
+            record (bool): Whether the records hold trajectories.
+
+        Returns:
+            BatchResult: Stacked trajectories and final states.
+        '''
+        n_samples = max(len(r['time']) for r in records) if record else 0
+        trajectories = [np.full((len(records), n_samples), np.nan)
+                        for _ in cls.FIELDS]
+        for i, r in enumerate(records):
+            for column, field in zip(trajectories, cls.FIELDS):
+                column[i, :len(r[field])] = r[field]
+        finals = {field: np.array([r[field] for r in records])
+                  for field in cls.MEMBER_FIELDS}
+        return cls(*trajectories, finals.pop('length'), finals.pop('burst'),
+                   finals.pop('out_of_bounds'), finals.pop('final_time'),
+                   finals.pop('final_altitude'), decimation=decimation,
+                   **finals)
+
+
+# All forces assume positive up coordinate frame.
+def gas_volume(gas_mass, molar_mass, temperature, pressure):
+    ''' Vectorized form of `Gas.volume`. Ideal gas volume (m^3).
+    '''
+    moles = gas_mass / molar_mass
+    return moles * R * temperature / pressure
+
+
+def gas_density(molar_mass, temperature, pressure):
+    ''' Vectorized form of `Gas.density`. Ideal gas density (kg/m^3).
+    '''
+    return (molar_mass * pressure) / (R * temperature)
+
+
+def radius_from_volume(volume):
+    ''' Vectorized form of `_radius_from_volume`. Radius (m) of a sphere.
+    '''
+    return (volume / (4/3 * PI)) ** (1/3)
+
+
+def buoyancy(atmosphere, volume, density):
+    ''' Vectorized form of `ascent_model.buoyancy`.
+
+    Args:
+        atmosphere (Atmosphere): Ambient conditions at each member's altitude.
+        volume (array): Lift gas volume of each member (m^3).
+        density (array): Lift gas density of each member (kg/m^3).
+
+    Returns:
+        array: Buoyancy force (positive up) in Newtons.
+    '''
+    density_diff = density - atmosphere.density
+    displaced_air = volume * density_diff
+    return -atmosphere.grav_accel * displaced_air
+
+
+def drag(atmosphere, cd, area, ascent_rate):
+    ''' Vectorized form of `ascent_model.drag`.
+
+    Args:
+        atmosphere (Atmosphere): Ambient conditions at each member's altitude.
+        cd (array): Drag coefficient of each member.
+        area (array): Projected area of each member's balloon (m^2).
+        ascent_rate (array): Velocity (positive up) in meters/second.
+
+    Returns:
+        array: Drag force (positive up) in Newtons.
+    '''
+    direction = -np.sign(ascent_rate)  # always oppose direction of motion
+    return direction * (1/2) * cd * area * (ascent_rate ** 2) * atmosphere.density
+
+
+def controller_update(m, t, altitude, dt):
+    ''' Vectorized form of `AltitudeController.update`.
+
+    Args:
+        m (dict): Controller parameters and state of each member, see
+            `_controller_parameters`. The state is updated in place.
+        t (array): Time at the start of the step (s).
+        altitude (array): Altitude at the start of the step (m).
+        dt (array): Time step (s).
+
+    Returns:
+        tuple: Mass flow rates of lift gas and of ballast (kg/s).
+    '''
+    m['max_altitude'] = np.maximum(m['max_altitude'], altitude)
+    error = altitude - m['target_altitude']
+    armed = (m['controlled']
+             & (t >= m['delay_time'])
+             & (m['max_altitude'] >= m['delay_altitude'])
+             & (np.abs(error) <= m['arm_tolerance']))
+    error = np.where(armed, error, 0.0)
+
+    derivative = m['n'] * (error - m['filter'])
+    effort = (m['kp'] * error
+              + m['ki'] * m['integral']
+              + m['kd'] * derivative)
+    m['integral'] = m['integral'] + error * dt
+    m['filter'] = m['filter'] + derivative * dt
+
+    effort = np.minimum(np.maximum(effort, -m['ballast_rate']),
+                        m['bleed_rate'])
+    gas_rate = np.where(m['continuous'],
+                        np.where(effort > m['bleed_min_rate'],
+                                 -(effort - m['bleed_min_rate']), 0.0),
+                        np.where(effort > 0, -m['bleed_rate'], 0.0))
+    ballast_rate = np.where(m['continuous'],
+                            np.where(effort < -m['ballast_min_rate'],
+                                     effort + m['ballast_min_rate'], 0.0),
+                            np.where(effort < 0, -m['ballast_rate'], 0.0))
+    return gas_rate, ballast_rate
+
+
+def release(gas_mass, ballast_mass, gas_rate, ballast_rate, dt,
+            reserve_gas_mass):
+    ''' Vectorized form of `AltitudeController.actuate`. Lift gas mass and
+    ballast mass (kg) at the end of a time step.
+    '''
+    gas_mass = np.maximum(gas_mass + gas_rate * dt,
+                          np.minimum(gas_mass, reserve_gas_mass))
+    ballast_mass = np.maximum(ballast_mass + ballast_rate * dt, 0.0)
+    return gas_mass, ballast_mass
+
+
+def _controller_parameters(sim_configs):
+    ''' Collect per-member altitude controller constants and initial state
+    from a list of simulation configs. Members without a controller are never
+    armed.
+    '''
+    keys = controller.AltitudeController.__slots__
+    columns = {key: [] for key in keys + ('controlled',)}
+    for sim_config in sim_configs:
+        control = None
+        if controller.is_enabled(sim_config):
+            control = controller.AltitudeController.from_config(sim_config)
+        columns['controlled'].append(control is not None)
+        for key in keys:
+            columns[key].append(getattr(control, key, 0.0))
+    params = {key: np.array(value, dtype=float)
+              for key, value in columns.items()}
+    params['controlled'] = params['controlled'].astype(bool)
+    params['continuous'] = params['continuous'].astype(bool)
+    return params
+
+
+def _member_parameters(sim_configs):
+    ''' Collect per-member constants from a list of simulation configs.
+    '''
+    columns = {key: [] for key in (
+        'gas_mass', 'reserve_gas_mass', 'molar_mass', 'balloon_mass',
+        'bus_mass', 'ballast_mass', 'payload_mass', 'cd',
+        'burst_diameter', 'h', 'v', 'dt', 'n_steps', 'temperature_std',
+        'pressure_std', 'density_std')}
+    for sim_config in sim_configs:
+        balloon = ascent_model.configure_balloon(sim_config)
+        payload = ascent_model.configure_payload(sim_config)
+        dt = ascent_model.limit_time_step(sim_config['simulation']['dt'])
+        duration = sim_config['simulation']['duration']
+        columns['gas_mass'].append(balloon.lift_gas.mass)
+        columns['reserve_gas_mass'].append(balloon.reserve_gas)
+        columns['molar_mass'].append(balloon.lift_gas.molar_mass)
+        columns['balloon_mass'].append(balloon.mass)
+        columns['bus_mass'].append(payload.dry_mass)
+        columns['ballast_mass'].append(payload.ballast_mass)
+        columns['payload_mass'].append(payload.total_mass)
+        columns['cd'].append(balloon.cd)
+        columns['burst_diameter'].append(balloon.burst_diameter)
+        columns['h'].append(sim_config['simulation']['initial_altitude'])
+        columns['v'].append(sim_config['simulation']['initial_velocity'])
+        columns['dt'].append(dt)
+        columns['n_steps'].append(ascent_model.step_count(duration, dt))
+        std = atmosphere_models.noise_std(sim_config)
+        columns['temperature_std'].append(std[0])
+        columns['pressure_std'].append(std[1])
+        columns['density_std'].append(std[2])
+    params = {key: np.array(value, dtype=float)
+              for key, value in columns.items()}
+    params['n_steps'] = params['n_steps'].astype(int)
+    return params
+
+
+def run_batch(sim_configs, atmosphere=None, record=True, decimation=1,
+              rng=None, abort_error=None, cache=None):
+    ''' Simulate many configs in lockstep.
+
+    Every member is advanced by one time step per iteration with the same
+    model as `ascent_model.run`. Members drop out of the batch when their
+    balloon exceeds its burst threshold or their `duration` is reached, and
+    the batch ends when no members are left. Members may have different time
+    steps, durations, atmosphere noise gains and altitude controllers.
+    Members are always advanced with the Euler integrator, any `integrator`
+    key in the configs is ignored.
+
+    Args:
+        sim_configs (list): List of `sim_config` dictionaries. See
+            `ascent_model.run` for supported keys.
+        atmosphere (AtmosphereModel): Atmosphere model shared by all members.
+            Optional, defaults to the model requested by the first config.
+            Atmosphere noise is added separately for each member according to
+            the noise gains in its config.
+        record (bool): Store stacked trajectories (`True`, default) or only
+            the final state of each member (`False`).
+        decimation (int): Only store every Nth time step. Optional, defaults
+            to `1`.
+        rng (Generator): A `numpy.random.Generator` to draw atmosphere noise
+            from. Optional, defaults to a new unseeded generator.
+        abort_error (float): Stop members with an altitude controller once
+            they have reached the controller's delay altitude and their
+            altitude is further than this from the target (m). Optional,
+            members are not aborted by default.
+        cache (ResultCache): Cache of the results of each member, see
+            `hab_toolbox.cache`. Only members that are not in the cache are
+            simulated. Members with atmosphere noise and batches with an
+            `atmosphere` model are never cached. Optional, results are not
+            cached by default.
+
+    Returns:
+        BatchResult: Stacked trajectories and final states of every member.
+    '''
+    n_members = len(sim_configs)
+    if n_members == 0:
+        raise ValueError('Batch must contain at least one simulation config')
+    if cache is not None and atmosphere is None:
+        return _run_batch_cached(sim_configs, record, decimation, rng,
+                                 abort_error, cache)
+    if atmosphere is None:
+        atmosphere = atmosphere_models.from_config(sim_configs[0], noise=False)
+    p = _member_parameters(sim_configs)
+    noisy = any(p[key].any() for key in (
+        'temperature_std', 'pressure_std', 'density_std'))
+    if noisy and rng is None:
+        rng = np.random.default_rng()
+    n_steps = p['n_steps']
+    max_steps = int(n_steps.max())
+    p['dry_mass'] = p['balloon_mass'] + p['payload_mass']
+    control = any(controller.is_enabled(c) for c in sim_configs)
+    if control:
+        p.update(_controller_parameters(sim_configs))
+
+    if record:
+        n_samples = -(-max_steps // decimation)
+        out = [np.full((n_members, n_samples), np.nan) for _ in range(4)]
+    length = np.full(n_members, max_steps)
+    burst = np.zeros(n_members, dtype=bool)
+    out_of_bounds = np.zeros(n_members, dtype=bool)
+    aborted = np.zeros(n_members, dtype=bool)
+    abort = control and abort_error is not None
+    final_time = p['dt'] * max_steps
+
+    # parameters and state of the members that are still active
+    idx = np.arange(n_members)
+    m = dict(p)
+    h = p['h'].copy()
+    v = p['v'].copy()
+    a = np.zeros(n_members)
+    # lift gas starts at standard temperature and pressure
+    temperature = STANDARD_TEMPERATURE_K
+    pressure = STANDARD_PRESSURE_Pa
+    volume = gas_volume(m['gas_mass'], m['molar_mass'], temperature, pressure)
+
+    log.info(f'Starting batch of {n_members} simulations')
+    for k in range(max_steps):
+        if control:
+            # gas was released after the volume of the last step was found
+            volume = gas_volume(m['gas_mass'], m['molar_mass'], temperature,
+                                pressure)
+        diameter = 2 * radius_from_volume(volume)
+        burst_now = diameter >= m['burst_diameter']
+        out_of_bounds_now = ((h < atmosphere_models.MIN_ALTITUDE)
+                             | (h > atmosphere_models.MAX_ALTITUDE))
+        done = burst_now | out_of_bounds_now | (k >= m['n_steps'])
+        if abort:
+            aborted_now = (m['controlled']
+                           & (m['max_altitude'] >= m['delay_altitude'])
+                           & (np.abs(h - m['target_altitude']) > abort_error)
+                           & ~done)
+            done |= aborted_now
+        if done.any():
+            stopped = idx[done]
+            burst[stopped] = burst_now[done]
+            out_of_bounds[stopped] = out_of_bounds_now[done] & ~burst_now[done]
+            if abort:
+                aborted[stopped] = aborted_now[done]
+            length[stopped] = k
+            final_time[stopped] = k * m['dt'][done]
+            p['h'][stopped] = h[done]
+            p['gas_mass'][stopped] = m['gas_mass'][done]
+            p['ballast_mass'][stopped] = m['ballast_mass'][done]
+            keep = ~done
+            idx, h, v, a = idx[keep], h[keep], v[keep], a[keep]
+            m = {key: value[keep] for key, value in m.items()}
+            log.info(f'{len(stopped)} simulations stopped at step {k}, '
+                     f'{len(idx)} remaining')
+            if len(idx) == 0:
+                break
+
+        ambient = atmosphere(h)
+        if noisy:
+            n = len(idx)
+            ambient = atmosphere_models.AtmosphereConditions(
+                h,
+                ambient.grav_accel,
+                ambient.temperature
+                + m['temperature_std'] * rng.standard_normal(n),
+                ambient.pressure + m['pressure_std'] * rng.standard_normal(n),
+                ambient.density + m['density_std'] * rng.standard_normal(n))
+        temperature = ambient.temperature
+        pressure = ambient.pressure
+        if control:
+            total_mass = m['balloon_mass'] + (m['bus_mass']
+                                              + m['ballast_mass'])
+        else:
+            total_mass = m['dry_mass']
+        volume = gas_volume(m['gas_mass'], m['molar_mass'],
+                            temperature, pressure)
+        area = PI * (radius_from_volume(volume) ** 2)
+
+        f_weight = ascent_model.weight(ambient, total_mass)
+        f_buoyancy = buoyancy(
+            ambient, volume,
+            gas_density(m['molar_mass'], temperature, pressure))
+        f_drag = drag(ambient, m['cd'], area, v)
+        f_net = f_weight + f_buoyancy + f_drag
+
+        a = f_net/total_mass
+        dv = a*m['dt']
+        dh = v*m['dt']
+        if control:
+            # mass flow is driven by the altitude at the start of the step
+            m['gas_mass'], m['ballast_mass'] = release(
+                m['gas_mass'], m['ballast_mass'],
+                *controller_update(m, k * m['dt'], h, m['dt']),
+                m['dt'], m['reserve_gas_mass'])
+        v = v + dv
+        h = h + dh
+        if record and k % decimation == 0:
+            j = k // decimation
+            out[0][idx, j] = k * m['dt']
+            out[1][idx, j] = h
+            out[2][idx, j] = v
+            out[3][idx, j] = a
+    else:
+        p['h'][idx] = h
+        p['gas_mass'][idx] = m['gas_mass']
+        p['ballast_mass'][idx] = m['ballast_mass']
+    final_altitude = p['h']
+
+    if out_of_bounds.any():
+        log.error(f'{np.count_nonzero(out_of_bounds)} simulations left the '
+                  f'valid altitude range of the atmosphere model')
+    if record:
+        stored = -(-length.max() // decimation)
+        trajectories = [column[:, :stored] for column in out]
+    else:
+        trajectories = [np.empty((n_members, 0)) for _ in range(4)]
+    log.info(f'Finished batch: {np.count_nonzero(burst)} of {n_members} '
+             f'balloons burst')
+    return BatchResult(*trajectories, length, burst, out_of_bounds,
+                       final_time, final_altitude,
+                       final_gas_mass=p['gas_mass'],
+                       final_ballast_mass=p['ballast_mass'],
+                       aborted=aborted, decimation=decimation)
+
+
+def _run_batch_cached(sim_configs, record, decimation, rng, abort_error,
+                      cache):
+    ''' `run_batch` that reads the members from a `ResultCache` and only
+    simulates the members that are missing.
+    '''
+    # every member uses the atmosphere model of the first config
+    atmosphere = atmosphere_models.from_config(sim_configs[0], noise=False)
+    params = {'record': record, 'decimation': decimation,
+              'abort_error': abort_error,
+              'atmosphere': sim_configs[0].get('atmosphere', {})}
+    keys = [None if any(atmosphere_models.noise_std(sim_config)) else
+            result_cache.make_key('batch_member', sim_config, **params)
+            for sim_config in sim_configs]
+    records = [None if key is None else cache.load(key) for key in keys]
+    missing = [i for i, r in enumerate(records) if r is None]
+    if missing:
+        result = run_batch([sim_configs[i] for i in missing], atmosphere,
+                           record=record, decimation=decimation, rng=rng,
+                           abort_error=abort_error)
+        for j, i in enumerate(missing):
+            records[i] = result.member_record(j)
+            if keys[i] is not None:
+                cache.save(keys[i], records[i], evict=False)
+        cache.trim()
+    return BatchResult.from_member_records(records, decimation, record)
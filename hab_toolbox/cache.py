@@ -0,0 +1,308 @@
+''' Simulation result cache.
+
+This module stores simulation results on disk, keyed by a hash of everything
+the results depend on, so that repeated simulations of the same config are
+read back instead of simulated again:
+``` python
+result_cache = ResultCache()
+ascent_model.run(sim_config, cache=result_cache)  # simulates and stores
+ascent_model.run(sim_config, cache=result_cache)  # reads the stored result
+```
+
+A key is the SHA-256 hash of a canonical JSON document of the simulation
+config, the contents of its balloon spec, the `code_version` and any other
+arguments that change the result. Editing a balloon spec or the toolbox
+itself therefore never returns stale results. Configs with atmosphere noise
+are only cached if their results are reproducible, see `ascent_model.run`.
+
+Each result is one file in the cache directory: a `.npy` array for a
+trajectory, or a `.npz` archive for other results. Files are written to a
+temporary file first and renamed into place, so several processes can share
+a cache. When the files exceed `max_size` bytes, the least recently used
+ones are deleted until they fit in `EVICT_FRACTION` of it. Reading a result
+marks it as used by updating its modification time.
+
+The cache directory is only scanned to find the size of the cache on the
+first save and to evict results. Saves in between add the size of each file
+to a running total, so saving many results costs the same per result. Files
+added by other processes are only counted at the next scan.
+
+The cache directory defaults to `~/.cache/hab-toolbox` and can be set with
+the `HAB_TOOLBOX_CACHE_DIR` environment variable, the size limit with
+`HAB_TOOLBOX_CACHE_SIZE` (bytes).
+'''
+
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+import hab_toolbox
+from hab_toolbox import sinks
+from hab_toolbox.balloon_library.balloon import get_balloon
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'hab-toolbox')
+DEFAULT_MAX_SIZE = 2**30  # [bytes] 1 GiB
+EVICT_FRACTION = 0.9  # evict down to this fraction of the maximum size
+EXTENSIONS = ('.npy', '.npz')
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    ''' Version of the toolbox and a hash of its source files, so that
+    results cached by modified code are not reused.
+    '''
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(PACKAGE_DIR):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.py'):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, PACKAGE_DIR).encode())
+                with open(path, 'rb') as source_file:
+                    digest.update(source_file.read())
+    return f'{hab_toolbox.__version__}+{digest.hexdigest()[:12]}'
+
+
+def make_key(kind, sim_config, **params):
+    ''' Cache key of a simulation result.
+
+    Args:
+        kind (string): Kind of result, such as the name of the function that
+            computed it.
+        sim_config (dict): Dictionary of simulation config parameters.
+        params: Other arguments the result depends on. Must be JSON
+            serializable.
+
+    Returns:
+        string: Hexadecimal SHA-256 hash.
+    '''
+    document = {
+        'kind': kind,
+        'sim_config': sim_config,
+        'balloon': get_balloon(sim_config['balloon']['type']),
+        'code_version': code_version(),
+        'params': params,
+    }
+    text = json.dumps(document, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache():
+    ''' Size-bounded, least recently used on-disk cache of simulation
+    results.
+
+    | Property | Description |
+    | -------- | ----------- |
+    | `hits` | Number of results read from the cache |
+    | `misses` | Number of results that were not in the cache |
+    | `evictions` | Number of results deleted to stay within `max_size` |
+
+    Args:
+        path (string): Cache directory. Optional, defaults to the
+            `HAB_TOOLBOX_CACHE_DIR` environment variable or
+            `DEFAULT_CACHE_DIR`.
+        max_size (int): Largest total size of the cached results in bytes.
+            Optional, defaults to the `HAB_TOOLBOX_CACHE_SIZE` environment
+            variable or `DEFAULT_MAX_SIZE`.
+    '''
+    def __init__(self, path=None, max_size=None):
+        if max_size is None:
+            max_size = int(os.environ.get('HAB_TOOLBOX_CACHE_SIZE',
+                                          DEFAULT_MAX_SIZE))
+        if max_size < 0:
+            raise ValueError('Cache size cannot be negative! (%s)' % max_size)
+        if path is None:
+            path = os.environ.get('HAB_TOOLBOX_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None  # running total of the sizes of the results
+        os.makedirs(path, exist_ok=True)
+
+    def _entry(self, key, extension):
+        return os.path.join(self.path, key + extension)
+
+    def load(self, key, mmap_mode=None):
+        ''' Read a cached result.
+
+        Args:
+            key (string): Cache key, see `make_key`.
+            mmap_mode (string): Memory-map a cached array instead of reading
+                it, see `numpy.load`. Optional.
+
+        Returns:
+            The cached array, or a dictionary of arrays for a result that was
+            saved as one, or `None` if the result is not in the cache.
+        '''
+        for extension in EXTENSIONS:
+            path = self._entry(key, extension)
+            try:
+                if extension == '.npy':
+                    result = np.load(path, mmap_mode=mmap_mode)
+                else:
+                    with np.load(path) as archive:
+                        result = dict(archive)
+                os.utime(path)
+            except FileNotFoundError:
+                continue
+            self.hits += 1
+            return result
+        self.misses += 1
+        return None
+
+    def save(self, key, result, evict=True):
+        ''' Store a result.
+
+        Args:
+            key (string): Cache key, see `make_key`.
+            result: An array, or a dictionary of arrays.
+            evict (bool): Evict results if the cache exceeds `max_size`
+                (`True`, default), or leave it to a later `trim` when saving
+                many results at once (`False`).
+        '''
+        extension = '.npz' if isinstance(result, dict) else '.npy'
+        with self._temporary(extension) as temp_path:
+            with open(temp_path, 'wb') as file:
+                if isinstance(result, dict):
+                    np.savez(file, **result)
+                else:
+                    np.save(file, result)
+            self._replace(temp_path, self._entry(key, extension))
+        if evict:
+            self.trim()
+
+    @contextlib.contextmanager
+    def writer(self, key):
+        ''' Store a trajectory one chunk at a time.
+
+        The trajectory is written to an `NpySink` that is only stored under
+        `key` if the context exits without an error:
+        ``` python
+        with result_cache.writer(key) as sink:
+            for chunk in chunks:
+                sink.write(*chunk)
+        ```
+        '''
+        with self._temporary('.npy') as temp_path:
+            sink = sinks.NpySink(temp_path)
+            try:
+                yield sink
+            finally:
+                sink.close()
+            self._replace(temp_path, self._entry(key, '.npy'))
+        self.trim()
+
+    def _replace(self, temp_path, path):
+        # rename a temporary file into place and count its size
+        size = os.path.getsize(temp_path)
+        with contextlib.suppress(FileNotFoundError):
+            size -= os.path.getsize(path)
+        os.replace(temp_path, path)
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += size
+
+    @contextlib.contextmanager
+    def _temporary(self, extension):
+        # temporary file in the cache directory, removed unless renamed
+        handle, temp_path = tempfile.mkstemp(suffix=extension + '.tmp',
+                                             dir=self.path)
+        os.close(handle)
+        try:
+            yield temp_path
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def entries(self):
+        ''' Paths, sizes and modification times of the cached results, least
+        recently used first.
+        '''
+        entries = []
+        with os.scandir(self.path) as scan:
+            for entry in scan:
+                if entry.name.endswith(EXTENSIONS):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:  # evicted by another process
+                        continue
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self):
+        ''' Total size of the cached results in bytes.
+        '''
+        return sum(size for _, size, _ in self.entries())
+
+    def trim(self):
+        ''' Evict results if the running total of their sizes exceeds
+        `max_size`. Only scans the cache directory to evict.
+        '''
+        if self._size is not None and self._size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        ''' Delete the least recently used results until the cache fits in
+        `EVICT_FRACTION` of `max_size`, if it exceeds `max_size`.
+        '''
+        entries = self.entries()
+        size = sum(size for _, size, _ in entries)
+        if size > self.max_size:
+            for path, entry_size, _ in entries:
+                if size <= self.max_size * EVICT_FRACTION:
+                    break
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+                    self.evictions += 1
+                size -= entry_size
+        self._size = size
+
+    def clear(self):
+        ''' Delete every cached result.
+        '''
+        for path, _, _ in self.entries():
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+        self._size = 0
+
+    def counts(self):
+        ''' Hit, miss and eviction counts as a tuple.
+        '''
+        return self.hits, self.misses, self.evictions
+
+    def add_counts(self, hits, misses, evictions):
+        ''' Add the counts of a copy of this cache that was used by a worker
+        process.
+        '''
+        self.hits += hits
+        self.misses += misses
+        self.evictions += evictions
+
+    def stats(self):
+        ''' Hit, miss and eviction counts, and the number and total size of
+        the cached results.
+        '''
+        entries = self.entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'size': sum(size for _, size, _ in entries),
+            'max_size': self.max_size,
+        }
@@ -0,0 +1,206 @@
+''' Simulation checkpoints.
+
+A `Checkpoint` holds the full state of a simulation between two time steps,
+so that a simulation that was stopped can continue from it and produce the
+same samples, bit for bit, as one that ran without stopping. Pass it to
+`ascent_model.iter_run`, which updates it before yielding each chunk, and
+save it after the chunk was written:
+``` python
+checkpoint = Checkpoint(sim_config)
+with sinks.open_sink('out.npy') as sink:
+    for chunk in ascent_model.iter_run(sim_config, checkpoint=checkpoint):
+        sink.write(*chunk)
+        checkpoint.output = sink.position
+        checkpoint.save('run.ckpt')
+```
+To resume, load the checkpoint, reopen the output at `checkpoint.output` and
+pass the checkpoint to `iter_run` again.
+
+A checkpoint file is a small JSON document. Floats are stored with their
+shortest exact representation, so they are read back unchanged:
+
+| Key | Content |
+| --- | ------- |
+| `version` | Format version |
+| `config` | SHA-256 hash of the simulation config |
+| `count` | Number of samples generated by the simulation |
+| `state` | Time, altitude, ascent rate and acceleration of the last sample, and the time step size |
+| `lift_gas` | Mass, temperature and pressure of the lift gas |
+| `payload` | Dry mass and ballast mass |
+| `controller` | Integrator, derivative filter and highest altitude of the altitude controller |
+| `rng` | State of the atmosphere noise random number generator |
+| `output` | Position of the output file, see `Sink.position` |
+'''
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+VERSION = 1
+CONTROLLER_FIELDS = ('integral', 'filter', 'max_altitude')
+
+
+def config_hash(sim_config):
+    ''' SHA-256 hash of a simulation config, independent of key order.
+    '''
+    text = json.dumps(sim_config, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _float(value):
+    # ambiance returns single-element arrays
+    return float(np.asarray(value).item())
+
+
+class Checkpoint():
+    ''' State of a simulation between two time steps.
+
+    A new checkpoint starts the simulation from the beginning. The simulation
+    binds its balloon, payload, controller and atmosphere to the checkpoint,
+    so that their state is read when the checkpoint is saved.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters of the
+            simulation.
+    '''
+    def __init__(self, sim_config):
+        self.config = config_hash(sim_config)
+        self.count = 0  # samples generated so far
+        self.state = None
+        self.lift_gas = None
+        self.payload = None
+        self.controller = None
+        self.rng = None
+        self.output = None
+        self._objects = None
+
+    @property
+    def resumed(self):
+        ''' Whether the simulation continues from a saved state.
+        '''
+        return self.count > 0
+
+    def bind(self, balloon, payload, control=None, atmosphere=None,
+             step_size=None):
+        ''' Attach the objects of a running simulation, and restore their
+        state if the simulation continues from a saved state.
+
+        Args:
+            balloon (Balloon): Balloon object with a `lift_gas`.
+            payload (Payload): Payload object.
+            control (AltitudeController): Altitude controller. Optional.
+            atmosphere (AtmosphereModel): Atmosphere model, a
+                `NoisyAtmosphere` draws noise from its `rng`. Optional.
+            step_size (function): Returns the size of the next time step in
+                seconds, for adaptive integrators. Optional.
+        '''
+        rng = getattr(atmosphere, 'rng', None)
+        if self.resumed:
+            gas = balloon.lift_gas
+            gas.mass = self.lift_gas['mass']
+            gas.match_conditions(self.lift_gas['temperature'],
+                                 self.lift_gas['pressure'])
+            payload.dry_mass = self.payload['dry_mass']
+            payload.ballast_mass = self.payload['ballast_mass']
+            if (control is None) != (self.controller is None):
+                raise ValueError('Checkpoint does not match the altitude '
+                                 'controller of the simulation')
+            if control is not None:
+                for field in CONTROLLER_FIELDS:
+                    setattr(control, field, self.controller[field])
+            if (rng is None) != (self.rng is None):
+                raise ValueError('Checkpoint does not match the atmosphere '
+                                 'noise of the simulation')
+            if rng is not None:
+                rng.bit_generator.state = self.rng
+        self._objects = (balloon, payload, control, rng, step_size)
+
+    def update(self, count, time, altitude, ascent_rate, ascent_accel):
+        ''' Record the last sample generated by the simulation.
+
+        Args:
+            count (int): Number of samples generated so far.
+            time (float): Time of the sample in seconds.
+            altitude (float): Altitude in meters.
+            ascent_rate (float): Velocity (positive up) in meters/second.
+            ascent_accel (float): Acceleration (positive up) in
+                meters/second^2.
+        '''
+        self.count = int(count)
+        self.state = {'time': _float(time), 'altitude': _float(altitude),
+                      'ascent_rate': _float(ascent_rate),
+                      'ascent_accel': _float(ascent_accel), 'dt': None}
+
+    def to_dict(self):
+        ''' Contents of the checkpoint file, with the state of the bound
+        objects as they are now.
+        '''
+        if self._objects is not None:
+            balloon, payload, control, rng, step_size = self._objects
+            gas = balloon.lift_gas
+            self.lift_gas = {'mass': _float(gas.mass),
+                             'temperature': _float(gas.temperature),
+                             'pressure': _float(gas.pressure)}
+            self.payload = {'dry_mass': _float(payload.dry_mass),
+                            'ballast_mass': _float(payload.ballast_mass)}
+            if control is not None:
+                self.controller = {field: _float(getattr(control, field))
+                                   for field in CONTROLLER_FIELDS}
+            if rng is not None:
+                self.rng = rng.bit_generator.state
+            if step_size is not None and self.state is not None:
+                self.state['dt'] = _float(step_size())
+        return {
+            'version': VERSION,
+            'config': self.config,
+            'count': self.count,
+            'state': self.state,
+            'lift_gas': self.lift_gas,
+            'payload': self.payload,
+            'controller': self.controller,
+            'rng': self.rng,
+            'output': self.output,
+        }
+
+    def save(self, path):
+        ''' Write the checkpoint to a file.
+
+        The file is replaced atomically, so a simulation that is stopped
+        while saving leaves the previous checkpoint intact.
+
+        Args:
+            path (string): Path of the checkpoint file.
+        '''
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump(self.to_dict(), checkpoint_file)
+        os.replace(temp_path, path)
+        log.info(f'Checkpoint saved to {path} at sample {self.count}')
+
+    @classmethod
+    def load(cls, path, sim_config):
+        ''' Read a checkpoint file saved by a simulation of `sim_config`.
+
+        Raises:
+            ValueError: If the checkpoint was saved by another version of
+                the format or for another simulation config.
+        '''
+        with open(path) as checkpoint_file:
+            data = json.load(checkpoint_file)
+        if data.get('version') != VERSION:
+            raise ValueError('Checkpoint format version must be %s, not %s'
+                             % (VERSION, data.get('version')))
+        checkpoint = cls(sim_config)
+        if data['config'] != checkpoint.config:
+            raise ValueError('Checkpoint %s was saved for a different '
+                             'simulation config' % path)
+        for key in ('count', 'state', 'lift_gas', 'payload', 'controller',
+                    'rng', 'output'):
+            setattr(checkpoint, key, data[key])
+        return checkpoint
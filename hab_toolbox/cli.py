@@ -1,15 +1,63 @@
+import contextlib
 import logging
 import click
+import csv
 import json
 import os
-import numpy as np
-from hab_toolbox import ascent_model
-from hab_toolbox import plot_tools
+import sys
+import time
+from hab_toolbox.lazy import lazy_import
+
+# modules are executed by the first command that uses them
+np = lazy_import('numpy')
+ascent_model = lazy_import('hab_toolbox.ascent_model')
+batch = lazy_import('hab_toolbox.batch')
+result_cache = lazy_import('hab_toolbox.cache')
+checkpoint = lazy_import('hab_toolbox.checkpoint')
+estimator = lazy_import('hab_toolbox.estimator')
+fill_solver = lazy_import('hab_toolbox.fill')
+ingest = lazy_import('hab_toolbox.ingest')
+monte_carlo = lazy_import('hab_toolbox.monte_carlo')
+pendulum_model = lazy_import('hab_toolbox.pendulum')
+plot_tools = lazy_import('hab_toolbox.plot_tools')
+profiling = lazy_import('hab_toolbox.profiling')
+schema = lazy_import('hab_toolbox.schema')
+sinks = lazy_import('hab_toolbox.sinks')
+trajectory_io = lazy_import('hab_toolbox.trajectory_io')
+tuning = lazy_import('hab_toolbox.tuning')
+wind = lazy_import('hab_toolbox.wind')
 
 FORMAT = '%(module)-10s %(levelname)+8s: %(message)s'
 logging.basicConfig(format=FORMAT, datefmt="%Y-%m-%dT%H:%M:%S%z")
 log = logging.getLogger()
 
+no_cache_option = click.option(
+    '--no-cache',
+    is_flag=True,
+    help='Always simulate instead of reading stored results from the result '
+    'cache, and do not store the results.')
+
+
+@contextlib.contextmanager
+def no_context():
+    ''' A context manager that does nothing, for optional context managers.
+    '''
+    yield
+
+
+def open_result_cache(no_cache):
+    ''' The result cache used by commands, or `None` if disabled.
+    '''
+    return None if no_cache else result_cache.ResultCache()
+
+
+def log_cache_stats(cache):
+    ''' Log the hit and miss counts of a result cache.
+    '''
+    if cache is not None:
+        log.warning(f'Result cache: {cache.hits} hits, {cache.misses} misses '
+                    f'({cache.path})')
+
 
 @click.group()
 @click.option('-v',
@@ -41,13 +89,51 @@ def cli(verbose, debug):
     '-o',
     '--save_output',
     type=click.Path(),
-    help='Save output to file. (Name only, data will be saved as CSV)')
+    help='Save output to file. Saved as a binary trajectory file if the name '
+    'ends in .traj, as NumPy arrays if it ends in .npy or .npz, as CSV '
+    'otherwise.')
+@click.option('--float32',
+              is_flag=True,
+              help='Store .traj output as 32-bit instead of 64-bit floats.')
 @click.option(
     '-p',
     '--plot',
     is_flag=True,
     help='Plot altitude, velocity, and acceleration after simulating.')
-def simple_ascent(config_file, save_output, plot):
+@click.option('--headless',
+              is_flag=True,
+              help='Save the plot without opening a window.')
+@click.option('--profile',
+              is_flag=True,
+              help='Print the time spent in each phase of the simulation, '
+              'steps per second and peak memory.')
+@click.option('--profile_stats',
+              type=click.Path(dir_okay=False),
+              help='Run cProfile and save its statistics to file. Implies '
+              '--profile.')
+@click.option('--trace_memory',
+              is_flag=True,
+              help='Trace memory allocations to report peak Python memory '
+              'when profiling. Slows down the simulation.')
+@click.option('--checkpoint',
+              'checkpoint_path',
+              type=click.Path(dir_okay=False),
+              help='Periodically save the simulation state to this file, so '
+              'that a stopped simulation can be resumed. Requires .npy or CSV '
+              'output. The file is removed when the simulation finishes.')
+@click.option('--checkpoint_interval',
+              type=float,
+              default=60.0,
+              show_default=True,
+              help='Seconds between checkpoints.')
+@click.option('--resume',
+              is_flag=True,
+              help='Continue from the --checkpoint file, if it exists, and '
+              'append to the output file.')
+@no_cache_option
+def simple_ascent(config_file, save_output, float32, plot, headless, profile,
+                  profile_stats, trace_memory, checkpoint_path,
+                  checkpoint_interval, resume, no_cache):
     ''' Start a 1D ascent simulation.
     
     Specify initial conditions and configurable parameters with a CONFIG_FILE 
@@ -63,8 +149,14 @@ def simple_ascent(config_file, save_output, plot):
         "ballast_mass_kg": Mass of ballast material (kg)
     "pid": (optional)
         "mode": Altitude controller mode. [pwm, continuous]
+        "target_altitude_m": Altitude to hold (m), enables the controller
+        "delay_time_s": Earliest time to arm the controller (s)
+        "delay_altitude_m": Altitude to reach before arming (m)
+        "arm_tolerance_m": Largest altitude error to arm at (m)
         "bleed_rate_kgps": Mass flow rate of lift gas bleed (kg/s)
         "ballast_rate_kgps": Mass flow rate of ballast release (kg/s)
+        "bleed_min_rate_kgps": Smallest mass flow rate of bleed (kg/s)
+        "ballast_min_rate_kgps": Smallest mass flow rate of ballast (kg/s)
         "gains":
             "kp": Proportional gain
             "ki": Integral gain
@@ -78,22 +170,67 @@ def simple_ascent(config_file, save_output, plot):
     '''
     sim_config = json.load(config_file)
     log.info(f'Loaded configuration from {config_file}')
-    t, h, v, a = ascent_model.run(sim_config)
-    if save_output:
-        # vertical stack single rows then transpose so they are columns
-        output_array = np.vstack([t, h, v, a]).T
-        output_filename, _ = os.path.splitext(save_output)
-        output_filename = f'{output_filename}.csv'
-        np.savetxt(output_filename,
-                   output_array,
-                   fmt='%.6f',
-                   delimiter=',',
-                   newline='\n',
-                   header='time,altitude,ascent_rate,ascent_accel',
-                   footer='',
-                   comments='# ',
-                   encoding=None)
-        log.warning(f'Simulation output saved to {output_filename}')
+    dtype = '<f4' if float32 else '<f8'
+    metadata = {'sim_config': sim_config}
+    if resume and not checkpoint_path:
+        raise click.UsageError('--resume requires --checkpoint')
+    state = None
+    position = None
+    if checkpoint_path:
+        if not save_output or plot:
+            raise click.UsageError('--checkpoint requires --save_output and '
+                                   'cannot be combined with --plot')
+        if os.path.splitext(save_output)[1] in ('.traj', '.npz'):
+            raise click.UsageError('--checkpoint requires .npy or CSV output')
+        if resume and os.path.exists(checkpoint_path):
+            state = checkpoint.Checkpoint.load(checkpoint_path, sim_config)
+            position = state.output
+            log.warning(f'Resuming simulation from {checkpoint_path} at '
+                        f'sample {state.count}')
+        else:
+            if resume:
+                log.warning(f'No checkpoint found at {checkpoint_path}, '
+                            f'starting from the beginning')
+            state = checkpoint.Checkpoint(sim_config)
+    if profile or profile_stats:
+        profile = profiling.Profile(trace_memory=trace_memory,
+                                    stats_path=profile_stats)
+    else:
+        profile = None
+    # profiled and checkpointed runs always simulate
+    cache = open_result_cache(no_cache or profile or checkpoint_path)
+    with profile or no_context():
+        if save_output and not plot:
+            # stream results to disk as they are computed
+            with sinks.open_sink(save_output, dtype=dtype, metadata=metadata,
+                                 position=position) as sink:
+                last_save = time.monotonic()
+                for chunk in ascent_model.iter_run(sim_config,
+                                                   profile=profile,
+                                                   checkpoint=state,
+                                                   cache=cache):
+                    sink.write(*chunk)
+                    if (state is not None and time.monotonic() - last_save
+                            >= checkpoint_interval):
+                        state.output = sink.position
+                        state.save(checkpoint_path)
+                        last_save = time.monotonic()
+            log.warning(f'Simulation output saved to {sink.path}')
+            if state is not None and os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+        else:
+            t, h, v, a = ascent_model.run(sim_config, profile=profile,
+                                          cache=cache)
+            if save_output:
+                with sinks.open_sink(save_output, dtype=dtype,
+                                     metadata=metadata) as sink:
+                    sink.write(t, h, v, a)
+                if profile is not None:
+                    profile.lap('io')
+                log.warning(f'Simulation output saved to {sink.path}')
+    log_cache_stats(cache)
+    if profile is not None:
+        click.echo(json.dumps(profile.report(), indent=4))
     if plot:
         log.warning('Plotting results...')
         if save_output:
@@ -107,47 +244,679 @@ def simple_ascent(config_file, save_output, plot):
                                a,
                                title=sim_config['simulation']['id'],
                                show=True,
-                               save_fig=save_fig)
+                               save_fig=save_fig,
+                               headless=headless)
     log.warning('Done.')
 
 
 @cli.command()
-@click.argument('csv_file', type=click.File('rb'))
+@click.argument('data_file', type=click.Path(exists=True, dir_okay=False))
 @click.option('-o',
               '--save_output',
               type=click.Path(),
               help='Save output to file. Creates a .png by default.')
-def plot_ascent(csv_file, save_output):
-    ''' Plot altitude, velocity, and acceleration from a CSV file.
-    '''
-    data = np.genfromtxt(csv_file, delimiter=',')
-    log.info(f'Loaded data from {csv_file}.')
-    time = data[:, 0]
-    altitude = data[:, 1]
-    ascent_rate = data[:, 2]
-    ascent_accel = data[:, 3]
+@click.option('--headless',
+              is_flag=True,
+              help='Save the plot without opening a window.')
+def plot_ascent(data_file, save_output, headless):
+    ''' Plot altitude, velocity, and acceleration from a DATA_FILE saved by
+    simple-ascent (.traj, .npy, .npz or CSV).
+    '''
+    time, altitude, ascent_rate, ascent_accel = trajectory_io.read(data_file)
+    log.info(f'Loaded data from {data_file}.')
+    title = data_file
+    if data_file.endswith('.traj'):
+        metadata = trajectory_io.read_header(data_file)['metadata']
+        title = metadata.get('sim_config', {}).get(
+            'simulation', {}).get('id', data_file)
     log.warning('Plotting results...')
     plot_tools.plot_ascent(time,
                            altitude,
                            ascent_rate,
                            ascent_accel,
-                           title=csv_file,
+                           title=title,
                            show=True,
-                           save_fig=save_output)
+                           save_fig=save_output,
+                           headless=headless)
+    log.warning('Done.')
+
+
+@cli.command(name='monte-carlo')
+@click.argument('config_file', type=click.File('rb'))
+@click.option('-n',
+              '--runs',
+              type=int,
+              help='Number of runs. Overrides "runs" in the config.')
+@click.option('-s',
+              '--seed',
+              type=int,
+              help='Seed for random numbers. Overrides "seed" in the config.')
+@click.option('-j',
+              '--workers',
+              type=int,
+              help='Number of worker processes. Defaults to the CPU count.')
+@click.option('--chunk-size',
+              type=int,
+              help='Number of runs simulated together by each worker task.')
+@click.option(
+    '-o',
+    '--save_output',
+    type=click.Path(),
+    help='Save the outcome of each run to file. '
+         '(Name only, data will be saved as CSV)')
+@no_cache_option
+def monte_carlo_analysis(config_file, runs, seed, workers, chunk_size,
+                         save_output, no_cache):
+    ''' Run a Monte Carlo dispersion analysis of a 1D ascent simulation.
+
+    Specify the base simulation with a CONFIG_FILE formatted as a JSON, like
+    for simple-ascent, and describe the dispersions in an extra block.
+
+    \b
+    "monte_carlo":
+        "runs": Number of runs
+        "seed": Seed for random numbers
+        "distributions":
+            "<dotted.path.of.config.field>":
+                "distribution": [normal, uniform, lognormal, choice]
+                "mean", "std": Parameters of a normal distribution
+                "low", "high": Parameters of a uniform distribution
+                "mean", "sigma": Parameters of a lognormal distribution
+                "values": Values of a choice distribution
+
+    Prints statistics of the burst altitude and time to burst. With a
+    "wind" block like for drift, also prints the spread of the final
+    positions.
+    '''
+    sim_config = json.load(config_file)
+    log.info(f'Loaded configuration from {config_file}')
+    cache = open_result_cache(no_cache)
+    result = monte_carlo.from_config(sim_config,
+                                     n_runs=runs,
+                                     seed=seed,
+                                     workers=workers,
+                                     chunk_size=chunk_size,
+                                     cache=cache)
+    log_cache_stats(cache)
+    click.echo(json.dumps(result.summary(), indent=4))
+    if save_output:
+        output_filename, _ = os.path.splitext(save_output)
+        output_filename = f'{output_filename}.csv'
+        paths = list(result.values)
+        fields = ['burst', 'out_of_bounds', 'final_time', 'final_altitude']
+        if result.final_latitude is not None:
+            fields += ['final_latitude', 'final_longitude']
+        columns = [result.values[path] for path in paths] + [
+            getattr(result, field) for field in fields]
+        with open(output_filename, 'w', newline='') as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(paths + fields)
+            writer.writerows(zip(*columns))
+        log.warning(f'Monte Carlo results saved to {output_filename}')
     log.warning('Done.')
 
 
-# @cli.command()
-# def pendulum():
-#     ''' Simulate HAB motion as a spherical pendulum.
-#     '''
-#     log.error(
-#         '''Nothing happened because this feature has not been implemented yet!
-#         See `etc/kinematics_model`
-#         ''')
+@cli.command()
+@click.argument('config_file', type=click.File('rb'))
+@click.option('-n',
+              '--samples',
+              type=int,
+              help='Number of Latin hypercube samples. Overrides "samples" in '
+              'the config.')
+@click.option('-i',
+              '--iterations',
+              type=int,
+              help='Largest number of iterations of each Nelder-Mead search. '
+              'Overrides "iterations" in the config.')
+@click.option('-s',
+              '--seed',
+              type=int,
+              help='Seed for random numbers. Overrides "seed" in the config.')
+@click.option('-j',
+              '--workers',
+              type=int,
+              help='Number of worker processes. Defaults to the CPU count.')
+@click.option('-o',
+              '--save_output',
+              type=click.Path(),
+              help='Save the config with the best gains to a JSON file.')
+@no_cache_option
+def tune(config_file, samples, iterations, seed, workers, save_output,
+         no_cache):
+    ''' Tune the gains of the altitude controller of a 1D ascent simulation.
+
+    Specify the simulation with a CONFIG_FILE formatted as a JSON, like for
+    simple-ascent, with a "target_altitude_m" in the "pid" block. Describe
+    the search in an extra block.
+
+    
+    "tune":
+        "gains":
+            "<kp, ki, kd or n>": [low, high] bounds of the gain
+        "samples": Number of Latin hypercube samples
+        "starts": Number of Nelder-Mead searches
+        "iterations": Largest number of iterations of each search
+        "seed": Seed for random numbers
+        "settle_tolerance_m": Largest altitude error of a settled flight (m)
+        "abort_error_m": Largest altitude error before a flight is stopped (m)
+        "weights":
+            "<settling_time, overshoot, gas or ballast>": Weight of the cost
+
+    Prints the best gains, their cost and flight metrics.
+    '''
+    sim_config = json.load(config_file)
+    log.info(f'Loaded configuration from {config_file}')
+    cache = open_result_cache(no_cache)
+    result = tuning.from_config(sim_config,
+                                samples=samples,
+                                iterations=iterations,
+                                seed=seed,
+                                workers=workers,
+                                cache=cache)
+    log_cache_stats(cache)
+    click.echo(json.dumps(result.summary(), indent=4))
+    if save_output:
+        for name, value in result.gains.items():
+            monte_carlo.set_config_value(sim_config, f'pid.gains.{name}',
+                                         value)
+        with open(save_output, 'w') as output_file:
+            json.dump(sim_config, output_file, indent=4)
+        log.warning(f'Tuned config saved to {save_output}')
+    log.warning('Done.')
+
+
+@cli.command()
+@click.argument('config_file', type=click.File('rb'))
+@click.option('-c',
+              '--compare',
+              is_flag=True,
+              help='Also simulate the config and report the accuracy of the '
+              'estimate.')
+def estimate(config_file, compare):
+    ''' Estimate burst altitude, time to burst and ascent rate of a 1D ascent
+    simulation without simulating it.
+
+    Specify the simulation with a CONFIG_FILE formatted as a JSON, like for
+    simple-ascent. The balloon is assumed to always ascend at the rate where
+    drag balances its free lift. The altitude controller is ignored.
+    '''
+    sim_config = json.load(config_file)
+    log.info(f'Loaded configuration from {config_file}')
+    result = estimator.from_configs([sim_config])
+    summary = {
+        'burst': bool(result.burst[0]),
+        'burst_altitude': float(result.burst_altitude[0]),
+        'burst_time': float(result.burst_time[0]),
+        'ascent_rate': float(result.ascent_rate[0]),
+        'mean_ascent_rate': float(result.mean_ascent_rate[0]),
+    }
+    if compare:
+        summary['accuracy'] = estimator.accuracy_report([sim_config])
+    click.echo(json.dumps(summary, indent=4))
+    log.warning('Done.')
+
+
+@cli.command()
+@click.option('-m',
+              '--payload_mass',
+              type=float,
+              required=True,
+              help='Total payload mass, including ballast (kg).')
+@click.option('-r',
+              '--ascent_rate',
+              type=float,
+              multiple=True,
+              help='Target ascent rate at launch (m/s). Repeat for more '
+              'targets.')
+@click.option('-a',
+              '--burst_altitude',
+              type=float,
+              multiple=True,
+              help='Target burst altitude (m). Repeat for more targets.')
+@click.option('-b',
+              '--balloon',
+              multiple=True,
+              help='Balloon from the balloon library. Repeat for more '
+              'balloons. Defaults to every balloon in the library.')
+@click.option('--lift_gas',
+              help='Lift gas species. Defaults to the species recommended '
+              'by each balloon spec.')
+@click.option('--initial_altitude',
+              type=float,
+              default=0.0,
+              help='Launch altitude (m).')
+@click.option('-o',
+              '--save_output',
+              type=click.Path(),
+              help='Save the fill table to file. (Name only, data will be '
+              'saved as CSV)')
+def fill(payload_mass, ascent_rate, burst_altitude, balloon, lift_gas,
+         initial_altitude, save_output):
+    ''' Find the lift gas mass to fill balloons with for target ascent rates
+    at launch or target burst altitudes.
+
+    Prints a fill table with the lift gas mass, free lift and estimated
+    ascent rate, burst altitude and time to burst of every balloon and
+    target. Set "reserve_mass_kg" plus "bleed_mass_kg" in a simulation config
+    to the lift gas mass to simulate a fill.
+    '''
+    if not ascent_rate and not burst_altitude:
+        raise click.UsageError('Specify at least one --ascent_rate or '
+                               '--burst_altitude target.')
+    rows = fill_solver.fill_table(payload_mass,
+                                  ascent_rates=ascent_rate,
+                                  burst_altitudes=burst_altitude,
+                                  balloons=balloon or None,
+                                  lift_gas=lift_gas,
+                                  initial_altitude=initial_altitude)
+    fields = fill_solver.TABLE_FIELDS
+    click.echo(' '.join(f'{field:>14}' for field in fields))
+    for row in rows:
+        click.echo(' '.join(
+            f'{row[field]:>14}' if isinstance(row[field], str)
+            else f'{row[field]:>14.4f}' for field in fields))
+    if save_output:
+        output_filename, _ = os.path.splitext(save_output)
+        output_filename = f'{output_filename}.csv'
+        with open(output_filename, 'w', newline='') as output_file:
+            writer = csv.DictWriter(output_file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+        log.warning(f'Fill table saved to {output_filename}')
+    log.warning('Done.')
+
+
+@cli.command()
+@click.argument('config_file', type=click.File('rb'))
+@click.option('-o',
+              '--save_output',
+              type=click.Path(),
+              help='Save the time, altitude, ascent rate, ascent '
+              'acceleration and phase of each sample to file. (Name only, '
+              'data will be saved as CSV)')
+@click.option(
+    '-p',
+    '--plot',
+    is_flag=True,
+    help='Plot altitude, velocity, and acceleration after simulating.')
+@click.option('--headless',
+              is_flag=True,
+              help='Save the plot without opening a window.')
+def flight(config_file, save_output, plot, headless):
+    ''' Simulate a full flight: ascent, burst and parachute descent.
+
+    Specify the simulation with a CONFIG_FILE formatted as a JSON, like for
+    simple-ascent, and the parachute in an extra block.
+
+    \b
+    "descent":
+        "parachute_cd": Drag coefficient of the parachute
+        "parachute_area_m2": Reference area of the parachute (m^2)
+        "ground_altitude_m": Altitude of the ground (m), defaults to the
+            initial altitude
+
+    Prints the time, altitude and velocity of the burst and the landing.
+    '''
+    sim_config = json.load(config_file)
+    log.info(f'Loaded configuration from {config_file}')
+    t, h, v, a, phase, events = ascent_model.run_flight(sim_config)
+    click.echo(json.dumps(events, indent=4))
+    output_filename = None
+    if save_output:
+        output_filename, _ = os.path.splitext(save_output)
+        with open(f'{output_filename}.csv', 'w', newline='') as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(['time', 'altitude', 'ascent_rate',
+                             'ascent_accel', 'phase'])
+            writer.writerows(zip(t, h, v, a, [
+                ascent_model.FLIGHT_PHASES[int(p)] for p in phase]))
+        log.warning(f'Flight saved to {output_filename}.csv')
+    if plot:
+        log.warning('Plotting results...')
+        plot_tools.plot_ascent(t,
+                               h,
+                               v,
+                               a,
+                               title=sim_config['simulation']['id'],
+                               show=True,
+                               save_fig=output_filename,
+                               headless=headless)
+    log.warning('Done.')
+
+
+@cli.command()
+@click.argument('config_file', type=click.File('rb'))
+@click.option('-o',
+              '--save_output',
+              type=click.Path(),
+              help='Save the time, altitude, latitude and longitude of each '
+              'sample to file. (Name only, data will be saved as CSV)')
+@no_cache_option
+def drift(config_file, save_output, no_cache):
+    ''' Predict where a 1D ascent simulation drifts with the wind.
+
+    Specify the simulation with a CONFIG_FILE formatted as a JSON, like for
+    simple-ascent, and the wind field in an extra block. The balloon moves
+    horizontally with the wind of a gridded wind file (.wind, see
+    hab_toolbox.wind), interpolated at its time, altitude and position.
+
+    \b
+    "wind":
+        "file": Path of a wind file
+        "launch_latitude_deg": Latitude of the launch (deg)
+        "launch_longitude_deg": Longitude of the launch (deg)
+        "launch_time_s": Time of the launch on the time axis of the file (s)
+
+    With a "descent" block like for flight, the full flight is simulated and
+    the drift ends where the payload lands.
+
+    Prints the final time, altitude and position, and the distance from the
+    launch.
+    '''
+    sim_config = json.load(config_file)
+    log.info(f'Loaded configuration from {config_file}')
+    cache = open_result_cache(no_cache)
+    t, h, _, _, latitude, longitude, interpolator = wind.run(sim_config,
+                                                             cache=cache)
+    log_cache_stats(cache)
+    click.echo(json.dumps({
+        'final_time': float(t[-1]),
+        'final_altitude': float(h[-1]),
+        'final_latitude': float(latitude[-1]),
+        'final_longitude': float(longitude[-1]),
+        'distance': float(wind.distance(latitude[0], longitude[0],
+                                        latitude[-1], longitude[-1])),
+        'visited_cells': len(interpolator.visited),
+    }, indent=4))
+    if save_output:
+        output_filename, _ = os.path.splitext(save_output)
+        output_filename = f'{output_filename}.csv'
+        with open(output_filename, 'w', newline='') as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(['time', 'altitude', 'latitude', 'longitude'])
+            writer.writerows(zip(t, h, latitude, longitude))
+        log.warning(f'Drift saved to {output_filename}')
+    log.warning('Done.')
+
+
+@cli.command(name='cache')
+@click.option('--clear',
+              is_flag=True,
+              help='Delete every stored result.')
+def cache_info(clear):
+    ''' Show the size of the result cache, or clear it.
+
+    Results of simple-ascent, monte-carlo and tune are stored in the
+    directory set by the HAB_TOOLBOX_CACHE_DIR environment variable, or
+    ~/.cache/hab-toolbox by default.
+    '''
+    cache = result_cache.ResultCache()
+    if clear:
+        cache.clear()
+        log.warning(f'Cleared result cache {cache.path}')
+    stats = cache.stats()
+    click.echo(json.dumps({'path': cache.path, 'entries': stats['entries'],
+                           'size': stats['size'],
+                           'max_size': stats['max_size']}, indent=4))
+
+
+@cli.command()
+@click.argument('config_files', nargs=-1, type=click.File('rb'))
+@click.option('-l',
+              '--length',
+              type=float,
+              multiple=True,
+              default=[1.0],
+              show_default=True,
+              help='Tether length (m). Repeat to sweep several lengths.')
+@click.option('--theta',
+              type=float,
+              multiple=True,
+              default=[10.0],
+              show_default=True,
+              help='Initial angle of the tether from the vertical (deg). '
+              'Repeat to sweep several angles.')
+@click.option('--phi_dot',
+              type=float,
+              default=0.0,
+              help='Initial rate of the azimuth of the tether (deg/s).')
+@click.option('-t',
+              '--duration',
+              type=float,
+              default=60.0,
+              show_default=True,
+              help='Duration (s) of a swing without CONFIG_FILES.')
+@click.option('--dt',
+              type=float,
+              default=0.01,
+              show_default=True,
+              help='Time step (s) of a swing without CONFIG_FILES.')
+@click.option('--substeps',
+              type=int,
+              default=1,
+              show_default=True,
+              help='Number of Runge-Kutta steps per time step.')
+@click.option('-o',
+              '--save_output',
+              type=click.Path(),
+              help='Save the time, tether angles and payload position of '
+              'each sample of each pendulum to file. (Name only, data will be '
+              'saved as CSV)')
+def pendulum(config_files, length, theta, phi_dot, duration, dt, substeps,
+             save_output):
+    ''' Simulate HAB payload swing as a spherical pendulum.
+
+    Without CONFIG_FILES, the balloon does not accelerate. With one or more
+    CONFIG_FILES formatted as a JSON, like for simple-ascent, the flights are
+    simulated together and each pendulum is driven by the ascent
+    acceleration of its flight.
+
+    Every combination of flight, tether length and initial angle is swung in
+    one batch. Prints the largest angle of the tether from the vertical of
+    each pendulum.
+    '''
+    sim_configs = [json.load(config_file) for config_file in config_files]
+    n_flights = max(len(sim_configs), 1)
+    members, lengths, thetas = (np.array(x).ravel() for x in np.meshgrid(
+        np.arange(n_flights), length, theta, indexing='ij'))
+    options = dict(phi_dot=np.radians(phi_dot), substeps=substeps,
+                   record=bool(save_output))
+    if sim_configs:
+        result = batch.run_batch(sim_configs)
+        swing = pendulum_model.swing_batch(result, lengths, np.radians(thetas),
+                                           members=members, **options)
+    else:
+        tspan = np.arange(0, duration, step=dt)
+        swing = pendulum_model.simulate(tspan, lengths, np.radians(thetas),
+                                        **options)
+    click.echo(json.dumps([{
+        'flight': (sim_configs[m]['simulation']['id'] if sim_configs
+                   else None),
+        'length': float(l),
+        'theta': float(th),
+        'max_swing': float(np.degrees(max_swing)),
+    } for m, l, th, max_swing in zip(members, lengths, thetas,
+                                     swing.max_swing)], indent=4))
+    if save_output:
+        output_filename, _ = os.path.splitext(save_output)
+        output_filename = f'{output_filename}.csv'
+        x, y, z = swing.positions()
+        with open(output_filename, 'w', newline='') as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(['pendulum', 'time', 'theta_deg', 'phi_deg', 'x',
+                             'y', 'z'])
+            for i in range(len(swing)):
+                valid = ~np.isnan(swing.time[i])
+                writer.writerows(zip(
+                    [i] * np.count_nonzero(valid), swing.time[i, valid],
+                    np.degrees(swing.theta[i, valid]),
+                    np.degrees(swing.phi[i, valid]), x[i, valid],
+                    y[i, valid], z[i, valid]))
+        log.warning(f'Swing saved to {output_filename}')
+    log.warning('Done.')
+
+
+@cli.command()
+@click.option('-o',
+              '--output_dir',
+              type=click.Path(file_okay=False),
+              help='Save the output of each simulation to this directory, '
+              'named after its config file.')
+@click.option('-f',
+              '--format',
+              'extension',
+              type=click.Choice(['.csv', '.traj', '.npy', '.npz']),
+              default='.traj',
+              show_default=True,
+              help='File format of the outputs.')
+@click.option('--float32',
+              is_flag=True,
+              help='Store trajectory files as float32 instead of float64.')
+@no_cache_option
+def worker(output_dir, extension, float32, no_cache):
+    ''' Simulate many config files in one process.
+
+    Reads one CONFIG_FILE per line from standard input and simulates it like
+    simple-ascent, so job scripts start the interpreter and import the
+    toolbox once instead of once per simulation. A line may name the output
+    file after a tab, overriding --output_dir:
+
+    \b
+    configs/a.json
+    configs/b.json<TAB>results/b.csv
+
+    Prints one JSON line per config as soon as it is done, with its final
+    time and altitude, highest altitude and output file, or the error that
+    stopped it. The final values are null if the simulation stored no
+    samples. An error does not stop the worker, which ends at the end of the
+    input.
+    '''
+    dtype = '<f4' if float32 else '<f8'
+    cache = open_result_cache(no_cache)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    for line in click.get_text_stream('stdin'):
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            continue
+        config_path, _, save_output = line.partition('\t')
+        if not save_output and output_dir:
+            name = os.path.splitext(os.path.basename(config_path))[0]
+            save_output = os.path.join(output_dir, name + extension)
+        start = time.perf_counter()
+        try:
+            with open(config_path, 'rb') as config_file:
+                sim_config = json.load(config_file)
+            summary = _simulate_to_file(sim_config, save_output or None,
+                                        dtype, cache)
+        except Exception as err:  # pylint: disable=broad-except
+            # one bad config must not stop the configs after it
+            log.error(f'{config_path}: {err}')
+            summary = {'error': f'{type(err).__name__}: {err}'}
+        summary['elapsed'] = time.perf_counter() - start
+        click.echo(json.dumps({'config': config_path, **summary}))
+    log_cache_stats(cache)
+
+
+@cli.command(name='batch')
+@click.argument('input_path', type=click.Path(exists=True))
+@click.option('-o',
+              '--save_output',
+              type=click.Path(dir_okay=False),
+              help='Save the trajectories of every config to one file, a '
+              '.npz archive with the outcome of each config or a CSV.')
+@click.option('-j',
+              '--workers',
+              type=int,
+              help='Number of worker processes. Defaults to the CPU count.')
+@click.option('--chunk-size',
+              type=int,
+              help='Number of configs simulated by each worker task.')
+@click.option('--check',
+              is_flag=True,
+              help='Only validate the configs, and exit with status 1 if any '
+              'is invalid.')
+@no_cache_option
+def batch_configs(input_path, save_output, workers, chunk_size, check,
+                  no_cache):
+    ''' Simulate a batch of configs from a JSON Lines file or a directory.
+
+    INPUT_PATH is a file with one JSON config per line, or a directory of
+    .json config files, each like for simple-ascent. Every config is checked
+    against the config schema before anything is simulated. Invalid configs
+    are reported with every field at fault and skipped, and identical
+    configs (ignoring their simulation id) are simulated once. Configs with
+    a "descent" block fly the full flight like for flight, and configs with
+    a "wind" block drift like for drift.
+
+    Prints one JSON line per config with its status (ok, duplicate, invalid
+    or failed), its final time, altitude and position, highest altitude,
+    burst and landing times, or its error. The samples of each simulation are
+    written to the output file as soon as they are done.
+    '''
+    configs = ingest.iter_configs(input_path)
+    if check:
+        invalid = 0
+        for source, sim_config, error in configs:
+            errors = [error] if error else schema.check(sim_config)
+            for message in errors:
+                click.echo(f'{source}: {message}')
+            invalid += bool(errors)
+        log.warning(f'{invalid} invalid configs')
+        if invalid:
+            sys.exit(1)
+        return
+    cache = open_result_cache(no_cache)
+    result = ingest.run_configs(configs, save_output=save_output,
+                                workers=workers, chunk_size=chunk_size,
+                                cache=cache)
+    log_cache_stats(cache)
+    for i in range(len(result)):
+        click.echo(json.dumps(result.summary(i)))
+    log.warning(', '.join(f'{count} {status}'
+                          for status, count in result.counts().items()))
+    if save_output:
+        log.warning(f'Batch results saved to {save_output}')
+    log.warning('Done.')
+
+
+def _simulate_to_file(sim_config, save_output, dtype, cache):
+    # simulate like simple-ascent without options, summarize the trajectory;
+    # the final values are None if no samples were stored
+    metadata = {'sim_config': sim_config}
+    t = h = max_altitude = None
+    if save_output:
+        with sinks.open_sink(save_output, dtype=dtype,
+                             metadata=metadata) as sink:
+            for chunk in ascent_model.iter_run(sim_config, cache=cache):
+                sink.write(*chunk)
+                if len(chunk[0]):
+                    highest = float(np.max(chunk[1]))
+                    max_altitude = (highest if max_altitude is None
+                                    else max(max_altitude, highest))
+                    t, h = float(chunk[0][-1]), float(chunk[1][-1])
+        save_output = sink.path
+    else:
+        tspan, altitude = ascent_model.run(sim_config, cache=cache)[:2]
+        if len(tspan):
+            max_altitude = float(np.max(altitude))
+            t, h = float(tspan[-1]), float(altitude[-1])
+    return {'output': save_output, 'final_time': t, 'final_altitude': h,
+            'max_altitude': max_altitude}
+
 
 cli.add_command(simple_ascent)
 cli.add_command(plot_ascent)
+cli.add_command(monte_carlo_analysis)
+cli.add_command(tune)
+cli.add_command(estimate)
+cli.add_command(fill)
+cli.add_command(flight)
+cli.add_command(drift)
+cli.add_command(pendulum)
+cli.add_command(worker)
+cli.add_command(batch_configs)
+cli.add_command(cache_info)
 
 if __name__ == '__main__':
     # pylint: disable=no-value-for-parameter
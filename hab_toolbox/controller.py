@@ -0,0 +1,190 @@
+''' Closed-loop altitude controller.
+
+This module is a port of the Simulink altitude controller in
+`etc/Simulink/altitude_control.slx`. A PID controller drives the altitude
+toward a target by bleeding lift gas (to descend) or dropping ballast (to
+ascend):
+
+1. The control error is `altitude - target`. It is held at `0` while the
+   controller is not armed.
+2. A parallel PID controller with a filtered derivative turns the error into a
+   control effort. The integrator and the derivative filter are discretized
+   with Forward Euler, like the Simulink model.
+3. The effort is limited to the largest mass flow rates of the valves, then a
+   dead zone removes efforts below the smallest mass flow rates.
+4. A positive effort bleeds lift gas and a negative effort drops ballast. In
+   `continuous` mode the mass flow rate follows the effort, in `pwm` mode the
+   valve is either closed or wide open.
+
+The controller is armed while the simulation time is at least `delay_time`,
+the highest altitude reached so far is at least `delay_altitude` and the
+altitude is within `arm_tolerance` of the target.
+'''
+
+import logging
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+MODES = ('continuous', 'pwm')
+DEFAULT_ARM_TOLERANCE = 1000.0  # [m] same as the Simulink model
+
+
+def is_enabled(sim_config):
+    ''' Whether a simulation config enables the altitude controller.
+
+    The controller is enabled when the `pid` block sets a
+    `target_altitude_m`.
+    '''
+    return 'target_altitude_m' in sim_config.get('pid', {})
+
+
+class AltitudeController():
+    ''' PID altitude controller that bleeds lift gas and drops ballast.
+
+    Args:
+        target_altitude (float): Altitude to hold in meters.
+        mode (string): Actuation of the valves, `continuous` or `pwm`.
+            Optional, defaults to `continuous`.
+        kp (float): Proportional gain. Optional, defaults to `0`.
+        ki (float): Integral gain. Optional, defaults to `0`.
+        kd (float): Derivative gain. Optional, defaults to `0`.
+        n (float): Derivative filter coefficient. Optional, defaults to `0`.
+        bleed_rate (float): Largest mass flow rate of lift gas bleed in
+            kilograms/second. Optional, defaults to `0`.
+        ballast_rate (float): Largest mass flow rate of ballast release in
+            kilograms/second. Optional, defaults to `0`.
+        bleed_min_rate (float): Smallest mass flow rate of lift gas bleed in
+            kilograms/second. Optional, defaults to `0`.
+        ballast_min_rate (float): Smallest mass flow rate of ballast release
+            in kilograms/second. Optional, defaults to `0`.
+        delay_time (float): Earliest time to arm the controller in seconds.
+            Optional, defaults to `0`.
+        delay_altitude (float): Altitude to reach before arming the
+            controller in meters. Optional, defaults to `target_altitude`.
+        arm_tolerance (float): Largest altitude error to arm the controller
+            at in meters. Optional, defaults to `DEFAULT_ARM_TOLERANCE`.
+        initial_altitude (float): Altitude at simulation start in meters.
+            Optional, defaults to `0`.
+    '''
+    __slots__ = ('target_altitude', 'continuous', 'kp', 'ki', 'kd', 'n',
+                 'bleed_rate', 'ballast_rate', 'bleed_min_rate',
+                 'ballast_min_rate', 'delay_time', 'delay_altitude',
+                 'arm_tolerance', 'integral', 'filter', 'max_altitude')
+
+    def __init__(self, target_altitude, mode='continuous', kp=0.0, ki=0.0,
+                 kd=0.0, n=0.0, bleed_rate=0.0, ballast_rate=0.0,
+                 bleed_min_rate=0.0, ballast_min_rate=0.0, delay_time=0.0,
+                 delay_altitude=None, arm_tolerance=DEFAULT_ARM_TOLERANCE,
+                 initial_altitude=0.0):
+        if mode not in MODES:
+            raise ValueError('Controller mode must be one of %s, not "%s"' % (
+                MODES, mode))
+        rates = (bleed_rate, ballast_rate, bleed_min_rate, ballast_min_rate)
+        if min(rates) < 0:
+            raise ValueError('Controller mass flow rates must not be '
+                             'negative, not %s' % (rates,))
+        self.target_altitude = target_altitude
+        self.continuous = mode == 'continuous'
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.n = n
+        self.bleed_rate = bleed_rate
+        self.ballast_rate = ballast_rate
+        self.bleed_min_rate = bleed_min_rate
+        self.ballast_min_rate = ballast_min_rate
+        self.delay_time = delay_time
+        if delay_altitude is None:
+            delay_altitude = target_altitude
+        self.delay_altitude = delay_altitude
+        self.arm_tolerance = arm_tolerance
+        self.integral = 0.0  # integrator state
+        self.filter = 0.0  # derivative filter state
+        self.max_altitude = initial_altitude
+
+    @classmethod
+    def from_config(cls, sim_config):
+        ''' Initialize a controller from the `pid` block of a simulation
+        config. See `ascent_model.run` for supported keys.
+        '''
+        pid = sim_config['pid']
+        gains = pid.get('gains', {})
+        return cls(pid['target_altitude_m'],
+                   mode=pid.get('mode', 'continuous'),
+                   kp=gains.get('kp', 0.0),
+                   ki=gains.get('ki', 0.0),
+                   kd=gains.get('kd', 0.0),
+                   n=gains.get('n', 0.0),
+                   bleed_rate=pid.get('bleed_rate_kgps', 0.0),
+                   ballast_rate=pid.get('ballast_rate_kgps', 0.0),
+                   bleed_min_rate=pid.get('bleed_min_rate_kgps', 0.0),
+                   ballast_min_rate=pid.get('ballast_min_rate_kgps', 0.0),
+                   delay_time=pid.get('delay_time_s', 0.0),
+                   delay_altitude=pid.get('delay_altitude_m'),
+                   arm_tolerance=pid.get('arm_tolerance_m',
+                                         DEFAULT_ARM_TOLERANCE),
+                   initial_altitude=sim_config['simulation'][
+                       'initial_altitude'])
+
+    def update(self, t, altitude, dt)->tuple:
+        ''' Advance the controller by one time step.
+
+        Args:
+            t (float): Time at the start of the step in seconds.
+            altitude (float): Altitude at the start of the step in meters.
+            dt (float): Time step in seconds.
+
+        Returns:
+            tuple: Mass flow rates of lift gas and of ballast during the step
+            in kilograms/second. Both are zero or negative.
+        '''
+        self.max_altitude = max(self.max_altitude, altitude)
+        error = altitude - self.target_altitude
+        if not (t >= self.delay_time
+                and self.max_altitude >= self.delay_altitude
+                and abs(error) <= self.arm_tolerance):
+            error = 0.0
+
+        derivative = self.n * (error - self.filter)
+        effort = (self.kp * error
+                  + self.ki * self.integral
+                  + self.kd * derivative)
+        self.integral += error * dt
+        self.filter += derivative * dt
+
+        # valves wide open, then the valves' smallest flow rates
+        effort = min(max(effort, -self.ballast_rate), self.bleed_rate)
+        if not self.continuous:
+            if effort > 0:
+                return -self.bleed_rate, 0.0
+            elif effort < 0:
+                return 0.0, -self.ballast_rate
+        elif effort > self.bleed_min_rate:
+            return -(effort - self.bleed_min_rate), 0.0
+        elif effort < -self.ballast_min_rate:
+            return 0.0, effort + self.ballast_min_rate
+        return 0.0, 0.0
+
+    def actuate(self, balloon, payload, t, altitude, dt):
+        ''' Advance the controller by one time step and release lift gas from
+        the balloon or ballast from the payload.
+
+        Lift gas is never bled below the balloon's `reserve_gas` and ballast
+        never drops below zero.
+
+        Args:
+            balloon (Balloon): Balloon object with a `lift_gas`.
+            payload (Payload): Payload object.
+            t (float): Time at the start of the step in seconds.
+            altitude (float): Altitude at the start of the step in meters.
+            dt (float): Time step in seconds.
+        '''
+        gas_rate, ballast_rate = self.update(t, altitude, dt)
+        if gas_rate:
+            gas_mass = balloon.lift_gas.mass
+            balloon.lift_gas.mass = max(gas_mass + gas_rate * dt,
+                                        min(gas_mass, balloon.reserve_gas))
+        if ballast_rate:
+            payload.ballast_mass = max(
+                payload.ballast_mass + ballast_rate * dt, 0.0)
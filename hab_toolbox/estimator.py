@@ -0,0 +1,289 @@
+''' Quasi-steady ascent estimates.
+
+This module estimates the burst altitude, time to burst and ascent rate of a
+balloon without integrating the equations of motion of `ascent_model.run`.
+It is meant to pre-screen large grids of configs before simulating the
+interesting ones.
+
+The estimates use the same force model as `ascent_model.forces`:
+
+1. The lift gas matches ambient temperature and pressure, so its ideal gas
+   volume grows as `T / P`. The balloon bursts at the altitude where that
+   volume reaches the volume of a sphere with the balloon's burst diameter.
+   This altitude is found by inverting a table of `T / P` over the valid
+   altitude range of the atmosphere model.
+2. The balloon is assumed to always fly at its terminal velocity, where drag
+   balances the free lift (buoyancy minus weight). The time to burst is the
+   integral of `1 / ascent_rate` over altitude, evaluated with Simpson's rule.
+
+The acceleration from the initial velocity to terminal velocity and the
+altitude controller are ignored. Use `accuracy_report` to compare the
+estimates against full simulations.
+'''
+
+import functools
+import logging
+import time
+import numpy as np
+
+from hab_toolbox import ascent_model
+from hab_toolbox import atmosphere as atmosphere_models
+from hab_toolbox import batch
+from hab_toolbox.balloon_library.balloon import PI, R
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+DEFAULT_NODES = 33  # altitudes per estimate for the time integral (odd)
+
+
+@functools.lru_cache(maxsize=8)
+def _log_volume_ratio(atmosphere):
+    ''' Altitudes (m) and `log(T / P)` over the valid altitude range of an
+    atmosphere model. `T / P` increases with altitude.
+    '''
+    n = round((atmosphere_models.MAX_ALTITUDE
+               - atmosphere_models.MIN_ALTITUDE)
+              / atmosphere_models.DEFAULT_RESOLUTION) + 1
+    h = np.linspace(atmosphere_models.MIN_ALTITUDE,
+                    atmosphere_models.MAX_ALTITUDE, n)
+    ambient = atmosphere(h)
+    return h, np.log(ambient.temperature) - np.log(ambient.pressure)
+
+
+def burst_altitude(gas_mass, molar_mass, burst_diameter, atmosphere=None):
+    ''' Altitude (m) at which lift gas in equilibrium with ambient air fills
+    a balloon to its burst diameter.
+
+    Args:
+        gas_mass (array): Lift gas mass (kg).
+        molar_mass (array): Molar mass of the lift gas (kg/mol).
+        burst_diameter (array): Burst diameter of the balloon (m).
+        atmosphere (AtmosphereModel): Atmosphere model. Optional, defaults to
+            the shared `TabulatedAtmosphere`.
+
+    Returns:
+        array: Burst altitude, `MIN_ALTITUDE` if the balloon is already too
+        large at the lowest altitude and `NaN` if it never bursts below
+        `MAX_ALTITUDE`.
+    '''
+    if atmosphere is None:
+        atmosphere = atmosphere_models.tabulated_atmosphere()
+    h, log_ratio = _log_volume_ratio(atmosphere)
+    burst_volume = 4/3 * PI * (np.asarray(burst_diameter) / 2) ** 3
+    moles = np.asarray(gas_mass) / np.asarray(molar_mass)
+    # V = n R T / P reaches the burst volume where T / P = V_burst / (n R)
+    target = np.log(burst_volume / (moles * R))
+    return np.interp(target, log_ratio, h, left=h[0], right=np.nan)
+
+
+def ascent_rate(ambient, gas_mass, molar_mass, total_mass, cd):
+    ''' Terminal ascent rate (m/s) where drag balances the free lift.
+
+    Args:
+        ambient (Atmosphere): Ambient conditions, such as the conditions
+            returned by an `AtmosphereModel` for an array of altitudes.
+        gas_mass (array): Lift gas mass (kg).
+        molar_mass (array): Molar mass of the lift gas (kg/mol).
+        total_mass (array): Balloon and payload mass (kg).
+        cd (array): Drag coefficient of the balloon.
+
+    Returns:
+        array: Ascent rate, `0` where the free lift is not positive.
+    '''
+    temperature = ambient.temperature
+    pressure = ambient.pressure
+    volume = batch.gas_volume(gas_mass, molar_mass, temperature, pressure)
+    f_lift = (ascent_model.weight(ambient, total_mass)
+              + batch.buoyancy(ambient, volume,
+                               batch.gas_density(molar_mass, temperature,
+                                                 pressure)))
+    area = PI * (batch.radius_from_volume(volume) ** 2)
+    # f_lift = 1/2 * cd * area * v^2 * density
+    return np.sqrt(np.maximum(f_lift, 0.0) / ((1/2) * cd * area
+                                              * ambient.density))
+
+
+class Estimate():
+    ''' Quasi-steady estimates for a set of balloons.
+
+    | Property | Description |
+    | -------- | ----------- |
+    | `burst_altitude` | Altitude at which each balloon bursts (m), `NaN` if above the atmosphere model's range |
+    | `burst_time` | Time to reach the burst altitude (s), `inf` if the balloon stops ascending first |
+    | `ascent_rate` | Ascent rate at the initial altitude (m/s) |
+    | `burst` | Whether each balloon bursts within its `duration` |
+    '''
+    def __init__(self, burst_altitude, burst_time, ascent_rate, burst,
+                 initial_altitude):
+        self.burst_altitude = burst_altitude
+        self.burst_time = burst_time
+        self.ascent_rate = ascent_rate
+        self.burst = burst
+        self.initial_altitude = initial_altitude
+
+    def __len__(self):
+        return len(self.burst)
+
+    @property
+    def mean_ascent_rate(self):
+        ''' Average ascent rate (m/s) from the initial altitude to burst.
+        '''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return ((self.burst_altitude - self.initial_altitude)
+                    / self.burst_time)
+
+
+def estimate(gas_mass, molar_mass, total_mass, cd, burst_diameter,
+             initial_altitude=0.0, duration=np.inf, atmosphere=None,
+             nodes=DEFAULT_NODES):
+    ''' Estimate burst altitude, time to burst and ascent rate.
+
+    All arguments except `atmosphere` and `nodes` may be arrays and are
+    broadcast against each other, with one estimate per element.
+
+    Args:
+        gas_mass (array): Lift gas mass (kg).
+        molar_mass (array): Molar mass of the lift gas (kg/mol).
+        total_mass (array): Balloon and payload mass (kg).
+        cd (array): Drag coefficient of the balloon.
+        burst_diameter (array): Burst diameter of the balloon (m).
+        initial_altitude (array): Altitude at launch (m). Optional, defaults
+            to `0`.
+        duration (array): Time available to reach burst (s). Optional,
+            defaults to unlimited.
+        atmosphere (AtmosphereModel): Atmosphere model. Optional, defaults to
+            the shared `TabulatedAtmosphere`.
+        nodes (int): Number of altitudes to evaluate the ascent rate at
+            between launch and burst. Optional, defaults to `DEFAULT_NODES`.
+
+    Returns:
+        Estimate: Estimates for every element.
+    '''
+    if nodes < 3 or nodes % 2 == 0:
+        raise ValueError('Number of nodes must be odd and at least 3, not %s'
+                         % nodes)
+    if atmosphere is None:
+        atmosphere = atmosphere_models.tabulated_atmosphere()
+    (gas_mass, molar_mass, total_mass, cd, burst_diameter, initial_altitude,
+     duration) = [np.atleast_1d(value).astype(float) for value in
+                  np.broadcast_arrays(gas_mass, molar_mass, total_mass, cd,
+                                      burst_diameter, initial_altitude,
+                                      duration)]
+    h_burst = burst_altitude(gas_mass, molar_mass, burst_diameter, atmosphere)
+    # a balloon that is already too large bursts right away
+    h_burst = np.maximum(h_burst, initial_altitude)
+    reachable = ~np.isnan(h_burst)
+    h_end = np.where(reachable, h_burst, initial_altitude)
+
+    # Simpson's rule for the integral of 1 / ascent_rate over altitude
+    s = np.linspace(0, 1, nodes)
+    weights = np.ones(nodes)
+    weights[1:-1:2] = 4
+    weights[2:-1:2] = 2
+    weights /= 3 * (nodes - 1)
+    h = initial_altitude[:, None] + (h_end - initial_altitude)[:, None] * s
+    rate = ascent_rate(atmosphere(h.ravel()), *(
+        np.repeat(value, nodes) for value in (
+            gas_mass, molar_mass, total_mass, cd))).reshape(h.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pace = np.where(rate > 0, 1 / rate, np.inf)
+        burst_time = (h_end - initial_altitude) * (pace @ weights)
+    burst_time = np.where(h_end == initial_altitude, 0.0, burst_time)
+    burst_time = np.where(reachable, burst_time, np.nan)
+    h_burst = np.where(reachable, h_burst, np.nan)
+    burst = np.isfinite(burst_time) & (burst_time <= duration)
+    return Estimate(h_burst, burst_time, rate[:, 0], burst, initial_altitude)
+
+
+def from_configs(sim_configs, atmosphere=None, nodes=DEFAULT_NODES):
+    ''' Estimate burst altitude, time to burst and ascent rate for a list of
+    simulation configs.
+
+    Args:
+        sim_configs (list): List of `sim_config` dictionaries. See
+            `ascent_model.run` for supported keys. The `pid` block and
+            atmosphere noise are ignored.
+        atmosphere (AtmosphereModel): Atmosphere model. Optional, defaults to
+            the model requested by the first config, without noise.
+        nodes (int): See `estimate`.
+
+    Returns:
+        Estimate: Estimates for every config.
+    '''
+    if atmosphere is None:
+        atmosphere = atmosphere_models.from_config(sim_configs[0], noise=False)
+    p = batch._member_parameters(sim_configs)
+    return estimate(p['gas_mass'], p['molar_mass'],
+                    p['balloon_mass'] + p['payload_mass'], p['cd'],
+                    p['burst_diameter'], initial_altitude=p['h'],
+                    duration=p['n_steps'] * p['dt'], atmosphere=atmosphere,
+                    nodes=nodes)
+
+
+def _errors(estimated, simulated):
+    ''' Largest and mean absolute and relative errors where both are
+    finite.
+    '''
+    valid = np.isfinite(estimated) & np.isfinite(simulated)
+    if not valid.any():
+        return {'count': 0}
+    error = np.abs(estimated[valid] - simulated[valid])
+    relative = error / np.abs(simulated[valid])
+    return {
+        'count': int(np.count_nonzero(valid)),
+        'max_abs': float(np.max(error)),
+        'mean_abs': float(np.mean(error)),
+        'max_rel': float(np.max(relative)),
+        'mean_rel': float(np.mean(relative)),
+    }
+
+
+def accuracy_report(sim_configs, atmosphere=None, nodes=DEFAULT_NODES):
+    ''' Compare estimates against full simulations of the same configs.
+
+    Configs are simulated with `batch.run_batch`, which follows the same
+    trajectories as `ascent_model.run`.
+
+    Args:
+        sim_configs (list): List of `sim_config` dictionaries.
+        atmosphere (AtmosphereModel): Atmosphere model. Optional, defaults to
+            the model requested by the first config, without noise.
+        nodes (int): See `estimate`.
+
+    Returns:
+        dict: Errors of `burst_altitude`, `burst_time` and
+        `mean_ascent_rate` for the configs that burst in both, the fraction
+        of configs where the estimate agrees on whether the balloon bursts,
+        and the wall time of the estimates and of the simulations (s).
+    '''
+    if atmosphere is None:
+        atmosphere = atmosphere_models.from_config(sim_configs[0], noise=False)
+    start = time.perf_counter()
+    result = from_configs(sim_configs, atmosphere, nodes)
+    estimate_time = time.perf_counter() - start
+    start = time.perf_counter()
+    simulated = batch.run_batch(sim_configs, atmosphere, record=False)
+    simulate_time = time.perf_counter() - start
+
+    both = result.burst & simulated.burst
+    burst_altitude = np.where(simulated.burst, simulated.final_altitude,
+                              np.nan)
+    burst_time = np.where(simulated.burst, simulated.final_time, np.nan)
+    initial_altitude = result.initial_altitude
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_ascent_rate = (burst_altitude - initial_altitude) / burst_time
+    report = {
+        'runs': len(result),
+        'burst_agreement': float(np.mean(result.burst == simulated.burst)),
+        'burst_altitude': _errors(result.burst_altitude[both],
+                                  burst_altitude[both]),
+        'burst_time': _errors(result.burst_time[both], burst_time[both]),
+        'mean_ascent_rate': _errors(result.mean_ascent_rate[both],
+                                    mean_ascent_rate[both]),
+        'estimate_time': estimate_time,
+        'simulate_time': simulate_time,
+    }
+    log.info(f'Estimated {len(result)} configs in {estimate_time:.6f} s, '
+             f'simulated them in {simulate_time:.3f} s')
+    return report
@@ -0,0 +1,307 @@
+''' Lift gas fill solver.
+
+This module finds the mass of lift gas to fill a balloon with for a target
+ascent rate at launch or a target burst altitude, instead of adjusting
+`reserve_mass_kg` and `bleed_mass_kg` by trial and error.
+
+Balloons are evaluated with the quasi-steady model of `hab_toolbox.estimator`:
+
+- The launch ascent rate increases with gas mass, from zero at the mass with
+  no free lift to its largest value at the mass that fills the balloon to its
+  burst diameter on the ground. The gas mass for a target ascent rate is found
+  with bracketed root finding (the Illinois variant of the false position
+  method, like `integrators.locate_event`).
+- The burst altitude only depends on the gas volume at ambient conditions, so
+  the gas mass for a target burst altitude is found directly from ambient
+  temperature and pressure at that altitude.
+
+A `FillSolver` keeps every ascent rate it evaluated for its balloon and
+payload, so later targets start from the tightest known bracket.
+'''
+
+import logging
+import numpy as np
+
+from hab_toolbox import atmosphere as atmosphere_models
+from hab_toolbox import estimator
+from hab_toolbox.balloon_library.balloon import (
+    Balloon, Gas, PI, R, list_known_balloons)
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+TARGETS = ('ascent_rate', 'burst_altitude')
+DEFAULT_TOLERANCE = 1e-6  # [kg] tolerance of the lift gas mass
+MAX_ITERATIONS = 100
+TABLE_FIELDS = ('balloon', 'target', 'value', 'gas_mass', 'free_lift',
+                'ascent_rate', 'burst_altitude', 'burst_time')
+
+
+def locate_roots(f, target, a, f_a, b, f_b, tol=DEFAULT_TOLERANCE,
+                 max_iter=MAX_ITERATIONS):
+    ''' Vectorized root finding of `f(x) = target` for an increasing
+    function, within the brackets `[a, b]`.
+
+    Uses the Illinois variant of the false position method, like
+    `integrators.locate_event`.
+
+    Args:
+        f (function): Increasing function of an array `x`. Only called
+            with the elements that have not converged yet.
+        target (array): Target value of each element.
+        a (array): Lower bracket of each element, `f(a) <= target`.
+        f_a (array): `f(a)`.
+        b (array): Upper bracket of each element, `f(b) >= target`.
+        f_b (array): `f(b)`.
+        tol (float): Tolerance of `x`. Optional, defaults to
+            `DEFAULT_TOLERANCE`.
+        max_iter (int): Maximum number of iterations. Optional, defaults to
+            `MAX_ITERATIONS`.
+
+    Returns:
+        array: Root of each element.
+    '''
+    a, b = np.array(a, dtype=float), np.array(b, dtype=float)
+    g_a = np.asarray(f_a, dtype=float) - target
+    g_b = np.asarray(f_b, dtype=float) - target
+    x = np.where(g_a == 0, a, b)
+    side = np.zeros(len(x), dtype=int)
+    active = np.flatnonzero((b - a >= tol) & (g_a != 0) & (g_b != 0))
+    for _ in range(max_iter):
+        if len(active) == 0:
+            break
+        x_new = ((a[active] * g_b[active] - b[active] * g_a[active])
+                 / (g_b[active] - g_a[active]))
+        g = f(x_new) - target[active]
+        x[active] = x_new
+        upper = g > 0
+        lower = ~upper
+        hi, lo = active[upper], active[lower]
+        b[hi], g_b[hi] = x_new[upper], g[upper]
+        g_a[hi[side[hi] == -1]] /= 2
+        side[hi] = -1
+        a[lo], g_a[lo] = x_new[lower], g[lower]
+        g_b[lo[side[lo] == 1]] /= 2
+        side[lo] = 1
+        active = active[(b[active] - a[active] >= tol) & (g != 0)]
+    return x
+
+
+class FillSolver():
+    ''' Lift gas mass of one balloon and payload for target ascent rates or
+    burst altitudes.
+
+    Args:
+        balloon (string): Name of a balloon in the balloon library.
+        payload_mass (float): Total payload mass, including ballast, in
+            kilograms.
+        lift_gas (string): Species of lift gas. Optional, defaults to the
+            lift gas recommended by the balloon spec.
+        initial_altitude (float): Launch altitude in meters. Optional,
+            defaults to `0`.
+        atmosphere (AtmosphereModel): Atmosphere model. Optional, defaults to
+            the shared `TabulatedAtmosphere`.
+        tol (float): Tolerance of the lift gas mass in kilograms. Optional,
+            defaults to `DEFAULT_TOLERANCE`.
+    '''
+    def __init__(self, balloon, payload_mass, lift_gas=None,
+                 initial_altitude=0.0, atmosphere=None,
+                 tol=DEFAULT_TOLERANCE):
+        if atmosphere is None:
+            atmosphere = atmosphere_models.tabulated_atmosphere()
+        spec = Balloon(balloon)
+        gas = Gas(lift_gas or spec.spec['lifting_gas'])
+        self.balloon = balloon
+        self.payload_mass = payload_mass
+        self.molar_mass = gas.molar_mass
+        self.total_mass = spec.mass + payload_mass
+        self.cd = spec.cd
+        self.burst_diameter = spec.burst_diameter
+        self.initial_altitude = initial_altitude
+        self.atmosphere = atmosphere
+        self.tol = tol
+        self.evaluations = 0
+        self._ambient = ambient = atmosphere(initial_altitude)
+        # gas mass per unit volume at launch
+        gas_density = (self.molar_mass * ambient.pressure) / (
+            R * ambient.temperature)
+        # gas mass with no free lift: (density - gas_density) * V = total_mass
+        lift_ratio = ambient.density / gas_density - 1
+        if lift_ratio <= 0:
+            raise ValueError('Lift gas %s is not lighter than air' % (
+                gas.species))
+        self.min_gas_mass = self.total_mass / lift_ratio
+        # gas mass that fills the balloon to its burst diameter at launch
+        self.max_gas_mass = gas_density * 4/3 * PI * (
+            self.burst_diameter / 2) ** 3
+        if self.max_gas_mass <= self.min_gas_mass:
+            raise ValueError('Balloon %s cannot lift a %s kg payload' % (
+                balloon, payload_mass))
+        # ascent rates evaluated so far, sorted by gas mass
+        self._gas_mass = np.array([self.min_gas_mass, self.max_gas_mass])
+        self._ascent_rate = np.array([0.0, self._evaluate(
+            np.array([self.max_gas_mass]))[0]])
+
+    def _evaluate(self, gas_mass):
+        ''' Launch ascent rate (m/s) for an array of gas masses (kg).
+        '''
+        self.evaluations += len(gas_mass)
+        return estimator.ascent_rate(self._ambient, gas_mass,
+                                     self.molar_mass, self.total_mass, self.cd)
+
+    @property
+    def max_ascent_rate(self):
+        ''' Launch ascent rate (m/s) of the balloon filled to its burst
+        diameter.
+        '''
+        return self._ascent_rate[-1]
+
+    def for_ascent_rate(self, ascent_rate):
+        ''' Lift gas mass (kg) for target ascent rates at launch.
+
+        Args:
+            ascent_rate (array): Target ascent rates (m/s).
+
+        Returns:
+            array: Lift gas mass for each target, `NaN` if the target is not
+            positive or the balloon would burst at launch.
+        '''
+        target = np.atleast_1d(np.asarray(ascent_rate, dtype=float))
+        feasible = (target > 0) & (target <= self.max_ascent_rate)
+        # tightest bracket from the ascent rates evaluated so far
+        i = np.searchsorted(self._ascent_rate, target[feasible])
+        i = np.clip(i, 1, len(self._ascent_rate) - 1)
+        evaluated = []
+
+        def f(gas_mass):
+            rate = self._evaluate(gas_mass)
+            evaluated.append((gas_mass, rate))
+            return rate
+
+        gas_mass = np.full(target.shape, np.nan)
+        gas_mass[feasible] = locate_roots(
+            f, target[feasible],
+            self._gas_mass[i-1], self._ascent_rate[i-1],
+            self._gas_mass[i], self._ascent_rate[i], tol=self.tol)
+        if evaluated:
+            masses, rates = (np.concatenate(column)
+                             for column in zip(*evaluated))
+            masses = np.concatenate([self._gas_mass, masses])
+            rates = np.concatenate([self._ascent_rate, rates])
+            self._gas_mass, index = np.unique(masses, return_index=True)
+            self._ascent_rate = rates[index]
+        return gas_mass
+
+    def for_burst_altitude(self, burst_altitude):
+        ''' Lift gas mass (kg) for target burst altitudes.
+
+        Args:
+            burst_altitude (array): Target burst altitudes (m).
+
+        Returns:
+            array: Lift gas mass for each target, `NaN` if the target is
+            below the launch altitude, outside the atmosphere model's range
+            or if the balloon would not have free lift.
+        '''
+        target = np.atleast_1d(np.asarray(burst_altitude, dtype=float))
+        feasible = ((target >= self.initial_altitude)
+                    & (target <= atmosphere_models.MAX_ALTITUDE))
+        ambient = self.atmosphere(np.where(feasible, target,
+                                           self.initial_altitude))
+        # the gas volume n R T / P equals the burst volume at the target
+        burst_volume = 4/3 * PI * (self.burst_diameter / 2) ** 3
+        gas_mass = (burst_volume * ambient.pressure
+                    / (R * ambient.temperature) * self.molar_mass)
+        feasible &= gas_mass > self.min_gas_mass
+        return np.where(feasible, gas_mass, np.nan)
+
+    def table(self, ascent_rates=(), burst_altitudes=()):
+        ''' Fill table rows for target ascent rates and burst altitudes.
+
+        Args:
+            ascent_rates (list): Target ascent rates at launch (m/s).
+            burst_altitudes (list): Target burst altitudes (m).
+
+        Returns:
+            list: One dictionary per target with the keys of
+            `TABLE_FIELDS`. `gas_mass` is the lift gas mass (kg) and
+            `free_lift` the lift (kg) in excess of the balloon and payload
+            at launch; `ascent_rate` (m/s), `burst_altitude` (m) and
+            `burst_time` (s) are estimates for that fill.
+        '''
+        targets = (['ascent_rate'] * len(ascent_rates)
+                   + ['burst_altitude'] * len(burst_altitudes))
+        values = np.concatenate([np.asarray(ascent_rates, dtype=float),
+                                 np.asarray(burst_altitudes, dtype=float)])
+        gas_mass = np.concatenate([self.for_ascent_rate(ascent_rates),
+                                   self.for_burst_altitude(burst_altitudes)])
+        result = estimator.estimate(
+            np.nan_to_num(gas_mass, nan=self.max_gas_mass), self.molar_mass,
+            self.total_mass, self.cd, self.burst_diameter,
+            initial_altitude=self.initial_altitude,
+            atmosphere=self.atmosphere)
+        # free lift is linear in gas mass and zero at min_gas_mass
+        free_lift = (gas_mass - self.min_gas_mass) * (
+            self.total_mass / self.min_gas_mass)
+        rows = []
+        for i, (target, value) in enumerate(zip(targets, values)):
+            solved = not np.isnan(gas_mass[i])
+            rows.append({
+                'balloon': self.balloon,
+                'target': target,
+                'value': float(value),
+                'gas_mass': float(gas_mass[i]),
+                'free_lift': float(free_lift[i]),
+                'ascent_rate': float(result.ascent_rate[i]) if solved
+                               else np.nan,
+                'burst_altitude': float(result.burst_altitude[i]) if solved
+                                  else np.nan,
+                'burst_time': float(result.burst_time[i]) if solved
+                              else np.nan,
+            })
+        return rows
+
+
+def fill_table(payload_mass, ascent_rates=(), burst_altitudes=(),
+               balloons=None, lift_gas=None, initial_altitude=0.0,
+               atmosphere=None):
+    ''' Fill table for several balloons and targets.
+
+    Args:
+        payload_mass (float): Total payload mass, including ballast, in
+            kilograms.
+        ascent_rates (list): Target ascent rates at launch (m/s).
+        burst_altitudes (list): Target burst altitudes (m).
+        balloons (list): Names of balloons in the balloon library. Optional,
+            defaults to every balloon in the library.
+        lift_gas (string): Species of lift gas. Optional, defaults to the
+            lift gas recommended by each balloon spec.
+        initial_altitude (float): Launch altitude in meters. Optional,
+            defaults to `0`.
+        atmosphere (AtmosphereModel): Atmosphere model. Optional, defaults to
+            the shared `TabulatedAtmosphere`.
+
+    Returns:
+        list: Rows of `FillSolver.table` for every balloon. Balloons that
+        cannot lift the payload get rows without a `gas_mass`.
+    '''
+    if balloons is None:
+        balloons = list_known_balloons()
+    rows = []
+    for balloon in balloons:
+        try:
+            solver = FillSolver(balloon, payload_mass, lift_gas=lift_gas,
+                                initial_altitude=initial_altitude,
+                                atmosphere=atmosphere)
+        except ValueError as err:
+            log.warning(f'Skipping {balloon}: {err}')
+            for target, values in zip(TARGETS,
+                                      (ascent_rates, burst_altitudes)):
+                rows.extend(dict(dict.fromkeys(TABLE_FIELDS, np.nan),
+                                 balloon=balloon, target=target,
+                                 value=float(value)) for value in values)
+            continue
+        rows.extend(solver.table(ascent_rates, burst_altitudes))
+        log.info(f'Solved {balloon} fills with {solver.evaluations} '
+                 f'ascent rate evaluations')
+    return rows
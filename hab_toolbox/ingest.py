@@ -0,0 +1,430 @@
+''' Batch config ingestion.
+
+This module simulates many independent simulation configs in one run, read
+from a JSON Lines file with one config per line or from a directory of
+`.json` config files, and writes every trajectory to one output file:
+``` python
+result = ingest.run_configs(ingest.iter_configs('configs.jsonl'),
+                            save_output='results.npz')
+```
+
+Configs are streamed from the input and each one is checked against the
+compiled `schema.SCHEMA` as it is read, so a config with a typo is reported
+with the field at fault instead of stopping the run halfway through. Configs
+that are invalid or cannot be parsed are recorded with their errors and
+skipped.
+
+Defaults are filled in before configs are compared, so configs that only
+differ by their `simulation.id`, by fields set to their default value or by
+blocks the simulation does not read (`monte_carlo`, `tune`) are simulated
+once. Configs with atmosphere noise and no `seed` are random and are always
+simulated.
+
+Each remaining config is simulated like the command that reads its blocks:
+with `ascent_model.run`, with `ascent_model.run_flight` if it has a
+`descent` block, and advected with `wind.drift` if it has a `wind` block.
+Configs are simulated in chunks on a pool of worker processes like
+`monte_carlo.run_monte_carlo`, and a simulation that raises is recorded
+with its error without stopping the others. The samples of each simulation
+are appended to the output file by `RunWriter` as soon as its chunk is done,
+so only the samples of the chunks in flight are held in memory.
+'''
+
+import concurrent.futures
+import csv
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+import zipfile
+import numpy as np
+
+from hab_toolbox import ascent_model
+from hab_toolbox import atmosphere as atmosphere_models
+from hab_toolbox import checkpoint
+from hab_toolbox import schema
+from hab_toolbox import sinks
+from hab_toolbox import wind
+from hab_toolbox.trajectory import FlightTrajectory
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+CONFIG_EXTENSION = '.json'  # files read from a directory of configs
+CHUNKS_PER_WORKER = 4  # extra chunks to balance the load between workers
+IGNORED_BLOCKS = ('monte_carlo', 'tune')  # blocks not read by the simulation
+STATUSES = ('ok', 'duplicate', 'invalid', 'failed')
+FIELDS = FlightTrajectory.FIELDS + ('latitude', 'longitude')
+SUMMARY_FIELDS = ('final_time', 'final_altitude', 'max_altitude',
+                  'burst_time', 'landing_time', 'final_latitude',
+                  'final_longitude')
+
+
+def _error(err):
+    return f'{type(err).__name__}: {err}'
+
+
+def iter_configs(path):
+    ''' Read simulation configs from a JSON Lines file or a directory.
+
+    Args:
+        path (string): Path of a JSON Lines file with one config per line,
+            or of a directory of config files ending in `CONFIG_EXTENSION`,
+            which are read in order of their names. Blank lines are skipped.
+
+    Yields:
+        tuple: `source`, `sim_config`, `error` of each config. The `source`
+        is the path of the config file or `path:line` of the line, and the
+        `error` is `None` unless the config could not be read or parsed, in
+        which case `sim_config` is `None`.
+    '''
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if not name.endswith(CONFIG_EXTENSION):
+                continue
+            source = os.path.join(path, name)
+            try:
+                with open(source, 'rb') as config_file:
+                    yield source, json.load(config_file), None
+            except (OSError, ValueError) as err:
+                yield source, None, _error(err)
+        return
+    with open(path, 'r', encoding='utf-8') as config_file:
+        for line_number, line in enumerate(config_file, start=1):
+            if not line.strip():
+                continue
+            source = f'{path}:{line_number}'
+            try:
+                yield source, json.loads(line), None
+            except ValueError as err:
+                yield source, None, _error(err)
+
+
+def dedupe_key(sim_config):
+    ''' Key under which identical configs are simulated once.
+
+    Args:
+        sim_config (dict): Simulation config with defaults resolved by
+            `schema.resolve`.
+
+    Returns:
+        string: Hash of the config without its `simulation.id` and the
+        `IGNORED_BLOCKS`, or `None` if the results of the config are random.
+    '''
+    atmo_config = sim_config.get('atmosphere', {})
+    if any(atmosphere_models.noise_std(sim_config)) and (
+            atmo_config.get('seed') is None):
+        return None
+    key_config = {key: value for key, value in sim_config.items()
+                  if key not in IGNORED_BLOCKS}
+    key_config['simulation'] = {
+        key: value for key, value in sim_config['simulation'].items()
+        if key != 'id'}
+    return checkpoint.config_hash(key_config)
+
+
+def simulate(sim_config, cache=None):
+    ''' Simulate one config of a batch.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+        cache (ResultCache): Cache of the ascent, see `ascent_model.run`.
+            Not used for full flights. Optional.
+
+    Returns:
+        tuple: The columns of `FIELDS`, with a `phase` of `ASCENT` without a
+        `descent` block and `NaN` positions without a `wind` block, and a
+        dictionary of the `SUMMARY_FIELDS`, `NaN` where they do not apply.
+    '''
+    summary = dict.fromkeys(SUMMARY_FIELDS, math.nan)
+    if 'descent' in sim_config:
+        tspan, h, v, a, phase, events = ascent_model.run_flight(sim_config)
+        for name, event in events.items():
+            if event is not None:
+                summary[f'{name}_time'] = event['time']
+    else:
+        tspan, h, v, a = ascent_model.run(sim_config, cache=cache)
+        phase = np.full(len(tspan), ascent_model.ASCENT)
+    wind_launch = wind.launch(sim_config)
+    if wind_launch is None:
+        latitude = longitude = np.full(len(tspan), np.nan)
+    else:
+        latitude, longitude = wind.drift(tspan, h, *wind_launch)
+    if len(tspan):
+        summary.update(final_time=float(tspan[-1]),
+                       final_altitude=float(h[-1]),
+                       max_altitude=float(np.max(h)),
+                       final_latitude=float(latitude[-1]),
+                       final_longitude=float(longitude[-1]))
+    return (tspan, h, v, a, phase, latitude, longitude), summary
+
+
+class RunWriter():
+    ''' Append the samples of each simulation of a batch to one file.
+
+    Simulations may be written in any order. Each one takes `length` rows
+    from `offset`, which are recorded by run index.
+
+    Args:
+        path (string): Path of the output file. A `.npz` archive holds one
+            array per field of `FIELDS` with the samples of every
+            simulation, and the arrays passed to `close`. Each field is
+            appended to a temporary `.npy` file, and the files are copied
+            into the archive on `close`, like `sinks.NpzSink`. Any other
+            extension writes a CSV with the index of the simulation in a
+            `run` column and one column per field of `FIELDS`.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.offset = {}
+        self.length = {}
+        self._npz = os.path.splitext(path)[1] == '.npz'
+        if self._npz:
+            self._tempdir = tempfile.mkdtemp(
+                dir=os.path.dirname(os.path.abspath(path)))
+            self._files = [
+                open(os.path.join(self._tempdir, f'{field}.npy'), 'w+b')
+                for field in FIELDS]
+            for file in self._files:
+                sinks.write_npy_header(file, (0,))
+        else:
+            self._file = open(path, 'w', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(('run',) + FIELDS)
+
+    def write(self, run, columns):
+        ''' Append the columns of `FIELDS` of the simulation with index
+        `run`.
+        '''
+        self.offset[run] = self.count
+        self.length[run] = len(columns[0])
+        self.count += len(columns[0])
+        if self._npz:
+            for file, column in zip(self._files, columns):
+                file.write(np.asarray(column, dtype='<f8').tobytes())
+        else:
+            self._writer.writerows((run, *row) for row in zip(*columns))
+
+    def close(self, arrays=None):
+        ''' Finish the file.
+
+        Args:
+            arrays (dict): Extra arrays stored in a `.npz` archive by name.
+                Ignored for CSV files. Optional.
+        '''
+        if not self._npz:
+            self._file.close()
+            return
+        try:
+            with zipfile.ZipFile(self.path, 'w', allowZip64=True) as archive:
+                for field, file in zip(FIELDS, self._files):
+                    file.seek(0)
+                    sinks.write_npy_header(file, (self.count,))
+                    file.close()
+                    archive.write(file.name, arcname=f'{field}.npy')
+                for name, array in (arrays or {}).items():
+                    with archive.open(f'{name}.npy', 'w',
+                                      force_zip64=True) as file:
+                        np.lib.format.write_array(file, np.asarray(array),
+                                                  allow_pickle=False)
+        finally:
+            shutil.rmtree(self._tempdir)
+
+
+class IngestResult():
+    ''' Outcome of every config of a batch.
+
+    Each config read from the input has a record, in input order:
+
+    | Key | Description |
+    | --- | ----------- |
+    | `source` | Path of the config file, or `path:line` of the line |
+    | `id` | `simulation.id` of the config, `None` if it has none |
+    | `status` | One of `STATUSES` |
+    | `error` | Error message of an `invalid` or `failed` config |
+    | `run` | Index of the simulation of the config, `None` if it was not simulated |
+    | `duplicate_of` | Index of the first identical config of a `duplicate` |
+
+    Args:
+        records (list): One record dictionary per config.
+        configs (list): Resolved config of each simulation.
+        summaries (list): Dictionary of the `SUMMARY_FIELDS` of each
+            simulation, `None` if it failed.
+        offset (array): First row of each simulation in the output file,
+            `-1` if it has none.
+        length (array): Number of samples of each simulation.
+    '''
+    def __init__(self, records, configs, summaries, offset, length):
+        self.records = records
+        self.configs = configs
+        self.summaries = summaries
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return len(self.records)
+
+    def counts(self):
+        ''' Number of configs with each of the `STATUSES`.
+        '''
+        counts = dict.fromkeys(STATUSES, 0)
+        for record in self.records:
+            counts[record['status']] += 1
+        return counts
+
+    def summary(self, i):
+        ''' Record of the config with index `i` in the input, with the
+        `SUMMARY_FIELDS` that apply to its simulation if it was simulated.
+        '''
+        summary = dict(self.records[i])
+        run = summary['run']
+        if run is not None and self.summaries[run] is not None:
+            summary.update((key, value)
+                           for key, value in self.summaries[run].items()
+                           if not math.isnan(value))
+        return summary
+
+    def arrays(self):
+        ''' The records and summaries as arrays, stored in a `.npz` output
+        file: one array per record key, with `-1` for missing indices and
+        empty strings for missing text, one array per field of
+        `SUMMARY_FIELDS` by config, `NaN` where it does not apply, and the
+        `offset`, `length` and resolved `config` (JSON) of each simulation.
+        '''
+        arrays = {}
+        for key in ('source', 'id', 'status', 'error'):
+            arrays[key] = np.array(['' if record[key] is None else record[key]
+                                    for record in self.records], dtype=str)
+        for key in ('run', 'duplicate_of'):
+            arrays[key] = np.array([-1 if record[key] is None else record[key]
+                                    for record in self.records], dtype=int)
+        for field in SUMMARY_FIELDS:
+            arrays[field] = np.array([self.summary(i).get(field, math.nan)
+                                      for i in range(len(self))], dtype=float)
+        arrays['offset'] = self.offset
+        arrays['length'] = self.length
+        arrays['config'] = np.array([json.dumps(c) for c in self.configs],
+                                    dtype=str)
+        return arrays
+
+
+def _run_chunk(start, sim_configs, cache=None):
+    ''' Simulate one chunk of configs. Executed by the worker processes.
+    Returns the index of the first config, the columns, summary or error of
+    each config and the counts added to the `cache`, which are lost with the
+    worker's copy of the cache.
+    '''
+    counts = None if cache is None else cache.counts()
+    outcomes = []
+    for sim_config in sim_configs:
+        try:
+            outcomes.append((*simulate(sim_config, cache=cache), None))
+        except (OSError, ValueError, KeyError, TypeError) as err:
+            outcomes.append((None, None, _error(err)))
+    if cache is not None:
+        counts = [new - old for new, old in zip(cache.counts(), counts)]
+    return start, outcomes, counts
+
+
+def run_configs(configs, save_output=None, workers=None, chunk_size=None,
+                cache=None):
+    ''' Validate, dedupe and simulate a batch of configs.
+
+    Args:
+        configs (iterable): `source`, `sim_config`, `error` of each config,
+            as yielded by `iter_configs`.
+        save_output (string): Path of the output file, see `RunWriter`.
+            Optional, samples are not kept by default.
+        workers (int): Number of worker processes. Optional, defaults to the
+            number of CPUs. Runs in the current process if `1`.
+        chunk_size (int): Number of configs simulated by each task.
+            Optional, defaults to splitting the configs into
+            `CHUNKS_PER_WORKER` chunks per worker.
+        cache (ResultCache): Cache of the ascent of each config, see
+            `ascent_model.run`. Optional, configs are not cached by default.
+
+    Returns:
+        IngestResult: Outcome of every config.
+    '''
+    records = []
+    sim_configs = []
+    first = {}  # dedupe key -> index of the first config with that key
+    for source, sim_config, error in configs:
+        record = {'source': source, 'id': None, 'status': 'ok',
+                  'error': error, 'run': None, 'duplicate_of': None}
+        records.append(record)
+        if error is not None:
+            record['status'] = 'invalid'
+            continue
+        try:
+            sim_config = schema.resolve(sim_config)
+        except ValueError as err:
+            record.update(status='invalid', error=str(err))
+            continue
+        record['id'] = sim_config['simulation'].get('id')
+        key = dedupe_key(sim_config)
+        if key in first:
+            original = records[first[key]]
+            record.update(status='duplicate', run=original['run'],
+                          duplicate_of=first[key])
+            continue
+        if key is not None:
+            first[key] = len(records) - 1
+        record['run'] = len(sim_configs)
+        sim_configs.append(sim_config)
+
+    n_runs = len(sim_configs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(n_runs / (workers * CHUNKS_PER_WORKER)))
+    chunks = [(i, sim_configs[i:i+chunk_size])
+              for i in range(0, n_runs, chunk_size)]
+    log.warning(f'Simulating {n_runs} of {len(records)} configs in '
+                f'{len(chunks)} chunks on {workers} workers')
+
+    writer = None if save_output is None else RunWriter(save_output)
+    summaries = [None] * n_runs
+    errors = [None] * n_runs
+
+    def collect(start, outcomes):
+        for run, (columns, summary, error) in enumerate(outcomes, start):
+            summaries[run], errors[run] = summary, error
+            if writer is not None and columns is not None:
+                writer.write(run, columns)
+
+    try:
+        if workers == 1:
+            for chunk in chunks:
+                collect(*_run_chunk(*chunk, cache)[:2])
+        else:
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                futures = [executor.submit(_run_chunk, *chunk, cache)
+                           for chunk in chunks]
+                # write each chunk as soon as it is done, in any order
+                for future in concurrent.futures.as_completed(futures):
+                    start, outcomes, counts = future.result()
+                    collect(start, outcomes)
+                    if cache is not None:
+                        cache.add_counts(*counts)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        raise
+
+    for record in records:
+        if record['run'] is not None and errors[record['run']] is not None:
+            record.update(status='failed', error=errors[record['run']])
+    offset = np.full(n_runs, -1, dtype=int)
+    length = np.zeros(n_runs, dtype=int)
+    if writer is not None:
+        for run in writer.offset:
+            offset[run] = writer.offset[run]
+            length[run] = writer.length[run]
+    result = IngestResult(records, sim_configs, summaries, offset, length)
+    if writer is not None:
+        writer.close(result.arrays())
+    return result
@@ -0,0 +1,186 @@
+''' Numerical integrators.
+
+This module defines explicit Runge-Kutta integrators for systems of ordinary
+differential equations `dy/dt = f(t, y)` where `y` is a NumPy array, and a
+root finder to locate events between integrator steps.
+
+| Integrator | Order | Step size |
+| ---------- | ----- | --------- |
+| `rk4_step` | 4 | Fixed |
+| `dormand_prince_step` | 5(4) | Adaptive, with an embedded error estimate |
+'''
+
+import logging
+import numpy as np
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+# Dormand-Prince 5(4) Butcher tableau
+DP_C = (0, 1/5, 3/10, 4/5, 8/9, 1, 1)
+DP_A = (
+    (),
+    (1/5,),
+    (3/40, 9/40),
+    (44/45, -56/15, 32/9),
+    (19372/6561, -25360/2187, 64448/6561, -212/729),
+    (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+    (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84),
+)
+# 5th order weights are the last row of DP_A, 4th order weights are DP_E4
+DP_E4 = (5179/57600, 0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40)
+DP_ERROR = tuple(b5 - b4 for b5, b4 in zip(DP_A[-1] + (0,), DP_E4))
+
+SAFETY = 0.9  # fraction of the optimal step size to use
+MIN_FACTOR = 0.2  # largest allowed decrease of the step size
+MAX_FACTOR = 5.0  # largest allowed increase of the step size
+
+
+def rk4_step(f, t, y, dt, k1=None):
+    ''' Advance `y` by one classic 4th order Runge-Kutta step.
+
+    Args:
+        f (function): Derivative function `f(t, y)`.
+        t (float): Time at the start of the step.
+        y (array): State at the start of the step.
+        dt (float): Step size.
+        k1 (array): `f(t, y)`, if it is already known. Optional.
+
+    Returns:
+        array: State at the end of the step.
+    '''
+    if k1 is None:
+        k1 = f(t, y)
+    k2 = f(t + dt/2, y + dt/2 * k1)
+    k3 = f(t + dt/2, y + dt/2 * k2)
+    k4 = f(t + dt, y + dt * k3)
+    return y + dt/6 * (k1 + 2*k2 + 2*k3 + k4)
+
+
+def dormand_prince_step(f, t, y, dt, k1=None):
+    ''' Attempt one Dormand-Prince 5(4) step.
+
+    Args:
+        f (function): Derivative function `f(t, y)`.
+        t (float): Time at the start of the step.
+        y (array): State at the start of the step.
+        dt (float): Step size.
+        k1 (array): `f(t, y)`, if it is already known. Optional.
+
+    Returns:
+        tuple: Tuple containing the result of the step:
+
+        - `y_new` (`array`): 5th order state at the end of the step.
+        - `error` (`array`): Estimate of the local error of `y_new`.
+        - `f_new` (`array`): `f(t + dt, y_new)`, which can be reused as `k1`
+            of the next step.
+    '''
+    k = [f(t, y) if k1 is None else k1]
+    for c, a in zip(DP_C[1:], DP_A[1:]):
+        k.append(f(t + c*dt, y + dt * sum(a_i * k_i for a_i, k_i in zip(a, k)
+                                          if a_i)))
+    # the last stage is evaluated at the 5th order solution
+    y_new = y + dt * sum(b * k_i for b, k_i in zip(DP_A[-1], k) if b)
+    error = dt * sum(e * k_i for e, k_i in zip(DP_ERROR, k) if e)
+    return y_new, error, k[-1]
+
+
+def error_norm(error, y, y_new, rtol, atol):
+    ''' Largest component of the local error relative to the tolerance.
+
+    A step is accepted if the norm is at most `1`.
+    '''
+    scale = atol + rtol * np.maximum(np.abs(y), np.abs(y_new))
+    return np.max(np.abs(error) / scale)
+
+
+def next_step_size(dt, norm, order=5):
+    ''' Step size (s) that is expected to give an error norm of `SAFETY`.
+
+    Args:
+        dt (float): Size of the last step.
+        norm (float): Error norm of the last step from `error_norm`.
+        order (int): Order of the error estimate plus one.
+
+    Returns:
+        float: Size of the next step.
+    '''
+    if norm == 0:
+        factor = MAX_FACTOR
+    else:
+        factor = min(MAX_FACTOR, max(MIN_FACTOR,
+                                     SAFETY * norm ** (-1 / order)))
+    return dt * factor
+
+
+def hermite(t0, y0, f0, t1, y1, f1, t):
+    ''' Cubic Hermite interpolation of the state between two steps.
+
+    Args:
+        t0 (float): Time at the start of the step.
+        y0 (array): State at the start of the step.
+        f0 (array): Derivative at the start of the step.
+        t1 (float): Time at the end of the step.
+        y1 (array): State at the end of the step.
+        f1 (array): Derivative at the end of the step.
+        t (float): Time to interpolate at.
+
+    Returns:
+        array: Interpolated state at time `t`.
+    '''
+    dt = t1 - t0
+    s = (t - t0) / dt
+    h00 = (1 + 2*s) * (1 - s)**2
+    h10 = s * (1 - s)**2
+    h01 = s**2 * (3 - 2*s)
+    h11 = s**2 * (s - 1)
+    return h00*y0 + h10*dt*f0 + h01*y1 + h11*dt*f1
+
+
+def locate_event(event, t0, y0, f0, t1, y1, f1, tol=1e-6, max_iter=50):
+    ''' Find the time between two steps where `event(y)` crosses zero.
+
+    The state between the steps is interpolated with `hermite` and the root
+    is found with the Illinois variant of the false position method.
+
+    Args:
+        event (function): Event function `event(y)`. Must have opposite
+            signs at `y0` and `y1`.
+        t0 (float): Time at the start of the step.
+        y0 (array): State at the start of the step.
+        f0 (array): Derivative at the start of the step.
+        t1 (float): Time at the end of the step.
+        y1 (array): State at the end of the step.
+        f1 (array): Derivative at the end of the step.
+        tol (float): Tolerance of the event time. Optional, defaults to
+            `1e-6`.
+        max_iter (int): Maximum number of iterations. Optional, defaults to
+            `50`.
+
+    Returns:
+        tuple: Time of the event and interpolated state at that time.
+    '''
+    a, b = t0, t1
+    g_a, g_b = event(y0), event(y1)
+    if g_a * g_b > 0:
+        raise ValueError('Event function does not change sign between '
+                         '%s and %s' % (t0, t1))
+    side = 0
+    t, y = b, y1
+    for _ in range(max_iter):
+        t = (a * g_b - b * g_a) / (g_b - g_a)
+        y = hermite(t0, y0, f0, t1, y1, f1, t)
+        g = event(y)
+        if g * g_b > 0:
+            b, g_b = t, g
+            if side == -1:
+                g_a /= 2
+            side = -1
+        else:
+            a, g_a = t, g
+            if side == 1:
+                g_b /= 2
+            side = 1
+        if b - a < tol or g == 0:
+            break
+    return t, y
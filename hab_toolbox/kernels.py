@@ -0,0 +1,154 @@
+''' Fused simulation kernels.
+
+This module advances the Euler ascent model of `ascent_model.run` in a single
+loop over plain floats. The atmosphere table lookup of `TabulatedAtmosphere`,
+the gas properties of `Gas`, the forces of `ascent_model.forces` and the
+state update of `ascent_model.step` are inlined in the same order of
+operations, so the results are identical to the object-oriented model.
+
+If [numba](https://numba.pydata.org/) is installed the kernel is compiled to
+machine code the first time it is called (and cached on disk). Otherwise the
+same kernel runs as pure Python, which still avoids the attribute lookups,
+properties and NumPy scalar operations of the object-oriented model.
+
+| Backend | Requirement |
+| ------- | ----------- |
+| `numba` | `numba` is installed |
+| `python` | Always available |
+'''
+
+import logging
+import math
+
+from hab_toolbox import atmosphere as atmosphere_models
+from hab_toolbox.balloon_library.balloon import PI, R
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+BACKEND = 'python' if numba is None else 'numba'
+# Exit status of `euler_steps`
+RUNNING = 0  # all requested steps were taken
+BURST = 1  # the balloon exceeded its burst diameter
+OUT_OF_BOUNDS = 2  # the altitude left the atmosphere tables
+
+MIN_ALTITUDE = atmosphere_models.MIN_ALTITUDE
+MAX_ALTITUDE = atmosphere_models.MAX_ALTITUDE
+SPHERE_VOLUME = 4/3 * PI  # volume of a sphere over radius cubed
+
+
+def euler_steps(h, v, temperature, pressure, n_steps, dt, gas_mass,
+                molar_mass, total_mass, cd, burst_diameter, resolution,
+                grav_accel_table, temperature_table, log_pressure_table,
+                log_density_table, altitude, ascent_rate, ascent_accel):
+    ''' Advance the Euler ascent model by up to `n_steps` time steps.
+
+    The state after each step is written to `altitude`, `ascent_rate` and
+    `ascent_accel`, which must have room for `n_steps` samples.
+
+    Args:
+        h (float): Altitude at the start of the first step (m).
+        v (float): Velocity (positive up) at the start of the first step
+            (m/s).
+        temperature (float): Lift gas temperature before the first step (K).
+        pressure (float): Lift gas pressure before the first step (Pa).
+        n_steps (int): Largest number of steps to take.
+        dt (float): Time step (s).
+        gas_mass (float): Lift gas mass (kg).
+        molar_mass (float): Molar mass of the lift gas (kg/mol).
+        total_mass (float): Balloon and payload mass (kg).
+        cd (float): Drag coefficient of the balloon.
+        burst_diameter (float): Burst diameter of the balloon (m).
+        resolution (float): Spacing of the atmosphere tables (m).
+        grav_accel_table (array): Gravitational acceleration table.
+        temperature_table (array): Temperature table.
+        log_pressure_table (array): Natural log of the pressure table.
+        log_density_table (array): Natural log of the density table.
+        altitude (array): Output altitudes (m).
+        ascent_rate (array): Output velocities (m/s).
+        ascent_accel (array): Output accelerations (m/s^2).
+
+    Returns:
+        tuple: Number of steps taken, exit status (`RUNNING`, `BURST` or
+        `OUT_OF_BOUNDS`), and `h`, `v`, `temperature` and `pressure` after
+        the last step.
+    '''
+    last = len(grav_accel_table) - 1
+    for k in range(n_steps):
+        # Balloon.burst_threshold_exceeded
+        volume = gas_mass / molar_mass * R * temperature / pressure
+        if 2 * (volume / SPHERE_VOLUME) ** (1/3) >= burst_diameter:
+            return k, BURST, h, v, temperature, pressure
+        # TabulatedAtmosphere.__call__
+        if not MIN_ALTITUDE <= h <= MAX_ALTITUDE:
+            return k, OUT_OF_BOUNDS, h, v, temperature, pressure
+        x = (h - MIN_ALTITUDE) / resolution
+        i = min(int(x), last - 1)
+        f = x - i
+        g = grav_accel_table[i] + f * (
+            grav_accel_table[i+1] - grav_accel_table[i])
+        temperature = temperature_table[i] + f * (
+            temperature_table[i+1] - temperature_table[i])
+        pressure = math.exp(log_pressure_table[i] + f * (
+            log_pressure_table[i+1] - log_pressure_table[i]))
+        density = math.exp(log_density_table[i] + f * (
+            log_density_table[i+1] - log_density_table[i]))
+        # ascent_model.forces
+        volume = gas_mass / molar_mass * R * temperature / pressure
+        gas_density = (molar_mass * pressure) / (R * temperature)
+        f_weight = -g * total_mass
+        f_buoyancy = -g * (volume * (gas_density - density))
+        area = PI * (((volume / SPHERE_VOLUME) ** (1/3)) ** 2)
+        if v > 0:
+            direction = -1.0
+        elif v < 0:
+            direction = 1.0
+        else:
+            direction = 0.0
+        f_drag = direction * (1/2) * cd * area * (v ** 2) * density
+        f_net = f_weight + f_buoyancy + f_drag
+        # ascent_model.step
+        a = f_net/total_mass
+        dv = a*dt
+        dh = v*dt
+        v += dv
+        h += dh
+        altitude[k] = h
+        ascent_rate[k] = v
+        ascent_accel[k] = a
+    return n_steps, RUNNING, h, v, temperature, pressure
+
+
+if numba is not None:
+    _euler_steps_jit = numba.njit(cache=True)(euler_steps)
+
+
+def compiled(function):
+    ''' The compiled version of a kernel in this module, or the kernel itself
+    if `numba` is not installed.
+    '''
+    if numba is None:
+        return function
+    return {euler_steps: _euler_steps_jit}[function]
+
+
+def tables(atmosphere):
+    ''' Atmosphere tables in the form expected by the kernels of the current
+    `BACKEND`: NumPy arrays for `numba`, Python lists otherwise.
+
+    Args:
+        atmosphere (TabulatedAtmosphere): Atmosphere model.
+
+    Returns:
+        tuple: Gravitational acceleration, temperature, log pressure and log
+        density tables.
+    '''
+    if numba is None:
+        # python lists are faster than arrays for scalar indexing
+        return tuple(atmosphere._tables)
+    return atmosphere._arrays
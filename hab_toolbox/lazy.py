@@ -0,0 +1,48 @@
+''' Lazy imports.
+
+The command line interface is started once per simulation by job scripts,
+so its startup time adds up. `lazy_import` returns a module that is only
+executed when one of its attributes is first used, so that commands only
+pay for importing the modules they need and `hab-toolbox --help` imports
+neither NumPy nor the simulation modules:
+``` python
+ascent_model = lazy_import('hab_toolbox.ascent_model')  # not executed yet
+ascent_model.run(sim_config)  # executes hab_toolbox.ascent_model
+```
+Modules that are only needed by a few functions, such as `matplotlib` in
+`hab_toolbox.plot_tools` or `ambiance` in `hab_toolbox.atmosphere`, are
+imported inside those functions instead.
+'''
+
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    ''' Import a module when one of its attributes is first used.
+
+    Args:
+        name (string): Absolute name of the module. Parent packages are
+            imported right away.
+
+    Returns:
+        module: The module, or the module itself if it was already imported.
+
+    Raises:
+        ModuleNotFoundError: If the module does not exist.
+    '''
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
@@ -0,0 +1,384 @@
+''' Monte Carlo dispersion analysis.
+
+This module samples simulation configs from random distributions over config
+fields and runs them in parallel, a Python port of the dispersion runs in
+`etc/Simulink/monte_carlo.m`.
+
+Config fields are addressed by dotted paths into a `sim_config` dictionary,
+for example `payload.bus_mass_kg`, `balloon.cd`,
+`atmosphere.temperature_noise_gain` or `simulation.initial_altitude`. Each
+field is sampled from a distribution described by a dictionary:
+
+| Distribution | Keys | Description |
+| ------------ | ---- | ----------- |
+| `normal` | `mean`, `std` | Normal distribution |
+| `uniform` | `low`, `high` | Uniform distribution |
+| `lognormal` | `mean`, `sigma` | Log-normal distribution, `mean` of the underlying normal |
+| `choice` | `values` | Uniform choice from a list of values |
+
+The `mean` of a `normal` distribution defaults to the value of the field in
+the base config.
+
+Runs are split into chunks that are simulated with `batch.run_batch` on a
+pool of worker processes. Random numbers are drawn from independent streams
+spawned from a single seed: one stream for sampling configs and one stream
+for the atmosphere noise of each chunk. Results are reproducible for a given
+seed and chunk size regardless of the number of workers. The default chunk
+size is a constant, so the same seed gives the same results on any machine.
+
+If the base config has a `wind` block (see `wind.launch`), every run is also
+advected through its wind field to predict the spread of final positions.
+Its launch position may be distributed like any other config field, for
+example `wind.launch_latitude_deg`. Each worker memory-maps the wind file,
+so the ensemble only reads the grid cells its flights pass through. Set the
+`decimation` of the simulation to bound the memory of the trajectories that
+are advected.
+'''
+
+import concurrent.futures
+import copy
+import logging
+import math
+import os
+import numpy as np
+
+from hab_toolbox import batch
+from hab_toolbox import wind
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+PERCENTILES = (5, 50, 95)
+# runs simulated in lockstep by each task; independent of the number of
+# workers, because each chunk draws from its own random number stream
+DEFAULT_CHUNK_SIZE = 32
+
+
+def get_config_value(sim_config, path):
+    ''' Get a value from a `sim_config` by its dotted path.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+        path (string): Dotted path to the field (i.e. `payload.bus_mass_kg`).
+
+    Returns:
+        The value of the field.
+    '''
+    value = sim_config
+    for key in path.split('.'):
+        value = value[key]
+    return value
+
+
+def set_config_value(sim_config, path, value):
+    ''' Set a value in a `sim_config` by its dotted path, creating any
+    missing blocks along the way.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+        path (string): Dotted path to the field (i.e. `payload.bus_mass_kg`).
+        value: Value to set.
+    '''
+    *blocks, key = path.split('.')
+    for block in blocks:
+        sim_config = sim_config.setdefault(block, {})
+    sim_config[key] = value
+
+
+def sample(distribution, n_runs, rng, default=None):
+    ''' Draw samples from a distribution.
+
+    Args:
+        distribution (dict): Distribution description. See the module
+            documentation for supported distributions.
+        n_runs (int): Number of samples to draw.
+        rng (Generator): A `numpy.random.Generator` to draw samples from.
+        default (float): Default `mean` of a `normal` distribution.
+
+    Returns:
+        array: Array of `n_runs` samples.
+    '''
+    kind = distribution.get('distribution', 'normal')
+    if kind == 'normal':
+        return rng.normal(distribution.get('mean', default),
+                          distribution['std'], n_runs)
+    elif kind == 'uniform':
+        return rng.uniform(distribution['low'], distribution['high'], n_runs)
+    elif kind == 'lognormal':
+        return rng.lognormal(distribution['mean'], distribution['sigma'],
+                             n_runs)
+    elif kind == 'choice':
+        return rng.choice(np.array(distribution['values'], dtype=object),
+                          n_runs)
+    else:
+        raise ValueError('Unknown distribution "%s"' % kind)
+
+
+def sample_values(base_config, distributions, n_runs, rng):
+    ''' Sample values for every distributed config field.
+
+    Args:
+        base_config (dict): Simulation config to sample around.
+        distributions (dict): Distribution description for each dotted path.
+        n_runs (int): Number of runs to sample.
+        rng (Generator): A `numpy.random.Generator` to draw samples from.
+
+    Returns:
+        dict: Array of `n_runs` samples for each dotted path.
+    '''
+    values = {}
+    for path in sorted(distributions):
+        try:
+            default = get_config_value(base_config, path)
+        except (KeyError, TypeError):
+            default = None
+        values[path] = sample(distributions[path], n_runs, rng,
+                              default=default)
+    return values
+
+
+def make_configs(base_config, values, n_runs):
+    ''' Build one `sim_config` for each set of sampled values.
+
+    Args:
+        base_config (dict): Simulation config to copy.
+        values (dict): Array of sampled values for each dotted path.
+        n_runs (int): Number of configs to build.
+
+    Returns:
+        list: List of `sim_config` dictionaries.
+    '''
+    configs = []
+    for i in range(n_runs):
+        sim_config = copy.deepcopy(base_config)
+        for path, samples in values.items():
+            value = samples[i]
+            set_config_value(sim_config, path,
+                             value.item() if hasattr(value, 'item') else value)
+        configs.append(sim_config)
+    return configs
+
+
+def _run_chunk(base_config, values, n_runs, seed, cache=None):
+    ''' Simulate one chunk of runs. Executed by the worker processes.
+    Returns the outcome of the runs and the counts added to the `cache`,
+    which are lost with the worker's copy of the cache.
+    '''
+    configs = make_configs(base_config, values, n_runs)
+    counts = None if cache is None else cache.counts()
+    drifting = 'wind' in base_config
+    decimation = 1
+    if drifting:
+        decimation = base_config['simulation'].get('decimation', 1)
+    result = batch.run_batch(configs, record=drifting, decimation=decimation,
+                             rng=np.random.default_rng(seed), cache=cache)
+    if cache is not None:
+        counts = [new - old for new, old in zip(cache.counts(), counts)]
+    outcome = (result.burst, result.out_of_bounds, result.final_time,
+               result.final_altitude)
+    if drifting:
+        launches = [wind.launch(sim_config) for sim_config in configs]
+        field = launches[0][0]
+        latitude, longitude, start_time = [
+            np.array(column) for column in list(zip(*launches))[1:]]
+        drift = wind.drift_batch(result, field, latitude, longitude,
+                                 start_time)
+        outcome += (np.where(drift.out_of_grid, np.nan, drift.final_latitude),
+                    np.where(drift.out_of_grid, np.nan, drift.final_longitude))
+    return outcome, counts
+
+
+def summarize(values):
+    ''' Summary statistics of an array of values.
+
+    Args:
+        values (array): Array of values. `NaN` values are ignored.
+
+    Returns:
+        dict: Count, mean, standard deviation, min, max and percentiles of
+        the values.
+    '''
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {'count': 0}
+    summary = {
+        'count': len(values),
+        'mean': float(np.mean(values)),
+        'std': float(np.std(values)),
+        'min': float(np.min(values)),
+        'max': float(np.max(values)),
+    }
+    for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f'p{q}'] = float(value)
+    return summary
+
+
+class MonteCarloResult():
+    ''' Outcome of every run in a Monte Carlo analysis.
+
+    | Property | Description |
+    | -------- | ----------- |
+    | `values` | Sampled value of each distributed field, keyed by dotted path |
+    | `burst` | Whether each run ended with a balloon burst |
+    | `out_of_bounds` | Whether each run left the atmosphere model's altitude range |
+    | `final_time` | Time at which each run ended (s) |
+    | `final_altitude` | Altitude at which each run ended (m) |
+    | `final_latitude` | Latitude at which each run ended (deg), `NaN` if it left the wind field. `None` without a `wind` block |
+    | `final_longitude` | Longitude at which each run ended (deg), `NaN` if it left the wind field. `None` without a `wind` block |
+    '''
+    def __init__(self, values, burst, out_of_bounds, final_time,
+                 final_altitude, final_latitude=None, final_longitude=None):
+        self.values = values
+        self.burst = burst
+        self.out_of_bounds = out_of_bounds
+        self.final_time = final_time
+        self.final_altitude = final_altitude
+        self.final_latitude = final_latitude
+        self.final_longitude = final_longitude
+
+    def __len__(self):
+        return len(self.burst)
+
+    @property
+    def burst_altitude(self):
+        ''' Burst altitude (m) of each run, `NaN` if it did not burst.
+        '''
+        return np.where(self.burst, self.final_altitude, np.nan)
+
+    @property
+    def burst_time(self):
+        ''' Time to burst (s) of each run, `NaN` if it did not burst.
+        '''
+        return np.where(self.burst, self.final_time, np.nan)
+
+    def summary(self):
+        ''' Aggregate statistics of burst altitude and time to burst.
+
+        Returns:
+            dict: Number of runs, fraction of runs that burst or left the
+            altitude range, and statistics of `burst_altitude` and
+            `burst_time` from `summarize`. Runs with a wind field add the
+            fraction of runs that left it and the spread of their final
+            positions from `wind.landing_zone`.
+        '''
+        n_runs = len(self)
+        summary = {
+            'runs': n_runs,
+            'burst_fraction': float(np.count_nonzero(self.burst) / n_runs),
+            'out_of_bounds_fraction': float(
+                np.count_nonzero(self.out_of_bounds) / n_runs),
+            'burst_altitude': summarize(self.burst_altitude),
+            'burst_time': summarize(self.burst_time),
+        }
+        if self.final_latitude is not None:
+            summary['out_of_grid_fraction'] = float(
+                np.count_nonzero(np.isnan(self.final_latitude)) / n_runs)
+            summary['landing_zone'] = wind.landing_zone(self.final_latitude,
+                                                        self.final_longitude)
+        return summary
+
+
+def run_monte_carlo(base_config, distributions, n_runs, seed=None,
+                    workers=None, chunk_size=None, cache=None):
+    ''' Run a Monte Carlo analysis of a simulation config.
+
+    Args:
+        base_config (dict): Simulation config to sample around. See
+            `ascent_model.run` for supported keys.
+        distributions (dict): Distribution description for each dotted path
+            of a config field. See the module documentation.
+        n_runs (int): Number of runs.
+        seed (int): Seed for all random number streams. Optional, defaults
+            to fresh entropy from the operating system.
+        workers (int): Number of worker processes. Optional, defaults to the
+            number of CPUs. Runs in the current process if `1`.
+        chunk_size (int): Number of runs simulated in lockstep by each task.
+            Optional, defaults to `DEFAULT_CHUNK_SIZE`.
+        cache (ResultCache): Cache of the outcome of each run, see
+            `batch.run_batch`. Optional, runs are not cached by default.
+
+    Returns:
+        MonteCarloResult: Outcome of every run.
+    '''
+    if n_runs < 1:
+        raise ValueError('Number of runs must be at least 1, not %s' % n_runs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = DEFAULT_CHUNK_SIZE
+    n_chunks = math.ceil(n_runs / chunk_size)
+    seed_sequence = np.random.SeedSequence(seed)
+    sampling_seed, *chunk_seeds = seed_sequence.spawn(1 + n_chunks)
+    values = sample_values(base_config, distributions, n_runs,
+                           np.random.default_rng(sampling_seed))
+    # only send each worker the samples for its own chunk
+    chunks = [
+        ({path: samples[i:i+chunk_size] for path, samples in values.items()},
+         min(chunk_size, n_runs - i),
+         chunk_seed)
+        for i, chunk_seed in zip(range(0, n_runs, chunk_size), chunk_seeds)]
+    log.warning(f'Starting Monte Carlo analysis: {n_runs} runs in '
+                f'{n_chunks} chunks on {workers} workers')
+
+    if workers == 1:
+        outcomes = [_run_chunk(base_config, *chunk, cache)[0]
+                    for chunk in chunks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(_run_chunk, base_config, *chunk, cache)
+                       for chunk in chunks]
+            outcomes = []
+            for future in futures:
+                outcome, counts = future.result()
+                outcomes.append(outcome)
+                if cache is not None:
+                    cache.add_counts(*counts)
+
+    columns = [np.concatenate(column) for column in zip(*outcomes)]
+    return MonteCarloResult(values, *columns)
+
+
+def from_config(sim_config, n_runs=None, seed=None, workers=None,
+                chunk_size=None, cache=None):
+    ''' Run the Monte Carlo analysis described by a simulation config.
+
+    The analysis is described by a `monte_carlo` block of `sim_config`:
+    ``` json
+    {
+        "monte_carlo": {
+            "runs": (int) Number of runs,
+            "seed": (int) Seed for all random number streams,
+            "distributions": {
+                (string) Dotted path of a config field: {
+                    "distribution": (string) [normal, uniform, lognormal, choice],
+                    ... parameters of the distribution
+                }
+            }
+        }
+    }
+    ```
+    Arguments that are not `None` override the values in the config.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+        n_runs (int): Number of runs.
+        seed (int): Seed for all random number streams.
+        workers (int): Number of worker processes.
+        chunk_size (int): Number of runs simulated in lockstep by each task.
+        cache (ResultCache): Cache of the outcome of each run.
+
+    Returns:
+        MonteCarloResult: Outcome of every run.
+    '''
+    mc_config = sim_config.get('monte_carlo', {})
+    base_config = {key: value for key, value in sim_config.items()
+                   if key != 'monte_carlo'}
+    return run_monte_carlo(
+        base_config,
+        mc_config.get('distributions', {}),
+        n_runs if n_runs is not None else mc_config.get('runs', 100),
+        seed=seed if seed is not None else mc_config.get('seed'),
+        workers=workers,
+        chunk_size=chunk_size,
+        cache=cache)
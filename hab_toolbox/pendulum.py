@@ -0,0 +1,312 @@
+''' Payload swing.
+
+This module models the payload as a spherical pendulum hanging from the
+balloon on a massless tether, ported from the MATLAB model in
+`etc/kinematics_model`. The tether angle from the downward vertical is
+`theta` and its azimuth is `phi` (rad):
+```
+theta'' = phi'^2 sin(theta) cos(theta) - g / l sin(theta)
+phi''   = -2 theta' phi' cot(theta)
+```
+
+Many pendulums, with different initial conditions and tether lengths, are
+advanced in lockstep with the classic 4th order Runge-Kutta method, with the
+state of every pendulum stored as arrays with one column per pendulum:
+``` python
+tspan = np.arange(0, 60, step=0.01)
+result = pendulum.simulate(tspan, length=[1, 2, 5], theta=np.radians(10))
+```
+
+The balloon can drive the pendulums: in the frame of a balloon accelerating
+upward at `a`, the payload feels the apparent gravity `g + a`. Pass the
+ascent acceleration of `ascent_model.run` to `simulate`, or use
+`swing_batch` to swing payloads from every member of a `BatchResult` in one
+call. The ascent acceleration is interpolated linearly between samples. A
+slack tether, where `g + a` is negative, is not modelled.
+
+`cot(theta)` is singular where the tether passes through the vertical, and
+a pendulum passing close to it spins around the vertical faster than any
+fixed time step resolves. The pendulums are therefore integrated in
+Cartesian coordinates, as the unit vector `n` along the tether and its rate
+`w`, which have no singularity:
+```
+n'' = g / l (n_z n - e_z) - |w|^2 n
+```
+`n` is renormalized after every step. Initial conditions are given and
+results returned as `theta` and `phi`, and `phi'` is computed with
+`sin(theta)` kept at least `SINGULARITY` away from zero.
+'''
+
+import logging
+import numpy as np
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+STANDARD_GRAVITY = 9.80665  # [m/s^2]
+SINGULARITY = 1e-6  # smallest magnitude of sin(theta) used for phi'
+STATE = ('theta', 'phi', 'theta_dot', 'phi_dot')
+
+
+def derivative(n, w, gravity_over_length):
+    ''' Second time derivative of the tether direction of spherical
+    pendulums.
+
+    Args:
+        n (array): `(3, N)` unit vector along the tether of each pendulum,
+            from the balloon to the payload.
+        w (array): `(3, N)` rate of `n` (1/s).
+        gravity_over_length (array): Apparent gravity divided by tether
+            length of each pendulum (1/s^2).
+
+    Returns:
+        array: `(3, N)` rate of `w` (1/s^2).
+    '''
+    accel = (gravity_over_length * n[2] - np.sum(w*w, axis=0)) * n
+    accel[2] -= gravity_over_length
+    return accel
+
+
+def to_unit_vector(theta, phi, theta_dot, phi_dot):
+    ''' Tether direction and its rate from spherical coordinates.
+
+    Returns:
+        tuple: `(3, N)` unit vector `n` and its rate `w`, see `derivative`.
+    '''
+    sin_theta, cos_theta = np.sin(theta), np.cos(theta)
+    sin_phi, cos_phi = np.sin(phi), np.cos(phi)
+    n = np.stack((sin_theta * cos_phi, sin_theta * sin_phi, -cos_theta))
+    w = np.stack((cos_theta * cos_phi * theta_dot
+                  - sin_theta * sin_phi * phi_dot,
+                  cos_theta * sin_phi * theta_dot
+                  + sin_theta * cos_phi * phi_dot,
+                  sin_theta * theta_dot))
+    return n, w
+
+
+def from_unit_vector(n, w):
+    ''' Spherical coordinates of the tether direction and its rate, the
+    inverse of `to_unit_vector`.
+
+    Returns:
+        tuple: `theta`, `phi` (rad), `theta_dot` and `phi_dot` (rad/s), in
+        the order of `STATE`. `theta` is between `0` and `pi`.
+    '''
+    horizontal = np.hypot(n[0], n[1])
+    theta = np.arctan2(horizontal, -n[2])
+    phi = np.arctan2(n[1], n[0])
+    cos_phi, sin_phi = np.cos(phi), np.sin(phi)
+    theta_dot = (np.cos(theta) * (cos_phi * w[0] + sin_phi * w[1])
+                 + np.sin(theta) * w[2])
+    phi_dot = ((cos_phi * w[1] - sin_phi * w[0])
+               / np.maximum(horizontal, SINGULARITY))
+    return theta, phi, theta_dot, phi_dot
+
+
+def cartesian(theta, phi, length):
+    ''' Position of the payload relative to the balloon.
+
+    Args:
+        theta (array): Angle of the tether from the downward vertical (rad).
+        phi (array): Azimuth of the tether (rad).
+        length (array): Tether length (m).
+
+    Returns:
+        tuple: `x`, `y` and `z` (positive up) position of the payload (m).
+    '''
+    return (length * np.sin(theta) * np.cos(phi),
+            length * np.sin(theta) * np.sin(phi),
+            -length * np.cos(theta))
+
+
+class PendulumResult():
+    ''' Swing of a batch of pendulums.
+
+    Trajectory fields are `(N, M)` arrays with one row per pendulum and one
+    column per sample, padded with `NaN` after the last sample of that
+    pendulum like a `BatchResult`. They are `None` if the swing was simulated
+    without `record`.
+
+    | Property | Description |
+    | -------- | ----------- |
+    | `time` | Time of each sample (s) |
+    | `theta` | Angle of the tether from the vertical at each sample (rad) |
+    | `phi` | Azimuth of the tether at each sample (rad) |
+    | `theta_dot` | Rate of `theta` at each sample (rad/s) |
+    | `phi_dot` | Rate of `phi` at each sample (rad/s) |
+    | `length` | Tether length of each pendulum (m) |
+    | `final_state` | `(4, N)` state of each pendulum at its last sample, in the order of `STATE` |
+    | `max_swing` | Largest angle between the tether and the vertical of each pendulum (rad) |
+    '''
+    FIELDS = STATE
+
+    def __init__(self, time, theta, phi, theta_dot, phi_dot, length,
+                 final_state, max_swing):
+        self.time = time
+        self.theta = theta
+        self.phi = phi
+        self.theta_dot = theta_dot
+        self.phi_dot = phi_dot
+        self.length = length
+        self.final_state = final_state
+        self.max_swing = max_swing
+
+    def __len__(self):
+        return len(self.length)
+
+    def positions(self):
+        ''' `x`, `y` and `z` position of the payload at each sample (m), see
+        `cartesian`.
+        '''
+        if self.theta is None:
+            raise ValueError('Swing was simulated without record')
+        return cartesian(self.theta, self.phi, self.length[:, np.newaxis])
+
+
+def simulate(tspan, length, theta, phi=0.0, theta_dot=0.0, phi_dot=0.0,
+             ascent_accel=None, gravity=STANDARD_GRAVITY, substeps=1,
+             record=True):
+    ''' Swing many spherical pendulums in lockstep.
+
+    Initial conditions and tether lengths are broadcast against each other
+    and against the rows of `tspan`, with one pendulum per element.
+
+    Args:
+        tspan (array): Time of each sample (s), either `(M,)` for all
+            pendulums or `(N, M)` with one row per pendulum, padded with
+            `NaN` after the last sample of that pendulum.
+        length (array): Tether length (m).
+        theta (array): Initial angle of the tether from the downward
+            vertical (rad).
+        phi (array): Initial azimuth of the tether (rad). Optional, defaults
+            to `0`.
+        theta_dot (array): Initial rate of `theta` (rad/s). Optional,
+            defaults to `0`.
+        phi_dot (array): Initial rate of `phi` (rad/s). Optional, defaults
+            to `0`.
+        ascent_accel (array): Acceleration (positive up) of the balloon at
+            each sample (m/s^2), with the shape of `tspan`. Optional, the
+            balloon does not accelerate by default.
+        gravity (float): Gravitational acceleration (m/s^2). Optional,
+            defaults to `STANDARD_GRAVITY`.
+        substeps (int): Number of Runge-Kutta steps per sample. Optional,
+            defaults to `1`.
+        record (bool): Store the state at every sample (`True`, default) or
+            only the final state and largest swing of each pendulum
+            (`False`).
+
+    Returns:
+        PendulumResult: Swing of every pendulum.
+    '''
+    if substeps < 1:
+        raise ValueError('Number of substeps must be at least 1, not %s'
+                         % substeps)
+    tspan = np.asarray(tspan, dtype=float)
+    initial = np.broadcast_arrays(length, theta, phi, theta_dot, phi_dot,
+                                  tspan[..., 0])
+    n_pendulums = initial[0].size
+    length, theta, phi, theta_dot, phi_dot, _ = (
+        np.array(x, dtype=float).reshape(n_pendulums) for x in initial)
+    if np.any(length <= 0):
+        raise ValueError('Tether length must be positive! (%s)'
+                         % length.min())
+    n_samples = tspan.shape[-1]
+    time = np.broadcast_to(tspan, (n_pendulums, n_samples))
+    if ascent_accel is None:
+        accel = np.zeros(n_pendulums)
+    else:
+        accel = np.broadcast_to(np.asarray(ascent_accel, dtype=float),
+                                (n_pendulums, n_samples))
+
+    n, w = to_unit_vector(theta, phi, theta_dot, phi_dot)
+    max_swing = np.arccos(np.clip(-n[2], -1, 1))
+    fields = None
+    if record:
+        fields = [np.full((n_pendulums, n_samples), np.nan)
+                  for _ in PendulumResult.FIELDS]
+        for field, value in zip(fields, (theta, phi, theta_dot, phi_dot)):
+            field[:, 0] = value
+    active = ~np.isnan(time[:, 0])
+
+    for j in range(n_samples - 1):
+        active &= ~np.isnan(time[:, j+1])
+        if not active.any():
+            break
+        dt = (time[:, j+1] - time[:, j]) / substeps
+        if ascent_accel is None:
+            a0 = a1 = accel
+        else:
+            a0, a1 = accel[:, j], accel[:, j+1]
+        n_new, w_new = n, w
+        for s in range(substeps):
+            # apparent gravity at the start, middle and end of the substep
+            g0, g1, g2 = ((gravity + a0 + (a1 - a0) * (s + f) / substeps)
+                          / length for f in (0, 0.5, 1))
+            k1 = derivative(n_new, w_new, g0)
+            n2, w2 = n_new + dt/2 * w_new, w_new + dt/2 * k1
+            k2 = derivative(n2, w2, g1)
+            n3, w3 = n_new + dt/2 * w2, w_new + dt/2 * k2
+            k3 = derivative(n3, w3, g1)
+            n4, w4 = n_new + dt * w3, w_new + dt * k3
+            k4 = derivative(n4, w4, g2)
+            n_new = n_new + dt/6 * (w_new + 2*w2 + 2*w3 + w4)
+            w_new = w_new + dt/6 * (k1 + 2*k2 + 2*k3 + k4)
+            # project back onto the unit sphere and its tangent plane
+            n_new = n_new / np.sqrt(np.sum(n_new*n_new, axis=0))
+            w_new = w_new - np.sum(n_new*w_new, axis=0) * n_new
+        if active.all():
+            n, w = n_new, w_new
+        else:
+            # pendulums after their last sample keep their final state
+            n, w = np.where(active, n_new, n), np.where(active, w_new, w)
+        max_swing = np.maximum(max_swing, np.arccos(np.clip(-n[2], -1, 1)))
+        if record:
+            rows = slice(None) if active.all() else active
+            for field, value in zip(fields, from_unit_vector(n[:, rows],
+                                                             w[:, rows])):
+                field[rows, j+1] = value
+
+    final_state = np.stack(from_unit_vector(n, w))
+    if not np.all(np.isfinite(final_state)):
+        log.error(f'{np.count_nonzero(~np.all(np.isfinite(final_state), 0))} '
+                  f'pendulums diverged, use a smaller time step or more '
+                  f'substeps')
+    if record:
+        return PendulumResult(time, *fields, length, final_state, max_swing)
+    return PendulumResult(time, None, None, None, None, length, final_state,
+                          max_swing)
+
+
+def swing_batch(result, length, theta, phi=0.0, theta_dot=0.0, phi_dot=0.0,
+                members=None, gravity=STANDARD_GRAVITY, substeps=1,
+                record=True):
+    ''' Swing payloads from the members of a `BatchResult`, driven by their
+    ascent acceleration.
+
+    Args:
+        result (BatchResult): Batch simulated with `record` enabled.
+        length (array): Tether length of each pendulum (m).
+        theta (array): Initial angle of the tether from the downward
+            vertical of each pendulum (rad).
+        phi (array): Initial azimuth of each pendulum (rad). Optional,
+            defaults to `0`.
+        theta_dot (array): Initial rate of `theta` of each pendulum (rad/s).
+            Optional, defaults to `0`.
+        phi_dot (array): Initial rate of `phi` of each pendulum (rad/s).
+            Optional, defaults to `0`.
+        members (array): Index of the batch member each pendulum hangs from,
+            so that several pendulums can hang from one flight. Optional,
+            defaults to one pendulum per member.
+        gravity (float): Gravitational acceleration (m/s^2). Optional.
+        substeps (int): Number of Runge-Kutta steps per sample. Optional.
+        record (bool): Store the state at every sample. Optional.
+
+    Returns:
+        PendulumResult: Swing of every pendulum.
+    '''
+    if members is None:
+        members = np.arange(len(result))
+    members = np.asarray(members)
+    return simulate(result.time[members], length, theta, phi, theta_dot,
+                    phi_dot, ascent_accel=result.ascent_accel[members],
+                    gravity=gravity, substeps=substeps, record=record)
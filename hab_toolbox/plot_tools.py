@@ -1,9 +1,19 @@
 import logging
-import matplotlib.pyplot as plt
+import os
+import numpy as np
 
+# matplotlib is imported by the plotting functions on first use, so that
+# commands that do not plot do not pay for importing it
 log = logging.getLogger()
 
 
+def _figure_filename(save_fig):
+    # matplotlib saves as a .png if no file extension is given
+    if os.path.splitext(save_fig)[1]:
+        return save_fig
+    return f'{save_fig}.png'
+
+
 def show_figure(save_fig=None):
     ''' Show all plots.
 
@@ -14,10 +24,49 @@ def show_figure(save_fig=None):
             If not specified, the figure is not saved.
             If no file extension is given, the figure will be saved as a `.png`
     '''
-    plt.show()
+    import matplotlib.pyplot as plt
     if save_fig:
+        # save first, the figure is gone once the window is closed
+        save_fig = _figure_filename(save_fig)
         plt.savefig(save_fig)
-        log.warning(f'Plot saved to {save_fig}.png')
+        log.warning(f'Plot saved to {save_fig}')
+    plt.show()
+
+
+def minmax_decimate(x, y, n_buckets):
+    ''' Downsample a line to the minimum and maximum of each bucket.
+
+    Samples are split into `n_buckets` buckets of consecutive samples and only
+    the smallest and largest `y` of each bucket are kept, in their original
+    order. With one bucket per pixel column, the plotted envelope of the line
+    looks the same as the full line.
+
+    Args:
+        x (array): Array of x values, such as time indices.
+        y (array): Array of y values. One entry for each x value.
+        n_buckets (int): Number of buckets.
+
+    Returns:
+        tuple: `x` and `y` arrays with at most `2 * n_buckets` entries.
+    '''
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return x, y
+    size = -(-n // n_buckets)
+    start = n // size * size
+    rows = np.asarray(y[:start]).reshape(-1, size)
+    offsets = np.arange(len(rows)) * size
+    i_min = offsets + np.argmin(rows, axis=1)
+    i_max = offsets + np.argmax(rows, axis=1)
+    if start < n:
+        # the last bucket is shorter
+        tail = np.asarray(y[start:])
+        i_min = np.append(i_min, start + np.argmin(tail))
+        i_max = np.append(i_max, start + np.argmax(tail))
+    # keep the pair of each bucket in time order
+    indices = np.column_stack((np.minimum(i_min, i_max),
+                               np.maximum(i_min, i_max))).ravel()
+    return np.asarray(x)[indices], np.asarray(y)[indices]
 
 
 def plot_ascent(time,
@@ -26,12 +75,17 @@ def plot_ascent(time,
                 acceleration,
                 title='',
                 show=True,
-                save_fig=None):
+                save_fig=None,
+                downsample=True,
+                headless=False):
     ''' Create plots for altitude, velocity, and acceleration over time.
 
     Expects all input arrays to be the same length. Best results when used
     with `hab_toolbox.cli.simple_ascent` or `hab_toolbox.cli.plot_ascent`.
 
+    Long trajectories are downsampled with `minmax_decimate` to two samples
+    per pixel column of the figure before drawing.
+
     Args:
         time (array): Array of time indices.
         altitude (array): Array of altitudes.
@@ -46,21 +100,35 @@ def plot_ascent(time,
         save_fig (string, optional): Filename to use for a saved figure.
             If not specified, the figure is not saved.
             If no file extension is given, the figure will be saved as a `.png`
+        downsample (bool, optional): Whether to downsample long trajectories
+            before drawing (`True`, default) or draw every sample (`False`).
+        headless (bool, optional): Draw on a standalone Agg canvas without
+            `matplotlib.pyplot`, and only save the figure to `save_fig`
+            instead of showing it. Defaults to `False`.
 
     Returns:
         tuple: Figure and Axis plot objects.
     '''
-    fig, axs = plt.subplots(3, 1)
+    if headless:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        axs = fig.subplots(3, 1)
+    else:
+        import matplotlib.pyplot as plt
+        fig, axs = plt.subplots(3, 1)
     if title:
         fig.suptitle(title)
 
-    axs[0].plot(time, altitude)
+    n_buckets = int(fig.get_figwidth() * fig.dpi)
+    for ax, values in zip(axs, (altitude, velocity, acceleration)):
+        if downsample:
+            ax.plot(*minmax_decimate(time, values, n_buckets))
+        else:
+            ax.plot(time, values)
     axs[0].set_ylabel('Altitude (m)')
-
-    axs[1].plot(time, velocity)
     axs[1].set_ylabel('Velocity (m/s)')
-
-    axs[2].plot(time, acceleration)
     axs[2].set_ylabel('Acceleration (m/s^2)')
 
     for ax in axs:
@@ -68,7 +136,14 @@ def plot_ascent(time,
         ax.grid(True)
         ax.set_frame_on(False)
 
-    if show:
+    if headless:
+        if save_fig:
+            save_fig = _figure_filename(save_fig)
+            fig.savefig(save_fig)
+            log.warning(f'Plot saved to {save_fig}')
+        else:
+            log.warning('Headless plot was not saved, no filename was given')
+    elif show:
         show_figure(save_fig=save_fig)
 
     return fig, axs
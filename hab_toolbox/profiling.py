@@ -0,0 +1,193 @@
+''' Simulation profiling.
+
+A `Profile` collects where the time of a simulation goes. Pass it to
+`ascent_model.run` or `ascent_model.iter_run` and read its report after the
+simulation:
+``` python
+with Profile() as profile:
+    ascent_model.run(sim_config, profile=profile)
+profile.report()  # phase times, steps/second and peak memory
+```
+
+Phase timers work like laps of a stopwatch: the simulation calls `lap` at the
+end of every phase, which adds the time since the previous lap to that
+phase. Calls of the atmosphere model are timed separately by wrapping it with
+`timed`, and their time is left out of the lap they happen in. Each lap only
+reads the clock once, so profiling adds little overhead to a step.
+
+| Phase | Description |
+| ----- | ----------- |
+| `setup` | Reading the config and initializing the balloon, payload and atmosphere |
+| `atmosphere` | Evaluating the atmosphere model |
+| `forces` | Gas properties and forces, except the atmosphere model |
+| `integration` | Updating the state and the altitude controller |
+| `burst_check` | Checking the balloon's burst threshold |
+| `logging` | Per-step log messages |
+| `kernel` | Steps of the fused kernel of `hab_toolbox.kernels`, which are not split into phases |
+| `io` | Storing samples in the trajectory and writing them to sinks |
+'''
+
+import cProfile
+import logging
+import pstats
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+PHASES = ('setup', 'atmosphere', 'forces', 'integration', 'burst_check',
+          'logging', 'kernel', 'io')
+
+
+class Profile():
+    ''' Context-managed instrumentation of one or more simulations.
+
+    The context measures wall time and peak memory, and runs `cProfile` if
+    requested. Phase timers and the step count are collected by the
+    simulations that are passed the profile, inside or outside the context.
+
+    Args:
+        trace_memory (bool): Trace Python memory allocations with
+            `tracemalloc` to report their peak (`True`) or only report the
+            peak resident set size of the process (`False`, default). Tracing
+            slows down allocations.
+        cprofile (bool): Also run `cProfile` while in the context. Optional,
+            defaults to `False`.
+        stats_path (string): File to dump `cProfile` statistics to when the
+            context exits, for use with `pstats` or `snakeviz`. Implies
+            `cprofile`. Optional.
+    '''
+    def __init__(self, trace_memory=False, cprofile=False, stats_path=None):
+        self.trace_memory = trace_memory
+        self.stats_path = stats_path
+        self.profiler = cProfile.Profile() if cprofile or stats_path else None
+        self.timers = dict.fromkeys(PHASES, 0.0)
+        self.steps = 0
+        self.wall_time = 0.0
+        self.peak_memory = None
+        self._start = None
+        self._last = time.perf_counter()
+        self._excluded = 0.0  # time of timed calls since the last lap
+        self._tracing = False
+
+    def __enter__(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        if self.profiler is not None:
+            self.profiler.enable()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall_time += time.perf_counter() - self._start
+        if self.profiler is not None:
+            self.profiler.disable()
+            if self.stats_path:
+                self.profiler.dump_stats(self.stats_path)
+                log.warning(f'Profile statistics saved to {self.stats_path}')
+        if self._tracing:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self._tracing = False
+
+    def mark(self):
+        ''' Start the next lap now.
+        '''
+        self._last = time.perf_counter()
+        self._excluded = 0.0
+
+    def lap(self, phase):
+        ''' Add the time since the previous lap to a phase, except the time
+        of `timed` calls made in between.
+
+        Args:
+            phase (string): One of `PHASES`.
+        '''
+        now = time.perf_counter()
+        self.timers[phase] += now - self._last - self._excluded
+        self._last = now
+        self._excluded = 0.0
+
+    def timed(self, phase, function):
+        ''' Wrap a function to add the time of every call to a phase.
+
+        Args:
+            phase (string): One of `PHASES`.
+            function (function): Function to time.
+
+        Returns:
+            function: Function with the same arguments and return value.
+        '''
+        timers = self.timers
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                timers[phase] += elapsed
+                self._excluded += elapsed
+        return wrapper
+
+    @property
+    def simulation_time(self):
+        ''' Total time of all phases (s).
+        '''
+        return sum(self.timers.values())
+
+    @property
+    def steps_per_second(self):
+        ''' Time steps simulated per second of `simulation_time`.
+        '''
+        if not self.simulation_time:
+            return 0.0
+        return self.steps / self.simulation_time
+
+    @property
+    def max_rss(self):
+        ''' Peak resident set size of the process (bytes), or `None` where
+        the `resource` module is not available.
+        '''
+        if resource is None:
+            return None
+        # kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def report(self):
+        ''' Summary of the profile.
+
+        Returns:
+            dict: Time of each phase (s) and its fraction of
+            `simulation_time`, number of steps, steps per second, wall time
+            (s), peak traced memory and peak resident set size (bytes).
+        '''
+        total = self.simulation_time
+        return {
+            'phases': {
+                phase: {'time': elapsed,
+                        'fraction': elapsed / total if total else 0.0}
+                for phase, elapsed in self.timers.items() if elapsed},
+            'steps': self.steps,
+            'steps_per_second': self.steps_per_second,
+            'simulation_time': total,
+            'wall_time': self.wall_time,
+            'peak_memory': self.peak_memory,
+            'max_rss': self.max_rss,
+        }
+
+    def stats(self, sort='cumulative'):
+        ''' `pstats.Stats` of the `cProfile` run, sorted by `sort`, or `None`
+        if `cProfile` was not enabled.
+        '''
+        if self.profiler is None:
+            return None
+        return pstats.Stats(self.profiler).sort_stats(sort)
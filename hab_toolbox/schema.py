@@ -0,0 +1,286 @@
+''' Simulation config validation.
+
+The simulation reads its config with plain dictionary lookups, so a missing
+or misspelled field only fails deep inside `ascent_model.run`, after the
+setup work is done, or is silently ignored if it was optional. This module
+checks a config against `SCHEMA` before it is simulated and fills in the
+defaults of optional fields:
+``` python
+sim_config = schema.resolve(sim_config)  # raises ValueError if invalid
+errors = schema.check(sim_config)  # list of error messages
+```
+
+`SCHEMA` describes each block of a config (see `ascent_model.run`) as a
+`Block` of `Field`s. It is compiled once into nested validation functions
+that only look up precomputed key sets, checks and defaults, so validating
+thousands of configs costs little next to simulating them. Every error of a
+config is reported, each prefixed with the dotted path of the field, and
+unknown fields are reported with the closest known field name.
+
+Defaults are only added to blocks that are present, so a resolved config
+simulates exactly like the original one.
+'''
+
+import difflib
+import functools
+import logging
+
+from hab_toolbox import ascent_model
+from hab_toolbox import atmosphere
+from hab_toolbox import controller
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+NUMBER = (int, float)
+
+
+class Field():
+    ''' One field of a config block.
+
+    Args:
+        types (type): Allowed type or tuple of types. Booleans are only
+            allowed if `bool` is one of them.
+        required (bool): Whether the field must be present. Optional,
+            defaults to `False`.
+        default: Value of the field if it is missing. Optional, missing
+            fields are left out by default.
+        choices (tuple): Allowed values. Optional.
+        minimum (float): Smallest allowed value. Optional.
+        maximum (float): Largest allowed value. Optional.
+        positive (bool): Whether the value must be greater than zero.
+            Optional, defaults to `False`.
+    '''
+    def __init__(self, types, required=False, default=None, choices=None,
+                 minimum=None, maximum=None, positive=False):
+        self.types = types if isinstance(types, tuple) else (types,)
+        self.required = required
+        self.default = default
+        self.choices = choices
+        self.minimum = minimum
+        self.maximum = maximum
+        self.positive = positive
+
+
+class Block():
+    ''' A block of a config, the top level config itself or a nested block.
+
+    Args:
+        fields (dict): `Field` or nested `Block` by name. Only these fields
+            are allowed.
+        required (bool): Whether the block must be present. Optional,
+            defaults to `False`.
+        open (bool): Allow any fields without checking them, for blocks that
+            are validated by the module that reads them. Optional, defaults
+            to `False`.
+    '''
+    def __init__(self, fields=None, required=False, open=False):
+        self.fields = fields or {}
+        self.required = required
+        self.open = open
+
+
+SCHEMA = Block({
+    'balloon': Block({
+        'type': Field(str, required=True),
+        'reserve_mass_kg': Field(NUMBER, required=True, minimum=0),
+        'bleed_mass_kg': Field(NUMBER, required=True, minimum=0),
+        'cd': Field(NUMBER, positive=True),
+    }, required=True),
+    'payload': Block({
+        'bus_mass_kg': Field(NUMBER, required=True, minimum=0),
+        'ballast_mass_kg': Field(NUMBER, required=True, minimum=0),
+    }, required=True),
+    'pid': Block({
+        'mode': Field(str, default='continuous',
+                      choices=controller.MODES),
+        'target_altitude_m': Field(NUMBER, minimum=atmosphere.MIN_ALTITUDE,
+                                   maximum=atmosphere.MAX_ALTITUDE),
+        'delay_time_s': Field(NUMBER, default=0.0, minimum=0),
+        'delay_altitude_m': Field(NUMBER),
+        'arm_tolerance_m': Field(NUMBER,
+                                 default=controller.DEFAULT_ARM_TOLERANCE,
+                                 minimum=0),
+        'bleed_rate_kgps': Field(NUMBER, default=0.0, minimum=0),
+        'ballast_rate_kgps': Field(NUMBER, default=0.0, minimum=0),
+        'bleed_min_rate_kgps': Field(NUMBER, default=0.0, minimum=0),
+        'ballast_min_rate_kgps': Field(NUMBER, default=0.0, minimum=0),
+        'gains': Block({
+            'kp': Field(NUMBER, default=0.0),
+            'ki': Field(NUMBER, default=0.0),
+            'kd': Field(NUMBER, default=0.0),
+            'n': Field(NUMBER, default=0.0, minimum=0),
+        }),
+    }),
+    'simulation': Block({
+        'id': Field(str),
+        'duration': Field(NUMBER, required=True, positive=True),
+        'dt': Field(NUMBER, required=True, positive=True),
+        'initial_altitude': Field(NUMBER, required=True,
+                                  minimum=atmosphere.MIN_ALTITUDE,
+                                  maximum=atmosphere.MAX_ALTITUDE),
+        'initial_velocity': Field(NUMBER, required=True),
+        'decimation': Field(int, default=1, minimum=1),
+        'max_samples': Field(int, minimum=1),
+        'integrator': Field(str, default='euler',
+                            choices=ascent_model.INTEGRATORS),
+        'rtol': Field(NUMBER, default=ascent_model.DEFAULT_RTOL,
+                      positive=True),
+        'atol': Field(NUMBER, default=ascent_model.DEFAULT_ATOL,
+                      positive=True),
+        'max_dt': Field(NUMBER, default=ascent_model.DEFAULT_MAX_DT,
+                        positive=True),
+    }, required=True),
+    'atmosphere': Block({
+        'model': Field(str, default='tabulated',
+                       choices=('tabulated', 'ambiance')),
+        'resolution_m': Field(NUMBER, default=atmosphere.DEFAULT_RESOLUTION,
+                              positive=True),
+        'temperature_noise_gain': Field(NUMBER, default=0.0, minimum=0),
+        'pressure_noise_gain': Field(NUMBER, default=0.0, minimum=0),
+        'density_noise_gain': Field(NUMBER, default=0.0, minimum=0),
+        'seed': Field(int, minimum=0),
+    }),
+    'descent': Block({
+        'parachute_cd': Field(NUMBER, required=True, positive=True),
+        'parachute_area_m2': Field(NUMBER, required=True, positive=True),
+        'ground_altitude_m': Field(NUMBER, minimum=atmosphere.MIN_ALTITUDE,
+                                   maximum=atmosphere.MAX_ALTITUDE),
+    }),
+    'wind': Block({
+        'file': Field(str, required=True),
+        'launch_latitude_deg': Field(NUMBER, required=True, minimum=-90,
+                                     maximum=90),
+        'launch_longitude_deg': Field(NUMBER, required=True, minimum=-180,
+                                      maximum=360),
+        'launch_time_s': Field(NUMBER, default=0.0),
+    }),
+    'monte_carlo': Block(open=True),
+    'tune': Block(open=True),
+}, required=True)
+
+
+def _join(path, key):
+    return f'{path}.{key}' if path else key
+
+
+def _type_names(types):
+    return ' or '.join('number' if t is float else t.__name__ for t in types
+                       if not (t is int and float in types))
+
+
+def _compile_field(field, path):
+    types = field.types
+    allow_bool = bool in types
+    type_names = _type_names(types)
+
+    def validate(value, errors):
+        if (not isinstance(value, types)
+                or isinstance(value, bool) and not allow_bool):
+            errors.append(f'{path}: expected {type_names}, not '
+                          f'{type(value).__name__} {value!r}')
+            return value
+        if field.choices is not None and value not in field.choices:
+            errors.append(f'{path}: must be one of '
+                          f'{", ".join(map(str, field.choices))}, not '
+                          f'{value!r}')
+        if field.minimum is not None and value < field.minimum:
+            errors.append(f'{path}: must be at least {field.minimum}, not '
+                          f'{value!r}')
+        if field.maximum is not None and value > field.maximum:
+            errors.append(f'{path}: must be at most {field.maximum}, not '
+                          f'{value!r}')
+        if field.positive and value <= 0:
+            errors.append(f'{path}: must be positive, not {value!r}')
+        return value
+    return validate
+
+
+def _compile_block(block, path):
+    fields = {key: _compile(spec, _join(path, key))
+              for key, spec in block.fields.items()}
+    required = tuple(key for key, spec in block.fields.items()
+                     if spec.required)
+    defaults = tuple((key, spec.default) for key, spec in block.fields.items()
+                     if isinstance(spec, Field) and spec.default is not None)
+    known = tuple(fields)
+    name = path or 'config'
+
+    def validate(value, errors):
+        if not isinstance(value, dict):
+            errors.append(f'{name}: must be an object, not '
+                          f'{type(value).__name__}')
+            return value
+        if block.open:
+            return dict(value)
+        for key in required:
+            if key not in value:
+                errors.append(f'{_join(path, key)}: required field is missing')
+        resolved = {}
+        for key, item in value.items():
+            check = fields.get(key)
+            if check is None:
+                message = f'{_join(path, key)}: unknown field'
+                close = difflib.get_close_matches(
+                    str(key), [k for k in known if k not in value], n=1)
+                if close:
+                    message += f', did you mean "{close[0]}"?'
+                errors.append(message)
+                continue
+            resolved[key] = check(item, errors)
+        for key, default in defaults:
+            resolved.setdefault(key, default)
+        return resolved
+    return validate
+
+
+def _compile(spec, path=''):
+    if isinstance(spec, Block):
+        return _compile_block(spec, path)
+    return _compile_field(spec, path)
+
+
+@functools.lru_cache(maxsize=None)
+def compiled():
+    ''' `SCHEMA` compiled into a function `validate(sim_config, errors)`
+    that returns the config with defaults resolved and appends a message to
+    the `errors` list for every problem it finds. Compiled on the first call.
+    '''
+    return _compile(SCHEMA)
+
+
+def check(sim_config):
+    ''' Check a simulation config against `SCHEMA`.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+
+    Returns:
+        list: Error messages, empty if the config is valid.
+    '''
+    errors = []
+    compiled()(sim_config, errors)
+    return errors
+
+
+def resolve(sim_config):
+    ''' Check a simulation config against `SCHEMA` and fill in defaults.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters. It is
+            not modified.
+
+    Returns:
+        dict: A copy of the config with the defaults of missing optional
+        fields of its blocks.
+
+    Raises:
+        ValueError: If the config is invalid, with every error in the
+            message.
+    '''
+    errors = []
+    resolved = compiled()(sim_config, errors)
+    if errors:
+        raise ValueError('Invalid simulation config:\n  '
+                         + '\n  '.join(errors))
+    return resolved
@@ -0,0 +1,334 @@
+''' Trajectory output sinks.
+
+This module defines writers that store a simulation trajectory on disk one
+chunk at a time, so that results can be streamed from `ascent_model.iter_run`
+at constant memory.
+
+| Sink | Extension | Description |
+| ---- | --------- | ----------- |
+| `CsvSink` | `.csv` | Comma separated text, one row per sample |
+| `NpySink` | `.npy` | NumPy array of shape `(N, 4)`, appended to as chunks arrive |
+| `NpzSink` | `.npz` | NumPy archive with one array per field |
+| `MemmapSink` | `.npy` | Memory-mapped `.npy` file with a fixed number of records |
+| `TrajectorySink` | `.traj` | Binary columnar trajectory file, see `trajectory_io` |
+
+Every sink writes the fields of `Trajectory.FIELDS` in order. The `.npy`
+files written by `NpySink` and `MemmapSink` can be read with `numpy.load`,
+including with `mmap_mode='r'`.
+
+`CsvSink` and `NpySink` write samples straight to the output file, so a
+simulation that was stopped can continue writing where it left off: save the
+sink's `position` with a checkpoint (see `hab_toolbox.checkpoint`) and
+reopen the file with that position. Samples written after the position are
+discarded.
+'''
+
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+import numpy as np
+
+from hab_toolbox import trajectory_io
+from hab_toolbox.trajectory import Trajectory
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+FIELDS = Trajectory.FIELDS
+NPY_MAGIC = b'\x93NUMPY\x01\x00'  # format version 1.0
+NPY_HEADER_SIZE = 128  # fixed so the header can be rewritten in place
+
+
+def write_npy_header(file, shape):
+    ''' Write a `.npy` header for a little-endian float64 array.
+
+    The header is padded to `NPY_HEADER_SIZE` bytes regardless of `shape` so
+    that it can be overwritten with the final shape once all data is written.
+
+    Args:
+        file (file): Binary file object positioned at the start of the file.
+        shape (tuple): Shape of the array.
+    '''
+    header = "{'descr': '<f8', 'fortran_order': False, 'shape': %r, }" % (
+        tuple(shape),)
+    header = header.ljust(NPY_HEADER_SIZE - len(NPY_MAGIC) - 3) + '\n'
+    file.write(NPY_MAGIC + struct.pack('<H', len(header))
+               + header.encode('latin1'))
+
+
+class Sink():
+    ''' Base class of trajectory sinks.
+
+    Sinks are context managers that are closed on exit:
+    ``` python
+    with NpySink('out.npy') as sink:
+        for chunk in ascent_model.iter_run(sim_config):
+            sink.write(*chunk)
+    ```
+
+    | Property | Description |
+    | -------- | ----------- |
+    | `path` | Path of the output file |
+    | `count` | Number of samples written |
+    | `position` | Point in the output file to resume writing at |
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+
+    @property
+    def position(self):
+        ''' Number of samples written and the byte offset of their end in
+        the output file, after flushing them to the file.
+
+        Raises:
+            ValueError: If the sink cannot resume writing.
+        '''
+        raise ValueError('%s output cannot be resumed' % (
+            type(self).__name__))
+
+    def write(self, time, altitude, ascent_rate, ascent_accel):
+        ''' Append a chunk of samples, one array per field.
+        '''
+        raise NotImplementedError
+
+    def close(self):
+        ''' Finish writing the output file.
+        '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _reopen(path, position, mode):
+    # open an output file to continue writing at a saved position
+    file = open(path, mode)
+    file.truncate(position['offset'])
+    file.seek(position['offset'])
+    return file
+
+
+class CsvSink(Sink):
+    ''' Write samples as comma separated text with a commented header row.
+
+    Args:
+        path (string): Path of the output file.
+        fmt (string): Format of each value. Optional, defaults to `%.6f`.
+        position (dict): Continue writing an existing file at a `position`
+            of a previous sink. Optional, creates a new file by default.
+    '''
+    def __init__(self, path, fmt='%.6f', position=None):
+        super().__init__(path)
+        self.fmt = fmt
+        if position is None:
+            self._file = open(path, 'w')
+            self._file.write('# ' + ','.join(FIELDS) + '\n')
+        else:
+            self._file = _reopen(path, position, 'r+')
+            self.count = position['count']
+
+    @property
+    def position(self):
+        self._file.flush()
+        return {'count': self.count, 'offset': self._file.tell()}
+
+    def write(self, *columns):
+        np.savetxt(self._file, np.column_stack(columns), fmt=self.fmt,
+                   delimiter=',')
+        self.count += len(columns[0])
+
+    def close(self):
+        self._file.close()
+
+
+class NpySink(Sink):
+    ''' Write samples to a `.npy` file of shape `(N, 4)` by appending rows.
+
+    The header is written with a placeholder shape and updated on `close`.
+
+    Args:
+        path (string): Path of the output file.
+        position (dict): Continue writing an existing file at a `position`
+            of a previous sink. Optional, creates a new file by default.
+    '''
+    def __init__(self, path, position=None):
+        super().__init__(path)
+        if position is None:
+            self._file = open(path, 'wb')
+            write_npy_header(self._file, (0, len(FIELDS)))
+        else:
+            self._file = _reopen(path, position, 'r+b')
+            self.count = position['count']
+
+    @property
+    def position(self):
+        self._file.flush()
+        return {'count': self.count, 'offset': self._file.tell()}
+
+    def write(self, *columns):
+        rows = np.column_stack(columns).astype('<f8', copy=False)
+        self._file.write(rows.tobytes())
+        self.count += len(rows)
+
+    def close(self):
+        self._file.seek(0)
+        write_npy_header(self._file, (self.count, len(FIELDS)))
+        self._file.close()
+
+
+class NpzSink(Sink):
+    ''' Write samples to an uncompressed `.npz` archive with one array per
+    field.
+
+    Each field is appended to a temporary `.npy` file, and the files are
+    copied into the archive on `close`.
+
+    Args:
+        path (string): Path of the output file.
+    '''
+    def __init__(self, path):
+        super().__init__(path)
+        self._tempdir = tempfile.mkdtemp(
+            dir=os.path.dirname(os.path.abspath(path)))
+        self._files = [open(os.path.join(self._tempdir, f'{field}.npy'), 'wb')
+                       for field in FIELDS]
+        for file in self._files:
+            write_npy_header(file, (0,))
+
+    def write(self, *columns):
+        for file, column in zip(self._files, columns):
+            file.write(np.asarray(column, dtype='<f8').tobytes())
+        self.count += len(columns[0])
+
+    def close(self):
+        try:
+            with zipfile.ZipFile(self.path, 'w', allowZip64=True) as archive:
+                for field, file in zip(FIELDS, self._files):
+                    file.seek(0)
+                    write_npy_header(file, (self.count,))
+                    file.close()
+                    archive.write(file.name, arcname=f'{field}.npy')
+        finally:
+            shutil.rmtree(self._tempdir)
+
+
+class MemmapSink(Sink):
+    ''' Write samples into a preallocated, memory-mapped `.npy` file of
+    fixed-size records.
+
+    Room for `capacity` records of `(time, altitude, ascent_rate,
+    ascent_accel)` is allocated up front. On `close` the file is truncated to
+    the records that were written.
+
+    Args:
+        path (string): Path of the output file.
+        capacity (int): Maximum number of samples.
+    '''
+    def __init__(self, path, capacity):
+        super().__init__(path)
+        self.capacity = int(capacity)
+        with open(path, 'wb') as file:
+            write_npy_header(file, (self.capacity, len(FIELDS)))
+            file.truncate(NPY_HEADER_SIZE + self.capacity * len(FIELDS) * 8)
+        self._records = np.memmap(path, dtype='<f8', mode='r+',
+                                  offset=NPY_HEADER_SIZE,
+                                  shape=(self.capacity, len(FIELDS)))
+
+    def write(self, *columns):
+        n = len(columns[0])
+        if self.count + n > self.capacity:
+            raise IndexError('Memory-mapped file is full (%s samples)' % (
+                self.capacity))
+        for j, column in enumerate(columns):
+            self._records[self.count:self.count + n, j] = column
+        self.count += n
+
+    def close(self):
+        self._records.flush()
+        del self._records
+        with open(self.path, 'r+b') as file:
+            write_npy_header(file, (self.count, len(FIELDS)))
+            file.truncate(NPY_HEADER_SIZE + self.count * len(FIELDS) * 8)
+
+
+class TrajectorySink(Sink):
+    ''' Write samples to a binary columnar trajectory file (`.traj`).
+
+    Each column is appended to a temporary file, and the header and columns
+    are copied into the trajectory file on `close`.
+
+    Args:
+        path (string): Path of the output file.
+        dtype (string): NumPy type of every column. Optional, defaults to
+            little-endian float64.
+        metadata (dict): Free-form information about the simulation, stored
+            in the header. Optional.
+    '''
+    def __init__(self, path, dtype='<f8', metadata=None):
+        super().__init__(path)
+        if dtype not in trajectory_io.DTYPES:
+            raise ValueError('Column type must be one of %s, not "%s"' % (
+                trajectory_io.DTYPES, dtype))
+        self.dtype = dtype
+        self.metadata = metadata
+        self._tempdir = tempfile.mkdtemp(
+            dir=os.path.dirname(os.path.abspath(path)))
+        self._files = [open(os.path.join(self._tempdir, field), 'w+b')
+                       for field in FIELDS]
+
+    def write(self, *columns):
+        for file, column in zip(self._files, columns):
+            file.write(np.asarray(column, dtype=self.dtype).tobytes())
+        self.count += len(columns[0])
+
+    def close(self):
+        try:
+            with open(self.path, 'wb') as output:
+                trajectory_io.write_header(output, self.count,
+                                           dtype=self.dtype,
+                                           metadata=self.metadata)
+                for file in self._files:
+                    file.seek(0)
+                    shutil.copyfileobj(file, output)
+                    file.close()
+        finally:
+            shutil.rmtree(self._tempdir)
+
+
+def open_sink(path, dtype='<f8', metadata=None, position=None):
+    ''' Open a sink for an output file based on its extension.
+
+    Args:
+        path (string): Path of the output file. Files ending in `.traj` are
+            written as trajectory files, files ending in `.npy` or `.npz` as
+            NumPy arrays. Any other extension is replaced by `.csv`.
+        dtype (string): NumPy type of the columns of a trajectory file.
+            Ignored for other formats. Optional, defaults to little-endian
+            float64.
+        metadata (dict): Free-form information about the simulation, stored
+            in the header of a trajectory file. Ignored for other formats.
+            Optional.
+        position (dict): Continue writing an existing file at the
+            `position` of a previous sink. Only `.npy` and CSV files can be
+            resumed. Optional, creates a new file by default.
+
+    Returns:
+        Sink: An open sink.
+    '''
+    root, extension = os.path.splitext(path)
+    if position is not None and extension in ('.traj', '.npz'):
+        raise ValueError('Only .npy and CSV output can be resumed, not "%s"'
+                         % path)
+    if extension == '.traj':
+        return TrajectorySink(path, dtype=dtype, metadata=metadata)
+    elif extension == '.npy':
+        return NpySink(path, position=position)
+    elif extension == '.npz':
+        return NpzSink(path)
+    return CsvSink(f'{root}.csv', position=position)
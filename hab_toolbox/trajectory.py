@@ -0,0 +1,260 @@
+''' Trajectory records.
+
+This module defines a preallocated, struct-of-arrays record for storing
+simulation results one time step at a time without growing arrays in the
+simulation loop.
+'''
+
+import logging
+import math
+import numpy as np
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+
+class Trajectory():
+    ''' Preallocated struct-of-arrays record of simulation states.
+
+    Each field in `FIELDS` is stored as its own contiguous array with room for
+    `capacity` samples. Samples are written in place with `append` and the
+    record is trimmed to the samples that were actually written with `trim`.
+
+    Two bounded-memory modes are supported so that long simulations can run
+    at constant memory:
+
+    - `decimation`: Only keep every Nth sample offered to `append`.
+    - `ring_buffer`: When the record is full, overwrite the oldest sample
+        instead of raising an error. Only the most recent `capacity` samples
+        are kept.
+
+    For simulations where the number of samples is not known ahead of time,
+    set `growable` to double the capacity whenever the record is full.
+
+    Args:
+        capacity (int): Maximum number of samples to store.
+        decimation (int): Keep every Nth sample. Optional, defaults to `1`
+            (keep every sample).
+        ring_buffer (bool): Overwrite the oldest samples when the record is
+            full. Optional, defaults to `False`.
+        growable (bool): Grow the record when it is full. Ignored if
+            `ring_buffer` is set. Optional, defaults to `False`.
+    '''
+    FIELDS = ('time', 'altitude', 'ascent_rate', 'ascent_accel')
+
+    def __init__(self, capacity, decimation=1, ring_buffer=False,
+                 growable=False):
+        if capacity < 0:
+            raise ValueError('Capacity cannot be negative! (%s)' % capacity)
+        if decimation < 1:
+            raise ValueError('Decimation must be at least 1, not %s' % (
+                decimation))
+        self.capacity = int(capacity)
+        self.decimation = int(decimation)
+        self.ring_buffer = ring_buffer
+        self.growable = growable and not ring_buffer
+        self.count = 0  # number of samples offered to append
+        self.size = 0  # number of samples stored
+        self._head = 0  # index of the next sample to write
+        self._columns = [np.empty(self.capacity) for _ in self.FIELDS]
+
+    @classmethod
+    def from_config(cls, n_steps, sim_config, growable=False):
+        ''' Size a `Trajectory` for a simulation of `n_steps` time steps.
+
+        Bounded-memory modes are set by optional keys in the `simulation`
+        block of `sim_config`:
+
+        - `decimation`: Keep every Nth sample.
+        - `max_samples`: Keep only the most recent `max_samples` samples.
+
+        Args:
+            n_steps (int): Maximum number of time steps in the simulation.
+                If `growable` is set, an estimate of the number of steps.
+            sim_config (dict): Dictionary of simulation config parameters.
+            growable (bool): Grow the record when it is full. Optional,
+                defaults to `False`.
+
+        Returns:
+            Trajectory: An empty record with enough room for the simulation.
+        '''
+        decimation = sim_config['simulation'].get('decimation', 1)
+        max_samples = sim_config['simulation'].get('max_samples')
+        capacity = math.ceil(n_steps / decimation)
+        if max_samples is not None and max_samples < capacity:
+            return cls(max_samples, decimation=decimation, ring_buffer=True)
+        return cls(capacity, decimation=decimation, growable=growable)
+
+    def __len__(self):
+        return self.size
+
+    def append(self, *values, keep=False):
+        ''' Record one sample, one value for each of `FIELDS`.
+
+        Samples that are skipped by `decimation` are counted but not stored,
+        unless `keep` is set.
+
+        Raises:
+            IndexError: If the record is full and neither `ring_buffer` nor
+                `growable` is set.
+        '''
+        count = self.count
+        self.count = count + 1
+        if count % self.decimation and not keep:
+            return
+        i = self._head
+        if i >= self.capacity and self.growable:
+            self._grow()
+        elif i >= self.capacity:
+            if not self.ring_buffer or self.capacity == 0:
+                raise IndexError(
+                    'Trajectory is full (%s samples)' % self.capacity)
+            i = 0
+        for column, value in zip(self._columns, values):
+            column[i] = value
+        self._head = i + 1
+        if self.size < self.capacity:
+            self.size += 1
+
+    def extend(self, *columns):
+        ''' Record many samples at once, one array for each of `FIELDS`.
+
+        Same as calling `append` for each sample in order.
+
+        Raises:
+            IndexError: If the samples do not fit and neither `ring_buffer`
+                nor `growable` is set. No samples are stored in that case.
+        '''
+        first = -self.count % self.decimation
+        self.count += len(columns[0])
+        columns = [column[first::self.decimation] for column in columns]
+        n = len(columns[0])
+        if n == 0:
+            return
+        if self._head + n > self.capacity and self.growable:
+            while self._head + n > self.capacity:
+                self._grow()
+        elif self._head + n > self.capacity and (
+                not self.ring_buffer or self.capacity == 0):
+            raise IndexError(
+                'Trajectory is full (%s samples)' % self.capacity)
+        if n > self.capacity:
+            # only the most recent samples fit in the ring buffer
+            columns = [column[n - self.capacity:] for column in columns]
+            self._head = self.capacity
+            n = self.capacity
+        start = 0
+        while start < n:
+            i = 0 if self._head >= self.capacity else self._head
+            size = min(n - start, self.capacity - i)
+            for column, values in zip(self._columns, columns):
+                column[i:i+size] = values[start:start+size]
+            self._head = i + size
+            start += size
+        self.size = min(self.size + n, self.capacity)
+
+    def configure_like(self, other):
+        ''' Empty the record and give it the capacity and bounded-memory modes
+        of another record, so that both store the same samples.
+
+        Args:
+            other (Trajectory): Record to copy the configuration of.
+        '''
+        self.capacity = other.capacity
+        self.decimation = other.decimation
+        self.ring_buffer = other.ring_buffer
+        self.growable = other.growable
+        self.count = 0
+        self.size = 0
+        self._head = 0
+        self._columns = [np.empty(self.capacity) for _ in self.FIELDS]
+
+    def clear(self):
+        ''' Discard the stored samples and reuse the record from the start.
+
+        `count` is kept so that `decimation` continues where it left off.
+        '''
+        self.size = 0
+        self._head = 0
+
+    def _grow(self):
+        # double the capacity so that appending stays amortized O(1)
+        capacity = max(2 * self.capacity, 1)
+        for j, column in enumerate(self._columns):
+            grown = np.empty(capacity)
+            grown[:self.size] = column[:self.size]
+            self._columns[j] = grown
+        self.capacity = capacity
+
+    def trim(self):
+        ''' Return the stored samples in chronological order.
+
+        Returns:
+            tuple: One array per field in `FIELDS`, each with one entry per
+            stored sample. Arrays are views into the record unless the ring
+            buffer has wrapped around.
+        '''
+        return tuple(self._trim_column(column) for column in self._columns)
+
+    def _trim_column(self, column):
+        if self.size < self.capacity or self._head == self.capacity:
+            return column[:self.size]
+        # ring buffer wrapped, the oldest sample is at the write index
+        return np.roll(column, -self._head)
+
+    def __getattr__(self, name):
+        # expose each column by name, trimmed to the stored samples
+        if name in type(self).FIELDS:
+            return self._trim_column(self._columns[self.FIELDS.index(name)])
+        raise AttributeError(name)
+
+
+class FlightTrajectory(Trajectory):
+    ''' Preallocated record of a full flight, see `ascent_model.run_flight`.
+
+    The same fields as `Trajectory`, and a phase marker for each sample.
+
+    | Field | Description |
+    | ----- | ----------- |
+    | `time` | Time index of each sample (s) |
+    | `altitude` | Altitude of each sample (m) |
+    | `ascent_rate` | Ascent rate of each sample (m/s), negative while descending |
+    | `ascent_accel` | Ascent acceleration of each sample (m/s^2) |
+    | `phase` | Index of the flight phase of each sample in `ascent_model.FLIGHT_PHASES` |
+    '''
+    FIELDS = Trajectory.FIELDS + ('phase',)
+
+
+class Telemetry(Trajectory):
+    ''' Preallocated record of the forces acting on the balloon and payload.
+
+    Pass a `Telemetry` to `ascent_model.run` to record one row of forces
+    (positive up) and masses for each stored trajectory sample. The record is
+    resized to match the trajectory before the simulation starts.
+
+    | Field | Description |
+    | ----- | ----------- |
+    | `time` | Time index of each sample (s) |
+    | `weight` | Weight force (N) |
+    | `buoyancy` | Buoyancy force (N) |
+    | `drag` | Drag force (N) |
+    | `net_force` | Sum of all forces (N) |
+    | `lift_gas_mass` | Mass of lift gas in the balloon (kg) |
+    | `ballast_mass` | Mass of ballast on the payload (kg) |
+
+    Args:
+        capacity (int): Maximum number of samples to store. Optional,
+            defaults to `0`.
+        decimation (int): Keep every Nth sample. Optional, defaults to `1`.
+        ring_buffer (bool): Overwrite the oldest samples when the record is
+            full. Optional, defaults to `False`.
+        growable (bool): Grow the record when it is full. Optional, defaults
+            to `True`.
+    '''
+    FIELDS = ('time', 'weight', 'buoyancy', 'drag', 'net_force',
+              'lift_gas_mass', 'ballast_mass')
+
+    def __init__(self, capacity=0, decimation=1, ring_buffer=False,
+                 growable=True):
+        super().__init__(capacity, decimation=decimation,
+                         ring_buffer=ring_buffer, growable=growable)
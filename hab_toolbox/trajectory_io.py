@@ -0,0 +1,168 @@
+''' Trajectory files.
+
+This module defines a compact binary format for simulation trajectories and
+readers for every format written by `hab_toolbox.sinks`.
+
+A trajectory file (`.traj`) is laid out as:
+
+| Bytes | Content |
+| ----- | ------- |
+| 8 | Magic string `HABTRAJ\n` |
+| 4 | Length of the header in bytes, little-endian unsigned integer |
+| header length | UTF-8 JSON header, padded with spaces to a multiple of `ALIGNMENT` |
+| `count` * item size per field | One contiguous column per field |
+
+The JSON header describes the columns:
+``` json
+{
+    "version": (int) Format version,
+    "fields": (list) Name of each column, in order,
+    "dtype": (string) NumPy type of every column. [<f8, <f4],
+    "count": (int) Number of samples in each column,
+    "metadata": (dict) Free-form information about the simulation
+}
+```
+
+Columns are read with `np.memmap` without copying, so opening a trajectory
+takes the same time regardless of its length.
+'''
+
+import json
+import logging
+import os
+import struct
+import numpy as np
+
+from hab_toolbox.trajectory import Trajectory
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+MAGIC = b'HABTRAJ\n'
+VERSION = 1
+ALIGNMENT = 64  # columns start on a multiple of this many bytes
+DTYPES = ('<f8', '<f4')
+
+
+def write_header(file, count, dtype='<f8', fields=Trajectory.FIELDS,
+                 metadata=None):
+    ''' Write the magic string and JSON header of a trajectory file.
+
+    Args:
+        file (file): Binary file object positioned at the start of the file.
+        count (int): Number of samples in each column.
+        dtype (string): NumPy type of every column. Optional, defaults to
+            little-endian float64.
+        fields (tuple): Name of each column. Optional, defaults to
+            `Trajectory.FIELDS`.
+        metadata (dict): Free-form information about the simulation.
+            Optional.
+
+    Returns:
+        int: Offset of the first column in bytes.
+    '''
+    if dtype not in DTYPES:
+        raise ValueError('Column type must be one of %s, not "%s"' % (
+            DTYPES, dtype))
+    header = json.dumps({
+        'version': VERSION,
+        'fields': list(fields),
+        'dtype': dtype,
+        'count': int(count),
+        'metadata': metadata or {},
+    }).encode('utf-8')
+    prefix = len(MAGIC) + 4
+    offset = -(-(prefix + len(header)) // ALIGNMENT) * ALIGNMENT
+    header = header.ljust(offset - prefix)
+    file.write(MAGIC + struct.pack('<I', len(header)) + header)
+    return offset
+
+
+def read_header(path):
+    ''' Read the JSON header of a trajectory file.
+
+    Args:
+        path (string): Path of the trajectory file.
+
+    Returns:
+        dict: The header, with the `offset` of the first column added.
+    '''
+    with open(path, 'rb') as file:
+        magic = file.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError('%s is not a trajectory file' % path)
+        length, = struct.unpack('<I', file.read(4))
+        header = json.loads(file.read(length).decode('utf-8'))
+    if header['version'] > VERSION:
+        raise ValueError('Trajectory file version %s is not supported' % (
+            header['version']))
+    header['offset'] = len(MAGIC) + 4 + length
+    return header
+
+
+def save(path, columns, dtype='<f8', metadata=None):
+    ''' Write trajectory columns to a trajectory file.
+
+    Args:
+        path (string): Path of the trajectory file.
+        columns (tuple): One array per field in `Trajectory.FIELDS`, like the
+            arrays returned by `ascent_model.run`.
+        dtype (string): NumPy type of every column. Optional, defaults to
+            little-endian float64.
+        metadata (dict): Free-form information about the simulation.
+            Optional.
+    '''
+    count = len(columns[0])
+    with open(path, 'wb') as file:
+        write_header(file, count, dtype=dtype, metadata=metadata)
+        for column in columns:
+            file.write(np.asarray(column, dtype=dtype).tobytes())
+
+
+def load(path, mode='r'):
+    ''' Open the columns of a trajectory file as memory-mapped arrays.
+
+    Args:
+        path (string): Path of the trajectory file.
+        mode (string): `np.memmap` file mode. Optional, defaults to
+            read-only.
+
+    Returns:
+        tuple: One array per field listed in the header. For files written
+        by this package, the fields of `Trajectory.FIELDS`.
+    '''
+    header = read_header(path)
+    count = header['count']
+    if count == 0:
+        return tuple(np.empty(0, dtype=header['dtype'])
+                     for _ in header['fields'])
+    data = np.memmap(path, dtype=header['dtype'], mode=mode,
+                     offset=header['offset'],
+                     shape=(len(header['fields']), count))
+    return tuple(data[j] for j in range(len(header['fields'])))
+
+
+def read(path):
+    ''' Read a trajectory saved in any format written by `hab_toolbox.sinks`.
+
+    Trajectory files and `.npy` files are memory-mapped, `.npz` archives are
+    loaded into memory, and any other file is parsed as CSV with `#` comment
+    lines.
+
+    Args:
+        path (string): Path of the file.
+
+    Returns:
+        tuple: `time`, `altitude`, `ascent_rate`, `ascent_accel` arrays.
+    '''
+    extension = os.path.splitext(path)[1]
+    if extension == '.traj':
+        return load(path)
+    elif extension == '.npy':
+        data = np.load(path, mmap_mode='r')
+        return tuple(data[:, j] for j in range(data.shape[1]))
+    elif extension == '.npz':
+        with np.load(path) as data:
+            return tuple(data[field] for field in Trajectory.FIELDS)
+    data = np.loadtxt(path, delimiter=',', comments='#', ndmin=2)
+    return tuple(data[:, j] for j in range(data.shape[1]))
@@ -0,0 +1,562 @@
+''' Altitude controller gain tuning.
+
+This module searches for gains of the altitude controller (see
+`hab_toolbox.controller`) that bring a simulated flight to its target
+altitude quickly, without overshooting it, and with little lift gas and
+ballast spent. It replaces the hand-edited `K_list` sweeps of
+`etc/Simulink/monte_carlo.m`.
+
+Every tuned gain is searched between a lower and an upper bound, on a
+logarithmic scale if both bounds are positive. The search runs in two passes:
+
+1. A Latin hypercube sample of the bounds gives a coarse picture of the cost.
+2. The best samples start Nelder-Mead searches, which are advanced in
+   lockstep so the candidates of every search are evaluated together.
+
+Candidates are simulated with `batch.run_batch` in chunks, on a pool of worker
+processes. Evaluated gains are cached, so a candidate that is proposed again
+is never simulated twice. Flights whose altitude strays further than
+`abort_error_m` from the target after reaching it are stopped early and
+penalized, as are flights that burst or leave the atmosphere model.
+
+The cost of a candidate is a weighted sum of:
+
+| Term | Description |
+| ---- | ----------- |
+| `settling_time` | Time after which the altitude stays within `settle_tolerance_m` of the target, as a fraction of the duration |
+| `overshoot` | Largest altitude above the target, as a fraction of `abort_error_m` |
+| `gas` | Lift gas bled, as a fraction of the bleed mass |
+| `ballast` | Ballast dropped, as a fraction of the ballast mass |
+
+Flights that stop early add `FAILURE_PENALTY` times one plus the fraction of
+the duration that was left.
+'''
+
+import concurrent.futures
+import copy
+import logging
+import os
+import numpy as np
+
+from hab_toolbox import batch
+from hab_toolbox.monte_carlo import set_config_value
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+GAINS = ('kp', 'ki', 'kd', 'n')
+TERMS = ('settling_time', 'overshoot', 'gas', 'ballast')
+FAILURE_PENALTY = 10.0
+METRIC_INTERVAL = 5.0  # [s] time between samples used for the metrics
+DEFAULT_SETTLE_TOLERANCE = 500.0  # [m]
+DEFAULT_ABORT_ERROR = 5000.0  # [m]
+DEFAULT_CHUNK_SIZE = 4  # candidates simulated in lockstep by each task
+
+# Nelder-Mead coefficients
+REFLECTION = 1.0
+EXPANSION = 2.0
+CONTRACTION = 0.5
+SHRINK = 0.5
+INITIAL_STEP = 0.1  # size of the initial simplex in the unit cube
+
+
+def latin_hypercube(n_samples, n_dims, rng):
+    ''' Latin hypercube sample of the unit cube.
+
+    Each dimension is split into `n_samples` equal strata and every stratum
+    holds exactly one sample.
+
+    Args:
+        n_samples (int): Number of samples.
+        n_dims (int): Number of dimensions.
+        rng (Generator): A `numpy.random.Generator` to draw samples from.
+
+    Returns:
+        array: `(n_samples, n_dims)` array of points in `[0, 1)`.
+    '''
+    strata = np.column_stack([rng.permutation(n_samples)
+                              for _ in range(n_dims)])
+    return (strata + rng.random((n_samples, n_dims))) / n_samples
+
+
+class SearchSpace():
+    ''' Maps points of the unit cube to controller gains.
+
+    Args:
+        bounds (dict): `[low, high]` bounds of each tuned gain. Gains with
+            positive bounds are searched on a logarithmic scale.
+    '''
+    def __init__(self, bounds):
+        unknown = set(bounds) - set(GAINS)
+        if unknown:
+            raise ValueError('Tuned gains must be in %s, not %s' % (
+                GAINS, sorted(unknown)))
+        if not bounds:
+            raise ValueError('At least one gain must be tuned')
+        self.names = [name for name in GAINS if name in bounds]
+        low, high = np.array([bounds[name] for name in self.names],
+                             dtype=float).T
+        if np.any(high <= low):
+            raise ValueError('Upper bounds must be above lower bounds, not '
+                             '%s' % bounds)
+        self.log_scale = low > 0
+        self.low = np.where(self.log_scale, np.log10(np.where(
+            self.log_scale, low, 1)), low)
+        self.high = np.where(self.log_scale, np.log10(np.where(
+            self.log_scale, high, 1)), high)
+
+    def __len__(self):
+        return len(self.names)
+
+    def gains(self, point):
+        ''' Gains at a point of the unit cube.
+
+        Returns:
+            dict: Value of each tuned gain.
+        '''
+        values = self.low + np.clip(point, 0, 1) * (self.high - self.low)
+        values = np.where(self.log_scale, 10 ** values, values)
+        # rounded so that nearly identical candidates share a cache entry
+        return {name: float('%.10g' % value)
+                for name, value in zip(self.names, values)}
+
+
+class NelderMead():
+    ''' Nelder-Mead simplex search in the unit cube.
+
+    The search is driven from outside: `propose` returns the points to
+    evaluate next and `tell` passes their costs back. Each iteration proposes
+    the reflected, expanded and both contracted points at once so that they
+    can be evaluated together, and the simplex is shrunk in the following
+    iteration if none of them is good enough.
+
+    Args:
+        start (array): First vertex of the initial simplex.
+    '''
+    def __init__(self, start):
+        start = np.clip(np.asarray(start, dtype=float), 0, 1)
+        simplex = [start]
+        for i in range(len(start)):
+            vertex = start.copy()
+            # step into the cube from the upper boundary
+            vertex[i] += INITIAL_STEP if start[i] + INITIAL_STEP <= 1 else (
+                -INITIAL_STEP)
+            simplex.append(vertex)
+        self.simplex = np.array(simplex)
+        self.costs = None
+        self.iterations = 0
+        self._pending = self.simplex  # the initial simplex is not evaluated
+        self._step = None
+
+    @property
+    def best(self):
+        ''' Best vertex and its cost.
+        '''
+        return self.simplex[0], self.costs[0]
+
+    def propose(self):
+        ''' Points to evaluate next.
+
+        Returns:
+            array: `(M, n_dims)` array of points.
+        '''
+        if self._pending is None:
+            centroid = self.simplex[:-1].mean(axis=0)
+            worst = self.simplex[-1]
+            self._pending = np.clip(np.array([
+                centroid + REFLECTION * (centroid - worst),
+                centroid + EXPANSION * REFLECTION * (centroid - worst),
+                centroid + CONTRACTION * REFLECTION * (centroid - worst),
+                centroid - CONTRACTION * (centroid - worst),
+            ]), 0, 1)
+            self._step = 'reflect'
+        return self._pending
+
+    def tell(self, costs):
+        ''' Update the simplex with the costs of the proposed points.
+
+        Args:
+            costs (array): Cost of each point returned by `propose`.
+        '''
+        points, self._pending = self._pending, None
+        costs = np.asarray(costs, dtype=float)
+        if self.costs is None or self._step == 'shrink':
+            if self.costs is None:
+                self.simplex, self.costs = points, costs
+            else:
+                self.simplex[1:], self.costs[1:] = points, costs
+            self._sort()
+            self._step = None
+            return
+        self.iterations += 1
+        f_reflect, f_expand, f_outside, f_inside = costs
+        if f_reflect < self.costs[0]:
+            i = 1 if f_expand < f_reflect else 0
+        elif f_reflect < self.costs[-2]:
+            i = 0
+        elif f_reflect < self.costs[-1] and f_outside <= f_reflect:
+            i = 2
+        elif f_reflect >= self.costs[-1] and f_inside < self.costs[-1]:
+            i = 3
+        else:
+            best = self.simplex[0]
+            self._pending = best + SHRINK * (self.simplex[1:] - best)
+            self._step = 'shrink'
+            return
+        self.simplex[-1], self.costs[-1] = points[i], costs[i]
+        self._sort()
+
+    def _sort(self):
+        order = np.argsort(self.costs, kind='stable')
+        self.simplex, self.costs = self.simplex[order], self.costs[order]
+
+
+def flight_metrics(result, i, target, tolerance, duration):
+    ''' Metrics of one member of a batch run with recorded trajectories.
+
+    Returns:
+        dict: Settling time (s), overshoot (m) and the final time (s) of the
+        member, and whether it stopped early.
+    '''
+    t, h = result.member(i)[:2]
+    error = np.abs(h - target)
+    stopped = bool(result.burst[i] or result.out_of_bounds[i]
+                   or result.aborted[i])
+    outside = np.flatnonzero(error > tolerance)
+    if stopped or len(t) == 0 or (len(outside) and outside[-1] == len(t) - 1):
+        settling_time = duration
+    elif len(outside):
+        settling_time = float(t[outside[-1] + 1])
+    else:
+        settling_time = 0.0
+    return {
+        'settling_time': settling_time,
+        'overshoot': max(0.0, float(np.max(h, initial=target)) - target),
+        'final_time': float(result.final_time[i]),
+        'stopped': stopped,
+    }
+
+
+def _run_chunk(configs, settle_tolerance, abort_error, seed, cache=None):
+    ''' Simulate one chunk of candidates. Executed by the worker processes.
+    Returns the metrics of the candidates and the counts added to the
+    `cache`, see `monte_carlo._run_chunk`.
+    '''
+    dt = configs[0]['simulation']['dt']
+    decimation = max(1, round(METRIC_INTERVAL / dt))
+    counts = None if cache is None else cache.counts()
+    result = batch.run_batch(configs, decimation=decimation,
+                             rng=np.random.default_rng(seed),
+                             abort_error=abort_error, cache=cache)
+    if cache is not None:
+        counts = [new - old for new, old in zip(cache.counts(), counts)]
+    metrics = []
+    for i, sim_config in enumerate(configs):
+        metric = flight_metrics(result, i,
+                                sim_config['pid']['target_altitude_m'],
+                                settle_tolerance,
+                                sim_config['simulation']['duration'])
+        metric['gas_used'] = (sim_config['balloon']['reserve_mass_kg']
+                              + sim_config['balloon']['bleed_mass_kg']
+                              - float(result.final_gas_mass[i]))
+        metric['ballast_used'] = (sim_config['payload']['ballast_mass_kg']
+                                  - float(result.final_ballast_mass[i]))
+        metrics.append(metric)
+    return metrics, counts
+
+
+class Evaluator():
+    ''' Scores candidate gains by simulating them, with a cache of every
+    candidate evaluated so far.
+
+    Use as a context manager to keep a pool of worker processes open between
+    evaluations.
+
+    Args:
+        base_config (dict): Simulation config with an altitude controller.
+        space (SearchSpace): Tuned gains and their bounds.
+        settle_tolerance (float): Largest altitude error of a settled
+            flight (m).
+        abort_error (float): Largest altitude error after reaching the
+            target before a flight is stopped (m).
+        weights (dict): Weight of each cost term in `TERMS`. Optional,
+            defaults to `1` for every term.
+        workers (int): Number of worker processes. Optional, defaults to the
+            number of CPUs. Runs in the current process if `1`.
+        chunk_size (int): Number of candidates simulated in lockstep by each
+            task. Optional, defaults to `DEFAULT_CHUNK_SIZE`.
+        seed (SeedSequence): Seed for atmosphere noise. Every chunk uses the
+            same noise stream, so results do not depend on the number of
+            workers. Optional, defaults to fresh entropy for every chunk.
+        result_cache (ResultCache): On-disk cache of simulated flights, see
+            `batch.run_batch`. Unlike `cache`, it is kept between tuning
+            runs. Optional.
+    '''
+    def __init__(self, base_config, space, settle_tolerance, abort_error,
+                 weights=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 seed=None, result_cache=None):
+        self.base_config = base_config
+        self.space = space
+        self.settle_tolerance = settle_tolerance
+        self.abort_error = abort_error
+        self.weights = {term: 1.0 for term in TERMS}
+        self.weights.update(weights or {})
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.cache = {}
+        self.hits = 0
+        self.result_cache = result_cache
+        self._executor = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self.workers)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def config(self, gains):
+        ''' Copy of the base config with the given gains.
+        '''
+        sim_config = copy.deepcopy(self.base_config)
+        for name, value in gains.items():
+            set_config_value(sim_config, f'pid.gains.{name}', value)
+        return sim_config
+
+    def cost(self, metrics):
+        ''' Weighted cost of the metrics of a flight.
+        '''
+        sim_config = self.base_config
+        duration = sim_config['simulation']['duration']
+        terms = {
+            'settling_time': metrics['settling_time'] / duration,
+            'overshoot': metrics['overshoot'] / self.abort_error,
+            'gas': _fraction(metrics['gas_used'],
+                             sim_config['balloon']['bleed_mass_kg']),
+            'ballast': _fraction(metrics['ballast_used'],
+                                 sim_config['payload']['ballast_mass_kg']),
+        }
+        cost = sum(self.weights[term] * terms[term] for term in TERMS)
+        if metrics['stopped']:
+            cost += FAILURE_PENALTY * (
+                2 - metrics['final_time'] / duration)
+        return cost
+
+    def __call__(self, points):
+        ''' Cost of each point of the unit cube.
+
+        Args:
+            points (array): `(M, n_dims)` array of points.
+
+        Returns:
+            array: Cost of each point.
+        '''
+        keys = [tuple(self.space.gains(point).items()) for point in points]
+        missing = list(dict.fromkeys(key for key in keys
+                                     if key not in self.cache))
+        self.hits += len(keys) - len(missing)
+        chunks = [missing[i:i+self.chunk_size]
+                  for i in range(0, len(missing), self.chunk_size)]
+        tasks = [([self.config(dict(key)) for key in chunk],
+                  self.settle_tolerance, self.abort_error, self.seed,
+                  self.result_cache)
+                 for chunk in chunks]
+        if self._executor is None:
+            outcomes = [_run_chunk(*task)[0] for task in tasks]
+        else:
+            futures = [self._executor.submit(_run_chunk, *task)
+                       for task in tasks]
+            outcomes = []
+            for future in futures:
+                metrics, counts = future.result()
+                outcomes.append(metrics)
+                if self.result_cache is not None:
+                    self.result_cache.add_counts(*counts)
+        for chunk, metrics in zip(chunks, outcomes):
+            for key, metric in zip(chunk, metrics):
+                metric['cost'] = self.cost(metric)
+                self.cache[key] = metric
+        return np.array([self.cache[key]['cost'] for key in keys])
+
+
+def _fraction(used, available):
+    return used / available if available > 0 else 0.0
+
+
+class TuningResult():
+    ''' Outcome of a tuning session.
+
+    | Property | Description |
+    | -------- | ----------- |
+    | `gains` | Best gains found |
+    | `cost` | Cost of the best gains |
+    | `metrics` | Flight metrics of the best gains |
+    | `evaluations` | Metrics of every candidate evaluated, keyed by its gains |
+    | `cache_hits` | Number of candidates that were proposed again |
+    | `iterations` | Number of Nelder-Mead iterations of each search |
+    '''
+    def __init__(self, gains, cost, metrics, evaluations, cache_hits,
+                 iterations):
+        self.gains = gains
+        self.cost = cost
+        self.metrics = metrics
+        self.evaluations = evaluations
+        self.cache_hits = cache_hits
+        self.iterations = iterations
+
+    def summary(self):
+        ''' Best gains, their cost and metrics, and evaluation counts.
+        '''
+        return {
+            'gains': self.gains,
+            'cost': self.cost,
+            'metrics': self.metrics,
+            'evaluations': len(self.evaluations),
+            'cache_hits': self.cache_hits,
+            'iterations': self.iterations,
+        }
+
+
+def run_tuning(base_config, bounds, samples=32, starts=4, iterations=30,
+               seed=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+               settle_tolerance=DEFAULT_SETTLE_TOLERANCE,
+               abort_error=DEFAULT_ABORT_ERROR, weights=None, tolerance=1e-3,
+               cache=None):
+    ''' Search for the altitude controller gains with the lowest cost.
+
+    Args:
+        base_config (dict): Simulation config with an altitude controller
+            (see `ascent_model.run`). Gains that are not tuned keep their
+            value from this config.
+        bounds (dict): `[low, high]` bounds of each tuned gain in `GAINS`.
+        samples (int): Number of Latin hypercube samples. Optional, defaults
+            to `32`.
+        starts (int): Number of Nelder-Mead searches, started from the best
+            samples. Optional, defaults to `4`.
+        iterations (int): Largest number of iterations of each search.
+            Optional, defaults to `30`.
+        seed (int): Seed for sampling and atmosphere noise. Optional,
+            defaults to fresh entropy from the operating system.
+        workers (int): Number of worker processes. Optional, defaults to the
+            number of CPUs. Runs in the current process if `1`.
+        chunk_size (int): Number of candidates simulated in lockstep by each
+            task. Optional, defaults to `DEFAULT_CHUNK_SIZE`.
+        settle_tolerance (float): Largest altitude error of a settled
+            flight (m). Optional, defaults to `DEFAULT_SETTLE_TOLERANCE`.
+        abort_error (float): Largest altitude error after reaching the
+            target before a flight is stopped (m). Optional, defaults to
+            `DEFAULT_ABORT_ERROR`.
+        weights (dict): Weight of each cost term in `TERMS`. Optional,
+            defaults to `1` for every term.
+        tolerance (float): A search stops once the costs of its simplex are
+            within this of each other. Optional, defaults to `1e-3`.
+        cache (ResultCache): On-disk cache of simulated flights, see
+            `batch.run_batch`. Optional, flights are not cached by default.
+
+    Returns:
+        TuningResult: Best gains and every evaluated candidate.
+    '''
+    if 'target_altitude_m' not in base_config.get('pid', {}):
+        raise ValueError('Tuning requires a "target_altitude_m" in the '
+                         '"pid" block of the config')
+    if samples < 1 or starts < 1:
+        raise ValueError('Tuning requires at least one sample and one '
+                         'search, not %s and %s' % (samples, starts))
+    space = SearchSpace(bounds)
+    sampling_seed, noise_seed = np.random.SeedSequence(seed).spawn(2)
+    points = latin_hypercube(samples, len(space),
+                             np.random.default_rng(sampling_seed))
+    log.warning(f'Starting tuning of {", ".join(space.names)}: {samples} '
+                f'samples, {starts} searches')
+
+    with Evaluator(base_config, space, settle_tolerance, abort_error,
+                   weights=weights, workers=workers, chunk_size=chunk_size,
+                   seed=noise_seed, result_cache=cache) as evaluate:
+        costs = evaluate(points)
+        order = np.argsort(costs, kind='stable')
+        searches = [NelderMead(points[i])
+                    for i in order[:min(starts, samples)]]
+        log.info(f'Best sample: cost {costs[order[0]]:.4f}')
+        active = list(searches)
+        while active:
+            proposals = [search.propose() for search in active]
+            costs = evaluate(np.concatenate(proposals))
+            offsets = np.cumsum([0] + [len(p) for p in proposals])
+            for search, start, end in zip(active, offsets, offsets[1:]):
+                search.tell(costs[start:end])
+            active = [search for search in active
+                      if search.iterations < iterations
+                      and np.ptp(search.costs) > tolerance]
+            log.info(f'{len(active)} searches active, '
+                     f'{len(evaluate.cache)} candidates evaluated')
+        best = min(searches, key=lambda search: search.best[1])
+        gains = space.gains(best.best[0])
+        metrics = evaluate.cache[tuple(gains.items())]
+        evaluations = {key: value for key, value in evaluate.cache.items()}
+        cache_hits = evaluate.hits
+
+    log.warning(f'Finished tuning: {len(evaluations)} candidates evaluated, '
+                f'{cache_hits} cache hits, best cost {metrics["cost"]:.4f}')
+    return TuningResult(gains, metrics['cost'], metrics, evaluations,
+                        cache_hits, [search.iterations for search in searches])
+
+
+def from_config(sim_config, samples=None, iterations=None, seed=None,
+                workers=None, cache=None):
+    ''' Tune the altitude controller described by a simulation config.
+
+    The search is described by a `tune` block of `sim_config`:
+    ``` json
+    {
+        "tune": {
+            "gains": {
+                (string) Gain to tune [kp, ki, kd, n]: [(float) low, (float) high]
+            },
+            "samples": (int) Number of Latin hypercube samples,
+            "starts": (int) Number of Nelder-Mead searches,
+            "iterations": (int) Largest number of iterations of each search,
+            "seed": (int) Seed for sampling and atmosphere noise,
+            "settle_tolerance_m": (float) Largest altitude error of a settled flight (m),
+            "abort_error_m": (float) Largest altitude error before a flight is stopped (m),
+            "weights": {
+                (string) Cost term [settling_time, overshoot, gas, ballast]: (float) weight
+            }
+        }
+    }
+    ```
+    Arguments that are not `None` override the values in the config.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+        samples (int): Number of Latin hypercube samples.
+        iterations (int): Largest number of iterations of each search.
+        seed (int): Seed for sampling and atmosphere noise.
+        workers (int): Number of worker processes.
+        cache (ResultCache): On-disk cache of simulated flights.
+
+    Returns:
+        TuningResult: Best gains and every evaluated candidate.
+    '''
+    tune_config = sim_config.get('tune', {})
+    base_config = {key: value for key, value in sim_config.items()
+                   if key != 'tune'}
+    return run_tuning(
+        base_config,
+        tune_config.get('gains', {}),
+        samples=samples if samples is not None else tune_config.get(
+            'samples', 32),
+        starts=tune_config.get('starts', 4),
+        iterations=iterations if iterations is not None else tune_config.get(
+            'iterations', 30),
+        seed=seed if seed is not None else tune_config.get('seed'),
+        workers=workers,
+        settle_tolerance=tune_config.get('settle_tolerance_m',
+                                         DEFAULT_SETTLE_TOLERANCE),
+        abort_error=tune_config.get('abort_error_m', DEFAULT_ABORT_ERROR),
+        weights=tune_config.get('weights'),
+        cache=cache)
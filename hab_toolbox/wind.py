@@ -0,0 +1,706 @@
+''' Wind drift.
+
+The ascent model is one dimensional. This module adds horizontal drift: the
+balloon is assumed to move horizontally with the wind, so its latitude and
+longitude are found by advecting it through a gridded wind field along the
+time and altitude of a simulated trajectory:
+``` python
+field = wind.open_wind_field('forecast.wind')
+tspan, altitude, _, _ = ascent_model.run(sim_config)
+latitude, longitude = wind.drift(tspan, altitude, field, 47.0, 8.0)
+```
+
+A wind field holds the eastward (`u`) and northward (`v`) wind components in
+meters/second on a grid of time (s), geometric altitude (m), latitude (deg)
+and longitude (deg). Grid axes must be increasing, but need not be evenly
+spaced. Wind fields are stored in wind files (`.wind`), laid out like the
+trajectory files of `hab_toolbox.trajectory_io`:
+
+| Bytes | Content |
+| ----- | ------- |
+| 8 | Magic string `HABWIND\\n` |
+| 4 | Length of the header in bytes, little-endian unsigned integer |
+| header length | UTF-8 JSON header, padded with spaces to a multiple of `ALIGNMENT` |
+| rest of the file | `(time, altitude, latitude, longitude, 2)` array of `u` and `v` |
+
+The JSON header describes the grid:
+``` json
+{
+    "version": (int) Format version,
+    "dtype": (string) NumPy type of the wind components. [<f4, <f8],
+    "axes": {
+        "time": (list) Time of each grid point (s),
+        "altitude": (list) Geometric altitude of each grid point (m),
+        "latitude": (list) Latitude of each grid point (deg),
+        "longitude": (list) Longitude of each grid point (deg)
+    },
+    "metadata": (dict) Free-form information about the wind field
+}
+```
+
+The wind components are opened with `np.memmap`, so only the grid cells a
+flight passes through are read from disk, and worker processes that open the
+same file share its pages in the operating system's page cache. Ensembles of
+thousands of flights never hold the whole grid in memory.
+
+Winds are interpolated quadrilinearly between the 16 corners of the grid cell
+around a point. Below the lowest and above the highest altitude of the grid,
+the winds of that level are used. Points outside of the time, latitude or
+longitude range of the grid are rejected. A `WindInterpolator` keeps the
+corners of the cell it last read, so a flight only reads from the file when
+it moves to another cell, and records every cell it visited.
+'''
+
+import bisect
+import functools
+import json
+import logging
+import math
+import struct
+import numpy as np
+
+from hab_toolbox import ascent_model
+
+# Logger (initialized by cli.py)
+log = logging.getLogger()
+
+MAGIC = b'HABWIND\n'
+VERSION = 1
+ALIGNMENT = 64  # wind components start on a multiple of this many bytes
+DTYPES = ('<f4', '<f8')
+AXES = ('time', 'altitude', 'latitude', 'longitude')
+EARTH_RADIUS = 6371008.8  # [m] mean radius of the Earth
+DEGREES = 180 / math.pi  # degrees per radian
+# offsets of the 16 corners of a grid cell, in the order of `interpolate`
+CORNERS = np.array(np.unravel_index(np.arange(16), (2, 2, 2, 2))).T
+
+
+def write_header(file, axes, dtype='<f4', metadata=None):
+    ''' Write the magic string and JSON header of a wind file.
+
+    Args:
+        file (file): Binary file object positioned at the start of the file.
+        axes (dict): Grid points of each axis in `AXES` by name.
+        dtype (string): NumPy type of the wind components. Optional,
+            defaults to little-endian float32.
+        metadata (dict): Free-form information about the wind field.
+            Optional.
+
+    Returns:
+        int: Offset of the wind components in bytes.
+    '''
+    if dtype not in DTYPES:
+        raise ValueError('Wind component type must be one of %s, not "%s"'
+                         % (DTYPES, dtype))
+    header = json.dumps({
+        'version': VERSION,
+        'dtype': dtype,
+        'axes': {name: [float(x) for x in axes[name]] for name in AXES},
+        'metadata': metadata or {},
+    }).encode('utf-8')
+    prefix = len(MAGIC) + 4
+    offset = -(-(prefix + len(header)) // ALIGNMENT) * ALIGNMENT
+    header = header.ljust(offset - prefix)
+    file.write(MAGIC + struct.pack('<I', len(header)) + header)
+    return offset
+
+
+def read_header(path):
+    ''' Read the JSON header of a wind file.
+
+    Args:
+        path (string): Path of the wind file.
+
+    Returns:
+        dict: The header, with the `offset` of the wind components added.
+    '''
+    with open(path, 'rb') as file:
+        magic = file.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError('%s is not a wind file' % path)
+        length, = struct.unpack('<I', file.read(4))
+        header = json.loads(file.read(length).decode('utf-8'))
+    if header['version'] > VERSION:
+        raise ValueError('Wind file version %s is not supported' % (
+            header['version']))
+    header['offset'] = len(MAGIC) + 4 + length
+    return header
+
+
+def save(path, time, altitude, latitude, longitude, u, v, dtype='<f4',
+         metadata=None):
+    ''' Write a gridded wind field to a wind file.
+
+    The wind components are written one time at a time, so `u` and `v` may
+    themselves be memory-mapped arrays larger than memory.
+
+    Args:
+        path (string): Path of the wind file.
+        time (array): Time of each grid point (s).
+        altitude (array): Geometric altitude of each grid point (m).
+        latitude (array): Latitude of each grid point (deg).
+        longitude (array): Longitude of each grid point (deg).
+        u (array): Eastward wind (m/s), a `(time, altitude, latitude,
+            longitude)` array.
+        v (array): Northward wind (m/s), same shape as `u`.
+        dtype (string): NumPy type of the wind components. Optional,
+            defaults to little-endian float32.
+        metadata (dict): Free-form information about the wind field.
+            Optional.
+    '''
+    axes = dict(zip(AXES, (time, altitude, latitude, longitude)))
+    shape = tuple(len(axes[name]) for name in AXES)
+    if np.shape(u) != shape or np.shape(v) != shape:
+        raise ValueError('Wind components must have the shape of the grid %s, '
+                         'not %s and %s' % (shape, np.shape(u), np.shape(v)))
+    with open(path, 'wb') as file:
+        write_header(file, axes, dtype=dtype, metadata=metadata)
+        for i in range(shape[0]):
+            file.write(np.stack((u[i], v[i]), axis=-1).astype(dtype).tobytes())
+
+
+def interpolate(corners, fractions):
+    ''' Quadrilinear interpolation of the wind within grid cells.
+
+    Args:
+        corners (array): `(N, 32)` array of the `u` and `v` components at the
+            16 corners of each cell, in the order of `CORNERS`.
+        fractions (array): `(N, 4)` array of the position of each point
+            within its cell along each axis in `AXES`, from `0` to `1`.
+
+    Returns:
+        array: `(N, 2)` array of the interpolated `u` and `v` (m/s).
+    '''
+    c = corners
+    for k in range(4):
+        # the first half of the corners is at the lower end of axis k
+        n = c.shape[1] // 2
+        c = c[:, :n] + fractions[:, k, None] * (c[:, n:] - c[:, :n])
+    return c
+
+
+def move(latitude, longitude, east, north, dt):
+    ''' Position (deg) after moving at a constant velocity over a spherical
+    Earth.
+
+    Args:
+        latitude (float): Latitude at the start of the time step (deg).
+        longitude (float): Longitude at the start of the time step (deg).
+        east (float): Eastward velocity (m/s).
+        north (float): Northward velocity (m/s).
+        dt (float): Time step size in seconds.
+
+    Returns:
+        tuple: Latitude and longitude at the end of the time step (deg).
+    '''
+    cos_latitude = np.cos(np.asarray(latitude) / DEGREES)
+    return (latitude + north * dt / EARTH_RADIUS * DEGREES,
+            longitude + east * dt / (EARTH_RADIUS * cos_latitude) * DEGREES)
+
+
+def distance(latitude, longitude, other_latitude, other_longitude):
+    ''' Great-circle distance (m) between two positions (deg) on a spherical
+    Earth.
+    '''
+    lat1 = np.asarray(latitude) / DEGREES
+    lat2 = np.asarray(other_latitude) / DEGREES
+    dlon = (np.asarray(other_longitude) - np.asarray(longitude)) / DEGREES
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2)
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+class WindField():
+    ''' Gridded wind field.
+
+    Calling a wind field interpolates the wind at arrays of points. Use
+    `interpolator` to follow a single flight.
+
+    | Property | Description |
+    | -------- | ----------- |
+    | `time` | Time of each grid point (s) |
+    | `altitude` | Geometric altitude of each grid point (m) |
+    | `latitude` | Latitude of each grid point (deg) |
+    | `longitude` | Longitude of each grid point (deg) |
+    | `data` | `(time, altitude, latitude, longitude, 2)` array of `u` and `v` (m/s) |
+
+    Args:
+        time (array): Time of each grid point (s).
+        altitude (array): Geometric altitude of each grid point (m).
+        latitude (array): Latitude of each grid point (deg).
+        longitude (array): Longitude of each grid point (deg).
+        data (array): Wind components, usually a `np.memmap` opened by
+            `load`.
+    '''
+    def __init__(self, time, altitude, latitude, longitude, data):
+        self.axes = [np.asarray(x, dtype=float)
+                     for x in (time, altitude, latitude, longitude)]
+        for name, axis in zip(AXES, self.axes):
+            if axis.ndim != 1 or len(axis) < 2 or np.any(np.diff(axis) <= 0):
+                raise ValueError('The %s axis of a wind field must have at '
+                                 'least 2 increasing grid points' % name)
+        shape = tuple(len(axis) for axis in self.axes) + (2,)
+        if data.shape != shape:
+            raise ValueError('Wind components must have the shape %s, not %s'
+                             % (shape, data.shape))
+        self.time, self.altitude, self.latitude, self.longitude = self.axes
+        self.data = data
+        self.metadata = {}
+        # python lists are faster than arrays for scalar bisection
+        self._lists = [axis.tolist() for axis in self.axes]
+
+    @classmethod
+    def load(cls, path, mode='r'):
+        ''' Open the wind field of a wind file without reading it.
+
+        Args:
+            path (string): Path of the wind file.
+            mode (string): `np.memmap` file mode. Optional, defaults to
+                read-only.
+
+        Returns:
+            WindField: Wind field backed by a memory-mapped array.
+        '''
+        header = read_header(path)
+        axes = [header['axes'][name] for name in AXES]
+        data = np.memmap(path, dtype=header['dtype'], mode=mode,
+                         offset=header['offset'],
+                         shape=tuple(len(axis) for axis in axes) + (2,))
+        field = cls(*axes, data)
+        field.metadata = header['metadata']
+        log.debug('Opened wind field %s with %s grid points' % (
+            path, 'x'.join(str(n) for n in data.shape[:4])))
+        return field
+
+    def locate(self, t, h, lat, lon):
+        ''' Grid cell around a point and the position of the point within it.
+
+        Args:
+            t (float): Time (s).
+            h (float): Geometric altitude (m).
+            lat (float): Latitude (deg).
+            lon (float): Longitude (deg).
+
+        Returns:
+            tuple: Index of the lower corner of the cell along each axis, and
+            the fraction of the cell along each axis, as tuples.
+
+        Raises:
+            ValueError: If the point is outside of the time, latitude or
+                longitude range of the grid.
+        '''
+        altitude = self._lists[1]
+        h = min(max(h, altitude[0]), altitude[-1])
+        cell = []
+        fractions = []
+        for name, axis, x in zip(AXES, self._lists, (t, h, lat, lon)):
+            if not axis[0] <= x <= axis[-1]:
+                raise ValueError('%s %s is outside of the wind grid (%s to %s)'
+                                 % (name.capitalize(), x, axis[0], axis[-1]))
+            i = min(bisect.bisect_right(axis, x), len(axis) - 1) - 1
+            cell.append(i)
+            fractions.append((x - axis[i]) / (axis[i+1] - axis[i]))
+        return tuple(cell), tuple(fractions)
+
+    def locate_array(self, t, h, lat, lon):
+        ''' Vectorized form of `locate`.
+
+        Returns:
+            tuple: `(N, 4)` arrays of cell indices and fractions, and a
+            boolean array of which points are inside the grid. Indices and
+            fractions of points outside of the grid are meaningless.
+        '''
+        points = np.broadcast_arrays(t, h, lat, lon)
+        n = points[0].size
+        cells = np.empty((n, 4), dtype=int)
+        fractions = np.empty((n, 4))
+        inside = np.ones(n, dtype=bool)
+        for k, (axis, x) in enumerate(zip(self.axes, points)):
+            x = np.asarray(x, dtype=float).ravel()
+            if k == 1:
+                x = np.minimum(np.maximum(x, axis[0]), axis[-1])
+            else:
+                inside &= (x >= axis[0]) & (x <= axis[-1])
+            i = np.minimum(np.maximum(
+                np.searchsorted(axis, x, side='right'), 1), len(axis) - 1) - 1
+            cells[:, k] = i
+            fractions[:, k] = (x - axis[i]) / (axis[i+1] - axis[i])
+        return cells, fractions, inside
+
+    def corners(self, cell):
+        ''' Wind components at the corners of a grid cell, as a list of 32
+        floats in the order of `interpolate`.
+        '''
+        it, iz, ia, io = cell
+        return self.data[it:it+2, iz:iz+2, ia:ia+2, io:io+2].ravel().tolist()
+
+    def corners_array(self, cells):
+        ''' Vectorized form of `corners`. Cells shared by several points are
+        only read once.
+
+        Args:
+            cells (array): `(N, 4)` array of cell indices.
+
+        Returns:
+            array: `(N, 32)` array of wind components.
+        '''
+        unique, inverse = np.unique(cells, axis=0, return_inverse=True)
+        index = unique[:, None, :] + CORNERS
+        values = self.data[index[..., 0], index[..., 1], index[..., 2],
+                           index[..., 3]]
+        return values.reshape(len(unique), 32).astype(float)[inverse.ravel()]
+
+    def __call__(self, t, h, lat, lon):
+        ''' Interpolate the wind at arrays of points.
+
+        Returns:
+            tuple: Eastward and northward wind (m/s) at each point, `NaN`
+            outside of the grid.
+        '''
+        shape = np.broadcast(t, h, lat, lon).shape
+        cells, fractions, inside = self.locate_array(t, h, lat, lon)
+        wind = np.full((len(inside), 2), np.nan)
+        if inside.any():
+            wind[inside] = interpolate(self.corners_array(cells[inside]),
+                                       fractions[inside])
+        return wind[:, 0].reshape(shape), wind[:, 1].reshape(shape)
+
+    def interpolator(self):
+        ''' A new `WindInterpolator` for one flight through this field.
+        '''
+        return WindInterpolator(self)
+
+
+class WindInterpolator():
+    ''' Interpolates the wind along the path of one flight.
+
+    The corners of the last grid cell are kept in memory, so the wind field
+    is only read when the flight enters another cell. Every cell entered is
+    recorded in `visited`.
+
+    | Property | Description |
+    | -------- | ----------- |
+    | `visited` | Index of every cell entered, in the order of the first visit |
+    | `hits` | Number of lookups within the cell of the previous lookup |
+    | `misses` | Number of lookups that read another cell |
+
+    Args:
+        field (WindField): Wind field to interpolate.
+    '''
+    __slots__ = ('field', 'cell', 'visited', 'hits', 'misses', '_corners',
+                 '_bounds')
+
+    def __init__(self, field):
+        self.field = field
+        self.cell = None
+        self.visited = {}  # ordered set of cell indices
+        self.hits = 0
+        self.misses = 0
+        self._corners = None
+        self._bounds = None
+
+    def __call__(self, t, h, lat, lon):
+        ''' Interpolate the wind at a point.
+
+        Args:
+            t (float): Time (s).
+            h (float): Geometric altitude (m).
+            lat (float): Latitude (deg).
+            lon (float): Longitude (deg).
+
+        Returns:
+            tuple: Eastward and northward wind (m/s).
+
+        Raises:
+            ValueError: If the point is outside of the time, latitude or
+                longitude range of the grid.
+        '''
+        altitude = self.field._lists[1]
+        h = min(max(h, altitude[0]), altitude[-1])
+        point = (t, h, lat, lon)
+        bounds = self._bounds
+        if bounds is not None and all(
+                lo <= x < hi for x, (lo, hi) in zip(point, bounds)):
+            self.hits += 1
+            fractions = [(x - lo) / (hi - lo)
+                         for x, (lo, hi) in zip(point, bounds)]
+        else:
+            cell, fractions = self.field.locate(*point)
+            if cell != self.cell:
+                self.misses += 1
+                self.cell = cell
+                self._corners = self.field.corners(cell)
+                self._bounds = [(axis[i], axis[i+1]) for axis, i in zip(
+                    self.field._lists, cell)]
+                self.visited[cell] = None
+            else:
+                self.hits += 1
+        # same arithmetic as `interpolate`
+        c = self._corners
+        for f in fractions:
+            n = len(c) // 2
+            c = [a + f * (b - a) for a, b in zip(c[:n], c[n:])]
+        return c[0], c[1]
+
+    def visited_cells(self):
+        ''' `(N, 4)` array of the index of every cell entered.
+        '''
+        return np.array(list(self.visited), dtype=int).reshape(-1, 4)
+
+
+@functools.lru_cache(maxsize=None)
+def open_wind_field(path):
+    ''' Get a shared `WindField` for a wind file.
+
+    The file is only opened the first time each `path` is requested, so all
+    simulations of a process share one memory map.
+    '''
+    return WindField.load(path)
+
+
+def drift(tspan, altitude, field, latitude, longitude, start_time=0.0,
+          interpolator=None):
+    ''' Advect a flight through a wind field.
+
+    The flight starts at the given position at the first sample and moves
+    with the wind at each sample until the next one.
+
+    Args:
+        tspan (array): Time of each sample (s), like the arrays returned by
+            `ascent_model.run`.
+        altitude (array): Altitude of each sample (m).
+        field (WindField): Wind field.
+        latitude (float): Latitude of the launch (deg).
+        longitude (float): Longitude of the launch (deg).
+        start_time (float): Time of the launch on the time axis of the wind
+            field (s). Optional, defaults to `0`.
+        interpolator (WindInterpolator): Interpolator to look up the wind
+            with, for example to read its `visited` cells afterwards.
+            Optional, defaults to a new one.
+
+    Returns:
+        tuple: Latitude and longitude (deg) of each sample.
+
+    Raises:
+        ValueError: If the flight leaves the time, latitude or longitude
+            range of the wind field.
+    '''
+    if interpolator is None:
+        interpolator = field.interpolator()
+    times = np.asarray(tspan).tolist()
+    altitudes = np.asarray(altitude).tolist()
+    lats = np.empty(len(times))
+    lons = np.empty(len(times))
+    lat, lon = latitude, longitude
+    for j, t in enumerate(times):
+        lats[j] = lat
+        lons[j] = lon
+        if j + 1 < len(times):
+            east, north = interpolator(start_time + t, altitudes[j], lat, lon)
+            dt = times[j+1] - t
+            lat, lon = (lat + north * dt / EARTH_RADIUS * DEGREES,
+                        lon + east * dt / (EARTH_RADIUS * math.cos(
+                            lat / DEGREES)) * DEGREES)
+    return lats, lons
+
+
+class DriftResult():
+    ''' Drift of every member of a batch.
+
+    Fields are padded with `NaN` like the `BatchResult` they were computed
+    from. A member that leaves the time, latitude or longitude range of the
+    wind field stops drifting there.
+
+    | Property | Description |
+    | -------- | ----------- |
+    | `latitude` | `(N, M)` latitude of each sample (deg) |
+    | `longitude` | `(N, M)` longitude of each sample (deg) |
+    | `final_latitude` | Latitude of each member at its last sample (deg) |
+    | `final_longitude` | Longitude of each member at its last sample (deg) |
+    | `out_of_grid` | Whether each member left the wind field |
+    | `visited` | `(K, 4)` index of every cell entered by any member |
+    '''
+    def __init__(self, latitude, longitude, final_latitude, final_longitude,
+                 out_of_grid, visited):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.final_latitude = final_latitude
+        self.final_longitude = final_longitude
+        self.out_of_grid = out_of_grid
+        self.visited = visited
+
+    def __len__(self):
+        return len(self.out_of_grid)
+
+
+def drift_batch(result, field, latitude, longitude, start_time=0.0):
+    ''' Vectorized form of `drift` for every member of a `BatchResult`.
+
+    Members are advanced through the wind field one sample at a time. Like a
+    `WindInterpolator`, the corners of the cell of each member are kept and
+    only read from the wind field when the member enters another cell, and
+    cells entered by several members at once are read once.
+
+    Args:
+        result (BatchResult): Batch simulated with `record` enabled.
+        field (WindField): Wind field.
+        latitude (array): Latitude of the launch of each member (deg), or
+            one latitude for all members.
+        longitude (array): Longitude of the launch of each member (deg), or
+            one longitude for all members.
+        start_time (array): Time of the launch on the time axis of the wind
+            field (s), for each member or all of them. Optional, defaults to
+            `0`.
+
+    Returns:
+        DriftResult: Drift of every member.
+    '''
+    time, altitude = result.time, result.altitude
+    n_members, n_samples = time.shape
+    lat = np.array(np.broadcast_to(latitude, n_members), dtype=float)
+    lon = np.array(np.broadcast_to(longitude, n_members), dtype=float)
+    start_time = np.broadcast_to(start_time, n_members)
+    out_lat = np.full((n_members, n_samples), np.nan)
+    out_lon = np.full((n_members, n_samples), np.nan)
+    out_of_grid = np.zeros(n_members, dtype=bool)
+    cells = np.full((n_members, 4), -1)
+    corners = np.empty((n_members, 32))
+    visited = []
+
+    for j in range(n_samples):
+        valid = ~np.isnan(time[:, j]) & ~out_of_grid
+        if not valid.any():
+            break
+        out_lat[valid, j] = lat[valid]
+        out_lon[valid, j] = lon[valid]
+        if j + 1 == n_samples:
+            break
+        i = np.flatnonzero(valid & ~np.isnan(time[:, j+1]))
+        if len(i) == 0:
+            continue
+        cell, fractions, inside = field.locate_array(
+            start_time[i] + time[i, j], altitude[i, j], lat[i], lon[i])
+        if not inside.all():
+            out_of_grid[i[~inside]] = True
+            i, cell, fractions = i[inside], cell[inside], fractions[inside]
+        changed = np.any(cells[i] != cell, axis=1)
+        if changed.any():
+            cells[i[changed]] = cell[changed]
+            corners[i[changed]] = field.corners_array(cell[changed])
+            visited.append(np.unique(cell[changed], axis=0))
+        wind = interpolate(corners[i], fractions)
+        dt = time[i, j+1] - time[i, j]
+        lat[i], lon[i] = move(lat[i], lon[i], wind[:, 0], wind[:, 1], dt)
+
+    if out_of_grid.any():
+        log.error(f'{np.count_nonzero(out_of_grid)} flights left the wind '
+                  f'field')
+    visited = (np.unique(np.concatenate(visited), axis=0) if visited
+               else np.empty((0, 4), dtype=int))
+    return DriftResult(out_lat, out_lon, lat, lon, out_of_grid, visited)
+
+
+def landing_zone(latitude, longitude):
+    ''' Spread of the final positions of an ensemble of flights.
+
+    Distances are measured on a plane tangent to the Earth at the mean
+    position. `NaN` positions are ignored.
+
+    Args:
+        latitude (array): Final latitude of each flight (deg).
+        longitude (array): Final longitude of each flight (deg).
+
+    Returns:
+        dict: Number of flights, mean latitude and longitude (deg), standard
+        deviation of the eastward and northward position (m), and the median,
+        95th percentile and largest distance from the mean position (m).
+    '''
+    latitude = np.asarray(latitude, dtype=float)
+    longitude = np.asarray(longitude, dtype=float)
+    valid = ~(np.isnan(latitude) | np.isnan(longitude))
+    latitude, longitude = latitude[valid], longitude[valid]
+    if len(latitude) == 0:
+        return {'count': 0}
+    center_lat = float(np.mean(latitude))
+    center_lon = float(np.mean(longitude))
+    north = (latitude - center_lat) / DEGREES * EARTH_RADIUS
+    east = ((longitude - center_lon) / DEGREES * EARTH_RADIUS
+            * math.cos(center_lat / DEGREES))
+    distance = np.hypot(east, north)
+    return {
+        'count': len(latitude),
+        'latitude': center_lat,
+        'longitude': center_lon,
+        'std_east': float(np.std(east)),
+        'std_north': float(np.std(north)),
+        'p50_distance': float(np.percentile(distance, 50)),
+        'p95_distance': float(np.percentile(distance, 95)),
+        'max_distance': float(np.max(distance)),
+    }
+
+
+def launch(sim_config):
+    ''' Launch position and time of the `wind` block of a simulation config.
+
+    The `wind` block is optional:
+    ``` json
+    {
+        "wind": {
+            "file": (string) Path of a wind file,
+            "launch_latitude_deg": (float) Latitude of the launch (deg),
+            "launch_longitude_deg": (float) Longitude of the launch (deg),
+            "launch_time_s": (float) Optional. Time of the launch on the time axis of the wind file (s)
+        }
+    }
+    ```
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+
+    Returns:
+        tuple: The `WindField` of the wind file, launch latitude and
+        longitude (deg) and launch time (s), or `None` if the config has no
+        `wind` block.
+    '''
+    wind_config = sim_config.get('wind')
+    if wind_config is None:
+        return None
+    return (open_wind_field(wind_config['file']),
+            wind_config['launch_latitude_deg'],
+            wind_config['launch_longitude_deg'],
+            wind_config.get('launch_time_s', 0.0))
+
+
+def run(sim_config, cache=None):
+    ''' Simulate a config with `ascent_model.run` and advect it through the
+    wind field of its `wind` block, see `launch`.
+
+    Configs with a `descent` block are simulated with
+    `ascent_model.run_flight` instead, so the drift ends where the payload
+    lands.
+
+    Args:
+        sim_config (dict): Dictionary of simulation config parameters.
+        cache (ResultCache): Cache to read the ascent from or store it in,
+            see `ascent_model.run`. Not used for full flights. Optional.
+
+    Returns:
+        tuple: `tspan`, `altitude`, `velocity` and `acceleration` arrays like
+        `ascent_model.run`, followed by the `latitude` and `longitude` of
+        each sample (deg) and the `WindInterpolator` that looked up the
+        winds.
+    '''
+    wind_launch = launch(sim_config)
+    if wind_launch is None:
+        raise ValueError('Simulation config has no "wind" block')
+    field, latitude, longitude, start_time = wind_launch
+    if 'descent' in sim_config:
+        tspan, h, v, a = ascent_model.run_flight(sim_config)[:4]
+    else:
+        tspan, h, v, a = ascent_model.run(sim_config, cache=cache)
+    interpolator = field.interpolator()
+    lats, lons = drift(tspan, h, field, latitude, longitude, start_time,
+                       interpolator)
+    log.warning(f'Drifted {len(interpolator.visited)} wind grid cells to '
+                f'latitude {lats[-1]:.5f} deg, longitude {lons[-1]:.5f} deg')
+    return tspan, h, v, a, lats, lons, interpolator
@@ -0,0 +1,47 @@
+''' Simulation configs shared by the tests.
+'''
+
+
+SIM_CONFIG = {
+    'balloon': {
+        'type': 'HAB-3000',
+        'reserve_mass_kg': 2,
+        'bleed_mass_kg': 0.5
+    },
+    'payload': {
+        'bus_mass_kg': 2,
+        'ballast_mass_kg': 0.5
+    },
+    'simulation': {
+        'id': 'test',
+        'duration': 20,
+        'dt': 0.5,
+        'initial_altitude': 0,
+        'initial_velocity': 0
+    }
+}
+
+
+def make_config(**simulation):
+    config = {key: dict(value) for key, value in SIM_CONFIG.items()}
+    config['simulation'].update(simulation)
+    return config
+
+
+def burst_config(**simulation):
+    # starts just below the burst altitude of the default balloon
+    return make_config(duration=600, initial_altitude=33000,
+                       initial_velocity=8, **simulation)
+
+
+def controlled_config(**pid):
+    config = make_config(duration=60)
+    config['pid'] = {
+        'mode': 'continuous',
+        'target_altitude_m': 50,
+        'bleed_rate_kgps': 0.01,
+        'ballast_rate_kgps': 0.01,
+        'gains': {'kp': 1, 'ki': 0, 'kd': 0, 'n': 0},
+    }
+    config['pid'].update(pid)
+    return config
@@ -1,2 +1,169 @@
 import pytest
+import numpy as np
+from hab_toolbox import ascent_model
+from hab_toolbox import atmosphere as atmosphere_models
+from tests.conftest import burst_config, make_config
 
+
+def test_run():
+    t, h, v, a = ascent_model.run(make_config())
+    assert len(t) == len(h) == len(v) == len(a) == 40
+    assert t[0] == 0
+    assert h[-1] > h[0]
+    assert np.all(np.diff(h) > 0)
+
+
+def test_run_decimation():
+    t, h, _, _ = ascent_model.run(make_config())
+    t_dec, h_dec, _, _ = ascent_model.run(make_config(decimation=4))
+    assert np.array_equal(t_dec, t[::4])
+    assert np.array_equal(h_dec, h[::4])
+
+
+def test_run_max_samples():
+    t, h, _, _ = ascent_model.run(make_config())
+    t_ring, h_ring, _, _ = ascent_model.run(make_config(max_samples=5))
+    assert np.array_equal(t_ring, t[-5:])
+    assert np.array_equal(h_ring, h[-5:])
+
+
+def test_step_count():
+    for duration, dt in ((20, 0.5), (10, 0.1), (1000, 0.3), (0.7, 0.25),
+                         (0, 0.5)):
+        tspan = np.arange(0, duration, step=dt)
+        assert ascent_model.step_count(duration, dt) == len(tspan)
+        assert np.array_equal(np.arange(len(tspan)) * dt, tspan)
+    # the time axis is not allocated, the ring buffer is all that is stored
+    t, _, _, _ = ascent_model.run(make_config(duration=1000, dt=0.1,
+                                              max_samples=3))
+    assert np.array_equal(t, np.arange(0, 1000, step=0.1)[-3:])
+
+
+def test_step_with_tabulated_atmosphere():
+    from hab_toolbox.balloon_library.balloon import Balloon, Gas, Payload
+    from hab_toolbox.atmosphere import tabulated_atmosphere
+    b = Balloon('HAB-3000', lift_gas=Gas('helium', mass=2.5))
+    p = Payload(dry_mass=2, ballast_mass=0.5)
+    a_exact, dv_exact, dh_exact = ascent_model.step(0.5, 0, 1, 100, b, p)
+    a, dv, dh = ascent_model.step(0.5, 0, 1, 100, b, p,
+                                  atmosphere=tabulated_atmosphere())
+    assert a == pytest.approx(a_exact[0], rel=1e-4)
+    assert dh == dh_exact
+
+
+def test_run_ambiance_atmosphere():
+    t, h, _, _ = ascent_model.run(make_config())
+    config = make_config()
+    config['atmosphere'] = {'model': 'ambiance'}
+    t_exact, h_exact, _, _ = ascent_model.run(config)
+    assert np.array_equal(t, t_exact)
+    assert h == pytest.approx(h_exact, rel=1e-6)
+
+
+def test_run_rk4():
+    t, h, v, a = ascent_model.run(make_config(integrator='rk4'))
+    assert len(t) == len(h) == len(v) == len(a) == 41
+    assert t[0] == 0 and t[-1] == 20
+    assert h[0] == 0 and v[0] == 0
+    t_euler, h_euler, _, _ = ascent_model.run(make_config())
+    assert h[-1] == pytest.approx(h_euler[-1], rel=0.05)
+
+
+@pytest.mark.parametrize('integrator', ['rk4', 'rk45'])
+def test_run_burst_event(integrator):
+    t, h, _, _ = ascent_model.run(burst_config(integrator=integrator))
+    assert t[-1] < 600
+    # the last sample lies on the burst diameter
+    balloon = ascent_model.configure_balloon(burst_config())
+    margin = ascent_model.burst_margin(h[-1], balloon,
+                                       atmosphere_models.tabulated_atmosphere())
+    assert margin == pytest.approx(0, abs=1e-6)
+
+
+def test_run_rk45_matches_rk4():
+    t_rk4, h_rk4, _, _ = ascent_model.run(burst_config(integrator='rk4'))
+    t, h, _, _ = ascent_model.run(burst_config(integrator='rk45'))
+    assert len(t) < len(t_rk4) / 5
+    assert t[-1] == pytest.approx(t_rk4[-1], abs=1e-3)
+    assert h[-1] == pytest.approx(h_rk4[-1], abs=1e-3)
+
+
+def test_run_unknown_integrator():
+    with pytest.raises(ValueError):
+        ascent_model.run(make_config(integrator='leapfrog'))
+
+
+@pytest.mark.parametrize('integrator', ['euler', 'rk45'])
+def test_iter_run(integrator):
+    config = make_config(integrator=integrator, decimation=3)
+    expected = ascent_model.run(config)
+    chunks = list(ascent_model.iter_run(config, chunk_size=4))
+    assert all(len(chunk[0]) <= 4 for chunk in chunks)
+    for column, expected_column in zip(zip(*chunks), expected):
+        assert np.array_equal(np.concatenate(column), expected_column)
+
+
+@pytest.mark.parametrize('integrator', ['euler', 'rk45'])
+def test_run_telemetry(integrator):
+    from hab_toolbox.trajectory import Telemetry
+    config = make_config(integrator=integrator, decimation=2)
+    telemetry = Telemetry()
+    t, h, v, a = ascent_model.run(config, telemetry=telemetry)
+    assert np.array_equal(telemetry.time, t)
+    assert telemetry.net_force == pytest.approx(
+        telemetry.weight + telemetry.buoyancy + telemetry.drag)
+    total_mass = 3.0 + 2.5  # HAB-3000 and payload
+    assert telemetry.net_force / total_mass == pytest.approx(a)
+    assert np.all(telemetry.weight < 0) and np.all(telemetry.buoyancy > 0)
+    assert np.array_equal(ascent_model.run(config)[1], h)
+
+
+def flight_config(**simulation):
+    config = burst_config(**simulation)
+    config['simulation']['duration'] = 3000
+    config['descent'] = {'parachute_cd': 1.5, 'parachute_area_m2': 1.5,
+                         'ground_altitude_m': 0}
+    return config
+
+
+@pytest.mark.parametrize('integrator', ['euler', 'rk4', 'rk45'])
+def test_run_flight(integrator):
+    config = flight_config(integrator=integrator)
+    t, h, v, a, phase, events = ascent_model.run_flight(config)
+    ascent = ascent_model.run(config)
+    n = len(ascent[0])
+    for column, expected in zip((t, h, v, a), ascent):
+        assert np.array_equal(column[:n], expected)
+    assert np.all(phase[:n] == ascent_model.ASCENT)
+    assert np.all(phase[n:] == ascent_model.DESCENT)
+    assert np.all(np.diff(t) > 0)
+    burst, landing = events['burst'], events['landing']
+    assert burst['altitude'] == pytest.approx(h[n-1], rel=1e-3)
+    # the landing is located within a time step, not on the next one
+    assert (t[-1], h[-1], v[-1]) == (landing['time'], landing['altitude'],
+                                     landing['velocity'])
+    assert landing['altitude'] == pytest.approx(0, abs=1e-6)
+    # (an Euler sample at t holds the state at the end of its step)
+    assert t[-2] < landing['time'] < t[-2] + 2 * 0.5
+    assert np.all(h[:-1] > 0)
+    # terminal velocity of the payload and balloon at sea level
+    assert landing['velocity'] == pytest.approx(
+        -np.sqrt(2 * 5.5 * 9.80665 / (1.225 * 1.5 * 1.5)), rel=1e-3)
+
+
+def test_run_flight_decimation():
+    t, h, _, _, phase, events = ascent_model.run_flight(
+        flight_config(decimation=7))
+    full = ascent_model.run_flight(flight_config())
+    assert np.array_equal(t[:-1], full[0][:-1:7])
+    assert t[-1] == events['landing']['time'] == full[0][-1]
+
+
+def test_run_flight_ends_before_landing():
+    config = flight_config()
+    config['simulation']['duration'] = 1000
+    t, h, _, _, phase, events = ascent_model.run_flight(config)
+    assert events['burst'] is not None and events['landing'] is None
+    assert phase[-1] == ascent_model.DESCENT and h[-1] > 0
+    with pytest.raises(ValueError):
+        ascent_model.run_flight(burst_config())
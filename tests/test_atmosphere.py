@@ -0,0 +1,81 @@
+import pytest
+import numpy as np
+from ambiance.ambiance import Atmosphere
+from hab_toolbox import atmosphere
+from hab_toolbox.balloon_library import balloon
+
+
+def test_tabulated_atmosphere_scalar():
+    table = atmosphere.tabulated_atmosphere()
+    conditions = table(1234.5)
+    expected = Atmosphere(1234.5)
+    assert conditions.h == 1234.5
+    assert type(conditions.density) == float
+    for name in ('grav_accel', 'temperature', 'pressure', 'density'):
+        assert getattr(conditions, name) == pytest.approx(
+            getattr(expected, name)[0], rel=1e-4)
+
+
+def test_tabulated_atmosphere_array():
+    table = atmosphere.tabulated_atmosphere()
+    h = np.array([-5004, 0, 11000, 32000.5, 80000])
+    conditions = table(h)
+    assert conditions.pressure.shape == h.shape
+    assert conditions.pressure == pytest.approx(Atmosphere(h).pressure,
+                                                rel=1e-4)
+    assert table(32000.5).pressure == pytest.approx(conditions.pressure[3])
+
+
+def test_tabulated_atmosphere_out_of_bounds():
+    table = atmosphere.tabulated_atmosphere()
+    with pytest.raises(ValueError):
+        table(-6000)
+    with pytest.raises(ValueError):
+        table(np.array([0, 90000]))
+    with pytest.raises(ValueError):
+        atmosphere.TabulatedAtmosphere(resolution=0)
+
+
+def test_tabulated_atmosphere_max_error():
+    report = atmosphere.TabulatedAtmosphere(resolution=100).max_error()
+    assert set(report) == {'grav_accel', 'temperature', 'pressure', 'density'}
+    assert max(report.values()) < 1e-3
+
+
+def test_tabulated_atmosphere_is_shared():
+    assert atmosphere.tabulated_atmosphere(10) is \
+        atmosphere.tabulated_atmosphere(10)
+
+
+def test_from_config():
+    assert isinstance(atmosphere.from_config({}),
+                      atmosphere.TabulatedAtmosphere)
+    config = {'atmosphere': {'model': 'ambiance'}}
+    assert isinstance(atmosphere.from_config(config),
+                      atmosphere.AmbianceAtmosphere)
+    with pytest.raises(ValueError):
+        atmosphere.from_config({'atmosphere': {'model': 'mars'}})
+
+
+def test_gas_match_tabulated_atmosphere():
+    conditions = atmosphere.tabulated_atmosphere()(100)
+    g = balloon.Gas('air', mass=0)
+    g.match_ambient(conditions)
+    assert g.temperature == conditions.temperature
+    assert g.pressure == conditions.pressure
+
+
+def test_noisy_atmosphere():
+    config = {'simulation': {'dt': 0.5},
+              'atmosphere': {'temperature_noise_gain': 0.5, 'seed': 4}}
+    assert atmosphere.noise_std(config) == (1, 0, 0)
+    noisy = atmosphere.from_config(config)
+    assert isinstance(noisy, atmosphere.NoisyAtmosphere)
+    exact = atmosphere.tabulated_atmosphere()
+    samples = noisy(np.full(1000, 100.0))
+    assert np.std(samples.temperature) == pytest.approx(1, rel=0.1)
+    assert np.array_equal(samples.pressure, exact(np.full(1000, 100.0)).pressure)
+    repeat = atmosphere.from_config(config)(np.full(1000, 100.0))
+    assert np.array_equal(samples.temperature, repeat.temperature)
+    assert not isinstance(atmosphere.from_config(config, noise=False),
+                          atmosphere.NoisyAtmosphere)
@@ -1,3 +1,5 @@
+import json
+import os
 import pytest
 import numpy as np
 from hab_toolbox.balloon_library import balloon
@@ -15,6 +17,18 @@ def test_list_known_species():
     assert len(balloon.list_known_species()) == len(balloon.get_gas_properties()[0])
 
 
+def test_gas_properties_read_only():
+    known_species, _ = balloon.get_gas_properties()
+    with pytest.raises(TypeError):
+        known_species['he'] = 1
+
+
+def test_is_valid_gas():
+    assert balloon.is_valid_gas('helium') is True
+    assert balloon.is_valid_gas('unobtainium') is False
+    assert balloon.is_valid_gas(['he']) is False
+
+
 def test_is_valid_balloon_true():
     assert balloon.is_valid_balloon('HAB-3000') is True
 
@@ -24,6 +38,58 @@ def test_is_valid_balloon_false():
     assert balloon.is_valid_balloon(10) is False
 
 
+def test_list_known_balloons():
+    assert 'HAB-3000' in balloon.list_known_balloons()
+
+
+def test_get_balloon_shared_and_read_only():
+    spec = balloon.get_balloon('HAB-3000')
+    assert spec is balloon.get_balloon('HAB-3000')
+    with pytest.raises(TypeError):
+        spec['name'] = 'HAB-0'
+    with pytest.raises(TypeError):
+        spec['spec']['mass']['value'] = 0
+    assert isinstance(spec['part_number'], tuple)
+
+
+def write_spec(path, name, mass=1.0):
+    spec = dict(balloon.get_balloon('HAB-800'))
+    spec['name'] = name
+    spec['spec'] = dict(spec['spec'], mass={'value': mass, 'unit': 'kg'})
+    path.joinpath(f'{name}.json').write_text(json.dumps(spec))
+
+
+def test_balloon_library_extra_path(tmp_path):
+    library = balloon.BalloonLibrary()
+    write_spec(tmp_path, 'HAB-800', mass=5.0)
+    write_spec(tmp_path, 'CUSTOM-1')
+    library.add_path(str(tmp_path))
+    assert 'CUSTOM-1' in library
+    assert 'HAB-3000' in library
+    # user paths take precedence
+    assert library.get('HAB-800')['spec']['mass']['value'] == 5.0
+
+
+def test_balloon_library_new_and_modified_files(tmp_path):
+    library = balloon.BalloonLibrary([str(tmp_path)])
+    assert library.names() == []
+    write_spec(tmp_path, 'CUSTOM-1')
+    assert library.get('CUSTOM-1')['spec']['mass']['value'] == 1.0
+    write_spec(tmp_path, 'CUSTOM-1', mass=2.0)
+    os.utime(tmp_path / 'CUSTOM-1.json', ns=(0, 0))
+    # cached until refreshed
+    assert library.get('CUSTOM-1')['spec']['mass']['value'] == 1.0
+    library.refresh()
+    assert library.get('CUSTOM-1')['spec']['mass']['value'] == 2.0
+
+
+def test_balloon_library_invalid_spec(tmp_path):
+    tmp_path.joinpath('BROKEN.json').write_text(json.dumps({'name': 'x'}))
+    library = balloon.BalloonLibrary([str(tmp_path)])
+    with pytest.raises(ValueError):
+        library.get('BROKEN')
+
+
 def test_radius_from_volume():
     assert balloon._radius_from_volume(1) == 0.6203504908994001
     assert balloon._radius_from_volume(0) == 0
@@ -50,6 +116,15 @@ def test_gas_initialization():
     assert g.molar_mass == 0.02897
 
 
+def test_gas_slots():
+    g = balloon.Gas('He', mass=1)
+    assert g.species == 'he'
+    with pytest.raises(AttributeError):
+        g.volume_m3 = 1
+    with pytest.raises(ValueError):
+        balloon.Gas('unobtainium')
+
+
 def test_gas_massless():
     g = balloon.Gas('air', mass=0)
     assert g.volume == 0
@@ -0,0 +1,90 @@
+import pytest
+import numpy as np
+from hab_toolbox import ascent_model, batch
+from hab_toolbox.trajectory import Telemetry
+from tests.conftest import controlled_config, make_config
+
+
+def make_batch():
+    configs = []
+    for bus_mass in (1.5, 2.0, 2.5):
+        config = make_config()
+        config['payload']['bus_mass_kg'] = bus_mass
+        configs.append(config)
+    configs[1]['simulation']['dt'] = 0.25
+    configs[2]['simulation']['duration'] = 7
+    return configs
+
+
+def test_run_batch_matches_run():
+    configs = make_batch()
+    result = batch.run_batch(configs)
+    assert len(result) == 3
+    assert result.altitude.shape == (3, 80)
+    for i, config in enumerate(configs):
+        t, h, v, a = ascent_model.run(config)
+        t_b, h_b, v_b, a_b = result.member(i)
+        assert result.length[i] == len(t)
+        assert np.array_equal(t, t_b)
+        assert h_b == pytest.approx(h, rel=1e-12)
+        assert v_b == pytest.approx(v, rel=1e-9)
+        assert result.final_altitude[i] == pytest.approx(h[-1], rel=1e-12)
+    assert np.isnan(result.altitude[2, -1])
+    assert not result.burst.any()
+
+
+def test_run_batch_controller():
+    configs = [controlled_config(), controlled_config(mode='pwm'),
+               make_config(duration=60)]
+    configs[1]['pid']['gains']['kd'] = 0.1
+    configs[1]['pid']['gains']['n'] = 1
+    result = batch.run_batch(configs)
+    for i, config in enumerate(configs):
+        telemetry = Telemetry()
+        t, h, v, a = ascent_model.run(config, telemetry=telemetry)
+        t_b, h_b, v_b, a_b = result.member(i)
+        assert np.array_equal(t, t_b)
+        assert h_b == pytest.approx(h, rel=1e-12)
+        assert result.final_gas_mass[i] == telemetry.lift_gas_mass[-1]
+        assert result.final_ballast_mass[i] == telemetry.ballast_mass[-1]
+    assert list(result.final_gas_mass < 2.5) == [True, True, False]
+
+
+def test_run_batch_burst():
+    configs = make_batch()
+    # just below the burst diameter at standard temperature and pressure,
+    # just above it once the gas matches the ambient temperature
+    configs[0]['balloon'].update(type='HAB-800', reserve_mass_kg=62)
+    configs[1]['balloon'].update(type='HAB-800', reserve_mass_kg=100)
+    result = batch.run_batch(configs, record=False)
+    assert list(result.burst) == [True, True, False]
+    assert list(result.length) == [1, 0, 14]
+    assert result.length[0] == len(ascent_model.run(configs[0])[0])
+    assert result.final_time[0] == 0.5
+
+
+def test_run_batch_decimation():
+    configs = make_batch()
+    result = batch.run_batch(configs, decimation=4)
+    full = batch.run_batch(configs)
+    for i in range(3):
+        assert np.array_equal(result.member(i)[1], full.member(i)[1][::4])
+
+
+def test_run_batch_out_of_bounds():
+    configs = make_batch()
+    configs[0]['simulation']['initial_altitude'] = -5003
+    configs[0]['payload']['bus_mass_kg'] = 50
+    result = batch.run_batch(configs, record=False)
+    assert list(result.out_of_bounds) == [True, False, False]
+    with pytest.raises(ValueError):
+        batch.run_batch([])
+
+
+def test_run_batch_abort():
+    configs = [controlled_config(), controlled_config()]
+    configs[1]['pid']['gains']['kp'] = 0  # never bleeds, keeps rising
+    result = batch.run_batch(configs, record=False, abort_error=150)
+    assert list(result.aborted) == [False, True]
+    assert result.final_altitude[1] > 200
+    assert result.length[1] < result.length[0]
@@ -0,0 +1,68 @@
+import pytest
+from benchmarks import bench_startup
+from benchmarks import harness
+
+
+def test_benchmark_registers_params(monkeypatch):
+    monkeypatch.setattr(harness, 'BENCHMARKS', {})
+
+    @harness.benchmark(params=[{'n': 1}, {'n': 10}])
+    def bench_sum(n):
+        return lambda: sum(range(n))
+    assert list(harness.BENCHMARKS) == ['bench_sum[n=1]', 'bench_sum[n=10]']
+    with pytest.raises(ValueError):
+        harness.benchmark(bench_sum, params=[{'n': 1}])
+
+
+def test_measure():
+    result = harness.measure(lambda: [0.0] * 100000, repeat=2, min_time=0.01)
+    assert result['time'] > 0 and result['calls'] >= 1
+    assert result['peak_memory'] >= 8 * 100000
+
+
+def test_compare():
+    baseline = {'a': {'time': 1.0, 'peak_memory': 100},
+                'b': {'time': 1.0, 'peak_memory': 100}}
+    results = {'a': {'time': 1.2, 'peak_memory': 120},
+               'b': {'time': 2.0, 'peak_memory': 100},
+               'c': {'time': 1.0, 'peak_memory': 100}}
+    rows = harness.compare(results, baseline, time_threshold=0.25,
+                           memory_threshold=0.1)
+    regressed = {(name, metric) for name, metric, *_, flag in rows if flag}
+    assert regressed == {('a', 'peak_memory'), ('b', 'time')}
+    assert len(rows) == 4
+
+
+def test_compare_calibration():
+    baseline = {'calibration': {'time': 1.0, 'peak_memory': 100},
+                'a': {'time': 1.0, 'peak_memory': 100}}
+    # a machine twice as slow as when the baseline was saved
+    results = {'calibration': {'time': 2.0, 'peak_memory': 100},
+               'a': {'time': 2.4, 'peak_memory': 100}}
+    rows = harness.compare(results, baseline, time_threshold=0.25)
+    assert [row[:2] for row in rows] == [('a', 'time'), ('a', 'peak_memory')]
+    assert rows[0][4] == pytest.approx(1.2)
+    assert not any(row[5] for row in rows)
+
+
+def test_save_results(tmp_path):
+    path = str(tmp_path / 'baseline.json')
+    assert harness.load_baseline(path) == ({}, {})
+    harness.save_results(path, {'a': {'time': 1.0, 'peak_memory': 1}})
+    harness.save_results(path, {'b': {'time': 2.0, 'peak_memory': 2}})
+    results, environment = harness.load_baseline(path)
+    assert set(results) == {'a', 'b'}
+    assert environment == harness.environment()
+
+
+def test_parse_importtime():
+    text = ('import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   click.types\n'
+            'import time:      1500 |       2000 | click\n')
+    assert bench_startup.parse_importtime(text) == {
+        'click.types': (120e-6, 120e-6), 'click': (1500e-6, 2000e-6)}
+
+
+def test_cli_startup():
+    # heavy modules are only imported by the commands that use them
+    assert bench_startup.loaded_modules('hab_toolbox.cli') == []
@@ -0,0 +1,105 @@
+import os
+import numpy as np
+from hab_toolbox import ascent_model
+from hab_toolbox import batch
+from hab_toolbox import monte_carlo
+from hab_toolbox.cache import ResultCache, make_key
+from tests.conftest import burst_config, make_config
+
+
+def assert_same(result, expected):
+    for column, expected_column in zip(result, expected):
+        assert np.array_equal(column, expected_column, equal_nan=True)
+
+
+def test_make_key():
+    key = make_key('trajectory', make_config())
+    assert key == make_key('trajectory', make_config())
+    assert key != make_key('trajectory', make_config(dt=0.1))
+    assert key != make_key('batch_member', make_config())
+    assert key != make_key('trajectory', make_config(), decimation=2)
+
+
+def test_run_cached(tmp_path):
+    cache = ResultCache(tmp_path)
+    sim_config = burst_config()
+    expected = ascent_model.run(sim_config)
+    assert_same(ascent_model.run(sim_config, cache=cache), expected)
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert_same(ascent_model.run(sim_config, cache=cache), expected)
+    assert (cache.hits, cache.misses) == (1, 1)
+    # streamed results are read from the same entry
+    chunks = list(ascent_model.iter_run(sim_config, 100, cache=cache))
+    assert_same([np.concatenate(column) for column in zip(*chunks)],
+                expected)
+    assert cache.stats()['entries'] == 1
+
+
+def test_run_not_cached(tmp_path):
+    cache = ResultCache(tmp_path)
+    noisy = make_config()
+    noisy['atmosphere'] = {'temperature_noise_gain': 0.5}
+    ascent_model.run(noisy, cache=cache)
+    noisy['atmosphere']['seed'] = 4
+    ascent_model.run(noisy, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+    # an unfinished stream is not stored
+    for chunk in ascent_model.iter_run(make_config(), 10, cache=cache):
+        break
+    assert cache.stats()['entries'] == 1
+    assert not [name for name in os.listdir(tmp_path)
+                if name.endswith('.tmp')]
+
+
+def test_evict_least_recently_used(tmp_path):
+    # evicts down to 2880 bytes, 90% of the maximum size
+    cache = ResultCache(tmp_path, max_size=3200)
+    for i, key in enumerate('abc'):
+        cache.save(key, np.zeros(100))  # 928 bytes each
+        os.utime(tmp_path / f'{key}.npy', (i, i))
+    assert cache.load('a') is not None  # now the most recently used
+    cache.save('d', np.zeros(100))
+    assert sorted(os.listdir(tmp_path)) == ['a.npy', 'c.npy', 'd.npy']
+    assert cache.evictions == 1
+    assert cache.load('b') is None
+    assert cache.stats()['size'] == 3 * 928
+
+
+def test_save_scans_once(tmp_path, monkeypatch):
+    # saving does not scan the cache directory again until it must evict
+    cache = ResultCache(tmp_path, max_size=10 * 928)
+    scans = []
+    entries = cache.entries
+    monkeypatch.setattr(cache, 'entries', lambda: scans.append(1) or entries())
+    for i in range(10):
+        cache.save(str(i), np.zeros(100))
+    assert len(scans) == 1
+    # every eviction deletes two results, which makes room for two saves
+    for i in range(10, 30):
+        cache.save(str(i), np.zeros(100))
+    assert len(scans) == 11 and cache.evictions == 20
+    assert len(os.listdir(tmp_path)) == 10
+
+
+def test_run_batch_cached(tmp_path):
+    cache = ResultCache(tmp_path)
+    sim_configs = [burst_config(), make_config(), burst_config(dt=0.2)]
+    expected = batch.run_batch(sim_configs, decimation=2)
+    batch.run_batch(sim_configs[1:], decimation=2, cache=cache)
+    result = batch.run_batch(sim_configs, decimation=2, cache=cache)
+    assert (cache.hits, cache.misses) == (2, 3)
+    for field in batch.BatchResult.FIELDS + batch.BatchResult.MEMBER_FIELDS:
+        assert np.array_equal(getattr(result, field),
+                              getattr(expected, field), equal_nan=True)
+
+
+def test_monte_carlo_cached(tmp_path):
+    cache = ResultCache(tmp_path)
+    distributions = {'payload.bus_mass_kg': {'distribution': 'uniform',
+                                             'low': 1.5, 'high': 2.5}}
+    results = [monte_carlo.run_monte_carlo(make_config(), distributions, 4,
+                                           seed=1, workers=1, cache=cache)
+               for _ in range(2)]
+    assert (cache.hits, cache.misses) == (4, 4)
+    assert np.array_equal(results[0].final_altitude,
+                          results[1].final_altitude)
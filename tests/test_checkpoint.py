@@ -0,0 +1,106 @@
+import json
+import pytest
+import numpy as np
+from hab_toolbox import ascent_model
+from hab_toolbox import sinks
+from hab_toolbox.checkpoint import Checkpoint
+from tests.conftest import burst_config, controlled_config, make_config
+
+
+def noisy_config():
+    config = make_config(duration=60)
+    config['atmosphere'] = {'temperature_noise_gain': 0.5, 'seed': 4}
+    return config
+
+
+def controller_config():
+    # gains small enough that the valves are not wide open
+    config = controlled_config(
+        gains={'kp': 1e-5, 'ki': 1e-6, 'kd': 1e-5, 'n': 2})
+    config['simulation']['decimation'] = 3
+    return config
+
+
+CONFIGS = {
+    'fused': burst_config(),
+    'fused_decimation': burst_config(decimation=3),
+    'controller': controller_config(),
+    'noise': noisy_config(),
+    'rk4': burst_config(integrator='rk4'),
+    'rk45': burst_config(integrator='rk45'),
+}
+
+
+def stop_and_resume(sim_config, path, stop_after, chunk_size):
+    ''' Run a simulation until `stop_after` chunks were yielded, save a
+    checkpoint and finish the simulation from the saved checkpoint.
+    '''
+    checkpoint = Checkpoint(sim_config)
+    chunks = []
+    for chunk in ascent_model.iter_run(sim_config, chunk_size,
+                                       checkpoint=checkpoint):
+        chunks.append(chunk)
+        if len(chunks) == stop_after:
+            checkpoint.save(path)
+            break
+    checkpoint = Checkpoint.load(path, sim_config)
+    assert checkpoint.resumed
+    chunks.extend(ascent_model.iter_run(sim_config, chunk_size,
+                                        checkpoint=checkpoint))
+    return [np.concatenate(column) for column in zip(*chunks)]
+
+
+@pytest.mark.parametrize('name', CONFIGS)
+def test_resume_is_bit_for_bit(tmp_path, name):
+    sim_config = CONFIGS[name]
+    expected = ascent_model.run(sim_config)
+    for stop_after in (1, 2):
+        resumed = stop_and_resume(sim_config, tmp_path / 'run.ckpt',
+                                  stop_after, chunk_size=7)
+        for column, expected_column in zip(resumed, expected):
+            assert np.array_equal(column, expected_column)
+
+
+def test_checkpoint_contents(tmp_path):
+    sim_config = controlled_config()
+    checkpoint = Checkpoint(sim_config)
+    for chunk in ascent_model.iter_run(sim_config, 10, checkpoint=checkpoint):
+        checkpoint.save(tmp_path / 'run.ckpt')
+        break
+    data = json.loads((tmp_path / 'run.ckpt').read_text())
+    assert data['count'] == 10
+    assert data['state']['time'] == chunk[0][-1]
+    assert data['state']['altitude'] == chunk[1][-1]
+    assert set(data['controller']) == {'integral', 'filter', 'max_altitude'}
+    assert data['payload']['dry_mass'] == 2
+    assert data['rng'] is None
+
+
+def test_load_other_config(tmp_path):
+    Checkpoint(make_config()).save(tmp_path / 'run.ckpt')
+    with pytest.raises(ValueError):
+        Checkpoint.load(tmp_path / 'run.ckpt', make_config(dt=0.1))
+
+
+def test_resume_sink(tmp_path):
+    sim_config = burst_config()
+    expected = np.column_stack(ascent_model.run(sim_config))
+    path = str(tmp_path / 'out.npy')
+    checkpoint = Checkpoint(sim_config)
+    sink = sinks.open_sink(path)
+    for n, chunk in enumerate(ascent_model.iter_run(sim_config, 50,
+                                                    checkpoint=checkpoint)):
+        sink.write(*chunk)
+        if n == 1:
+            checkpoint.output = sink.position
+            checkpoint.save(tmp_path / 'run.ckpt')
+        elif n == 2:
+            # stopped after writing past the checkpoint, without closing
+            sink._file.close()
+            break
+    checkpoint = Checkpoint.load(tmp_path / 'run.ckpt', sim_config)
+    with sinks.open_sink(path, position=checkpoint.output) as sink:
+        for chunk in ascent_model.iter_run(sim_config, 50,
+                                           checkpoint=checkpoint):
+            sink.write(*chunk)
+    assert np.array_equal(np.load(path), expected)
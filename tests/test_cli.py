@@ -0,0 +1,57 @@
+import json
+import numpy as np
+from click.testing import CliRunner
+from hab_toolbox import ascent_model
+from hab_toolbox.cli import cli
+from tests.conftest import make_config
+
+
+def write_config(path, config):
+    with open(path, 'w') as output_file:
+        json.dump(config, output_file)
+    return str(path)
+
+
+def test_worker(tmp_path):
+    good = write_config(tmp_path / 'good.json', make_config())
+    empty = write_config(tmp_path / 'empty.json', make_config(duration=0))
+    missing = str(tmp_path / 'missing.json')
+    output = str(tmp_path / 'empty.csv')
+    stdin = f'{good}\n{missing}\n\n{empty}\t{output}\n{good}\n'
+    result = CliRunner().invoke(
+        cli, ['worker', '--no-cache', '-o', str(tmp_path / 'out'),
+              '-f', '.npy'], input=stdin)
+    assert result.exit_code == 0, result.output
+    lines = [json.loads(line) for line in result.output.splitlines()]
+    assert [line['config'] for line in lines] == [good, missing, empty, good]
+    t, h, _, _ = ascent_model.run(make_config())
+    assert lines[0]['final_time'] == t[-1]
+    assert lines[0]['max_altitude'] == np.max(h)
+    assert lines[0]['output'] == str(tmp_path / 'out' / 'good.npy')
+    assert np.array_equal(np.load(lines[0]['output'])[:, 1], h)
+    assert lines[1]['error'].startswith('FileNotFoundError')
+    # a simulation without samples is not an error
+    assert 'error' not in lines[2]
+    assert lines[2]['output'] == output
+    assert lines[2]['final_time'] is None
+    assert lines[2]['max_altitude'] is None
+    assert lines[3]['final_altitude'] == lines[0]['final_altitude']
+
+
+def test_batch(tmp_path):
+    configs = tmp_path / 'configs.jsonl'
+    configs.write_text(json.dumps(make_config()) + '\n'
+                       + json.dumps(make_config()) + '\n{"balloon": 1}\n')
+    output = str(tmp_path / 'batch.npz')
+    result = CliRunner().invoke(
+        cli, ['batch', str(configs), '--no-cache', '-o', output])
+    assert result.exit_code == 0, result.output
+    lines = [json.loads(line) for line in result.output.splitlines()]
+    assert [line['status'] for line in lines] == ['ok', 'duplicate',
+                                                  'invalid']
+    t, h, _, _ = ascent_model.run(make_config())
+    assert lines[0]['final_time'] == t[-1]
+    saved = np.load(output)
+    assert np.array_equal(saved['altitude'], h)
+    assert list(saved['run']) == [0, 0, -1]
+    assert list(saved['length']) == [len(h)]
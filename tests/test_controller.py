@@ -0,0 +1,105 @@
+import pytest
+from hab_toolbox import ascent_model
+from hab_toolbox.controller import AltitudeController, is_enabled
+from hab_toolbox.trajectory import Telemetry
+from tests.conftest import controlled_config, make_config
+
+
+def make_controller(**kwargs):
+    params = dict(target_altitude=1000, kp=1e-4, bleed_rate=0.01,
+                  ballast_rate=0.02, initial_altitude=1000)
+    params.update(kwargs)
+    return AltitudeController(**params)
+
+
+def test_is_enabled():
+    assert not is_enabled(make_config())
+    config = make_config()
+    config['pid'] = {'mode': 'pwm'}
+    assert not is_enabled(config)
+    assert is_enabled(controlled_config())
+
+
+def test_from_config_defaults():
+    control = AltitudeController.from_config(controlled_config())
+    assert control.continuous
+    assert control.delay_altitude == 50
+    assert control.arm_tolerance == 1000
+    assert control.bleed_min_rate == control.ballast_min_rate == 0
+    assert control.max_altitude == 0
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        make_controller(mode='bang-bang')
+    with pytest.raises(ValueError):
+        make_controller(ballast_rate=-1)
+
+
+def test_update_continuous():
+    control = make_controller(bleed_min_rate=0.001)
+    # efforts below the smallest flow rate are in the dead zone
+    assert control.update(0, 1005, 1) == (0.0, 0.0)
+    assert control.update(1, 1050, 1) == pytest.approx((-0.004, 0.0))
+    # effort is limited to the largest flow rate before the dead zone
+    assert control.update(2, 1900, 1) == pytest.approx((-0.009, 0.0))
+    # below the target drops ballast
+    assert control.update(3, 900, 1) == pytest.approx((0.0, -0.01))
+    assert control.update(4, -5, 1) == (0.0, 0.0)  # out of tolerance
+
+
+def test_update_pwm():
+    control = make_controller(mode='pwm')
+    assert control.update(0, 1000.5, 1) == (-0.01, 0.0)
+    assert control.update(1, 999.5, 1) == (0.0, -0.02)
+    assert control.update(2, 1000, 1) == (0.0, 0.0)
+
+
+def test_update_arming():
+    control = make_controller(delay_time=10, delay_altitude=1500,
+                              ki=1e-6)
+    assert control.update(0, 1200, 1) == (0.0, 0.0)  # too early
+    assert control.update(10, 1200, 1) == (0.0, 0.0)  # not high enough yet
+    assert control.integral == 0
+    assert control.update(11, 2600, 1) == (0.0, 0.0)  # out of tolerance
+    assert control.max_altitude == 2600
+    gas_rate, _ = control.update(12, 1050, 1)
+    assert gas_rate == pytest.approx(-0.005)
+    assert control.integral == 50
+
+
+def test_update_derivative_filter():
+    control = make_controller(kp=0, kd=1e-3, n=2)
+    control.update(0, 1001, 0.25)
+    assert control.filter == pytest.approx(0.5)
+    _, ballast_rate = control.update(0.25, 1000, 0.25)
+    # derivative of the error is filtered: 2 * (0 - 0.5)
+    assert ballast_rate == pytest.approx(-1e-3)
+
+
+def test_run_bleeds_above_target():
+    telemetry = Telemetry()
+    t, h, v, a = ascent_model.run(controlled_config(), telemetry=telemetry)
+    above = h > 50
+    assert above.any() and not above.all()
+    assert telemetry.lift_gas_mass[0] == 2.5
+    assert telemetry.lift_gas_mass[-1] < 2.5
+    assert telemetry.lift_gas_mass.min() >= 2.0  # reserve
+    assert (telemetry.ballast_mass == 0.5).all()
+
+
+def test_run_drops_ballast_below_target():
+    config = controlled_config(target_altitude_m=1000, delay_altitude_m=0,
+                               ballast_rate_kgps=0.05)
+    telemetry = Telemetry()
+    ascent_model.run(config, telemetry=telemetry)
+    assert (telemetry.lift_gas_mass == 2.5).all()
+    assert telemetry.ballast_mass[0] == pytest.approx(0.475)
+    assert telemetry.ballast_mass[-1] == 0
+
+
+def test_run_requires_euler():
+    config = controlled_config()
+    config['simulation']['integrator'] = 'rk4'
+    with pytest.raises(ValueError):
+        ascent_model.run(config)
@@ -0,0 +1,53 @@
+import pytest
+import numpy as np
+from hab_toolbox import ascent_model, estimator
+from tests.conftest import burst_config, make_config
+
+
+def test_from_configs_matches_simulation():
+    config = make_config(duration=10000)
+    t, h, v, a = ascent_model.run(config)
+    result = estimator.from_configs([config])
+    assert result.burst[0]
+    assert result.burst_altitude[0] == pytest.approx(h[-1], rel=1e-3)
+    assert result.burst_time[0] == pytest.approx(t[-1], rel=1e-2)
+    assert result.ascent_rate[0] == pytest.approx(v[20], rel=1e-3)
+    assert not estimator.from_configs([make_config()]).burst[0]
+
+
+def test_estimate_vectorized():
+    gas_mass = np.array([2.0, 2.5, 3.0])
+    total_mass = np.array([4.0, 5.5, 7.0])
+    result = estimator.estimate(gas_mass, 0.0040026, total_mass, 0.25, 13.0)
+    assert len(result) == 3
+    for i in range(3):
+        single = estimator.estimate(gas_mass[i], 0.0040026, total_mass[i],
+                                    0.25, 13.0)
+        assert single.burst_time[0] == pytest.approx(result.burst_time[i])
+    # more gas bursts lower
+    assert np.all(np.diff(result.burst_altitude) < 0)
+
+
+def test_estimate_edge_cases():
+    # too heavy to lift off
+    result = estimator.estimate(0.5, 0.0040026, 10, 0.25, 13.0)
+    assert result.ascent_rate[0] == 0
+    assert result.burst_time[0] == np.inf and not result.burst[0]
+    # already above the burst altitude
+    result = estimator.estimate(2.5, 0.0040026, 5.5, 0.25, 13.0,
+                                initial_altitude=40000)
+    assert result.burst_altitude[0] == 40000 and result.burst_time[0] == 0
+    # never bursts below the top of the atmosphere model
+    result = estimator.estimate(2.5, 0.0040026, 5.5, 0.25, 100.0)
+    assert np.isnan(result.burst_altitude[0]) and not result.burst[0]
+    with pytest.raises(ValueError):
+        estimator.estimate(2.5, 0.0040026, 5.5, 0.25, 13.0, nodes=4)
+
+
+def test_accuracy_report():
+    report = estimator.accuracy_report([burst_config(), make_config()])
+    assert report['runs'] == 2
+    assert report['burst_agreement'] == 1
+    assert report['burst_altitude']['count'] == 1
+    assert report['burst_altitude']['max_rel'] < 1e-3
+    assert report['burst_time']['max_rel'] < 0.05
@@ -0,0 +1,65 @@
+import pytest
+import numpy as np
+from hab_toolbox import ascent_model, fill
+from tests.conftest import make_config
+
+
+def test_locate_roots():
+    target = np.array([1.0, 4.0, 9.0])
+    calls = []
+
+    def f(x):
+        calls.append(len(x))
+        return x ** 2
+    x = fill.locate_roots(f, target, np.zeros(3), np.zeros(3),
+                          np.full(3, 4.0), np.full(3, 16.0), tol=1e-12)
+    assert x == pytest.approx([1, 2, 3])
+    # converged elements are not evaluated again
+    assert calls[-1] < 3
+
+
+def test_for_ascent_rate():
+    solver = fill.FillSolver('HAB-3000', 2.5)
+    # the default config fills 2.5 kg of helium
+    rate = ascent_model.run(make_config())[2][20]
+    gas_mass = solver.for_ascent_rate([rate, 0, solver.max_ascent_rate + 1])
+    assert gas_mass[0] == pytest.approx(2.5, rel=1e-3)
+    assert np.isnan(gas_mass[1:]).all()
+
+
+def test_for_ascent_rate_reuses_evaluations():
+    solver = fill.FillSolver('HAB-3000', 2.5)
+    solver.for_ascent_rate([4, 5, 6])
+    evaluations = solver.evaluations
+    nearby = solver.for_ascent_rate([5.01])
+    assert solver.evaluations - evaluations < evaluations / 3
+    fresh = fill.FillSolver('HAB-3000', 2.5).for_ascent_rate([5.01])
+    assert nearby == pytest.approx(fresh)
+
+
+def test_for_burst_altitude():
+    solver = fill.FillSolver('HAB-3000', 2.5)
+    gas_mass = solver.for_burst_altitude([30000, 90000, -10])
+    assert np.isnan(gas_mass[1:]).all()
+    config = make_config(duration=10000)
+    config['balloon'].update(reserve_mass_kg=gas_mass[0], bleed_mass_kg=0)
+    t, h, v, a = ascent_model.run(config)
+    assert h[-1] == pytest.approx(30000, rel=1e-3)
+
+
+def test_cannot_lift():
+    with pytest.raises(ValueError):
+        fill.FillSolver('HAB-800', 500)
+
+
+def test_fill_table():
+    rows = fill.fill_table(2.5, ascent_rates=[5], burst_altitudes=[30000])
+    balloons = {row['balloon'] for row in rows}
+    assert len(balloons) == 5 and len(rows) == 10
+    for row in rows:
+        assert set(row) == set(fill.TABLE_FIELDS)
+        if row['target'] == 'ascent_rate':
+            assert row['ascent_rate'] == pytest.approx(5, rel=1e-6)
+            assert row['free_lift'] > 0
+    rows = fill.fill_table(500, ascent_rates=[5], balloons=['HAB-800'])
+    assert len(rows) == 1 and np.isnan(rows[0]['gas_mass'])
@@ -0,0 +1,145 @@
+import json
+import numpy as np
+from hab_toolbox import ascent_model
+from hab_toolbox import ingest
+from hab_toolbox import wind
+from tests.conftest import burst_config, make_config
+
+
+def write_jsonl(path, configs):
+    with open(path, 'w') as output_file:
+        for config in configs:
+            output_file.write('\n' if config is None else
+                              json.dumps(config) + '\n')
+
+
+def run_rows(saved, run):
+    # rows of the samples of a simulation in a .npz output
+    offset = saved['offset'][run]
+    return slice(offset, offset + saved['length'][run])
+
+
+def test_iter_configs(tmp_path):
+    path = tmp_path / 'configs.jsonl'
+    write_jsonl(path, [make_config(), None, make_config(duration=10)])
+    with open(path, 'a') as output_file:
+        output_file.write('{"balloon": \n')
+    configs = list(ingest.iter_configs(str(path)))
+    assert [source for source, _, _ in configs] == [
+        f'{path}:1', f'{path}:3', f'{path}:4']
+    assert configs[1][1] == make_config(duration=10)
+    assert configs[2][1] is None
+    assert configs[2][2].startswith('JSONDecodeError')
+    for name in ('b.json', 'a.json'):
+        with open(tmp_path / name, 'w') as output_file:
+            json.dump(make_config(id=name), output_file)
+    (tmp_path / 'notes.txt').write_text('not a config')
+    configs = list(ingest.iter_configs(str(tmp_path)))
+    assert [config['simulation']['id'] for _, config, _ in configs] == [
+        'a.json', 'b.json']
+
+
+def test_dedupe_key():
+    config = make_config()
+    assert ingest.dedupe_key(config) == ingest.dedupe_key(
+        dict(make_config(id='other'), monte_carlo={'runs': 3}))
+    assert ingest.dedupe_key(config) != ingest.dedupe_key(
+        make_config(duration=10))
+    config['atmosphere'] = {'density_noise_gain': 1e-8}
+    assert ingest.dedupe_key(config) is None
+    config['atmosphere']['seed'] = 0
+    assert ingest.dedupe_key(config) is not None
+
+
+def test_run_configs(tmp_path):
+    invalid = make_config(dt=-1)
+    failing = make_config()
+    failing['balloon']['type'] = 'HAB-0'
+    configs = [make_config(), make_config(duration=10, integrator='rk4'),
+               make_config(id='copy', integrator='euler', decimation=1),
+               invalid, failing]
+    path = tmp_path / 'configs.jsonl'
+    write_jsonl(path, configs)
+    output = str(tmp_path / 'results.npz')
+    result = ingest.run_configs(ingest.iter_configs(str(path)),
+                                save_output=output, workers=1)
+    assert len(result) == 5
+    assert [r['status'] for r in result.records] == [
+        'ok', 'ok', 'duplicate', 'invalid', 'failed']
+    assert result.counts() == {'ok': 2, 'duplicate': 1, 'invalid': 1,
+                               'failed': 1}
+    assert result.records[2]['duplicate_of'] == 0
+    assert result.records[2]['id'] == 'copy'
+    assert 'simulation.dt' in result.records[3]['error']
+    assert result.records[4]['error']
+    saved = np.load(output)
+    assert list(saved['status']) == [r['status'] for r in result.records]
+    assert list(saved['run']) == [0, 1, 0, -1, 2]
+    assert list(saved['length']) == [40, 21, 0]
+    assert json.loads(saved['config'][1])['simulation']['integrator'] == 'rk4'
+    for i in range(2):
+        rows = run_rows(saved, i)
+        expected = ascent_model.run(configs[i])
+        for field, column in zip(ingest.FIELDS, expected):
+            assert np.array_equal(saved[field][rows], column)
+        assert np.all(saved['phase'][rows] == ascent_model.ASCENT)
+        assert np.all(np.isnan(saved['latitude'][rows]))
+        summary = result.summary(i)
+        assert summary['max_altitude'] == np.max(expected[1])
+        assert saved['final_time'][i] == expected[0][-1]
+        assert 'landing_time' not in summary
+    assert saved['final_time'][2] == saved['final_time'][0]
+    assert np.isnan(saved['final_time'][3])
+    assert 'final_time' not in result.summary(3)
+
+    # the same outcome on a pool of workers, written as chunks finish
+    csv_output = str(tmp_path / 'results.csv')
+    pooled = ingest.run_configs(ingest.iter_configs(str(path)),
+                                save_output=csv_output, workers=2,
+                                chunk_size=1)
+    assert pooled.records == result.records
+    assert [pooled.summary(i) for i in range(5)] == [
+        result.summary(i) for i in range(5)]
+    rows = np.loadtxt(csv_output, delimiter=',', skiprows=1)
+    assert len(rows) == saved['length'].sum()
+    for run in range(2):
+        run_csv = rows[rows[:, 0] == run]
+        for j, field in enumerate(ingest.FIELDS[:4]):
+            assert np.array_equal(run_csv[:, j + 1],
+                                  saved[field][run_rows(saved, run)])
+
+
+def test_run_configs_flight_and_wind(tmp_path):
+    flight = burst_config()
+    flight['simulation']['duration'] = 3000
+    flight['descent'] = {'parachute_cd': 1.5, 'parachute_area_m2': 1.5,
+                         'ground_altitude_m': 0}
+    wind_file = str(tmp_path / 'test.wind')
+    axes = ([0.0, 1800.0], [0.0, 5000.0], [45.0, 47.0], [6.0, 9.0])
+    wind.save(wind_file, *axes, np.full((2, 2, 2, 2), 2.0),
+              np.full((2, 2, 2, 2), -1.0))
+    drifting = make_config(duration=600)
+    drifting['wind'] = {'file': wind_file, 'launch_latitude_deg': 46.0,
+                        'launch_longitude_deg': 7.0}
+    output = str(tmp_path / 'results.npz')
+    result = ingest.run_configs(
+        [('flight', flight, None), ('drift', drifting, None)],
+        save_output=output, workers=1)
+    assert [r['status'] for r in result.records] == ['ok', 'ok']
+    saved = np.load(output)
+
+    t, h, v, a, phase, events = ascent_model.run_flight(flight)
+    rows = run_rows(saved, 0)
+    assert np.array_equal(saved['altitude'][rows], h)
+    assert np.array_equal(saved['phase'][rows], phase)
+    summary = result.summary(0)
+    assert summary['burst_time'] == events['burst']['time']
+    assert summary['landing_time'] == events['landing']['time']
+    assert summary['final_altitude'] == 0
+
+    t, h, _, _, latitude, longitude, _ = wind.run(drifting)
+    rows = run_rows(saved, 1)
+    assert np.array_equal(saved['latitude'][rows], latitude)
+    assert np.array_equal(saved['longitude'][rows], longitude)
+    assert result.summary(1)['final_longitude'] == longitude[-1]
+    assert 'landing_time' not in result.summary(1)
@@ -0,0 +1,38 @@
+import pytest
+import numpy as np
+from hab_toolbox import integrators
+
+
+def decay(t, y):
+    return -y
+
+
+def test_rk4_step():
+    y = np.array([1.0])
+    for _ in range(10):
+        y = integrators.rk4_step(decay, 0, y, 0.1)
+    assert y[0] == pytest.approx(np.exp(-1), rel=1e-6)
+
+
+def test_dormand_prince_step():
+    y = np.array([1.0])
+    y_new, error, f_new = integrators.dormand_prince_step(decay, 0, y, 0.5)
+    assert y_new[0] == pytest.approx(np.exp(-0.5), rel=1e-5)
+    assert abs(error[0]) < 1e-4
+    assert f_new == pytest.approx(decay(0.5, y_new))
+
+
+def test_next_step_size():
+    assert integrators.next_step_size(1, 0) == integrators.MAX_FACTOR
+    assert integrators.next_step_size(1, 1e9) == integrators.MIN_FACTOR
+    assert integrators.next_step_size(1, 2) < 1 < integrators.next_step_size(1, 0.01)
+
+
+def test_locate_event():
+    # uniform motion crosses y = 0.3 at t = 0.3
+    y0, y1, f = np.array([0.0]), np.array([1.0]), np.array([1.0])
+    t, y = integrators.locate_event(lambda y: y[0] - 0.3, 0, y0, f, 1, y1, f)
+    assert t == pytest.approx(0.3)
+    assert y[0] == pytest.approx(0.3)
+    with pytest.raises(ValueError):
+        integrators.locate_event(lambda y: y[0] + 1, 0, y0, f, 1, y1, f)
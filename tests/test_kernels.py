@@ -0,0 +1,67 @@
+import pytest
+import numpy as np
+from hab_toolbox import ascent_model, kernels
+from hab_toolbox import atmosphere as atmosphere_models
+from hab_toolbox.trajectory import Trajectory
+from tests.conftest import burst_config, make_config
+
+
+def run_step_by_step(config):
+    trajectory = Trajectory.from_config(ascent_model._sample_count(config),
+                                        config)
+    for sample in ascent_model._simulate(config):
+        trajectory.append(*sample)
+    return trajectory.trim()
+
+
+def test_euler_steps_matches_step():
+    config = make_config()
+    balloon = ascent_model.configure_balloon(config)
+    payload = ascent_model.configure_payload(config)
+    atmosphere = atmosphere_models.tabulated_atmosphere()
+    gas = balloon.lift_gas
+    out = [np.empty(10) for _ in range(3)]
+    n, status, h, v, _, _ = kernels.euler_steps(
+        0.0, 0.0, gas.temperature, gas.pressure, 10, 0.5, gas.mass,
+        gas.molar_mass, balloon.mass + payload.total_mass, balloon.cd,
+        balloon.burst_diameter, atmosphere.resolution,
+        *atmosphere._tables, *out)
+    assert (n, status) == (10, kernels.RUNNING)
+    h_step, v_step = 0.0, 0.0
+    for k in range(10):
+        a, dv, dh = ascent_model.step(0.5, 0, v_step, h_step, balloon,
+                                      payload, atmosphere)
+        v_step += dv
+        h_step += dh
+        assert (out[0][k], out[1][k], out[2][k]) == (h_step, v_step, a)
+    assert (h, v) == (h_step, v_step)
+
+
+@pytest.mark.parametrize('config', [
+    make_config(),
+    make_config(decimation=3, max_samples=4),
+    burst_config(),
+])
+def test_run_fused_matches_step_by_step(config):
+    assert ascent_model._fused(config)
+    fused = ascent_model.run(config)
+    expected = run_step_by_step(config)
+    assert np.array_equal(fused[0], expected[0])
+    for column, expected_column in zip(fused[1:], expected[1:]):
+        # the compiled backend may round math functions differently
+        assert column == pytest.approx(expected_column, rel=1e-12)
+
+
+def test_fused_only_without_extras():
+    assert not ascent_model._fused(make_config(integrator='rk4'))
+    config = make_config()
+    config['atmosphere'] = {'density_noise_gain': 1e-9}
+    assert not ascent_model._fused(config)
+    config['atmosphere'] = {'model': 'ambiance'}
+    assert not ascent_model._fused(config)
+
+
+def test_run_fused_out_of_bounds():
+    config = make_config(initial_altitude=-5000, initial_velocity=-100)
+    with pytest.raises(ValueError):
+        ascent_model.run(config)
@@ -0,0 +1,75 @@
+import pytest
+import numpy as np
+from hab_toolbox import monte_carlo
+from tests.conftest import make_config
+
+
+DISTRIBUTIONS = {
+    'payload.bus_mass_kg': {'distribution': 'normal', 'std': 0.1},
+    'balloon.cd': {'distribution': 'uniform', 'low': 0.2, 'high': 0.3},
+    'atmosphere.density_noise_gain': {'distribution': 'uniform',
+                                      'low': 0, 'high': 1e-7},
+}
+
+
+def test_config_values():
+    config = make_config()
+    assert monte_carlo.get_config_value(config, 'balloon.type') == 'HAB-3000'
+    monte_carlo.set_config_value(config, 'atmosphere.seed', 3)
+    assert config['atmosphere'] == {'seed': 3}
+
+
+def test_sample():
+    rng = np.random.default_rng(0)
+    samples = monte_carlo.sample({'std': 0.1}, 1000, rng, default=2)
+    assert len(samples) == 1000
+    assert np.mean(samples) == pytest.approx(2, abs=0.02)
+    choices = monte_carlo.sample(
+        {'distribution': 'choice', 'values': ['HAB-800', 'HAB-3000']}, 10, rng)
+    assert set(choices) <= {'HAB-800', 'HAB-3000'}
+    with pytest.raises(ValueError):
+        monte_carlo.sample({'distribution': 'cauchy'}, 10, rng)
+
+
+def test_make_configs():
+    config = make_config()
+    values = {'payload.bus_mass_kg': np.array([1.0, 2.0])}
+    configs = monte_carlo.make_configs(config, values, 2)
+    assert [c['payload']['bus_mass_kg'] for c in configs] == [1.0, 2.0]
+    assert config['payload']['bus_mass_kg'] == 2
+
+
+def test_run_monte_carlo_is_reproducible():
+    config = make_config()
+    result = monte_carlo.run_monte_carlo(config, DISTRIBUTIONS, 10, seed=1,
+                                         workers=1, chunk_size=3)
+    again = monte_carlo.run_monte_carlo(config, DISTRIBUTIONS, 10, seed=1,
+                                        workers=2, chunk_size=3)
+    assert len(result) == 10
+    assert np.array_equal(result.final_altitude, again.final_altitude)
+    assert np.array_equal(result.values['balloon.cd'],
+                          again.values['balloon.cd'])
+    # the default chunks do not depend on the number of workers
+    default = monte_carlo.run_monte_carlo(config, DISTRIBUTIONS, 40, seed=1,
+                                          workers=1)
+    again = monte_carlo.run_monte_carlo(config, DISTRIBUTIONS, 40, seed=1,
+                                        workers=3)
+    assert np.array_equal(default.final_altitude, again.final_altitude)
+    other = monte_carlo.run_monte_carlo(config, DISTRIBUTIONS, 10, seed=2,
+                                        workers=1, chunk_size=3)
+    assert not np.array_equal(result.final_altitude, other.final_altitude)
+
+
+def test_monte_carlo_summary():
+    config = make_config()
+    config['monte_carlo'] = {'runs': 4, 'seed': 0,
+                             'distributions': DISTRIBUTIONS}
+    result = monte_carlo.from_config(config, workers=1)
+    summary = result.summary()
+    assert summary['runs'] == 4
+    assert summary['burst_fraction'] == 0
+    assert summary['burst_altitude'] == {'count': 0}
+    assert np.all(np.isnan(result.burst_altitude))
+    stats = monte_carlo.summarize([1, 2, 3, np.nan])
+    assert stats['count'] == 3
+    assert stats['p50'] == 2
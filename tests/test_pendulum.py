@@ -0,0 +1,107 @@
+import pytest
+import numpy as np
+from hab_toolbox import batch
+from hab_toolbox import pendulum
+from tests.conftest import make_config
+
+G = pendulum.STANDARD_GRAVITY
+TSPAN = np.arange(0, 20, step=0.01)
+
+
+def energy(result, length, gravity=G):
+    # per unit mass
+    return (0.5 * length**2 * (result.theta_dot**2 + (
+        np.sin(result.theta) * result.phi_dot)**2)
+            - gravity * length * np.cos(result.theta))
+
+
+def test_unit_vector():
+    rng = np.random.default_rng(0)
+    state = (rng.uniform(0.1, 3.0, 20), rng.uniform(-3.0, 3.0, 20),
+             rng.normal(size=20), rng.normal(size=20))
+    n, w = pendulum.to_unit_vector(*state)
+    assert np.allclose(np.sum(n*n, axis=0), 1)
+    assert np.allclose(np.sum(n*w, axis=0), 0)
+    for value, expected in zip(pendulum.from_unit_vector(n, w), state):
+        assert np.allclose(value, expected)
+    # the equations of motion of etc/kinematics_model/hab_pendulum.m
+    theta, phi, theta_dot, phi_dot = state
+    theta_dd = phi_dot**2 * np.cos(theta) * np.sin(theta) - G * np.sin(theta)
+    phi_dd = -2 * theta_dot * phi_dot / np.tan(theta)
+    dt = 1e-6
+    expected = pendulum.to_unit_vector(theta + dt*theta_dot,
+                                       phi + dt*phi_dot,
+                                       theta_dot + dt*theta_dd,
+                                       phi_dot + dt*phi_dd)[1]
+    assert np.allclose(pendulum.derivative(n, w, G), (expected - w) / dt,
+                       atol=1e-4)
+
+
+def test_simulate():
+    lengths = np.array([1.0, 2.0, 5.0])
+    result = pendulum.simulate(TSPAN, lengths, np.radians(10))
+    assert result.theta.shape == (3, len(TSPAN))
+    x = result.positions()[0]
+    for i, length in enumerate(lengths):
+        crossings = TSPAN[np.flatnonzero((x[i, :-1] > 0) & (x[i, 1:] <= 0))]
+        period = 2 * np.pi * np.sqrt(length / G) * (1 + np.radians(10)**2/16)
+        assert np.mean(np.diff(crossings)) == pytest.approx(period, rel=1e-2)
+        # each pendulum swings as if it was simulated alone
+        alone = pendulum.simulate(TSPAN, length, np.radians(10))
+        assert np.allclose(alone.theta[0], result.theta[i], atol=1e-12)
+    assert np.allclose(result.max_swing, np.radians(10))
+    assert np.allclose(energy(result, lengths[:, np.newaxis]),
+                       energy(result, lengths[:, np.newaxis])[:, :1],
+                       rtol=1e-6)
+    # a conical pendulum keeps its angle
+    rate = np.sqrt(G / np.cos(0.5))
+    conical = pendulum.simulate(TSPAN, 1.0, 0.5, phi_dot=rate)
+    assert np.allclose(conical.theta, 0.5, atol=1e-6)
+    assert np.allclose(conical.phi_dot, rate, rtol=1e-6)
+    with pytest.raises(ValueError):
+        pendulum.simulate(TSPAN, 0.0, 0.1)
+
+
+def test_singularity():
+    # swinging in a plane through the vertical, and passing within 1e-4 rad
+    # of it, where phi' exceeds 1e4 rad/s
+    result = pendulum.simulate(TSPAN, 1.0, [0.0, 0.3, 0.3],
+                               theta_dot=[1.0, 0.0, 0.0],
+                               phi_dot=[0.0, 0.0, 1e-3])
+    assert np.all(np.isfinite(result.theta))
+    assert np.all(np.isfinite(result.phi_dot))
+    assert np.all(result.theta >= 0)
+    assert result.theta[2].min() < 1e-3
+    assert np.allclose(result.max_swing, [0.32070, 0.3, 0.3], atol=1e-5)
+    e = energy(result, 1.0)
+    assert np.allclose(e, e[:, :1], rtol=1e-6)
+
+
+def test_ascent_accel():
+    # a balloon accelerating upward at a constant rate increases gravity
+    driven = pendulum.simulate(TSPAN, 2.0, 0.2, phi_dot=0.5,
+                               ascent_accel=np.full(len(TSPAN), 1.5),
+                               substeps=2)
+    heavier = pendulum.simulate(TSPAN, 2.0, 0.2, phi_dot=0.5,
+                                gravity=G + 1.5, substeps=2)
+    for field in pendulum.PendulumResult.FIELDS:
+        assert np.allclose(getattr(driven, field), getattr(heavier, field))
+
+
+def test_swing_batch():
+    configs = [make_config(duration=duration) for duration in (100, 200)]
+    result = batch.run_batch(configs)
+    swing = pendulum.swing_batch(result, [1.0, 3.0, 3.0], 0.1,
+                                 members=[0, 0, 1])
+    assert swing.theta.shape == (3, result.time.shape[1])
+    for i, member in enumerate([0, 0, 1]):
+        t, _, _, a = result.member(member)
+        alone = pendulum.simulate(t, swing.length[i], 0.1, ascent_accel=a)
+        n = len(t)
+        assert np.allclose(swing.theta[i, :n], alone.theta[0], atol=1e-12)
+        assert np.all(np.isnan(swing.theta[i, n:]))
+        assert np.allclose(swing.final_state[:, i], alone.final_state[:, 0])
+        assert swing.max_swing[i] == pytest.approx(alone.max_swing[0])
+    final = pendulum.swing_batch(result, 1.0, 0.1, record=False)
+    assert final.theta is None
+    assert np.array_equal(final.final_state[:, 0], swing.final_state[:, 0])
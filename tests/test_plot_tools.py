@@ -0,0 +1,26 @@
+import numpy as np
+from hab_toolbox import plot_tools
+
+
+def test_minmax_decimate():
+    x = np.arange(1003, dtype=float)
+    y = np.sin(x / 50) + np.random.default_rng(0).normal(0, 0.1, len(x))
+    x_dec, y_dec = plot_tools.minmax_decimate(x, y, 10)
+    assert len(x_dec) == 2 * 10  # nine full buckets and a shorter one
+    assert np.all(np.diff(x_dec) >= 0)
+    assert y_dec.max() == y.max() and y_dec.min() == y.min()
+    assert np.array_equal(y_dec, y[x_dec.astype(int)])
+
+
+def test_minmax_decimate_short():
+    x = y = np.arange(10)
+    x_dec, y_dec = plot_tools.minmax_decimate(x, y, 10)
+    assert x_dec is x and y_dec is y
+
+
+def test_plot_ascent_headless(tmp_path):
+    t = np.arange(5000.)
+    fig, axs = plot_tools.plot_ascent(t, t, t, t, title='test', headless=True,
+                                      save_fig=str(tmp_path / 'plot'))
+    assert (tmp_path / 'plot.png').stat().st_size > 0
+    assert len(axs[0].lines[0].get_xdata()) < len(t)
@@ -0,0 +1,77 @@
+import time
+import pytest
+import numpy as np
+from hab_toolbox import ascent_model
+from hab_toolbox.profiling import PHASES, Profile
+from hab_toolbox.trajectory import Telemetry
+from tests.conftest import make_config
+
+
+def test_lap_excludes_timed_calls():
+    profile = Profile()
+    sleep = profile.timed('atmosphere', time.sleep)
+    profile.mark()
+    sleep(0.02)
+    profile.lap('forces')
+    assert profile.timers['atmosphere'] >= 0.02
+    assert profile.timers['forces'] < 0.01
+    assert profile.simulation_time == pytest.approx(
+        profile.timers['atmosphere'] + profile.timers['forces'])
+
+
+def test_run_step_by_step_phases():
+    config = make_config()
+    expected = ascent_model.run(config, telemetry=Telemetry())
+    with Profile() as profile:
+        result = ascent_model.run(config, telemetry=Telemetry(),
+                                  profile=profile)
+    for column, expected_column in zip(result, expected):
+        assert np.array_equal(column, expected_column)
+    assert profile.steps == len(result[0])
+    for phase in ('setup', 'atmosphere', 'forces', 'integration',
+                  'burst_check', 'io'):
+        assert profile.timers[phase] > 0
+    assert profile.timers['kernel'] == 0
+    assert profile.wall_time >= profile.simulation_time
+    report = profile.report()
+    assert report['steps_per_second'] == pytest.approx(
+        profile.steps / profile.simulation_time)
+    assert sum(p['fraction'] for p in report['phases'].values()) == \
+        pytest.approx(1)
+
+
+def test_run_fused_phases():
+    profile = Profile()
+    t, h, v, a = ascent_model.run(make_config(), profile=profile)
+    assert profile.steps == len(t)
+    assert profile.timers['kernel'] > 0
+    assert profile.timers['atmosphere'] == profile.timers['forces'] == 0
+
+
+@pytest.mark.parametrize('integrator', ['rk4', 'rk45'])
+def test_run_runge_kutta_phases(integrator):
+    profile = Profile()
+    t, h, v, a = ascent_model.run(make_config(integrator=integrator),
+                                  profile=profile)
+    # trajectories include the initial state
+    assert profile.steps == len(t) - 1
+    assert profile.timers['burst_check'] > 0
+
+
+def test_iter_run_io(tmp_path):
+    profile = Profile()
+    for chunk in ascent_model.iter_run(make_config(), chunk_size=8,
+                                       profile=profile):
+        time.sleep(0.005)
+    assert profile.timers['io'] >= 0.025
+
+
+def test_memory_and_cprofile(tmp_path):
+    path = tmp_path / 'run.pstats'
+    with Profile(trace_memory=True, stats_path=str(path)) as profile:
+        ascent_model.run(make_config(), profile=profile)
+    assert profile.peak_memory > 0
+    assert path.stat().st_size > 0
+    assert profile.stats().total_calls > 0
+    assert Profile().stats() is None
+    assert set(profile.report()['phases']) <= set(PHASES)
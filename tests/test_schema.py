@@ -0,0 +1,57 @@
+import copy
+import pytest
+from hab_toolbox import ascent_model
+from hab_toolbox import controller
+from hab_toolbox import schema
+from tests.conftest import make_config
+
+
+def test_resolve():
+    config = make_config()
+    config['pid'] = {'target_altitude_m': 20000, 'gains': {'kp': 0.1}}
+    original = copy.deepcopy(config)
+    resolved = schema.resolve(config)
+    assert config == original
+    assert resolved['simulation']['integrator'] == 'euler'
+    assert resolved['simulation']['decimation'] == 1
+    assert resolved['simulation']['max_dt'] == ascent_model.DEFAULT_MAX_DT
+    assert resolved['pid']['mode'] == 'continuous'
+    assert (resolved['pid']['arm_tolerance_m']
+            == controller.DEFAULT_ARM_TOLERANCE)
+    assert resolved['pid']['gains'] == {'kp': 0.1, 'ki': 0.0, 'kd': 0.0,
+                                        'n': 0.0}
+    assert 'delay_altitude_m' not in resolved['pid']
+    # blocks are only resolved if present
+    assert 'atmosphere' not in resolved
+    assert 'descent' not in resolved
+    assert schema.resolve(resolved) == resolved
+
+
+def test_check():
+    assert schema.check(make_config()) == []
+    config = make_config(dt=0, integrator='rk5', decimation=2.0)
+    config['balloon']['reserve_mas_kg'] = config['balloon'].pop(
+        'reserve_mass_kg')
+    config['payload']['bus_mass_kg'] = True
+    config['atmosphere'] = 'tabulated'
+    config['monte_carlo'] = {'runs': 10, 'anything': {}}
+    del config['simulation']['initial_velocity']
+    errors = schema.check(config)
+    assert sorted(errors) == sorted([
+        'balloon.reserve_mass_kg: required field is missing',
+        'balloon.reserve_mas_kg: unknown field, did you mean '
+        '"reserve_mass_kg"?',
+        "payload.bus_mass_kg: expected number, not bool True",
+        'simulation.initial_velocity: required field is missing',
+        'simulation.dt: must be positive, not 0',
+        'simulation.integrator: must be one of euler, rk4, rk45, not '
+        "'rk5'",
+        'simulation.decimation: expected int, not float 2.0',
+        'atmosphere: must be an object, not str',
+    ])
+    assert schema.check([]) == ['config: must be an object, not list']
+    assert schema.check({}) == [
+        f'{block}: required field is missing'
+        for block in ('balloon', 'payload', 'simulation')]
+    with pytest.raises(ValueError, match='simulation.dt'):
+        schema.resolve(config)
@@ -0,0 +1,75 @@
+import pytest
+import numpy as np
+from hab_toolbox import sinks
+
+
+CHUNKS = [tuple(np.arange(4*n, 4*n + 4, dtype=float) + j for j in range(4))
+          for n in range(3)]
+EXPECTED = np.column_stack([np.concatenate(column) for column in zip(*CHUNKS)])
+
+
+def write_chunks(sink):
+    with sink:
+        for chunk in CHUNKS:
+            sink.write(*chunk)
+    assert sink.count == 12
+
+
+def test_csv_sink(tmp_path):
+    path = tmp_path / 'out.csv'
+    write_chunks(sinks.CsvSink(path))
+    assert path.read_text().startswith('# time,altitude,ascent_rate,')
+    assert np.array_equal(np.genfromtxt(path, delimiter=','), EXPECTED)
+
+
+def test_npy_sink(tmp_path):
+    path = tmp_path / 'out.npy'
+    write_chunks(sinks.NpySink(path))
+    assert np.array_equal(np.load(path), EXPECTED)
+    assert np.array_equal(np.load(path, mmap_mode='r'), EXPECTED)
+
+
+def test_npz_sink(tmp_path):
+    path = tmp_path / 'out.npz'
+    write_chunks(sinks.NpzSink(path))
+    with np.load(path) as data:
+        assert list(data.keys()) == list(sinks.FIELDS)
+        assert np.array_equal(data['altitude'], EXPECTED[:, 1])
+    assert [p.name for p in tmp_path.iterdir()] == ['out.npz']
+
+
+def test_memmap_sink(tmp_path):
+    path = tmp_path / 'out.npy'
+    write_chunks(sinks.MemmapSink(path, capacity=20))
+    assert np.array_equal(np.load(path), EXPECTED)
+    with pytest.raises(IndexError):
+        with sinks.MemmapSink(path, capacity=2) as sink:
+            sink.write(*CHUNKS[0])
+
+
+def test_open_sink(tmp_path):
+    for name, kind in [('a.npy', sinks.NpySink), ('a.npz', sinks.NpzSink),
+                       ('a.txt', sinks.CsvSink)]:
+        with sinks.open_sink(str(tmp_path / name)) as sink:
+            assert isinstance(sink, kind)
+    assert sink.path.endswith('a.csv')
+
+
+@pytest.mark.parametrize('name', ['out.csv', 'out.npy'])
+def test_resume_sink(tmp_path, name):
+    path = str(tmp_path / name)
+    sink = sinks.open_sink(path)
+    sink.write(*CHUNKS[0])
+    position = sink.position
+    sink.write(*CHUNKS[1])
+    sink._file.close()  # stopped without finishing the file
+    with sinks.open_sink(path, position=position) as sink:
+        for chunk in CHUNKS[1:]:
+            sink.write(*chunk)
+    assert sink.count == 12
+    if name.endswith('.npy'):
+        assert np.array_equal(np.load(path), EXPECTED)
+    else:
+        assert np.array_equal(np.genfromtxt(path, delimiter=','), EXPECTED)
+    with pytest.raises(ValueError):
+        sinks.open_sink(str(tmp_path / 'out.traj'), position=position)
@@ -0,0 +1,106 @@
+import pytest
+import numpy as np
+from hab_toolbox.trajectory import Trajectory
+
+
+def test_trajectory_append_and_trim():
+    traj = Trajectory(5)
+    for i in range(3):
+        traj.append(i, 10*i, 20*i, 30*i)
+    t, h, v, a = traj.trim()
+    assert len(traj) == 3
+    assert list(t) == [0, 1, 2]
+    assert list(a) == [0, 30, 60]
+    assert list(traj.altitude) == [0, 10, 20]
+
+
+def test_trajectory_full():
+    traj = Trajectory(2)
+    traj.append(0, 0, 0, 0)
+    traj.append(1, 0, 0, 0)
+    with pytest.raises(IndexError):
+        traj.append(2, 0, 0, 0)
+
+
+def test_trajectory_decimation():
+    traj = Trajectory(4, decimation=3)
+    for i in range(10):
+        traj.append(i, i, i, i)
+    assert list(traj.time) == [0, 3, 6, 9]
+    assert traj.count == 10
+
+
+def test_trajectory_ring_buffer():
+    traj = Trajectory(3, ring_buffer=True)
+    for i in range(7):
+        traj.append(i, i, i, i)
+    assert len(traj) == 3
+    assert list(traj.time) == [4, 5, 6]
+
+
+def test_trajectory_from_config():
+    config = {'simulation': {'decimation': 2}}
+    assert Trajectory.from_config(11, config).capacity == 6
+    config = {'simulation': {'decimation': 2, 'max_samples': 3}}
+    traj = Trajectory.from_config(11, config)
+    assert traj.capacity == 3
+    assert traj.ring_buffer is True
+    with pytest.raises(ValueError):
+        Trajectory(3, decimation=0)
+
+
+def test_trajectory_growable():
+    traj = Trajectory(2, growable=True)
+    for i in range(5):
+        traj.append(i, i, i, i)
+    assert traj.capacity == 8
+    assert list(traj.time) == [0, 1, 2, 3, 4]
+
+
+def test_trajectory_configure_like():
+    from hab_toolbox.trajectory import Telemetry
+    traj = Trajectory(3, decimation=2, ring_buffer=True)
+    telemetry = Telemetry()
+    telemetry.configure_like(traj)
+    for i in range(10):
+        traj.append(i, i, i, i)
+        telemetry.append(i, i, i, i, i)
+    assert np.array_equal(telemetry.time, traj.time)
+    assert list(telemetry.net_force) == [4, 6, 8]
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'capacity': 20},
+    {'capacity': 7, 'decimation': 3},
+    {'capacity': 4, 'ring_buffer': True},
+    {'capacity': 3, 'decimation': 2, 'ring_buffer': True},
+    {'capacity': 1, 'growable': True},
+])
+def test_trajectory_extend_matches_append(kwargs):
+    extended = Trajectory(**kwargs)
+    appended = Trajectory(**kwargs)
+    values = np.arange(20.0)
+    for start, stop in ((0, 5), (5, 6), (6, 6), (6, 20)):
+        chunk = values[start:stop]
+        extended.extend(chunk, -chunk, 2*chunk, 3*chunk)
+        for x in chunk:
+            appended.append(x, -x, 2*x, 3*x)
+    assert extended.count == appended.count == 20
+    for column, expected in zip(extended.trim(), appended.trim()):
+        assert np.array_equal(column, expected)
+
+
+def test_trajectory_extend_full():
+    traj = Trajectory(3)
+    with pytest.raises(IndexError):
+        traj.extend(*[np.zeros(4)] * 4)
+    assert len(traj) == 0
+
+
+def test_trajectory_append_keep():
+    traj = Trajectory(4, decimation=3)
+    for i in range(5):
+        traj.append(i, i, i, i)
+    traj.append(5, 5, 5, 5, keep=True)
+    assert list(traj.time) == [0, 3, 5]
+    assert traj.count == 6
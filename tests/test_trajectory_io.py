@@ -0,0 +1,55 @@
+import pytest
+import numpy as np
+from hab_toolbox import sinks
+from hab_toolbox import trajectory_io
+
+
+COLUMNS = tuple(np.linspace(0, 1, 11) + j for j in range(4))
+
+
+@pytest.mark.parametrize('dtype', ['<f8', '<f4'])
+def test_save_and_load(tmp_path, dtype):
+    path = tmp_path / 'out.traj'
+    trajectory_io.save(path, COLUMNS, dtype=dtype, metadata={'id': 'test'})
+    header = trajectory_io.read_header(path)
+    assert header['count'] == 11
+    assert header['metadata'] == {'id': 'test'}
+    assert header['offset'] % trajectory_io.ALIGNMENT == 0
+    columns = trajectory_io.load(path)
+    assert isinstance(columns[0], np.memmap)
+    for column, expected in zip(columns, COLUMNS):
+        assert np.array_equal(column, expected.astype(dtype))
+
+
+def test_trajectory_sink(tmp_path):
+    path = tmp_path / 'out.traj'
+    with sinks.TrajectorySink(path) as sink:
+        sink.write(*(column[:4] for column in COLUMNS))
+        sink.write(*(column[4:] for column in COLUMNS))
+    for column, expected in zip(trajectory_io.load(path), COLUMNS):
+        assert np.array_equal(column, expected)
+    assert [p.name for p in tmp_path.iterdir()] == ['out.traj']
+
+
+def test_load_empty(tmp_path):
+    path = tmp_path / 'out.traj'
+    trajectory_io.save(path, tuple(np.empty(0) for _ in range(4)))
+    assert all(len(column) == 0 for column in trajectory_io.load(path))
+
+
+def test_read_header_not_a_trajectory(tmp_path):
+    path = tmp_path / 'out.traj'
+    path.write_bytes(b'time,altitude\n')
+    with pytest.raises(ValueError):
+        trajectory_io.read_header(path)
+
+
+@pytest.mark.parametrize('name', ['out.csv', 'out.npy', 'out.npz', 'out.traj'])
+def test_read(tmp_path, name):
+    path = str(tmp_path / name)
+    with sinks.open_sink(path) as sink:
+        sink.write(*COLUMNS)
+    columns = trajectory_io.read(path)
+    assert len(columns) == 4
+    for column, expected in zip(columns, COLUMNS):
+        assert column == pytest.approx(expected)
@@ -0,0 +1,70 @@
+import pytest
+import numpy as np
+from hab_toolbox import tuning
+from tests.conftest import controlled_config, make_config
+
+BOUNDS = {'kp': [1e-4, 1], 'kd': [0, 0.1]}
+
+
+def test_latin_hypercube():
+    points = tuning.latin_hypercube(8, 3, np.random.default_rng(0))
+    assert points.shape == (8, 3)
+    # one sample in each stratum of each dimension
+    for column in points.T:
+        assert sorted(np.floor(column * 8)) == list(range(8))
+
+
+def test_search_space():
+    space = tuning.SearchSpace(BOUNDS)
+    assert space.names == ['kp', 'kd']
+    assert space.gains([0, 0]) == {'kp': 1e-4, 'kd': 0}
+    assert space.gains([0.5, 0.5]) == pytest.approx({'kp': 1e-2, 'kd': 0.05})
+    assert space.gains([2, -1]) == space.gains([1, 0])
+    with pytest.raises(ValueError):
+        tuning.SearchSpace({'kx': [0, 1]})
+    with pytest.raises(ValueError):
+        tuning.SearchSpace({'kp': [1, 0]})
+
+
+def test_nelder_mead():
+    target = np.array([0.3, 0.7])
+    search = tuning.NelderMead([0.9, 0.1])
+    for _ in range(100):
+        points = search.propose()
+        search.tell(np.sum((points - target) ** 2, axis=1))
+    point, cost = search.best
+    assert point == pytest.approx(target, abs=1e-3)
+    assert cost < 1e-6
+
+
+def test_run_tuning():
+    config = controlled_config()
+    result = tuning.run_tuning(config, BOUNDS, samples=6, starts=2,
+                               iterations=3, seed=1, workers=1,
+                               settle_tolerance=20, abort_error=100)
+    assert set(result.gains) == {'kp', 'kd'}
+    assert 1e-4 <= result.gains['kp'] <= 1
+    assert result.cost == min(metrics['cost']
+                              for metrics in result.evaluations.values())
+    assert result.metrics['settling_time'] <= 60
+    assert all(n <= 3 for n in result.iterations)
+    again = tuning.run_tuning(config, BOUNDS, samples=6, starts=2,
+                              iterations=3, seed=1, workers=1,
+                              settle_tolerance=20, abort_error=100)
+    assert again.gains == result.gains
+
+
+def test_evaluator_cache():
+    space = tuning.SearchSpace(BOUNDS)
+    with tuning.Evaluator(controlled_config(), space, 20, 100,
+                          workers=1) as evaluate:
+        costs = evaluate(np.array([[0.5, 0.5], [0.5, 0.5], [0, 1]]))
+        assert costs[0] == costs[1]
+        assert len(evaluate.cache) == 2 and evaluate.hits == 1
+        evaluate(np.array([[0, 1]]))
+        assert len(evaluate.cache) == 2 and evaluate.hits == 2
+
+
+def test_run_tuning_requires_target():
+    with pytest.raises(ValueError):
+        tuning.run_tuning(make_config(), BOUNDS)
@@ -0,0 +1,138 @@
+import pytest
+import numpy as np
+from hab_toolbox import ascent_model
+from hab_toolbox import batch
+from hab_toolbox import monte_carlo
+from hab_toolbox import wind
+from tests.conftest import make_config
+
+TIME = np.array([0.0, 600.0, 1800.0])
+ALTITUDE = np.array([0.0, 100.0, 1000.0, 5000.0])
+LATITUDE = np.linspace(45.0, 47.0, 5)
+LONGITUDE = np.linspace(6.0, 9.0, 7)
+
+
+def linear_wind(t, h, lat, lon):
+    # multilinear, so quadrilinear interpolation is exact
+    u = 2 + 1e-3 * t + 1e-3 * h + 0.5 * (lat - 45)
+    v = -1 + 0.2 * (lon - 6) + 1e-6 * t * h
+    return u, v
+
+
+@pytest.fixture
+def wind_file(tmp_path):
+    grid = np.meshgrid(TIME, ALTITUDE, LATITUDE, LONGITUDE, indexing='ij')
+    path = str(tmp_path / 'test.wind')
+    wind.save(path, TIME, ALTITUDE, LATITUDE, LONGITUDE, *linear_wind(*grid),
+              dtype='<f8', metadata={'source': 'test'})
+    return path
+
+
+def wind_config(wind_file, duration=600):
+    config = make_config(duration=duration)
+    config['wind'] = {'file': wind_file, 'launch_latitude_deg': 46.0,
+                      'launch_longitude_deg': 7.0, 'launch_time_s': 100.0}
+    return config
+
+
+def test_load(wind_file):
+    field = wind.WindField.load(wind_file)
+    assert isinstance(field.data, np.memmap)
+    assert field.data.shape == (3, 4, 5, 7, 2)
+    assert np.array_equal(field.altitude, ALTITUDE)
+    assert field.metadata == {'source': 'test'}
+
+
+def test_interpolation(wind_file):
+    field = wind.WindField.load(wind_file)
+    rng = np.random.default_rng(0)
+    points = (rng.uniform(0, 1800, 50), rng.uniform(0, 5000, 50),
+              rng.uniform(45, 47, 50), rng.uniform(6, 9, 50))
+    u, v = field(*points)
+    assert np.allclose(u, linear_wind(*points)[0], rtol=1e-12)
+    # v is bilinear in time and altitude, which is still exact per cell
+    assert np.allclose(v, linear_wind(*points)[1], rtol=1e-12)
+    interpolator = field.interpolator()
+    for i in range(50):
+        point = [x[i] for x in points]
+        assert interpolator(*point) == (u[i], v[i])
+    # altitudes above the grid use the highest level
+    assert field(0.0, 9000.0, 46.0, 7.0) == field(0.0, 5000.0, 46.0, 7.0)
+    assert np.isnan(field(0.0, 0.0, 44.0, 7.0)[0])
+    with pytest.raises(ValueError):
+        interpolator(0.0, 0.0, 46.0, 10.0)
+
+
+def test_interpolator_cache(wind_file):
+    field = wind.WindField.load(wind_file)
+    interpolator = field.interpolator()
+    for t in np.arange(0, 1200, 10.0):
+        interpolator(t, 50.0, 46.1, 7.1)
+    # two time cells in the same altitude, latitude and longitude cell
+    assert interpolator.misses == 2
+    assert interpolator.hits == 118
+    assert np.array_equal(interpolator.visited_cells(),
+                          [[0, 0, 2, 2], [1, 0, 2, 2]])
+
+
+def test_drift(wind_file):
+    sim_config = wind_config(wind_file)
+    t, h, v, a, latitude, longitude, interpolator = wind.run(sim_config)
+    assert np.array_equal(t, ascent_model.run(sim_config)[0])
+    assert (latitude[0], longitude[0]) == (46.0, 7.0)
+    # the wind at the launch blows east and south
+    assert longitude[-1] > 7.0 and latitude[-1] < 46.0
+    assert len(interpolator.visited) >= 2
+    # constant wind of 10 m/s east for 100 s
+    field = wind.WindField(TIME, ALTITUDE, LATITUDE, LONGITUDE,
+                           np.zeros((3, 4, 5, 7, 2)) + [10.0, 0.0])
+    latitude, longitude = wind.drift(np.arange(0, 101.0), np.zeros(101),
+                                     field, 46.0, 7.0)
+    assert latitude[-1] == 46.0
+    assert wind.distance(46.0, 7.0, 46.0, longitude[-1]) == pytest.approx(
+        1000, rel=1e-6)
+
+
+def test_drift_batch(wind_file):
+    field = wind.open_wind_field(wind_file)
+    launch_latitude = [46.0, 46.5]
+    result = batch.run_batch([wind_config(wind_file, duration)
+                              for duration in (200, 600)])
+    drifted = wind.drift_batch(result, field, launch_latitude, 7.0,
+                               start_time=100.0)
+    for i in range(len(result)):
+        t, h = result.member(i)[:2]
+        latitude, longitude = wind.drift(t, h, field, launch_latitude[i], 7.0,
+                                         start_time=100.0)
+        n = len(t)
+        assert np.allclose(drifted.latitude[i, :n], latitude, rtol=1e-12)
+        assert np.allclose(drifted.longitude[i, :n], longitude, rtol=1e-12)
+        assert np.all(np.isnan(drifted.latitude[i, n:]))
+        assert drifted.final_latitude[i] == pytest.approx(latitude[-1],
+                                                          rel=1e-12)
+    assert not drifted.out_of_grid.any()
+    assert len(drifted.visited) >= 2
+
+
+def test_drift_batch_out_of_grid(wind_file):
+    configs = [wind_config(wind_file, 3000)]
+    result = batch.run_batch(configs)
+    drifted = wind.drift_batch(result, wind.open_wind_field(wind_file),
+                               46.0, 7.0)
+    # the flight outlasts the time axis of the grid
+    assert drifted.out_of_grid[0]
+    assert np.isnan(drifted.latitude[0, -1])
+
+
+def test_monte_carlo_landing_zone(wind_file):
+    base_config = wind_config(wind_file)
+    distributions = {'wind.launch_latitude_deg': {'std': 0.1}}
+    result = monte_carlo.run_monte_carlo(base_config, distributions, 8,
+                                         seed=0, workers=1)
+    assert not np.isnan(result.final_latitude).any()
+    assert np.corrcoef(result.values['wind.launch_latitude_deg'],
+                       result.final_latitude)[0, 1] > 0.99
+    summary = result.summary()
+    assert summary['out_of_grid_fraction'] == 0
+    assert summary['landing_zone']['count'] == 8
+    assert summary['landing_zone']['std_north'] > 1000